@@ -1,7 +1,8 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
+from fastapi import APIRouter, HTTPException, Query
+from typing import List, Optional
 from backend.models.communication import Communication, InitiatorLog
-from backend.core.communication.service import get_message, get_chain, get_initiators
+from backend.models.message import DEFAULT_SESSION_ID
+from backend.core.communication.service import get_message, get_chain, get_initiators, get_latest_reply
 
 router = APIRouter(prefix="/communications", tags=["communications"])
 
@@ -13,6 +14,14 @@ async def list_initiators():
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/latest", response_model=Optional[Communication])
+async def read_latest_reply(session_id: str = Query(DEFAULT_SESSION_ID)):
+    """Get the session's newest assistant reply, so a reloaded client can continue its thread (null if none)."""
+    try:
+        return get_latest_reply(session_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/{com_id}", response_model=Communication)
 async def read_message(com_id: str):
     """Get the full raw content and metadata of a single message by com_id."""
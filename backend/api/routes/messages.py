@@ -1,5 +1,5 @@
 from fastapi import APIRouter, HTTPException, Query
-from typing import List
+from typing import List, Optional
 import logging
 
 from backend.models.message import MessageResponse, MessageCreate
@@ -16,10 +16,10 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/messages", tags=["messages"])
 
 @router.get("", response_model=List[MessageResponse])
-async def list_messages(limit: int = Query(100, ge=1, le=1000)):
-    """Retrieve all messages with an optional limit."""
+async def list_messages(limit: int = Query(100, ge=1, le=1000), session_id: Optional[str] = None):
+    """Retrieve all messages (of one session, if given) with an optional limit."""
     try:
-        messages = get_all_messages(limit)
+        messages = get_all_messages(limit, session_id)
         return [
             MessageResponse(
                 id=msg.id,
@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+
+from backend.core.metrics import metrics
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+
+@router.get("")
+async def read_metrics():
+    """Return a snapshot of all in-process operational metrics."""
+    return metrics.snapshot()
@@ -0,0 +1,19 @@
+from fastapi import APIRouter, HTTPException
+
+from backend.core.scheduler import scheduler
+
+router = APIRouter(prefix="/scheduler", tags=["scheduler"])
+
+
+@router.get("/jobs")
+async def read_jobs():
+    """Return the scheduler state and every job's schedule and last outcome."""
+    return scheduler.status()
+
+
+@router.post("/jobs/{name}/run")
+async def run_job(name: str):
+    """Make a job due immediately."""
+    if not scheduler.run_now(name):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"status": "scheduled", "name": name}
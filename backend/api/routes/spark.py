@@ -0,0 +1,32 @@
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request
+
+router = APIRouter(prefix="/spark", tags=["spark"])
+
+
+def _engine(request: Request):
+    engine = getattr(request.app.state, "spark", None)
+    if engine is None:
+        raise HTTPException(status_code=503, detail="SPARK is not running")
+    return engine
+
+
+@router.get("/status")
+async def read_status(request: Request):
+    """Return whether SPARK is running and its most recent heartbeats."""
+    return _engine(request).status()
+
+
+@router.get("/log")
+async def read_log(request: Request, since: Optional[datetime] = None, until: Optional[datetime] = None):
+    """Return logged heartbeats in [since, until]; defaults to the last 24 hours."""
+    engine = _engine(request)
+    until = until or datetime.now().astimezone()
+    since = since or until - timedelta(days=1)
+    records = await engine.query_log(since, until)
+    return [
+        {"timestamp": record.timestamp.isoformat(), "status": record.status, "action": record.action}
+        for record in records
+    ]
@@ -0,0 +1,141 @@
+"""Adaptive token coalescing for streamed WebSocket responses."""
+from typing import Awaitable, Callable, List, Optional
+import asyncio
+import logging
+import time
+
+from backend.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Feature name clients advertise in their "hello" message
+TOKEN_BATCHING_FEATURE = "token_batching"
+
+
+class TokenCoalescer:
+    """
+    Batch streamed tokens into fewer frames.
+
+    The first token is sent immediately so time-to-first-token is unchanged.
+    Later tokens are buffered and flushed when the time window elapses or the
+    buffer reaches max_bytes. The window adapts to the stream: it widens
+    (up to max_window_ms) while flushes carry several tokens and snaps back to
+    min_window_ms when tokens arrive slowly, so slow streams stay responsive.
+
+    Usage:
+        coalescer = TokenCoalescer(send_batch)
+        async for token in stream:
+            await coalescer.add(token)
+        await coalescer.close()
+    """
+
+    def __init__(
+        self,
+        send: Callable[[str, int], Awaitable[None]],
+        min_window_ms: float = 16.0,
+        max_window_ms: float = 50.0,
+        max_bytes: int = 4096
+    ):
+        """
+        Args:
+            send: Coroutine called with (text, token_count) for every frame.
+            min_window_ms: Shortest batching window.
+            max_window_ms: Longest batching window.
+            max_bytes: Flush as soon as the buffer reaches this many UTF-8 bytes.
+        """
+        self._send = send
+        self.min_window = min_window_ms / 1000
+        self.max_window = max(max_window_ms, min_window_ms) / 1000
+        self.max_bytes = max_bytes
+        self.window = self.min_window
+
+        self._pending: List[str] = []
+        self._pending_bytes = 0
+        self._lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+        self._error: Optional[BaseException] = None
+        self._last_flush = 0.0
+
+        self.frames_sent = 0
+        self.tokens_sent = 0
+
+    async def add(self, token: str) -> None:
+        """
+        Queue a token for sending.
+
+        Raises:
+            Exception: Any error raised by a previous background flush
+                       (e.g. the client disconnected).
+        """
+        self._raise_pending_error()
+        if not token:
+            return
+
+        self._pending.append(token)
+        self._pending_bytes += len(token.encode("utf-8"))
+
+        if self.frames_sent == 0 or self._pending_bytes >= self.max_bytes:
+            await self.flush()
+            return
+
+        # Flush straight away if the window already elapsed since the last frame
+        elapsed = time.monotonic() - self._last_flush
+        if elapsed >= self.window:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_after(self.window - elapsed))
+
+    async def flush(self) -> None:
+        """Send everything buffered as one frame."""
+        self._cancel_timer()
+        async with self._lock:
+            if not self._pending:
+                return
+            text = "".join(self._pending)
+            count = len(self._pending)
+            self._pending = []
+            self._pending_bytes = 0
+
+            self._adapt(count)
+            self._last_flush = time.monotonic()
+            await self._send(text, count)
+
+            self.frames_sent += 1
+            self.tokens_sent += count
+            metrics.increment("websocket.stream.frames")
+            metrics.increment("websocket.stream.tokens", count)
+
+    async def close(self) -> None:
+        """Flush the remainder and stop the timer; errors from the final flush are raised."""
+        self._cancel_timer()
+        self._raise_pending_error()
+        await self.flush()
+
+    def _adapt(self, batch_size: int) -> None:
+        """Widen the window for fast streams, reset it for slow ones."""
+        if batch_size > 1:
+            self.window = min(self.window * 1.5, self.max_window)
+        else:
+            self.window = self.min_window
+
+    async def _flush_after(self, delay: float) -> None:
+        try:
+            await asyncio.sleep(delay)
+            self._timer = None
+            await self.flush()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            # Surfaced to the producer on its next add()/close()
+            self._error = e
+
+    def _cancel_timer(self) -> None:
+        timer = self._timer
+        self._timer = None
+        if timer is not None and timer is not asyncio.current_task() and not timer.done():
+            timer.cancel()
+
+    def _raise_pending_error(self) -> None:
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
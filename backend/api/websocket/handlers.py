@@ -1,27 +1,325 @@
 """WebSocket message handlers."""
 from fastapi import WebSocket, WebSocketDisconnect
 from starlette.websockets import WebSocketState
+from contextlib import aclosing
 from datetime import datetime
+from typing import List, Optional, Set
+import asyncio
 import json
 import logging
 import uuid
+from .coalescer import TokenCoalescer, TOKEN_BATCHING_FEATURE
 from .connection import manager
-from backend.core.agent import head_agent
-from backend.core.communication.service import save_message
+from backend.config.settings import settings
+from backend.core.agent import HeadAgent, sessions
+from backend.core.communication.service import get_message, save_message
+from backend.core.metrics import metrics
 from backend.models.communication import CommunicationCreate
+from backend.models.message import DEFAULT_SESSION_ID
 
 logger = logging.getLogger(__name__)
 
+# Sentinel returned by anext() once the agent stream is exhausted
+_STREAM_END = object()
+
+
+# Protocol features the server can negotiate via {"type": "hello"}
+SUPPORTED_FEATURES = {TOKEN_BATCHING_FEATURE}
+
+
+class _TurnState:
+    """Tracks the turn currently streaming on a connection so it can be cancelled."""
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.message_id: Optional[str] = None
+        # Features negotiated for this connection
+        self.features: Set[str] = set()
+        # Agent of the session this connection talks to (set via hello)
+        self.session_id: Optional[str] = None
+        self.agent: Optional[HeadAgent] = sessions.get()
+
+    def cancel(self, message_id: Optional[str] = None) -> bool:
+        """
+        Cancel the running turn.
+
+        Args:
+            message_id: If given, only cancel when it matches the running turn.
+
+        Returns:
+            True if a running turn was cancelled.
+        """
+        if self.task is None or self.task.done():
+            return False
+        if message_id and self.message_id and message_id != self.message_id:
+            return False
+        self.task.cancel()
+        return True
+
+
+def _save_user_communication(content: str, last_com_id: Optional[str], session_id: str) -> Optional[str]:
+    """Save the user's message to the communications chain and return its com_id."""
+    try:
+        user_comm = save_message(CommunicationCreate(
+            sender="user",
+            recipient="assistant",
+            raw_content=content,
+            initiator_com_id=last_com_id,
+            session_id=session_id
+        ))
+        return str(user_comm.com_id)
+    except Exception as e:
+        logger.error(f"Failed to save user message: {e}")
+        # Continue without saving, chat should not break
+        return None
+
+
+def _thread_in_session(com_id: str, session_id: str) -> bool:
+    """Whether com_id is a saved message of the given session (so a turn may continue it)."""
+    try:
+        message = get_message(com_id)
+    except Exception as e:
+        logger.error(f"Failed to load message {com_id}: {e}")
+        return False
+    return message is not None and message.session_id == session_id
+
+
+def _reply_initiator(com_id: str) -> Optional[str]:
+    """com_id of the user message an assistant reply answered, if known."""
+    try:
+        reply = get_message(com_id)
+        return reply.initiator_com_id if reply else None
+    except Exception as e:
+        logger.error(f"Failed to load reply {com_id}: {e}")
+        return None
+
+
+async def _run_turn(
+    websocket: WebSocket,
+    client_id: str,
+    content: str,
+    last_com_id: Optional[str],
+    turn: _TurnState,
+    agent: HeadAgent,
+    regenerate: Optional[str] = None
+):
+    """
+    Stream a single agent turn to the client.
+
+    The user message is persisted in a worker thread while the agent builds
+    its context, so the save never delays the first token.
+
+    If regenerate is the com_id of an earlier assistant reply, a new answer
+    is streamed from that reply's cached context instead: nothing is saved
+    for the user, and the new answer is saved as a new version linked to
+    the same user message (which then points to it as its reply).
+
+    If the task is cancelled (client sent "cancel" or disconnected), the agent
+    generator is closed immediately — which aborts the upstream LLM stream —
+    and the partial response is persisted exactly once.
+    """
+    # --- 1. Save User Message (in a worker thread, off the critical path) ---
+    if regenerate:
+        # The user message already exists: find it so the new version links to it
+        user_save = asyncio.create_task(asyncio.to_thread(_reply_initiator, regenerate))
+        agent_stream = agent.regenerate(regenerate)
+    else:
+        user_save = asyncio.create_task(asyncio.to_thread(_save_user_communication, content, last_com_id, agent.session_id))
+        agent_stream = agent.process_message(content, last_com_id=last_com_id)
+    user_com_id = None
+
+    # Streaming logic
+    message_id = str(uuid.uuid4())
+    turn.message_id = message_id
+
+    async def send_tokens(text: str, count: int) -> None:
+        # Check if client is still connected before sending
+        if websocket.client_state != WebSocketState.CONNECTED:
+            raise ConnectionError("client disconnected during streaming")
+        frame = {
+            "type": "stream_token",
+            "message_id": message_id,
+            "token": text,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        if coalescer is not None:
+            frame["count"] = count
+        await manager.send_message(client_id, frame)
+
+    # Clients that negotiated batching get coalesced frames; others one frame per token
+    coalescer: Optional[TokenCoalescer] = None
+    if TOKEN_BATCHING_FEATURE in turn.features:
+        coalescer = TokenCoalescer(
+            send_tokens,
+            min_window_ms=settings.ws_token_batch_min_ms,
+            max_window_ms=settings.ws_token_batch_max_ms,
+            max_bytes=settings.ws_token_batch_max_bytes
+        )
+
+    async def emit(token: str) -> None:
+        if coalescer is not None:
+            await coalescer.add(token)
+        else:
+            await send_tokens(token, 1)
+
+    # Streamed text is buffered in a list and joined once when the turn ends
+    response_parts: List[str] = []
+    cancelled = False
+    try:
+        # Process message through agent (streaming); aclosing() closes the
+        # generator chain deterministically on break, error or cancellation
+        async with aclosing(agent_stream) as stream:
+            # Start context assembly and LLM dispatch while the user row is written
+            next_token = asyncio.ensure_future(anext(stream, _STREAM_END))
+            try:
+                user_com_id = await user_save
+
+                # --- 2. Send stream start with user_com_id ---
+                if websocket.client_state == WebSocketState.CONNECTED:
+                    start_frame = {
+                        "type": "stream_start",
+                        "message_id": message_id,
+                        "user_com_id": user_com_id,
+                        "timestamp": datetime.utcnow().isoformat()
+                    }
+                    if regenerate:
+                        start_frame["regenerates"] = regenerate
+                    try:
+                        await manager.send_message(client_id, start_frame)
+                    except Exception as send_error:
+                        logger.error(f"Failed to send stream_start: {send_error}")
+
+                token = await next_token
+            except BaseException:
+                # The generator must not be closed while the prefetch is still running it
+                next_token.cancel()
+                await asyncio.gather(next_token, return_exceptions=True)
+                raise
+
+            while token is not _STREAM_END:
+                try:
+                    await emit(token)
+                except Exception as send_error:
+                    logger.error(f"Failed to send token: {send_error}")
+                    cancelled = True
+                    break
+                response_parts.append(token)
+                token = await anext(stream, _STREAM_END)
+    except asyncio.CancelledError:
+        logger.info(f"Turn {message_id} for {client_id} cancelled after {len(response_parts)} tokens.")
+        cancelled = True
+        # Cancellation is handled here (partial save + stream_end below)
+        asyncio.current_task().uncancel()
+    except WebSocketDisconnect:
+        logger.info(f"Client {client_id} disconnected during streaming (expected).")
+        cancelled = True
+    except Exception as e:
+        logger.error(f"Error during streaming for {client_id}: {e}")
+        # Attempt to send error message only if still connected
+        if websocket.client_state == WebSocketState.CONNECTED:
+            try:
+                await manager.send_message(client_id, {"type": "error", "message": "Streaming error occurred."})
+            except Exception:
+                pass
+
+    if coalescer is not None:
+        # Deliver any buffered tokens before stream_end
+        try:
+            await coalescer.close()
+        except Exception as send_error:
+            logger.error(f"Failed to flush tokens: {send_error}")
+
+    if cancelled:
+        metrics.increment("websocket.turns.cancelled")
+
+    accumulated = "".join(response_parts)
+
+    # --- 3. Save AI Message (partial if cancelled) ---
+    ai_com_id = None
+    if accumulated:
+        try:
+            ai_comm = save_message(CommunicationCreate(
+                sender="assistant",
+                recipient="user",
+                raw_content=accumulated,
+                initiator_com_id=user_com_id,
+                session_id=agent.session_id
+            ))
+            ai_com_id = str(ai_comm.com_id)
+            agent.remember_reply(ai_com_id)
+        except Exception as e:
+            logger.error(f"Failed to save AI message: {e}")
+
+    # --- 4. Send stream end with ai_com_id ---
+    if websocket.client_state == WebSocketState.CONNECTED:
+        end_frame = {
+            "type": "stream_end",
+            "message_id": message_id,
+            "content": accumulated,
+            "sender": "assistant",
+            "ai_com_id": ai_com_id,
+            "cancelled": cancelled,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        if regenerate:
+            end_frame["replaces_com_id"] = regenerate
+        try:
+            await manager.send_message(client_id, end_frame)
+        except Exception as send_error:
+            logger.error(f"Failed to send stream_end: {send_error}")
+
+    # --- 5. Index the new messages for semantic recall (the reply is already delivered) ---
+    await agent.sync_recall_index()
+
+
+async def _turn_worker(websocket: WebSocket, client_id: str, queue: asyncio.Queue, turn: _TurnState):
+    """Run queued turns one at a time, in arrival order."""
+    while True:
+        content, last_com_id, agent, regenerate = await queue.get()
+        turn.task = asyncio.create_task(
+            _run_turn(websocket, client_id, content, last_com_id, turn, agent, regenerate)
+        )
+        try:
+            # wait() (unlike awaiting the task) does not raise when only the
+            # turn was cancelled, so the worker keeps serving the connection
+            await asyncio.wait({turn.task})
+        except asyncio.CancelledError:
+            # Connection is going away: cancel the running turn and let it clean up
+            turn.task.cancel()
+            await asyncio.gather(turn.task, return_exceptions=True)
+            raise
+        finally:
+            turn.task = None
+            turn.message_id = None
+
 
 async def handle_websocket(websocket: WebSocket):
     """
     Main WebSocket handler - accepts connections and processes messages.
 
+    Messages are received concurrently with streaming so the client can
+    send {"type": "cancel"} to abort the turn in progress.
+
+    Clients may send {"type": "hello", "features": ["token_batching"]} to opt
+    in to coalesced stream_token frames (several tokens per frame, with a
+    "count" field); clients that never say hello get one frame per token.
+    A "session_id" in the hello binds the connection to that session's own
+    agent (see backend.core.agent.sessions); without one the default agent
+    is used. A message's last_com_id must belong to the connection's
+    session, otherwise an error frame is sent and the message is dropped.
+
+    {"type": "regenerate", "com_id": ...} streams a new answer to a recent
+    assistant reply from its cached context (see HeadAgent.regenerate);
+    an error frame is sent once that context has expired.
+
     Args:
         websocket: The WebSocket connection
     """
     # Generate unique client ID
     client_id = str(uuid.uuid4())
+    turn = _TurnState()
+    turn_queue: asyncio.Queue = asyncio.Queue()
+    worker: Optional[asyncio.Task] = None
 
     try:
         # Accept the connection
@@ -45,99 +343,72 @@ async def handle_websocket(websocket: WebSocket):
                 message_data = json.loads(data)
                 logger.info(f"Received from {client_id}: {message_data}")
 
+                if message_data.get('type') == 'hello':
+                    requested = message_data.get('features') or []
+                    turn.features = SUPPORTED_FEATURES.intersection(requested)
+                    session_id = message_data.get('session_id')
+                    if session_id and session_id != turn.session_id:
+                        try:
+                            agent = sessions.acquire(session_id)
+                        except ValueError as e:
+                            await manager.send_message(client_id, {
+                                "type": "error",
+                                "message": str(e),
+                                "timestamp": datetime.utcnow().isoformat()
+                            })
+                            continue
+                        sessions.release(turn.session_id)
+                        turn.session_id, turn.agent = session_id, agent
+                    await manager.send_message(client_id, {
+                        "type": "hello_ack",
+                        "features": sorted(turn.features),
+                        "session_id": turn.session_id or DEFAULT_SESSION_ID,
+                        "timestamp": datetime.utcnow().isoformat()
+                    })
+                    continue
+
+                if message_data.get('type') == 'cancel':
+                    if turn.cancel(message_data.get('message_id')):
+                        logger.info(f"Client {client_id} cancelled the current turn.")
+                    continue
+
+                if message_data.get('type') == 'regenerate':
+                    com_id = message_data.get('com_id')
+                    if not (turn.agent and com_id and turn.agent.can_regenerate(com_id)):
+                        await manager.send_message(client_id, {
+                            "type": "error",
+                            "message": "This reply can no longer be regenerated; resend the message instead.",
+                            "com_id": com_id,
+                            "timestamp": datetime.utcnow().isoformat()
+                        })
+                        continue
+                    if worker is None:
+                        worker = asyncio.create_task(_turn_worker(websocket, client_id, turn_queue, turn))
+                    await turn_queue.put((None, None, turn.agent, com_id))
+                    continue
+
                 content = message_data.get('content', '')
                 last_com_id = message_data.get('last_com_id')
 
                 if not content:
                     continue
 
-                # --- 1. Save User Message ---
-                user_com_id = None
-                try:
-                    user_comm = save_message(CommunicationCreate(
-                        sender="user",
-                        recipient="assistant",
-                        raw_content=content,
-                        initiator_com_id=last_com_id
-                    ))
-                    user_com_id = str(user_comm.com_id)
-                except Exception as e:
-                    logger.error(f"Failed to save user message: {e}")
-                    # Continue without saving, chat should not break
-
-                if head_agent:
-                    # Streaming logic
-                    message_id = str(uuid.uuid4())
-
-                    # --- 2. Send stream start with user_com_id ---
-                    if websocket.client_state == WebSocketState.CONNECTED:
-                        try:
-                            await manager.send_message(client_id, {
-                                "type": "stream_start",
-                                "message_id": message_id,
-                                "user_com_id": user_com_id,
-                                "timestamp": datetime.utcnow().isoformat()
-                            })
-                        except Exception as send_error:
-                            logger.error(f"Failed to send stream_start: {send_error}")
+                # A session may only continue its own threads
+                if last_com_id and turn.agent and not await asyncio.to_thread(
+                    _thread_in_session, last_com_id, turn.agent.session_id
+                ):
+                    await manager.send_message(client_id, {
+                        "type": "error",
+                        "message": "Unknown conversation thread for this session.",
+                        "last_com_id": last_com_id,
+                        "timestamp": datetime.utcnow().isoformat()
+                    })
+                    continue
 
-                    accumulated = ""
-                    try:
-                        # Process message through agent (streaming)
-                        async for token in head_agent.process_message(content):
-                            # Check if client is still connected before sending
-                            if websocket.client_state != WebSocketState.CONNECTED:
-                                logger.warning("Client disconnected during streaming, aborting send.")
-                                break
-                            try:
-                                await manager.send_message(client_id, {
-                                    "type": "stream_token",
-                                    "message_id": message_id,
-                                    "token": token,
-                                    "timestamp": datetime.utcnow().isoformat()
-                                })
-                            except Exception as send_error:
-                                logger.error(f"Failed to send token: {send_error}")
-                                break
-                            accumulated += token
-                    except WebSocketDisconnect:
-                        logger.info(f"Client {client_id} disconnected during streaming (expected).")
-                    except Exception as e:
-                        logger.error(f"Error during streaming for {client_id}: {e}")
-                        # Attempt to send error message only if still connected
-                        if websocket.client_state == WebSocketState.CONNECTED:
-                            try:
-                                await manager.send_message(client_id, {"type": "error", "message": "Streaming error occurred."})
-                            except Exception:
-                                pass
-
-                    # --- 3. Save AI Message ---
-                    ai_com_id = None
-                    if accumulated:
-                        try:
-                            ai_comm = save_message(CommunicationCreate(
-                                sender="assistant",
-                                recipient="user",
-                                raw_content=accumulated,
-                                initiator_com_id=user_com_id
-                            ))
-                            ai_com_id = str(ai_comm.com_id)
-                        except Exception as e:
-                            logger.error(f"Failed to save AI message: {e}")
-
-                    # --- 4. Send stream end with ai_com_id ---
-                    if websocket.client_state == WebSocketState.CONNECTED:
-                        try:
-                            await manager.send_message(client_id, {
-                                "type": "stream_end",
-                                "message_id": message_id,
-                                "content": accumulated,
-                                "sender": "assistant",
-                                "ai_com_id": ai_com_id,
-                                "timestamp": datetime.utcnow().isoformat()
-                            })
-                        except Exception as send_error:
-                            logger.error(f"Failed to send stream_end: {send_error}")
+                if turn.agent:
+                    if worker is None:
+                        worker = asyncio.create_task(_turn_worker(websocket, client_id, turn_queue, turn))
+                    await turn_queue.put((content, last_com_id, turn.agent, None))
 
                 else:
                     # Fallback if agent failed to initialize
@@ -165,8 +436,17 @@ async def handle_websocket(websocket: WebSocket):
 
     except WebSocketDisconnect:
         logger.info(f"Client {client_id} disconnected normally")
-        manager.disconnect(client_id)
 
     except Exception as e:
         logger.error(f"Error in WebSocket handler for {client_id}: {e}")
-        manager.disconnect(client_id)
+
+    finally:
+        try:
+            # Abort any in-flight generation immediately so it stops costing tokens
+            if worker is not None:
+                worker.cancel()
+                await asyncio.gather(worker, return_exceptions=True)
+        finally:
+            # Runs even if the handler itself is cancelled while waiting above
+            sessions.release(turn.session_id)
+            manager.disconnect(client_id)
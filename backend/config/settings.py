@@ -1,9 +1,19 @@
 from pydantic_settings import BaseSettings
-from pydantic import ConfigDict
+from pydantic import BaseModel, ConfigDict
 from typing import Optional
 from pathlib import Path
 
 
+class LLMEndpointConfig(BaseModel):
+    """An additional OpenAI-compatible endpoint used for routing/failover."""
+
+    name: str
+    base_url: str
+    api_key: Optional[str] = None            # Defaults to llm_api_key
+    model_name: Optional[str] = None         # Defaults to llm_model_name
+    model_aliases: dict[str, str] = {}       # Requested model -> provider model name
+
+
 class Settings(BaseSettings):
     """Application settings loaded from environment variables."""
 
@@ -25,6 +35,55 @@ class Settings(BaseSettings):
     llm_model_name: Optional[str] = None
     llm_base_url: Optional[str] = None
 
+    # LLM request scheduling (token budgets: 0 = unlimited)
+    llm_max_concurrency: int = 8
+    llm_interactive_concurrency: int = 8
+    llm_background_concurrency: int = 2
+    llm_interactive_tokens_per_minute: int = 0
+    llm_background_tokens_per_minute: int = 0
+
+    # Multi-provider routing (JSON list in LLM_ENDPOINTS, tried alongside llm_base_url)
+    llm_endpoints: list[LLMEndpointConfig] = []
+    llm_router_ewma_alpha: float = 0.3
+    llm_router_failure_threshold: int = 3
+    llm_router_cooldown_seconds: float = 30.0
+    # Expected latency assumed for endpoints with no successful request yet
+    # (pessimistic, so measured endpoints are preferred over unknown ones)
+    llm_router_prior_latency_ms: float = 10000.0
+    # Client timeouts: connect, and the longest wait for the next bytes of a
+    # response (bounds time-to-first-token on streams) before failing over
+    llm_connect_timeout: float = 5.0
+    llm_read_timeout: float = 60.0
+
+    # Complexity-based model tiers: easy turns go to llm_fast_model_name
+    # (unset = every turn uses llm_model_name); llm_tier_override forces
+    # "fast" or "full" for every turn
+    llm_fast_model_name: Optional[str] = None
+    llm_tier_threshold: float = 0.5
+    llm_tier_override: Optional[str] = None
+
+    # WebSocket streaming (token batching for clients that negotiate it)
+    ws_token_batch_min_ms: float = 16.0
+    ws_token_batch_max_ms: float = 50.0
+    ws_token_batch_max_bytes: int = 4096
+
+    # Agent sessions (named sessions kept in memory before LRU eviction)
+    agent_max_sessions: int = 64
+
+    # Time allowed for context assembly before the LLM call (0 = unlimited);
+    # slower optional stages degrade instead of delaying the first token
+    agent_turn_budget_ms: float = 2500.0
+
+    # Recent turn contexts kept for regenerating replies, and how long (seconds)
+    agent_context_snapshots: int = 32
+    agent_context_snapshot_ttl: float = 600.0
+
+    # Semantic answer cache: replay answers to near-identical questions while
+    # the notebook/profile are unchanged (cosine similarity, seconds; size 0 = off)
+    agent_answer_cache_threshold: float = 0.92
+    agent_answer_cache_ttl: float = 600.0
+    agent_answer_cache_size: int = 256
+
     # File workspace settings
     WORKSPACE_DIR: Path = Path(__file__).parent.parent / "workspace"
     MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10 MB
@@ -1,5 +1,6 @@
 """Head Agent core logic."""
 
 from backend.core.agent.head_agent import HeadAgent, head_agent
+from backend.core.agent.sessions import AgentSessionRegistry, sessions
 
-__all__ = ["HeadAgent", "head_agent"]
+__all__ = ["AgentSessionRegistry", "HeadAgent", "head_agent", "sessions"]
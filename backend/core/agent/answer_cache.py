@@ -0,0 +1,192 @@
+"""
+Semantic answer cache for repeated questions.
+
+Answers are stored under a local embedding of the user message together
+with a fingerprint of the agent state the answer depended on (the stamps of
+the system prompt files, so any notebook or profile change counts). A later
+message whose embedding is at least `threshold` cosine-similar to a stored
+question, asked while the fingerprint is unchanged, gets the stored answer
+back without an LLM round trip.
+
+An answer also depends on the conversation it was given in, so every entry
+carries the thread position it was asked at (e.g. the com_id the turn
+continued). Lookups only consider entries of the same position: the same
+question asked in another thread, or later in the same one, is a miss.
+
+Entries expire after ttl_seconds and are dropped as soon as the fingerprint
+they were stored under no longer matches. Very short messages ("yes", "why?")
+depend on the conversation rather than on the agent state and are never
+cached.
+"""
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Hashable, List, Optional
+
+import numpy as np
+
+from backend.core.memory.embeddings import HashingEmbedder
+from backend.core.metrics import metrics
+
+# Messages with fewer words are too context-dependent to answer from cache
+MIN_QUESTION_WORDS = 3
+
+
+@dataclass
+class CachedAnswer:
+    """A stored answer and what it was stored under."""
+
+    question: str
+    answer: str
+    vector: np.ndarray
+    fingerprint: Hashable
+    stored_at: float
+    context_key: Optional[str] = None
+    scope: Optional[Hashable] = None
+    similarity: float = 1.0
+
+
+class SemanticAnswerCache:
+    """
+    Embedding-keyed answer cache, scoped to one agent state fingerprint.
+
+    Usage:
+        hit = cache.lookup(user_message, fingerprint, scope=last_com_id)
+        if hit is None:
+            ...answer with the LLM...
+            cache.store(user_message, answer, fingerprint, context_key, scope=last_com_id)
+    """
+
+    def __init__(
+        self,
+        embedder: Optional[HashingEmbedder] = None,
+        threshold: float = 0.92,
+        ttl_seconds: float = 600.0,
+        max_entries: int = 256,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Args:
+            embedder: Text embedder (default: HashingEmbedder).
+            threshold: Minimum cosine similarity for a hit.
+            ttl_seconds: Seconds an answer stays usable.
+            max_entries: Answers kept before the least recently used is dropped (0 disables the cache).
+            clock: Monotonic time source (replaceable in tests).
+        """
+        self.embedder = embedder or HashingEmbedder()
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def _embed(self, question: str) -> Optional[np.ndarray]:
+        if len(question.split()) < MIN_QUESTION_WORDS:
+            return None
+        vector = self.embedder.embed(question)
+        # Stopword-only text has no content to match on
+        return vector if vector.any() else None
+
+    def _prune(self, fingerprint: Hashable) -> None:
+        """Drop expired entries and entries of a different agent state."""
+        now = self._clock()
+        for entry_id, entry in list(self._entries.items()):
+            if entry.fingerprint != fingerprint:
+                del self._entries[entry_id]
+                metrics.increment("agent.answer_cache.invalidated")
+            elif now - entry.stored_at > self.ttl_seconds:
+                del self._entries[entry_id]
+                metrics.increment("agent.answer_cache.expired")
+
+    def lookup(
+        self,
+        question: str,
+        fingerprint: Optional[Hashable],
+        scope: Optional[Hashable] = None
+    ) -> Optional[CachedAnswer]:
+        """
+        The stored answer to the most similar question, if similar enough.
+
+        Args:
+            question: The user's message.
+            fingerprint: Current agent state fingerprint (None = unknown, never hits).
+            scope: Thread position the question is asked at; only answers
+                   stored under the same scope are considered.
+        """
+        if not self.enabled or fingerprint is None:
+            return None
+        self._prune(fingerprint)
+        ids: List[int] = [entry_id for entry_id, entry in self._entries.items() if entry.scope == scope]
+        vector = self._embed(question) if ids else None
+        if vector is None:
+            metrics.increment("agent.answer_cache.misses")
+            return None
+
+        similarities = np.vstack([self._entries[entry_id].vector for entry_id in ids]) @ vector
+        best = int(np.argmax(similarities))
+        if float(similarities[best]) < self.threshold:
+            metrics.increment("agent.answer_cache.misses")
+            return None
+
+        self._entries.move_to_end(ids[best])
+        entry = self._entries[ids[best]]
+        entry.similarity = float(similarities[best])
+        metrics.increment("agent.answer_cache.hits")
+        return entry
+
+    def store(
+        self,
+        question: str,
+        answer: str,
+        fingerprint: Optional[Hashable],
+        context_key: Optional[str] = None,
+        scope: Optional[Hashable] = None
+    ) -> bool:
+        """
+        Remember an answer; returns False if the question or state cannot be cached.
+
+        Args:
+            context_key: Key of the turn context that produced the answer
+                         (lets a regeneration invalidate it).
+            scope: Thread position the question was asked at.
+        """
+        if not self.enabled or fingerprint is None or not answer:
+            return False
+        vector = self._embed(question)
+        if vector is None:
+            return False
+        self._entries[self._next_id] = CachedAnswer(
+            question=question,
+            answer=answer,
+            vector=vector,
+            fingerprint=fingerprint,
+            stored_at=self._clock(),
+            context_key=context_key,
+            scope=scope
+        )
+        self._next_id += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        metrics.increment("agent.answer_cache.stores")
+        return True
+
+    def invalidate_context(self, context_key: str) -> int:
+        """Drop answers produced from a context (e.g. one the user asked to regenerate)."""
+        stale = [entry_id for entry_id, entry in self._entries.items() if entry.context_key == context_key]
+        for entry_id in stale:
+            del self._entries[entry_id]
+        if stale:
+            metrics.increment("agent.answer_cache.invalidated", len(stale))
+        return len(stale)
+
+    def clear(self) -> None:
+        self._entries.clear()
@@ -0,0 +1,130 @@
+"""Thread-scoped, token-budgeted conversation history for the Head Agent."""
+
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+from backend.core.communication.service import get_thread_history
+from backend.core.memory.token_counter import TokenCounter, token_counter as default_token_counter
+from backend.core.metrics import metrics
+from backend.models.communication import Communication
+
+logger = logging.getLogger(__name__)
+
+# Thread rows fetched per query while walking back through a conversation
+THREAD_PAGE_SIZE = 50
+
+# Cached per-message token counts (messages are immutable once saved)
+TOKEN_CACHE_SIZE = 4096
+
+# Per-message overhead, as in TokenCounter.count_messages_tokens
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_PRIMING_TOKENS = 2
+
+
+class ThreadContextBuilder:
+    """
+    Builds LLM history for one conversation thread of the communications chain.
+
+    Starting from the client's last_com_id, it walks initiator_com_id links
+    newest-first and keeps adding messages until the token budget is spent,
+    so the window adapts to message size instead of a fixed count. Every
+    message carries its com_id, which lets the condensation engine persist
+    against the right rows; rows already condensed are replaced by their
+    (shared) summary, emitted once per run. Token counts are cached per
+    com_id, so repeated turns in the same thread only count new messages.
+    """
+
+    def __init__(
+        self,
+        token_counter: Optional[TokenCounter] = None,
+        fetch_thread: Callable[[str, int], List[Communication]] = get_thread_history,
+        cache_size: int = TOKEN_CACHE_SIZE
+    ):
+        """
+        Args:
+            token_counter: Counter used for message costs (defaults to the global one).
+            fetch_thread: Returns (com_id and its predecessors, newest first, limit).
+            cache_size: Maximum number of cached token counts.
+        """
+        self.token_counter = token_counter or default_token_counter
+        self._fetch_thread = fetch_thread
+        self.cache_size = cache_size
+        self._token_cache: "OrderedDict[Hashable, int]" = OrderedDict()
+
+    def _cost(self, key: Hashable, content: str) -> int:
+        tokens = self._token_cache.get(key)
+        if tokens is not None:
+            self._token_cache.move_to_end(key)
+            metrics.increment("agent.context.token_cache_hits")
+            return tokens
+
+        tokens = self.token_counter.count_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+        self._token_cache[key] = tokens
+        if len(self._token_cache) > self.cache_size:
+            self._token_cache.popitem(last=False)
+        return tokens
+
+    def build(self, last_com_id: Optional[str], current_message: str, budget: int) -> List[Dict[str, Any]]:
+        """
+        Assemble the thread's history plus the current message.
+
+        Args:
+            last_com_id: Newest message of the thread before this turn (None = new thread).
+            current_message: The user's new message (always included).
+            budget: Token budget for the whole list.
+
+        Returns:
+            Message dicts, oldest first. Raw messages carry "com_id";
+            condensed summaries carry "condensed" and "com_ids".
+        """
+        used = (
+            self.token_counter.count_tokens(current_message)
+            + MESSAGE_OVERHEAD_TOKENS + REPLY_PRIMING_TOKENS
+        )
+        newest_first: List[Dict[str, Any]] = []
+        cursor = last_com_id
+        exhausted = False
+
+        while cursor and not exhausted:
+            page = self._fetch_thread(cursor, THREAD_PAGE_SIZE)
+            if not page:
+                break
+
+            for comm in page:
+                if comm.is_condensed and comm.condensed_summary:
+                    previous = newest_first[-1] if newest_first else None
+                    if previous and previous.get("condensed") and previous["content"] == comm.condensed_summary:
+                        # Same condensation run: one summary covers all its rows
+                        previous["com_ids"].insert(0, comm.com_id)
+                        continue
+                    entry = {
+                        "role": "system",
+                        "content": comm.condensed_summary,
+                        "condensed": True,
+                        "com_ids": [comm.com_id],
+                    }
+                    cost = self._cost(("summary", comm.condensed_summary), comm.condensed_summary)
+                else:
+                    entry = {
+                        "role": "user" if comm.sender == "user" else "assistant",
+                        "content": comm.raw_content,
+                        "com_id": comm.com_id,
+                    }
+                    cost = self._cost(comm.com_id, comm.raw_content)
+
+                if used + cost > budget:
+                    exhausted = True
+                    break
+                newest_first.append(entry)
+                used += cost
+
+            cursor = page[-1].initiator_com_id
+
+        history = newest_first[::-1]
+        history.append({"role": "user", "content": current_message})
+
+        metrics.observe("agent.context.history_tokens", used)
+        metrics.observe("agent.context.history_messages", len(history) - 1)
+        logger.debug(f"Thread context: {len(history) - 1} messages, {used}/{budget} tokens")
+        return history
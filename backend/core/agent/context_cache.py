@@ -0,0 +1,116 @@
+"""
+Short-lived cache of assembled turn contexts, for regenerating replies.
+
+Every turn stores the exact message list it sent to the LLM, keyed by a
+hash of its content (identical contexts share one entry). The com_id of
+the reply is then bound to that key, so a regeneration can stream a new
+answer from the same context without rebuilding the system prompt,
+re-reading history or condensing again.
+
+Entries are kept in LRU order, expire after ttl_seconds, and at most
+max_entries contexts are held in memory.
+"""
+
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from backend.core.metrics import metrics
+
+# Reply bindings kept per cached context (a reply and its regenerations)
+REPLIES_PER_CONTEXT = 4
+
+
+@dataclass
+class CachedReply:
+    """Context that produced a reply, and the reply's row in the messages table."""
+
+    context_key: str
+    messages: List[Dict[str, str]]
+    message_id: Optional[int] = None
+
+
+def context_key(messages: List[Dict[str, str]]) -> str:
+    """Content address of a message list."""
+    payload = json.dumps(messages, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ContextSnapshotCache:
+    """
+    LRU cache of turn contexts with reply bindings.
+
+    Usage:
+        key = cache.put(full_messages)
+        cache.bind(ai_com_id, key, message_id)
+        cached = cache.lookup(ai_com_id)   # None once evicted or expired
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 32,
+        ttl_seconds: float = 600.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Args:
+            max_entries: Contexts kept before the least recently used is dropped.
+            ttl_seconds: Seconds a context stays usable after it was last stored.
+            clock: Monotonic time source (replaceable in tests).
+        """
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+
+        # key -> (stored_at, messages)
+        self._contexts: "OrderedDict[str, Tuple[float, List[Dict[str, str]]]]" = OrderedDict()
+        # reply com_id -> (context key, messages-table id)
+        self._replies: "OrderedDict[str, Tuple[str, Optional[int]]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._contexts)
+
+    def put(self, messages: List[Dict[str, str]]) -> str:
+        """Store a context (or refresh an identical one) and return its key."""
+        key = context_key(messages)
+        if key in self._contexts:
+            self._contexts.move_to_end(key)
+        # Copied so later mutation of the turn's list cannot change the snapshot
+        self._contexts[key] = (self._clock(), [dict(message) for message in messages])
+        while len(self._contexts) > self.max_entries:
+            self._contexts.popitem(last=False)
+            metrics.increment("agent.context_cache.evicted")
+        return key
+
+    def get(self, key: str) -> Optional[List[Dict[str, str]]]:
+        """Messages of a stored context, or None if unknown or expired."""
+        entry = self._contexts.get(key)
+        if entry is None:
+            return None
+        stored_at, messages = entry
+        if self._clock() - stored_at > self.ttl_seconds:
+            del self._contexts[key]
+            metrics.increment("agent.context_cache.expired")
+            return None
+        self._contexts.move_to_end(key)
+        return [dict(message) for message in messages]
+
+    def bind(self, com_id: str, key: str, message_id: Optional[int] = None) -> None:
+        """Record that the reply com_id was generated from the context key."""
+        self._replies[com_id] = (key, message_id)
+        self._replies.move_to_end(com_id)
+        while len(self._replies) > self.max_entries * REPLIES_PER_CONTEXT:
+            self._replies.popitem(last=False)
+
+    def lookup(self, com_id: str) -> Optional[CachedReply]:
+        """Context a reply was generated from, or None if it is no longer cached."""
+        binding = self._replies.get(com_id)
+        messages = self.get(binding[0]) if binding else None
+        if messages is None:
+            metrics.increment("agent.context_cache.misses")
+            return None
+        metrics.increment("agent.context_cache.hits")
+        return CachedReply(context_key=binding[0], messages=messages, message_id=binding[1])
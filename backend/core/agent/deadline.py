@@ -0,0 +1,73 @@
+"""
+Per-turn latency budget.
+
+A TurnDeadline is started when a turn begins. Optional context stages wait
+for their result only as long as the budget allows; a stage that would
+overrun is abandoned (left to finish in the background) and the turn
+continues with a cheaper fallback. Every such degradation is counted in
+metrics under "agent.turn.degraded.<stage>".
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, List, Optional, Tuple
+
+from backend.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _log_background_failure(stage: str, task: asyncio.Future) -> None:
+    if task.cancelled():
+        return
+    error = task.exception()
+    if error is not None:
+        logger.error(f"Abandoned {stage} stage failed in the background: {error}")
+
+
+class TurnDeadline:
+    """Time budget for the context stages of one turn."""
+
+    def __init__(self, budget_ms: float):
+        """
+        Args:
+            budget_ms: Milliseconds from now until the budget is spent (<= 0 = unlimited).
+        """
+        self.budget_ms = budget_ms
+        self.started = time.perf_counter()
+        self.degradations: List[str] = []
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left in the budget (never negative), or None if unlimited."""
+        if self.budget_ms <= 0:
+            return None
+        return max(0.0, self.budget_ms / 1000 - (time.perf_counter() - self.started))
+
+    def degrade(self, stage: str) -> None:
+        """Record that a stage was skipped or replaced by its fallback."""
+        self.degradations.append(stage)
+        metrics.increment(f"agent.turn.degraded.{stage}")
+        logger.info(f"Turn budget of {self.budget_ms:g} ms exhausted; degraded {stage}")
+
+    async def wait(self, task: asyncio.Future, stage: str) -> Tuple[bool, Any]:
+        """
+        Wait for an optional stage within the remaining budget.
+
+        The task is not cancelled on timeout, so work with lasting effects
+        (e.g. persisted condensation) still completes for later turns.
+
+        Returns:
+            (True, result) if the task finished in time, else (False, None).
+            Exceptions raised by a task that finished in time propagate.
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return True, await task
+        if not task.done():
+            done, _ = await asyncio.wait({task}, timeout=remaining)
+            if not done:
+                self.degrade(stage)
+                task.add_done_callback(lambda finished: _log_background_failure(stage, finished))
+                return False, None
+        return True, task.result()
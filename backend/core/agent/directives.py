@@ -0,0 +1,143 @@
+"""Incremental parser for agent directives embedded in streamed LLM output."""
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+# Directive tag prefix (upper-cased) -> directive kind
+DIRECTIVE_PREFIXES: Dict[str, str] = {
+    "[NOTE:": "note",
+    "[COMPLETE:": "complete",
+}
+
+# Longest directive body held back before it is released as plain text
+MAX_DIRECTIVE_CHARS = 2000
+
+_TEXT = 0
+_PREFIX = 1
+_BODY = 2
+
+
+@dataclass
+class Directive:
+    """A directive extracted from the response, e.g. kind="note", content="buy milk"."""
+
+    kind: str
+    content: str
+
+
+class DirectiveParser:
+    """
+    State machine that strips [NOTE: ...] and [COMPLETE: ...] tags from a token stream.
+
+    Text that cannot start a directive is returned from feed() immediately;
+    only a potential tag (from its "[" onwards) is held back until it either
+    closes with "]" (recorded in self.directives and dropped from the output)
+    or turns out not to be a directive (released verbatim). Matching follows
+    the original regexes: prefixes are case-insensitive and a directive ends
+    at the first "]" on the same line.
+
+    Usage:
+        parser = DirectiveParser()
+        for token in stream:
+            emit(parser.feed(token))
+        emit(parser.finish())
+        handle(parser.directives)
+    """
+
+    def __init__(self, max_directive_chars: int = MAX_DIRECTIVE_CHARS):
+        self.max_directive_chars = max_directive_chars
+        self.directives: List[Directive] = []
+        self._state = _TEXT
+        self._prefix = ""                 # Upper-cased prefix matched so far
+        self._held: List[str] = []        # Raw text of the potential tag
+        self._body: List[str] = []        # Directive body collected so far
+        self._body_len = 0
+        self._kind: Optional[str] = None
+
+    def feed(self, chunk: str) -> str:
+        """
+        Consume a chunk of streamed text.
+
+        Args:
+            chunk: Next token(s) from the LLM.
+
+        Returns:
+            Clean text that is safe to show now (may be empty).
+        """
+        out: List[str] = []
+        pos = 0
+        end = len(chunk)
+
+        while pos < end:
+            if self._state == _TEXT:
+                idx = chunk.find("[", pos)
+                if idx == -1:
+                    out.append(chunk[pos:])
+                    break
+                out.append(chunk[pos:idx])
+                self._state = _PREFIX
+                self._prefix = "["
+                self._held = ["["]
+                pos = idx + 1
+
+            elif self._state == _PREFIX:
+                candidate = self._prefix + chunk[pos].upper()
+                if not any(prefix.startswith(candidate) for prefix in DIRECTIVE_PREFIXES):
+                    # Not a directive: release the held "[..." and rescan this char as text
+                    out.append(self._release())
+                    continue
+                self._prefix = candidate
+                self._held.append(chunk[pos])
+                pos += 1
+                if candidate in DIRECTIVE_PREFIXES:
+                    self._state = _BODY
+                    self._kind = DIRECTIVE_PREFIXES[candidate]
+                    self._body = []
+                    self._body_len = 0
+
+            else:
+                close = chunk.find("]", pos)
+                stop = close if close != -1 else end
+                newline = chunk.find("\n", pos, stop)
+                if newline != -1:
+                    stop = newline
+
+                piece = chunk[pos:stop]
+                self._body.append(piece)
+                self._held.append(piece)
+                self._body_len += len(piece)
+                pos = stop
+
+                if close != -1 and stop == close:
+                    self.directives.append(Directive(kind=self._kind, content="".join(self._body)))
+                    self._reset()
+                    pos = close + 1
+                elif newline != -1 or self._body_len > self.max_directive_chars:
+                    # Unterminated on this line (or runaway): it was just text after all
+                    out.append(self._release())
+
+        return "".join(out)
+
+    def finish(self) -> str:
+        """
+        End of stream: release any held text that never became a directive.
+
+        Returns:
+            The remaining clean text (may be empty).
+        """
+        if self._state == _TEXT:
+            return ""
+        return self._release()
+
+    def _release(self) -> str:
+        held = "".join(self._held)
+        self._reset()
+        return held
+
+    def _reset(self) -> None:
+        self._state = _TEXT
+        self._prefix = ""
+        self._held = []
+        self._body = []
+        self._body_len = 0
+        self._kind = None
@@ -1,22 +1,125 @@
 """Head Agent - Main agent think loop for Moon-AI system."""
 
+import asyncio
 import logging
+import os
+import re
+from contextlib import aclosing
 from pathlib import Path
-from typing import List, Dict, Optional, AsyncGenerator
+from typing import List, Dict, Optional, AsyncGenerator, Awaitable, Tuple, TypeVar
 import traceback
-import re
+import time
 from datetime import datetime
 
 from backend.core.llm.service import LLMService, llm_service as global_llm_service
-from backend.services.message_service import get_recent_messages, save_message
-from backend.models.message import MessageCreate
+from backend.core.llm.scheduler import BACKGROUND
+from backend.core.llm.complexity import FULL, ComplexityRouter, TierDecision, record_tier_turn
+from backend.services.message_service import (
+    get_messages_after, get_recent_messages, save_message, update_message_content
+)
+from backend.models.message import DEFAULT_SESSION_ID, Message, MessageCreate
+from backend.core.communication.service import get_latest_reply
 from backend.core.memory import CondensationEngine
+from backend.core.memory.token_counter import token_counter as default_token_counter
+from backend.core.memory.notebook_store import RACY_MTIME_WINDOW_NS, NotebookStore
+from backend.core.memory.profile_compactor import ProfileCompactor, split_sentences
+from backend.core.memory.recall import MessageRecall
+from backend.config.settings import settings
+from backend.core.agent.answer_cache import CachedAnswer, SemanticAnswerCache
+from backend.core.agent.context_builder import ThreadContextBuilder
+from backend.core.agent.context_cache import CachedReply, ContextSnapshotCache
+from backend.core.agent.deadline import TurnDeadline
+from backend.core.agent.directives import Directive, DirectiveParser
+from backend.core.agent.profile_updater import ProfileUpdater
+from backend.core.metrics import metrics
+import backend.database.db as db
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
 # Path to agent core files
 AGENT_FILES_DIR = Path(__file__).resolve().parent.parent.parent / "agents" / "head-agent"
 
+# Files the system prompt is assembled from
+SYSTEM_PROMPT_FILES = ("AGENT.md", "SOUL.md", "USER.md", "NOTEBOOK.md")
+
+# Identity files every session reads from the shared agent directory; the
+# rest (USER.md, NOTEBOOK.md, profile state) live in the session's own one
+SHARED_AGENT_FILES = ("AGENT.md", "SOUL.md", "SPARK.md")
+
+# Cached answers are replayed word by word (with surrounding whitespace)
+_REPLAY_CHUNK_RE = re.compile(r"\s*\S+\s*|\s+")
+
+# (st_mtime_ns, st_size) of a file, or None if it does not exist
+FileStamp = Optional[Tuple[int, int]]
+
+# Profile analysis: newest messages fetched per incremental update, token
+# budget per LLM analysis call, and backfill paging/concurrency
+PROFILE_FETCH_LIMIT = 200
+PROFILE_BATCH_TOKENS = 3000
+PROFILE_BACKFILL_PAGE_SIZE = 500
+PROFILE_BACKFILL_CONCURRENCY = 3
+
+# USER.md sections in the order they are written; other sections follow
+PROFILE_SECTIONS = (
+    "Name", "Communication Style", "Interests & Topics",
+    "Preferences", "Context", "Technical Level", "Patterns"
+)
+
+
+def render_user_profile(sections: Dict[str, str]) -> str:
+    """USER.md text for parsed profile sections, in PROFILE_SECTIONS order."""
+    ordered_keys = list(PROFILE_SECTIONS) + [key for key in sections if key not in PROFILE_SECTIONS]
+    content = "# User Profile\n\n"
+    for key in ordered_keys:
+        if key in sections:
+            body = sections[key].strip()
+            content += f"## {key}\n{body}\n\n" if body else f"## {key}\n\n"
+    return content
+
+SYSTEM_PROMPT_TEMPLATE = """You are the Moon AI Head Agent. Below are your core identity files that define who you are, how you behave, and what you know about the current user.
+
+=== AGENT DEFINITION (Capabilities & Rules) ===
+{agent}
+
+=== SOUL DEFINITION (Personality & Ethics) ===
+{soul}
+
+=== USER PROFILE ===
+{profile}
+
+=== WORKING NOTEBOOK (Recent Notes) ===
+{notebook}
+
+=== INSTRUCTIONS ===
+- Respond naturally based on your SOUL personality
+- Follow all rules defined in your AGENT definition
+- Reference USER profile to personalize responses
+- Check NOTEBOOK for any pending tasks or context
+- Keep responses helpful, direct, and conversational
+
+=== NOTEBOOK USAGE INSTRUCTIONS ===
+You can write notes to your NOTEBOOK.md for future reference using special syntax:
+- To add a note: Include [NOTE: your note content here] anywhere in your response
+- To mark a task complete: Include [COMPLETE: task description or keyword]
+- Notes are automatically tagged with [PENDING] and timestamped
+- Completed items are automatically archived to archived_notebook.md
+- Keep notes brief and actionable for future reference
+"""
+
+# Recall index directory, kept next to the communications database
+RECALL_INDEX_DIR = "recall_index"
+
+# Recalled past messages: how many, their total token budget, and the
+# longest excerpt taken from any one message
+RECALL_TOP_K = 5
+RECALL_TOKEN_BUDGET = 800
+RECALL_MAX_CHARS = 600
+
+# System prompt sections trimmed to fit the ceiling, lowest priority first
+SYSTEM_PROMPT_TRIM_ORDER = ("notebook", "profile")
+
 PROFILE_ANALYSIS_PROMPT = """
 You are analyzing conversation history to build a user profile. Extract key information about the user.
 
@@ -53,26 +156,106 @@ IMPORTANT:
 - Focus on actionable insights that help personalize future responses
 """
 
+PROFILE_COMPACTION_PROMPT = """
+Condense the "{section_name}" section of a user profile to at most {token_cap} tokens.
+
+CURRENT SECTION:
+{content}
+
+RULES:
+- Keep every distinct, still-relevant fact; merge repeated or overlapping statements
+- Prefer the most recent wording when statements conflict
+- Reply with the condensed section text only, without a heading
+"""
+
 class HeadAgent:
     """
     Head Agent that manages the central think loop of the Moon-AI system.
     It loads identity files, maintains context, and communicates via LLM.
     """
 
-    def __init__(self, llm_service: Optional[LLMService] = None):
+    def __init__(
+        self,
+        llm_service: Optional[LLMService] = None,
+        session_id: str = DEFAULT_SESSION_ID,
+        agent_files_dir: Optional[Path] = None,
+        shared_files_dir: Optional[Path] = None,
+        recall: Optional[MessageRecall] = None
+    ):
         """
         Initialize the Head Agent.
 
         Args:
             llm_service: Optional LLMService instance. If not provided,
                          attempts to use the global instance.
+            session_id: Session whose messages this agent saves and reads.
+            agent_files_dir: Directory of the session's own files (default: AGENT_FILES_DIR).
+            shared_files_dir: Directory of SHARED_AGENT_FILES (default: agent_files_dir).
+            recall: Recall index to share with other agents (default: opened lazily).
         """
         self.llm_service = llm_service if llm_service else global_llm_service
-        self.agent_files_dir = AGENT_FILES_DIR
-
-        # User profile update settings
-        self.user_profile_update_interval = 5
-        self._message_count_since_last_update = 0
+        self.session_id = session_id
+        self.agent_files_dir = agent_files_dir or AGENT_FILES_DIR
+        self.shared_files_dir = shared_files_dir
+
+        # User profile updates run in the background every few turns
+        self.profile_updater = ProfileUpdater(
+            update=lambda: self._update_user_profile(),
+            state_dir=lambda: self.agent_files_dir,
+            interval=5
+        )
+
+        # Stage durations (ms) of the most recent turn
+        self.last_turn_timings: Dict[str, float] = {}
+        # Budget for context assembly before the LLM call, and the stages the
+        # most recent turn degraded to stay within it
+        self.turn_budget_ms = settings.agent_turn_budget_ms
+        self.last_turn_degradations: List[str] = []
+
+        # Contexts of recent turns, so replies can be regenerated without
+        # assembling them again; last_reply is (context key, messages-table id)
+        # of the most recent reply until remember_reply() binds it to a com_id
+        self.context_snapshots = ContextSnapshotCache(
+            max_entries=settings.agent_context_snapshots,
+            ttl_seconds=settings.agent_context_snapshot_ttl
+        )
+        self.last_reply: Optional[Tuple[str, Optional[int]]] = None
+
+        # Easy turns go to the fast model tier; last_turn_route is the most
+        # recent turn's routing decision
+        self.complexity_router = ComplexityRouter.from_settings()
+        self.last_turn_route: Optional[TierDecision] = None
+
+        # Answers to repeated questions, replayed while the agent state is unchanged
+        self.answer_cache = SemanticAnswerCache(
+            threshold=settings.agent_answer_cache_threshold,
+            ttl_seconds=settings.agent_answer_cache_ttl,
+            max_entries=settings.agent_answer_cache_size
+        )
+
+        # File contents keyed by path, validated by (mtime, size) on every read
+        self._file_cache: Dict[Path, Tuple[int, int, str]] = {}
+        # Assembled system prompt and its token count, keyed by source file stamps
+        self._prompt_cache_key: Optional[Tuple] = None
+        self._prompt_cache: Optional[str] = None
+        self._prompt_tokens: Optional[int] = None
+        self.token_counter = default_token_counter
+        self.profile_compactor = ProfileCompactor(token_counter=self.token_counter)
+        self.system_prompt_ceiling = self.token_counter.get_budget()["system_ceiling"]
+        # Thread history may fill what the system prompt and response reserve
+        # leave; condensation still triggers above the (smaller) history ceiling
+        budget = self.token_counter.get_budget()
+        self.history_token_budget = (
+            budget["context_limit"] - budget["system_ceiling"] - budget["response_reserve"]
+        )
+        self.context_builder = ThreadContextBuilder(token_counter=self.token_counter)
+        # Semantic recall index; opened lazily next to the current database
+        self._recall: Optional[MessageRecall] = recall
+        self.recall_top_k = RECALL_TOP_K
+        self.recall_token_budget = RECALL_TOKEN_BUDGET
+
+        # Notebook rows live in SQLite; opened lazily for the current agent_files_dir
+        self._notebook: Optional[NotebookStore] = None
 
         if self.llm_service:
             logger.info("HeadAgent initialized with LLM service.")
@@ -81,23 +264,46 @@ class HeadAgent:
             logger.warning("HeadAgent initialized WITHOUT LLM service. AI responses disabled.")
             self.condensation_engine = None
 
+    def _agent_file(self, filename: str) -> Path:
+        """Path of an agent file: shared identity files or the session's own."""
+        if self.shared_files_dir is not None and filename in SHARED_AGENT_FILES:
+            return self.shared_files_dir / filename
+        return self.agent_files_dir / filename
+
     def _read_file(self, filename: str) -> str:
         """
         Read a file from the agent files directory.
 
+        Contents are cached and only re-read when the file's mtime or size
+        changes, so an unchanged file costs a single stat() call.
+
         Args:
             filename: Name of the file to read (e.g., "AGENT.md")
 
         Returns:
             File content as string, or empty string if not found.
         """
-        file_path = self.agent_files_dir / filename
+        file_path = self._agent_file(filename)
         try:
-            if file_path.exists():
-                return file_path.read_text(encoding="utf-8")
-            else:
+            try:
+                stat = os.stat(file_path)
+            except FileNotFoundError:
+                self._file_cache.pop(file_path, None)
                 logger.warning(f"Agent file not found: {file_path}")
                 return ""
+
+            cached = self._file_cache.get(file_path)
+            if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+                metrics.increment("agent.file_cache.hits")
+                return cached[2]
+
+            metrics.increment("agent.file_cache.misses")
+            content = file_path.read_text(encoding="utf-8")
+            if time.time_ns() - stat.st_mtime_ns >= RACY_MTIME_WINDOW_NS:
+                self._file_cache[file_path] = (stat.st_mtime_ns, stat.st_size, content)
+            else:
+                self._file_cache.pop(file_path, None)
+            return content
         except Exception as e:
             logger.error(f"Error reading agent file {filename}: {e}")
             return ""
@@ -110,12 +316,151 @@ class HeadAgent:
             filename: Name of the file to write (e.g., "USER.md")
             content: Content to write
         """
-        file_path = self.agent_files_dir / filename
+        file_path = self._agent_file(filename)
+        self._file_cache.pop(file_path, None)
         try:
             file_path.write_text(content, encoding="utf-8")
         except Exception as e:
             logger.error(f"Error writing agent file {filename}: {e}")
 
+    def _file_stamp(self, filename: str) -> FileStamp:
+        """Return (mtime_ns, size) for an agent file, or None if it is missing."""
+        try:
+            stat = os.stat(self._agent_file(filename))
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _system_prompt_key(self) -> Optional[Tuple]:
+        """
+        Cache key for the assembled system prompt.
+
+        Returns None (never cache) while any source file was modified within
+        the racy mtime window.
+        """
+        stamps = tuple(self._file_stamp(name) for name in SYSTEM_PROMPT_FILES)
+        now = time.time_ns()
+        if any(stamp and now - stamp[0] < RACY_MTIME_WINDOW_NS for stamp in stamps):
+            return None
+        return (str(self.agent_files_dir), str(self.shared_files_dir), stamps)
+
+    @property
+    def user_profile_update_interval(self) -> int:
+        """Number of turns between user profile updates."""
+        return self.profile_updater.interval
+
+    @user_profile_update_interval.setter
+    def user_profile_update_interval(self, value: int) -> None:
+        self.profile_updater.interval = value
+
+    @property
+    def _message_count_since_last_update(self) -> int:
+        """Turns since the last profile update (persisted watermark)."""
+        return self.profile_updater.turns_since_update
+
+    @_message_count_since_last_update.setter
+    def _message_count_since_last_update(self, value: int) -> None:
+        self.profile_updater.turns_since_update = value
+
+    @property
+    def notebook(self) -> NotebookStore:
+        """Notebook store for the current agent files directory."""
+        if self._notebook is None or self._notebook.agent_dir != self.agent_files_dir:
+            if self._notebook is not None:
+                self._notebook.close()
+            self._notebook = NotebookStore(self.agent_files_dir)
+        return self._notebook
+
+    async def close(self) -> None:
+        """Let a pending profile update finish, then close the notebook store."""
+        await self.profile_updater.shutdown()
+        if self._notebook is not None:
+            self._notebook.close()
+            self._notebook = None
+
+    @property
+    def recall(self) -> MessageRecall:
+        """Semantic recall index for the current communications database."""
+        index_dir = Path(db.DB_PATH).parent / RECALL_INDEX_DIR
+        if self._recall is None or self._recall.index.index_dir != index_dir:
+            self._recall = MessageRecall(index_dir)
+        return self._recall
+
+    async def sync_recall_index(self) -> int:
+        """Index communications saved since the last sync (in a worker thread)."""
+        try:
+            return await asyncio.to_thread(self.recall.sync)
+        except Exception as e:
+            logger.error(f"Recall index sync failed: {e}")
+            return 0
+
+    async def condense_history(self) -> bool:
+        """
+        Condense the session's latest thread ahead of its next turn.
+
+        The condensation engine persists summaries onto the rows it covers,
+        so the next turn in that thread reads them back instead of waiting
+        for the LLM inside its context deadline.
+
+        Returns:
+            True if the thread was over the condensation limit.
+        """
+        if self.condensation_engine is None:
+            return False
+        latest = await asyncio.to_thread(get_latest_reply, self.session_id)
+        if latest is None:
+            return False
+        history = await asyncio.to_thread(
+            self.context_builder.build, latest.com_id, "", self.history_token_budget
+        )
+        # The builder always appends the turn's (here empty) user message
+        history = history[:-1]
+        condensed = await self.condensation_engine.condense(history)
+        return condensed is not history
+
+    def _recall_context(self, user_message: str, history: List[Dict]) -> Optional[Dict[str, str]]:
+        """
+        Build a system message with past messages relevant to user_message.
+
+        Messages already in history are skipped, and excerpts are added best
+        first until recall_token_budget is spent.
+
+        Returns:
+            The message dict, or None if nothing relevant was found.
+        """
+        in_context = set()
+        for msg in history:
+            if msg.get("com_id"):
+                in_context.add(msg["com_id"])
+            in_context.update(msg.get("com_ids", ()))
+
+        try:
+            hits = self.recall.search(
+                user_message, k=self.recall_top_k, exclude=in_context, session_id=self.session_id
+            )
+        except Exception as e:
+            logger.error(f"Recall search failed: {e}")
+            return None
+
+        header = "=== RELEVANT PAST MESSAGES (recalled from earlier conversations) ==="
+        lines = [header]
+        used = self.token_counter.count_tokens(header)
+        for comm, score in hits:
+            content = comm.raw_content
+            if len(content) > RECALL_MAX_CHARS:
+                content = content[:RECALL_MAX_CHARS].rstrip() + "…"
+            line = f"[{comm.timestamp:%Y-%m-%d} {comm.sender.upper()}] {content}"
+            cost = self.token_counter.count_tokens(line)
+            if used + cost > self.recall_token_budget:
+                continue
+            lines.append(line)
+            used += cost
+
+        metrics.observe("agent.recall.results", len(lines) - 1)
+        if len(lines) == 1:
+            return None
+        return {"role": "system", "content": "\n".join(lines)}
+
     def _get_notebook_tail(self, num_lines: int = 15) -> str:
         """
         Read the last N lines of NOTEBOOK.md.
@@ -126,16 +471,12 @@ class HeadAgent:
         Returns:
             String containing the last N lines.
         """
-        content = self._read_file("NOTEBOOK.md")
-        if not content:
+        try:
+            return self.notebook.tail(num_lines)
+        except Exception as e:
+            logger.error(f"Error reading notebook: {e}")
             return ""
 
-        lines = content.splitlines()
-        if len(lines) <= num_lines:
-            return content
-
-        return "\n".join(lines[-num_lines:])
-
     def _append_notebook_entry(self, content: str, tag: str = "[PENDING]") -> None:
         """
         Append a new entry to NOTEBOOK.md with timestamp and tag.
@@ -147,19 +488,7 @@ class HeadAgent:
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M")
         entry = f"{tag} {timestamp} - {content}"
 
-        current_content = self._read_file("NOTEBOOK.md")
-        if current_content and not current_content.endswith("\n"):
-            entry = f"\n{entry}"
-        elif not current_content:
-            entry = f"{entry}"
-        else:
-            entry = f"{entry}" # Already has newline at end of file usually, but append needs care
-
-        # Append to file
-        # We use read/write because _write_file overwrites.
-        # We should append.
-        full_content = current_content + ("\n" if current_content and not current_content.endswith("\n") else "") + entry
-        self._write_file("NOTEBOOK.md", full_content)
+        self.notebook.append(entry)
         logger.info(f"Appended notebook entry: {entry}")
 
     def _find_entry_index(self, keyword: str) -> int:
@@ -172,20 +501,7 @@ class HeadAgent:
         Returns:
             Line index (0-based) or -1 if not found.
         """
-        content = self._read_file("NOTEBOOK.md")
-        if not content:
-            return -1
-
-        lines = content.splitlines()
-        keyword_lower = keyword.lower()
-
-        # Prefer exact match or significant overlap
-        # Logic: find lines with [PENDING] that contain keyword
-        for i, line in enumerate(lines):
-            if "[PENDING]" in line and keyword_lower in line.lower():
-                return i
-
-        return -1
+        return self.notebook.find_pending(keyword)
 
     def _mark_notebook_completed(self, entry_index: int) -> None:
         """
@@ -194,139 +510,204 @@ class HeadAgent:
         Args:
             entry_index: Line number of the entry to mark (0-indexed)
         """
-        content = self._read_file("NOTEBOOK.md")
-        if not content:
-            return
-
-        lines = content.splitlines()
-        if entry_index < 0 or entry_index >= len(lines):
-            logger.warning(f"Invalid notebook entry index: {entry_index}")
-            return
-
-        line = lines[entry_index]
-        if "[PENDING]" in line:
-            lines[entry_index] = line.replace("[PENDING]", "[COMPLETED]")
-            self._write_file("NOTEBOOK.md", "\n".join(lines))
-            logger.info(f"Marked notebook entry {entry_index} as completed")
+        with self.notebook.batch() as notebook:
+            if notebook.mark_completed(entry_index):
+                logger.info(f"Marked notebook entry {entry_index} as completed")
 
-            # Auto-archive
-            self._archive_completed_entries()
+                # Auto-archive
+                self.archive_completed_entries()
 
-    def _archive_completed_entries(self) -> None:
+    def archive_completed_entries(self) -> int:
         """
         Move all [COMPLETED] entries from NOTEBOOK.md to archived_notebook.md.
-        Auto-called after marking items complete.
-        """
-        content = self._read_file("NOTEBOOK.md")
-        if not content:
-            return
-
-        lines = content.splitlines()
-        pending_lines = []
-        completed_lines = []
-
-        for line in lines:
-            if "[COMPLETED]" in line:
-                completed_lines.append(line)
-            else:
-                pending_lines.append(line)
-
-        if not completed_lines:
-            return
-
-        # Write back NOTEBOOK.md
-        self._write_file("NOTEBOOK.md", "\n".join(pending_lines))
+        Auto-called after marking items complete, and hourly by the scheduler.
 
-        # Append to archived_notebook.md
-        archive_content = self._read_file("archived_notebook.md")
-        if not archive_content:
-            archive_content = "# Archived Notebook Entries\n\n"
-
-        new_archive_content = archive_content + ("\n" if archive_content and not archive_content.endswith("\n") else "") + "\n".join(completed_lines)
-        self._write_file("archived_notebook.md", new_archive_content)
-        logger.info(f"Archived {len(completed_lines)} entries")
+        Returns:
+            Number of entries archived.
+        """
+        archived = self.notebook.archive_completed()
+        if archived:
+            logger.info(f"Archived {archived} entries")
+        return archived
 
     def _read_archived_notebook(self, num_lines: int = 15) -> str:
         """
         Read last N lines of archived_notebook.md for SPARK heartbeat checks.
 
+        Seeks back from the end of the active archive segment, so the cost
+        does not grow with the archive.
+
         Args:
             num_lines: Number of lines to return from end
 
         Returns:
             String containing last N lines of archived notebook
         """
-        content = self._read_file("archived_notebook.md")
-        if not content:
+        try:
+            return self.notebook.archive.tail(num_lines)
+        except Exception as e:
+            logger.error(f"Error reading archived notebook: {e}")
             return ""
 
-        lines = content.splitlines()
-        if len(lines) <= num_lines:
-            return content
-
-        return "\n".join(lines[-num_lines:])
-
     def build_system_prompt(self) -> str:
         """
         Construct the system prompt from agent core files.
 
+        The result is memoized until any of SYSTEM_PROMPT_FILES changes.
+
         Returns:
             Formatted system prompt string.
         """
-        agent_def = self._read_file("AGENT.md")
-        soul_def = self._read_file("SOUL.md")
-        user_profile = self._read_file("USER.md")
-        notebook_tail = self._get_notebook_tail()
-
-        if not user_profile:
-            user_profile = "No user profile yet. Learn about the user through conversation."
-
-        if not notebook_tail:
-            notebook_tail = "No notes yet."
+        key = self._system_prompt_key()
+        if key is not None and key == self._prompt_cache_key and self._prompt_cache is not None:
+            metrics.increment("agent.system_prompt.cache_hits")
+            return self._prompt_cache
+
+        prompt = self._assemble_system_prompt()
+        self._prompt_cache_key = key
+        self._prompt_cache = prompt
+        self._prompt_tokens = None
+        return prompt
 
-        prompt = f"""You are the Moon AI Head Agent. Below are your core identity files that define who you are, how you behave, and what you know about the current user.
+    def system_prompt_tokens(self, system_prompt: str) -> int:
+        """
+        Token count of a system prompt, memoized alongside the prompt cache.
 
-=== AGENT DEFINITION (Capabilities & Rules) ===
-{agent_def}
+        Args:
+            system_prompt: Prompt returned by build_system_prompt().
+        """
+        if system_prompt == self._prompt_cache:
+            if self._prompt_tokens is None:
+                self._prompt_tokens = self.token_counter.count_tokens(system_prompt)
+            return self._prompt_tokens
+        return self.token_counter.count_tokens(system_prompt)
 
-=== SOUL DEFINITION (Personality & Ethics) ===
-{soul_def}
+    def _assemble_system_prompt(self) -> str:
+        """
+        Read the agent core files and format the system prompt within its token ceiling.
+
+        Each section is measured; if the prompt would exceed
+        self.system_prompt_ceiling, the lowest-priority sections are trimmed
+        in SYSTEM_PROMPT_TRIM_ORDER (notebook tail first, then profile
+        details). The identity files are never trimmed, only reported.
+        Per-section usage goes to the log and to the
+        "agent.system_prompt.tokens.*" gauges.
+        """
+        sections = {
+            "agent": self._read_file("AGENT.md"),
+            "soul": self._read_file("SOUL.md"),
+            "profile": self._read_file("USER.md") or "No user profile yet. Learn about the user through conversation.",
+            "notebook": self._get_notebook_tail() or "No notes yet.",
+        }
+
+        count = self.token_counter.count_tokens
+        usage = {name: count(text) for name, text in sections.items()}
+        usage["template"] = count(SYSTEM_PROMPT_TEMPLATE.format(**{name: "" for name in sections}))
+        ceiling = self.system_prompt_ceiling
+
+        for name in SYSTEM_PROMPT_TRIM_ORDER:
+            overage = sum(usage.values()) - ceiling
+            if overage <= 0:
+                break
+            before = usage[name]
+            trim = self._trim_notebook_tail if name == "notebook" else self._trim_profile
+            sections[name] = trim(sections[name], max(0, before - overage))
+            usage[name] = count(sections[name])
+            metrics.increment(f"agent.system_prompt.trimmed.{name}")
+            logger.warning(
+                f"System prompt over its {ceiling}-token ceiling by {overage}; "
+                f"trimmed {name} from {before} to {usage[name]} tokens"
+            )
 
-=== USER PROFILE ===
-{user_profile}
+        total = sum(usage.values())
+        for name, tokens in usage.items():
+            metrics.set_gauge(f"agent.system_prompt.tokens.{name}", tokens)
+        metrics.set_gauge("agent.system_prompt.tokens.total", total)
+        logger.info(
+            f"System prompt tokens: {total}/{ceiling} ("
+            + ", ".join(f"{name}={tokens}" for name, tokens in usage.items()) + ")"
+        )
+        if total > ceiling:
+            metrics.increment("agent.system_prompt.over_ceiling")
+            logger.warning(
+                f"System prompt still {total - ceiling} tokens over its ceiling: "
+                f"AGENT.md ({usage['agent']}) and SOUL.md ({usage['soul']}) are too large"
+            )
 
-=== WORKING NOTEBOOK (Recent Notes) ===
-{notebook_tail}
+        return SYSTEM_PROMPT_TEMPLATE.format(**sections)
 
-=== INSTRUCTIONS ===
-- Respond naturally based on your SOUL personality
-- Follow all rules defined in your AGENT definition
-- Reference USER profile to personalize responses
-- Check NOTEBOOK for any pending tasks or context
-- Keep responses helpful, direct, and conversational
+    def _fit_lines(self, lines: List[str], max_tokens: int, marker: str) -> str:
+        """
+        Drop lines from the front until the rest (plus marker) fits in max_tokens.
 
-=== NOTEBOOK USAGE INSTRUCTIONS ===
-You can write notes to your NOTEBOOK.md for future reference using special syntax:
-- To add a note: Include [NOTE: your note content here] anywhere in your response
-- To mark a task complete: Include [COMPLETE: task description or keyword]
-- Notes are automatically tagged with [PENDING] and timestamped
-- Completed items are automatically archived to archived_notebook.md
-- Keep notes brief and actionable for future reference
-"""
-        return prompt
+        Args:
+            lines: Lines, most important last.
+            max_tokens: Token allowance.
+            marker: Format string noting how many lines were dropped ({count}).
+        """
+        for dropped in range(len(lines) + 1):
+            kept = lines[dropped:]
+            text = "\n".join(([marker.format(count=dropped)] if dropped else []) + kept)
+            if self.token_counter.count_tokens(text) <= max_tokens:
+                return text
+        return ""
+
+    def _trim_notebook_tail(self, notebook_tail: str, max_tokens: int) -> str:
+        """Keep the newest notebook lines that fit in max_tokens."""
+        return self._fit_lines(notebook_tail.splitlines(), max_tokens, "({count} older notes omitted)")
+
+    def _trim_profile(self, profile: str, max_tokens: int) -> str:
+        """
+        Shrink USER.md content to max_tokens.
 
-    def _build_conversation_history(self, current_message: str) -> List[Dict[str, str]]:
+        Details go first: the "Additionally:" paragraphs, then everything but
+        each section's first sentence, then whole trailing sections.
+        """
+        sections = self._parse_profile_sections(profile)
+        if not sections:
+            lines = profile.splitlines()
+            while lines and self.token_counter.count_tokens("\n".join(lines)) > max_tokens:
+                lines.pop()
+            return "\n".join(lines)
+
+        def render(section_text: Dict[str, str]) -> str:
+            return "\n\n".join(f"## {key}\n{value}" for key, value in section_text.items())
+
+        summary = {key: value.split("\n\n")[0].strip() for key, value in sections.items()}
+        if self.token_counter.count_tokens(render(summary)) <= max_tokens:
+            return render(summary)
+
+        headline = {key: next(iter(split_sentences(value)), value) for key, value in summary.items()}
+        text = render(headline)
+        while headline and self.token_counter.count_tokens(text) > max_tokens:
+            headline.pop(next(reversed(headline)))
+            text = render(headline)
+        return text
+
+    def _build_conversation_history(
+        self,
+        current_message: str,
+        last_com_id: Optional[str] = None,
+        thread_scoped: bool = False
+    ) -> List[Dict[str, str]]:
         """
         Build conversation history for the LLM.
 
         Args:
             current_message: The latest user message.
+            last_com_id: Newest communication of the current thread.
+            thread_scoped: Read the thread from the communications chain
+                           (token-budgeted, with com_ids) instead of the
+                           global last 20 rows of the legacy messages table.
 
         Returns:
             List of message dictionaries [{"role": "user", "content": ...}, ...]
         """
+        if thread_scoped:
+            return self.context_builder.build(last_com_id, current_message, self.history_token_budget)
+
         # Fetch last 20 messages
-        recent_messages = get_recent_messages(limit=20)
+        recent_messages = get_recent_messages(limit=20, session_id=self.session_id)
 
         history = []
         for msg in recent_messages:
@@ -393,174 +774,647 @@ You can write notes to your NOTEBOOK.md for future reference using special synta
         if new in existing:
             return existing
 
+        # Only add sentences the section does not already (nearly) say
+        novel = self.profile_compactor.novel_sentences(existing, new)
+        if not novel:
+            return existing
+
         # Both have content — combine them
-        return f"{existing}\n\nAdditionally: {new}"
+        return f"{existing}\n\nAdditionally: {' '.join(novel)}"
+
+    def _profile_batches(self, messages: List[Message]) -> List[Tuple[str, int]]:
+        """
+        Group messages into transcripts of at most PROFILE_BATCH_TOKENS tokens.
+
+        A single message larger than the budget gets a batch of its own.
+
+        Returns:
+            (conversation_text, last_message_id) per batch, oldest first.
+        """
+        batches: List[Tuple[str, int]] = []
+        lines: List[str] = []
+        batch_tokens = 0
+        last_id = 0
+
+        for msg in messages:
+            line = f"{msg.sender.upper()}: {msg.content}\n"
+            line_tokens = self.token_counter.count_tokens(line)
+            if lines and batch_tokens + line_tokens > PROFILE_BATCH_TOKENS:
+                batches.append(("".join(lines), last_id))
+                lines = []
+                batch_tokens = 0
+            lines.append(line)
+            batch_tokens += line_tokens
+            last_id = msg.id
+
+        if lines:
+            batches.append(("".join(lines), last_id))
+        return batches
+
+    async def _analyse_profile_batch(self, conversation_text: str) -> str:
+        """Ask the cheap model for profile observations about one transcript batch."""
+        prompt = PROFILE_ANALYSIS_PROMPT.format(conversation_history=conversation_text)
+        messages = [{"role": "user", "content": prompt}]
+
+        # Using openrouter/free as the default cheap model; background lane
+        # so interactive turns are always admitted first
+        analysis = await self.llm_service.send_message(
+            messages=messages,
+            stream=False,
+            model="openrouter/free",
+            priority=BACKGROUND
+        )
+        metrics.increment("agent.profile_update.batches")
+        return analysis
+
+    async def _summarise_profile_section(self, section_name: str, text: str, token_cap: int) -> str:
+        """Ask the cheap model to condense an over-long profile section."""
+        prompt = PROFILE_COMPACTION_PROMPT.format(
+            section_name=section_name, token_cap=token_cap, content=text
+        )
+        summary = await self.llm_service.send_message(
+            messages=[{"role": "user", "content": prompt}],
+            stream=False,
+            model="openrouter/free",
+            priority=BACKGROUND
+        )
+        # Drop any heading the model echoes back
+        return "\n".join(line for line in summary.splitlines() if not line.lstrip().startswith("#"))
+
+    async def _apply_profile_analyses(self, analyses: List[str]) -> None:
+        """
+        Merge one or more analyses (oldest first) into USER.md with a single write.
+
+        Sections over their token cap are compacted before writing.
+        """
+        current_profile = self._read_file("USER.md")
+        sections = self._parse_profile_sections(current_profile)
+
+        for analysis in analyses:
+            new_sections = self._parse_profile_sections(analysis)
+            for key, new_val in new_sections.items():
+                sections[key] = self._merge_profile_sections(sections.get(key, ""), new_val, key)
+
+        summarise = self._summarise_profile_section if self.llm_service else None
+        sections = await self.profile_compactor.compact(sections, summarise)
+
+        self._write_file("USER.md", render_user_profile(sections))
 
     async def _update_user_profile(self) -> None:
         """
-        Analyze recent conversation and update USER.md.
+        Analyze messages newer than the persisted watermark and update USER.md.
+
+        Only messages after profile_updater.analysed_message_id are sent, in
+        token-bounded batches; the watermark advances after each batch is
+        merged, so a failed batch is retried on the next update.
+
+        Raises:
+            Exception: Whatever the analysis or merge of a batch raised; the
+                       ProfileUpdater records it and keeps the turn counter.
         """
         if not self.llm_service:
             return
 
-        logger.info("Updating user profile based on recent messages...")
+        logger.info("Updating user profile based on new messages...")
 
-        try:
-            # 1. Fetch recent messages
-            recent_messages = get_recent_messages(limit=20)
-            if not recent_messages:
-                return
-
-            conversation_text = ""
-            for msg in recent_messages:
-                conversation_text += f"{msg.sender.upper()}: {msg.content}\n"
-
-            # 2. Build analysis prompt
-            prompt = PROFILE_ANALYSIS_PROMPT.format(conversation_history=conversation_text)
-            messages = [{"role": "user", "content": prompt}]
-
-            # 3. Send to LLM (using cheap model)
-            # Using openrouter/free as the default cheap model
-            analysis = await self.llm_service.send_message(
-                messages=messages,
-                stream=False,
-                model="openrouter/free"
-            )
-
-            # 4. Parse & Merge
-            current_profile = self._read_file("USER.md")
-            current_sections = self._parse_profile_sections(current_profile)
-            new_sections = self._parse_profile_sections(analysis)
-
-            # Get all unique section keys
-            all_keys = set(current_sections.keys()) | set(new_sections.keys())
+        # 1. Fetch messages the profile has not seen yet
+        watermark = self.profile_updater.analysed_message_id
+        recent_messages = get_recent_messages(limit=PROFILE_FETCH_LIMIT, session_id=self.session_id)
+        new_messages = [msg for msg in recent_messages if msg.id > watermark]
+        if not new_messages:
+            return
 
-            # Use specific order if possible
-            ordered_keys = [
-                "Name", "Communication Style", "Interests & Topics",
-                "Preferences", "Context", "Technical Level", "Patterns"
-            ]
+        if watermark and len(new_messages) == PROFILE_FETCH_LIMIT:
+            logger.warning(
+                f"More than {PROFILE_FETCH_LIMIT} messages since the last profile update; "
+                "older ones are skipped (run backfill_user_profile to cover them)"
+            )
 
-            # Add any custom sections found
-            for key in all_keys:
-                if key not in ordered_keys:
-                    ordered_keys.append(key)
+        # 2. Analyse and merge batch by batch
+        for conversation_text, last_id in self._profile_batches(new_messages):
+            analysis = await self._analyse_profile_batch(conversation_text)
+            await self._apply_profile_analyses([analysis])
+            self.profile_updater.analysed_message_id = last_id
 
-            final_content = "# User Profile\n\n"
+        logger.info("User profile updated successfully.")
 
-            for key in ordered_keys:
-                if key in all_keys:
-                    existing_val = current_sections.get(key, "")
-                    new_val = new_sections.get(key, "")
-                    merged_val = self._merge_profile_sections(existing_val, new_val, key)
-                    final_content += f"## {key}\n{merged_val}\n\n"
+    async def backfill_user_profile(self, max_concurrency: int = PROFILE_BACKFILL_CONCURRENCY) -> int:
+        """
+        One-off rebuild of USER.md observations from the entire message history.
 
-            # 5. Write back to USER.md
-            self._write_file("USER.md", final_content)
-            logger.info("User profile updated successfully.")
+        Map-reduce: the history is paged from the database and split into
+        token-bounded batches, which are analysed concurrently (at most
+        max_concurrency LLM calls in flight). The analyses are then merged
+        in chronological order with a single USER.md write. The watermark is
+        moved to the end of the last batch before the first failure, so the
+        regular incremental updates pick up from there.
 
-        except Exception as e:
-            logger.error(f"Failed to update user profile: {e}")
-            logger.debug(traceback.format_exc())
+        Args:
+            max_concurrency: Maximum concurrent analysis calls.
 
+        Returns:
+            Number of batches analysed successfully.
+        """
+        if not self.llm_service:
+            return 0
 
-    async def process_message(self, user_message: str) -> AsyncGenerator[str, None]:
+        messages: List[Message] = []
+        after_id = 0
+        while True:
+            page = await asyncio.to_thread(
+                get_messages_after, after_id, PROFILE_BACKFILL_PAGE_SIZE, self.session_id
+            )
+            if not page:
+                break
+            messages.extend(page)
+            after_id = page[-1].id
+
+        batches = self._profile_batches(messages)
+        if not batches:
+            return 0
+        logger.info(f"Backfilling user profile from {len(messages)} messages in {len(batches)} batches")
+
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+        async def analyse(conversation_text: str) -> str:
+            async with semaphore:
+                return await self._analyse_profile_batch(conversation_text)
+
+        results = await asyncio.gather(
+            *(analyse(text) for text, _ in batches), return_exceptions=True
+        )
+
+        # Reduce only the unbroken prefix so the watermark stays truthful
+        analyses: List[str] = []
+        watermark = self.profile_updater.analysed_message_id
+        for (_, last_id), result in zip(batches, results):
+            if isinstance(result, BaseException):
+                logger.error(f"Profile backfill batch ending at message {last_id} failed: {result}")
+                break
+            analyses.append(result)
+            watermark = max(watermark, last_id)
+
+        if analyses:
+            await self._apply_profile_analyses(analyses)
+            self.profile_updater.analysed_message_id = watermark
+        return len(analyses)
+
+    async def process_message(
+        self,
+        user_message: str,
+        last_com_id: Optional[str] = None,
+        thread_scoped: Optional[bool] = None
+    ) -> AsyncGenerator[str, None]:
         """
         Process a user message through the agent think loop.
 
-        1. Save user message
-        2. Build context (system prompt + history)
-        3. Stream from LLM
-        4. Save full response to DB
+        The turn runs as a pipeline so time-to-first-token is bounded by the
+        slowest single context step rather than the sum of all of them:
+
+        0. A question similar to a recent one, asked at the same thread
+           position while the agent state (notebook, profile, identity
+           files) is unchanged, is answered by replaying the cached answer;
+           nothing below runs
+        1. System prompt assembly and history fetch run concurrently
+        2. User message persistence starts in the background once history is read
+        3. Condensation runs on the fetched history, alongside semantic recall
+           of relevant older messages (thread-scoped turns)
+        4. Stream from the model tier the turn's estimated complexity calls for
+        5. Save full response to DB (after the user message is persisted)
+        6. Count the turn towards the next background profile update
+
+        Per-stage durations are recorded in metrics ("agent.turn.stage_ms.*")
+        and in self.last_turn_timings.
+
+        Context assembly is bounded by self.turn_budget_ms. Optional stages
+        that would overrun it degrade instead of delaying the first token:
+        condensation falls back to the newest raw messages that fit the
+        history ceiling (and finishes in the background for later turns),
+        recall is skipped, and a slow system prompt rebuild is replaced by
+        the last assembled prompt. Degradations are counted in metrics
+        ("agent.turn.degraded.*") and listed in self.last_turn_degradations.
 
         Args:
             user_message: The user's input message.
+            last_com_id: Newest communication of the thread this message continues.
+            thread_scoped: Build history from that thread only; defaults to
+                           True when last_com_id is given.
 
         Yields:
             Tokens from the LLM response.
         """
-        # 1. Save user message immediately
-        try:
-            save_message(MessageCreate(sender="user", content=user_message))
-        except Exception as e:
-            logger.error(f"Failed to save user message: {e}")
-
-        # 2. Build context
-        system_prompt = self.build_system_prompt()
-        conversation_history = self._build_conversation_history(user_message)
+        if thread_scoped is None:
+            thread_scoped = last_com_id is not None
+        timings: Dict[str, float] = {}
+        self.last_turn_timings = timings
+        turn_started = time.perf_counter()
+        deadline = TurnDeadline(self.turn_budget_ms)
+        self.last_turn_degradations = deadline.degradations
+        self.last_reply = None
+        self.last_turn_route = None
+
+        # 0. Repeated question: replay the cached answer if the state and thread position are unchanged
+        fingerprint = self._system_prompt_key()
+        lookup_started = time.perf_counter()
+        position = None
+        if self.answer_cache.enabled and fingerprint is not None:
+            position = await asyncio.to_thread(self._thread_position, last_com_id, thread_scoped)
+        cached_answer = self.answer_cache.lookup(user_message, fingerprint, scope=position)
+        timings["answer_cache"] = round((time.perf_counter() - lookup_started) * 1000, 3)
+        metrics.observe("agent.turn.stage_ms.answer_cache", timings["answer_cache"])
+        if cached_answer is not None:
+            async with aclosing(self._replay_answer(user_message, cached_answer, timings, turn_started)) as replay:
+                async for chunk in replay:
+                    yield chunk
+            return
 
-        # Apply smart condensation if engine is available
-        if self.condensation_engine:
-            try:
-                conversation_history = await self.condensation_engine.condense(conversation_history)
-                logger.debug("Context builder: history has %d messages after condensation check.", len(conversation_history))
-            except Exception as e:
-                logger.error("Condensation failed, using raw history: %s", e)
+        # 1. Build context: file reads and the history query are independent
+        prompt_task = asyncio.create_task(
+            self._timed("system_prompt", asyncio.to_thread(self.build_system_prompt), timings)
+        )
+        # Stage tasks of this turn; settled below if assembly does not complete
+        context_tasks: List[asyncio.Future] = [prompt_task]
+        persist_task = None
+        assembled = False
+        try:
+            conversation_history = await self._timed(
+                "history",
+                asyncio.to_thread(self._build_conversation_history, user_message, last_com_id, thread_scoped),
+                timings
+            )
 
-        full_messages = [{"role": "system", "content": system_prompt}] + conversation_history
+            # 2. Save user message off the critical path (after the history read,
+            #    so the current message is never duplicated in its own history)
+            persist_task = asyncio.create_task(
+                self._timed("persist_user", asyncio.to_thread(self._save_user_message, user_message), timings)
+            )
 
-        accumulated_response = ""
+            # Semantic recall of older messages runs alongside condensation
+            recall_task = None
+            if thread_scoped and self.recall_top_k > 0:
+                recall_task = asyncio.create_task(self._timed(
+                    "recall",
+                    asyncio.to_thread(self._recall_context, user_message, conversation_history),
+                    timings
+                ))
+                context_tasks.append(recall_task)
+
+            # 3. Apply smart condensation if engine is available
+            if self.condensation_engine:
+                condense_task = asyncio.ensure_future(self._timed(
+                    "condensation", self.condensation_engine.condense(conversation_history), timings
+                ))
+                context_tasks.append(condense_task)
+                try:
+                    finished, condensed = await deadline.wait(condense_task, "condensation")
+                    if finished:
+                        conversation_history = condensed
+                        logger.debug("Context builder: history has %d messages after condensation check.", len(conversation_history))
+                    else:
+                        conversation_history = self._raw_history_window(conversation_history)
+                except Exception as e:
+                    logger.error("Condensation failed, using raw history: %s", e)
+
+            system_prompt = await self._await_system_prompt(prompt_task, deadline)
+            recall_message = None
+            if recall_task:
+                _, recall_message = await deadline.wait(recall_task, "recall")
+            assembled = True
+        finally:
+            if not assembled:
+                await self._abandon_context(context_tasks, persist_task)
+        timings["context_total"] = round((time.perf_counter() - turn_started) * 1000, 3)
+        metrics.observe("agent.turn.stage_ms.context_total", timings["context_total"])
+
+        # Bookkeeping keys (com_id, condensed, ...) are not sent to the provider
+        full_messages = [{"role": "system", "content": system_prompt}]
+        if recall_message:
+            full_messages.append(recall_message)
+        full_messages += [
+            {"role": msg["role"], "content": msg["content"]} for msg in conversation_history
+        ]
+        context_key = self.context_snapshots.put(full_messages)
+
+        # Response text is collected in a list and joined once at the end
+        response_parts: List[str] = []
+        parser = DirectiveParser()
+        failed = False
 
         # 3. Call LLM (or fallback)
         if not self.llm_service:
             fallback_msg = f"I'm not fully configured yet. Please set up your LLM_API_KEY in the .env file to enable AI responses. For now, I received your message: '{user_message[:100]}...'"
-            accumulated_response = fallback_msg
+            response_parts.append(fallback_msg)
             yield fallback_msg
         else:
             try:
-                logger.info(f"Streaming message from LLM (History: {len(conversation_history)} msgs)")
-                async for token in await self.llm_service.send_message(messages=full_messages, stream=True):
-                    if token:
-                        accumulated_response += token
-                        yield token
+                route = self.complexity_router.route(user_message, history_turns=len(conversation_history))
+                self.last_turn_route = route
+                logger.info(
+                    f"Streaming message from LLM (History: {len(conversation_history)} msgs, {route.tier} tier)"
+                )
+                stream = self._stream_llm(full_messages, parser, timings, turn_started, model=route.model)
+                async with aclosing(stream) as tokens:
+                    async for clean in tokens:
+                        response_parts.append(clean)
+                        yield clean
+            except (GeneratorExit, asyncio.CancelledError):
+                # Turn abandoned by the client: persist what was shown (once)
+                # and skip the profile update — nothing else runs for this turn
+                partial = "".join(response_parts)
+                logger.info(f"Turn cancelled after {len(partial)} chars; saving partial response.")
+                await persist_task
+                self.last_reply = (context_key, self._finalize_response(partial, parser.directives))
+                raise
             except Exception as e:
                 logger.error(f"Error calling LLM: {e}")
                 logger.debug(traceback.format_exc())
+                failed = True
                 error_msg = "\n\n[I encountered an issue processing your message. Please try again.]"
-                accumulated_response += error_msg
+                response_parts.append(error_msg)
                 yield error_msg
 
-        # 4. Process notebook commands and save response
-        if accumulated_response:
-            # Handle [NOTE: ...]
-            # Use non-greedy match .*? to capture individual notes
-            note_matches = re.findall(r"\[NOTE:(.*?)\]", accumulated_response, re.IGNORECASE)
-            for note in note_matches:
-                self._append_notebook_entry(note.strip())
-                # Remove from response
-                # Escape the note for regex replacement
-                escaped_note = re.escape(note)
-                # Use raw string for regex pattern
-                accumulated_response = re.sub(rf"\[NOTE:{escaped_note}\]", "", accumulated_response, flags=re.IGNORECASE)
-
-            # Handle [COMPLETE: ...]
-            complete_matches = re.findall(r"\[COMPLETE:(.*?)\]", accumulated_response, re.IGNORECASE)
-            for keyword in complete_matches:
-                keyword = keyword.strip()
-                idx = self._find_entry_index(keyword)
-                if idx != -1:
-                    self._mark_notebook_completed(idx)
-                else:
-                    logger.warning(f"Could not find notebook entry to complete: {keyword}")
-                # Remove from response
-                escaped_keyword = re.escape(keyword)
-                accumulated_response = re.sub(rf"\[COMPLETE:{escaped_keyword}\]", "", accumulated_response, flags=re.IGNORECASE)
+        # 5. Process notebook directives and save response
+        await persist_task
+        response = "".join(response_parts)
+        self.last_reply = (context_key, self._finalize_response(response, parser.directives))
+        timings["total"] = round((time.perf_counter() - turn_started) * 1000, 3)
+        if self.llm_service:
+            self._record_route(full_messages, response, timings)
+            # Answers with directives changed the notebook, so they are never replayed
+            if not failed and not parser.directives:
+                self.answer_cache.store(user_message, response, fingerprint, context_key, scope=position)
+
+        # 6. User profile update runs in the background; the turn ends here
+        self.profile_updater.record_turn()
+
+    def _thread_position(self, last_com_id: Optional[str], thread_scoped: bool) -> str:
+        """
+        Where in the conversation a turn is asked, as an answer cache scope.
+
+        Thread-scoped turns are positioned by the com_id they continue; other
+        turns see the session's recent messages, so by the newest of those.
+        """
+        if thread_scoped:
+            return f"thread:{last_com_id}"
+        newest = get_recent_messages(limit=1, session_id=self.session_id)
+        return f"recent:{newest[-1].id if newest else 0}"
+
+    async def _replay_answer(
+        self,
+        user_message: str,
+        cached: CachedAnswer,
+        timings: Dict[str, float],
+        started: float
+    ) -> AsyncGenerator[str, None]:
+        """Stream a cached answer and save the turn like an answered one, without an LLM call."""
+        logger.info(f"Answering from cache (similarity {cached.similarity:.3f} to {cached.question[:60]!r})")
+        await asyncio.to_thread(self._save_user_message, user_message)
+
+        response_parts: List[str] = []
+        try:
+            for chunk in _REPLAY_CHUNK_RE.findall(cached.answer):
+                if "ttft" not in timings:
+                    timings["ttft"] = round((time.perf_counter() - started) * 1000, 3)
+                    metrics.observe("agent.turn.stage_ms.ttft", timings["ttft"])
+                response_parts.append(chunk)
+                yield chunk
+        finally:
+            # Also runs when the consumer stops early: the shown part is saved once
+            message_id = self._finalize_response("".join(response_parts), [])
+            if cached.context_key:
+                self.last_reply = (cached.context_key, message_id)
+        timings["total"] = round((time.perf_counter() - started) * 1000, 3)
+        self.profile_updater.record_turn()
+
+    async def _stream_llm(
+        self,
+        messages: List[Dict[str, str]],
+        parser: DirectiveParser,
+        timings: Dict[str, float],
+        started: float,
+        model: Optional[str] = None
+    ) -> AsyncGenerator[str, None]:
+        """
+        Stream a completion with directives stripped, recording time-to-first-token.
+
+        model selects the tier's model (None = the service default).
 
+        aclosing() guarantees the upstream HTTP stream is aborted as soon as
+        this generator is closed or cancelled by the consumer.
+        """
+        stream = await self.llm_service.send_message(messages=messages, stream=True, model=model)
+        async with aclosing(stream):
+            async for token in stream:
+                if token:
+                    # Directives are stripped inline so tags never reach the client
+                    clean = parser.feed(token)
+                    if clean:
+                        if "ttft" not in timings:
+                            timings["ttft"] = round((time.perf_counter() - started) * 1000, 3)
+                            metrics.observe("agent.turn.stage_ms.ttft", timings["ttft"])
+                        yield clean
+        tail = parser.finish()
+        if tail:
+            yield tail
+
+    def remember_reply(self, com_id: Optional[str]) -> None:
+        """Bind the most recent reply's context to its communication, making it regenerable."""
+        if com_id and self.last_reply is not None:
+            self.context_snapshots.bind(com_id, *self.last_reply)
+
+    def can_regenerate(self, com_id: str) -> bool:
+        """True while the context of the reply com_id is still cached."""
+        return self.context_snapshots.lookup(com_id) is not None
+
+    async def regenerate(self, com_id: str) -> AsyncGenerator[str, None]:
+        """
+        Stream a new answer to an earlier reply from its cached context.
+
+        No context is assembled and no user message is saved: the exact
+        messages that produced the reply are sent again. The new answer
+        replaces the old one in the messages table. Directives are stripped
+        but not applied again, since the original reply already applied them.
+        A retry means the first answer fell short, so it always uses the
+        full model tier (unless llm_tier_override forces a tier).
+
+        Args:
+            com_id: Communication id of the reply to regenerate.
+
+        Raises:
+            LookupError: If the reply's context is no longer cached.
+
+        Yields:
+            Tokens of the new answer.
+        """
+        cached = self.context_snapshots.lookup(com_id)
+        if cached is None:
+            raise LookupError(f"No cached context for reply {com_id}")
+        metrics.increment("agent.regenerations")
+        # The user rejected this answer: stop replaying it for similar questions
+        self.answer_cache.invalidate_context(cached.context_key)
+        timings: Dict[str, float] = {}
+        self.last_turn_timings = timings
+        self.last_turn_degradations = []
+        self.last_reply = None
+        self.last_turn_route = None
+        started = time.perf_counter()
+
+        response_parts: List[str] = []
+        parser = DirectiveParser()
+        if not self.llm_service:
+            fallback_msg = "I'm not fully configured yet, so I can't regenerate this answer."
+            response_parts.append(fallback_msg)
+            yield fallback_msg
+        else:
+            route = self.complexity_router.route("", force=FULL)
+            self.last_turn_route = route
             try:
-                save_message(MessageCreate(sender="assistant", content=accumulated_response))
+                stream = self._stream_llm(cached.messages, parser, timings, started, model=route.model)
+                async with aclosing(stream) as tokens:
+                    async for clean in tokens:
+                        response_parts.append(clean)
+                        yield clean
+            except (GeneratorExit, asyncio.CancelledError):
+                self._replace_reply(cached, "".join(response_parts))
+                raise
             except Exception as e:
-                logger.error(f"Failed to save assistant message: {e}")
-
-        # 5. User Profile Update Logic
-        self._message_count_since_last_update += 1
-        if self._message_count_since_last_update >= self.user_profile_update_interval:
-            # We don't want to block the response, but since this is an async generator,
-            # we are already "done" yielding.
-            # However, running this here means the generator won't finish until the update is done.
-            # This is acceptable for a background process in this architecture.
-            # In a more complex system, we might offload this to a task queue.
-            await self._update_user_profile()
-            self._message_count_since_last_update = 0
+                logger.error(f"Error regenerating reply {com_id}: {e}")
+                error_msg = "\n\n[I encountered an issue processing your message. Please try again.]"
+                response_parts.append(error_msg)
+                yield error_msg
+
+        response = "".join(response_parts)
+        self._replace_reply(cached, response)
+        timings["total"] = round((time.perf_counter() - started) * 1000, 3)
+        if self.llm_service:
+            self._record_route(cached.messages, response, timings)
+
+    def _record_route(self, messages: List[Dict[str, str]], response: str, timings: Dict[str, float]) -> None:
+        """Record the finished turn's latency and token usage under its model tier."""
+        if self.last_turn_route is None:
+            return
+        # ~4 characters per token: the prompt is too large to tokenize on every turn
+        prompt_tokens = sum(len(message["content"]) for message in messages) // 4
+        record_tier_turn(
+            self.last_turn_route.tier, timings.get("ttft"), timings["total"],
+            prompt_tokens, self.token_counter.count_tokens(response)
+        )
+
+    def _replace_reply(self, cached: CachedReply, response: str) -> None:
+        """Store a regenerated answer over the reply it replaces."""
+        if not response:
+            return
+        message_id = cached.message_id
+        try:
+            if message_id is None or not update_message_content(message_id, response):
+                message_id = save_message(
+                    MessageCreate(sender="assistant", content=response, session_id=self.session_id)
+                ).id
+        except Exception as e:
+            logger.error(f"Failed to save regenerated message: {e}")
+            message_id = None
+        self.last_reply = (cached.context_key, message_id)
+
+    async def _abandon_context(self, tasks: List[asyncio.Future], persist_task: Optional[asyncio.Future]) -> None:
+        """
+        Settle the stage tasks of a turn that ended during context assembly.
+
+        Prompt, recall and condensation work is cancelled and awaited, so no
+        task outlives its turn unobserved; a user message whose save already
+        started is still saved, as on a cancelled stream.
+        """
+        for task in tasks:
+            task.cancel()
+        if persist_task is not None:
+            tasks = tasks + [persist_task]
+        # Shielded so a second cancellation cannot orphan them again
+        await asyncio.shield(asyncio.gather(*tasks, return_exceptions=True))
+        metrics.increment("agent.turn.abandoned_in_context")
+
+    async def _await_system_prompt(self, prompt_task: asyncio.Future, deadline: TurnDeadline) -> str:
+        """The assembled system prompt, or the previous one if assembly would overrun the budget."""
+        if self._prompt_cache is not None:
+            finished, prompt = await deadline.wait(prompt_task, "system_prompt")
+            if finished:
+                return prompt
+            return self._prompt_cache
+        # Nothing to fall back to: the first turn always waits for its prompt
+        return await prompt_task
+
+    def _raw_history_window(self, history: List[Dict]) -> List[Dict]:
+        """Newest messages that fit the history ceiling, used when condensation can't finish in time."""
+        ceiling = self.token_counter.get_budget()["history_ceiling"]
+        window: List[Dict] = []
+        used = 2
+        for message in reversed(history):
+            used += 4 + self.token_counter.count_tokens(str(message.get("content", "")))
+            if used > ceiling and window:
+                break
+            window.append(message)
+        window.reverse()
+        return window
+
+    async def _timed(self, stage: str, awaitable: Awaitable[T], timings: Dict[str, float]) -> T:
+        """
+        Await a pipeline stage and record how long it took.
+
+        Args:
+            stage: Stage name used in timings and metrics.
+            awaitable: The stage's coroutine or future.
+            timings: Per-turn timings dict to record into.
+        """
+        started = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            timings[stage] = round(elapsed_ms, 3)
+            metrics.observe(f"agent.turn.stage_ms.{stage}", elapsed_ms)
+
+    def _save_user_message(self, user_message: str) -> None:
+        """Persist the user's message; failures are logged, never raised."""
+        try:
+            save_message(MessageCreate(sender="user", content=user_message, session_id=self.session_id))
+        except Exception as e:
+            logger.error(f"Failed to save user message: {e}")
+
+    def _finalize_response(self, response: str, directives: List[Directive]) -> Optional[int]:
+        """
+        Apply notebook directives collected from the response and save it to the DB.
+
+        Kept synchronous so it can also run from the cancellation path
+        without yielding control back to the event loop.
+
+        Args:
+            response: Response text with directives already stripped
+                      (partial, if the turn was cancelled).
+            directives: Directives extracted by DirectiveParser, in order.
+
+        Returns:
+            Messages-table id of the saved response, or None if nothing was saved.
+        """
+        if directives:
+            # One transaction and one NOTEBOOK.md export for the whole turn
+            with self.notebook.batch():
+                for directive in directives:
+                    content = directive.content.strip()
+                    if directive.kind == "note":
+                        self._append_notebook_entry(content)
+                    elif directive.kind == "complete":
+                        idx = self._find_entry_index(content)
+                        if idx != -1:
+                            self._mark_notebook_completed(idx)
+                        else:
+                            logger.warning(f"Could not find notebook entry to complete: {content}")
+
+        if not response:
+            return None
+
+        try:
+            return save_message(MessageCreate(sender="assistant", content=response, session_id=self.session_id)).id
+        except Exception as e:
+            logger.error(f"Failed to save assistant message: {e}")
+            return None
 
 
 # Create global instance (lazy — will use global llm_service)
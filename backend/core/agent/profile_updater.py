@@ -0,0 +1,240 @@
+"""Background, debounced user-profile updates for the Head Agent."""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from backend.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+PROFILE_STATE_FILE = "profile_state.json"
+
+
+class ProfileUpdater:
+    """
+    Runs user-profile updates off the turn's critical path.
+
+    Every finished turn calls record_turn(). Once `interval` turns have
+    accumulated, an update is scheduled as a background task that first
+    waits until no trigger arrived for `debounce_seconds` (each new turn
+    restarts the quiet period, up to `max_debounce_seconds` in total) so
+    bursts of messages are folded into one run. Only one update runs at a
+    time (single-flight); triggers arriving while it runs are coalesced
+    into a single follow-up run. The turn counter is a watermark persisted
+    to profile_state.json, so progress survives restarts; the per-turn
+    write happens in a worker thread, off the event loop. Failures are
+    logged and retried on the next trigger with the counter kept.
+    """
+
+    def __init__(
+        self,
+        update: Callable[[], Awaitable[None]],
+        state_dir: Callable[[], Path],
+        interval: int = 5,
+        debounce_seconds: float = 2.0,
+        max_debounce_seconds: Optional[float] = None
+    ):
+        """
+        Args:
+            update: Coroutine function performing the actual update.
+            state_dir: Returns the directory profile_state.json lives in
+                       (evaluated lazily so the agent directory can change).
+            interval: Number of turns between updates.
+            debounce_seconds: Quiet period before an update starts.
+            max_debounce_seconds: Longest an update is postponed by new
+                                  triggers (default: 5 x debounce_seconds).
+        """
+        self._update = update
+        self._state_dir = state_dir
+        self.interval = interval
+        self.debounce_seconds = debounce_seconds
+        self.max_debounce_seconds = max_debounce_seconds
+
+        self._state: Optional[Dict[str, Any]] = None
+        self._state_path: Optional[Path] = None
+        self._task: Optional[asyncio.Task] = None
+        self._rerun = False
+        self._flush = asyncio.Event()
+        self._triggered = asyncio.Event()
+
+        # State writes are numbered so a slow background write never
+        # replaces a newer one on disk
+        self._write_lock = threading.Lock()
+        self._state_version = 0
+        self._written_version = 0
+        self._save_task: Optional[asyncio.Task] = None
+
+    # ------------------------------------------------------------------ state
+
+    @property
+    def state(self) -> Dict[str, Any]:
+        """Persisted watermark: turns since the last update and run bookkeeping."""
+        path = self._state_dir() / PROFILE_STATE_FILE
+        if self._state is None or path != self._state_path:
+            self._state_path = path
+            try:
+                self._state = json.loads(path.read_text(encoding="utf-8"))
+            except FileNotFoundError:
+                self._state = {}
+            except Exception as e:
+                logger.error(f"Corrupt profile state, starting fresh: {e}")
+                self._state = {}
+            self._state.setdefault("turns_since_update", 0)
+        return self._state
+
+    def _snapshot_state(self) -> Tuple[int, Path, str]:
+        payload = json.dumps(self.state)
+        self._state_version += 1
+        return self._state_version, self._state_path, payload
+
+    def _write_state(self, version: int, path: Path, payload: str) -> None:
+        with self._write_lock:
+            if version <= self._written_version:
+                return
+            try:
+                tmp_path = path.with_suffix(".tmp")
+                tmp_path.write_text(payload, encoding="utf-8")
+                os.replace(tmp_path, path)
+                self._written_version = version
+            except Exception as e:
+                logger.error(f"Failed to persist profile state: {e}")
+
+    def _save_state(self) -> None:
+        self._write_state(*self._snapshot_state())
+
+    def _save_state_in_background(self) -> None:
+        """Persist the state from a worker thread (synchronously without a running loop)."""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self._save_state()
+            return
+        snapshot = self._snapshot_state()
+        task = asyncio.create_task(asyncio.to_thread(self._write_state, *snapshot), name="profile-state-save")
+        # Writes of older snapshots are skipped, so only the newest task matters
+        self._save_task = task
+
+    @property
+    def turns_since_update(self) -> int:
+        return self.state["turns_since_update"]
+
+    @turns_since_update.setter
+    def turns_since_update(self, value: int) -> None:
+        self.state["turns_since_update"] = value
+        self._save_state()
+
+    @property
+    def analysed_message_id(self) -> int:
+        """Id of the newest message already included in a profile analysis."""
+        return self.state.get("last_analysed_message_id", 0)
+
+    @analysed_message_id.setter
+    def analysed_message_id(self, value: int) -> None:
+        self.state["last_analysed_message_id"] = value
+        self._save_state()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    # -------------------------------------------------------------- scheduling
+
+    def record_turn(self) -> None:
+        """Count a finished turn and schedule an update when the interval is reached."""
+        self.state["turns_since_update"] = self.turns_since_update + 1
+        self._save_state_in_background()
+        if self.turns_since_update >= self.interval:
+            self.schedule()
+
+    def schedule(self) -> None:
+        """Start a background update, or coalesce into the one already running."""
+        if self.running:
+            self._rerun = True
+            self._triggered.set()
+            metrics.increment("agent.profile_update.coalesced")
+            return
+        self._flush.clear()
+        self._triggered.clear()
+        self._task = asyncio.create_task(self._run(), name="profile-update")
+
+    async def _run(self) -> None:
+        while True:
+            await self._debounce()
+            self._rerun = False
+
+            # Turns arriving during the run count towards the next update
+            turns_at_start = self.turns_since_update
+            started = datetime.now()
+            try:
+                await self._update()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                metrics.increment("agent.profile_update.failures")
+                self.state["last_error"] = str(e)
+                self._save_state()
+                logger.error(f"Background profile update failed: {e}")
+                return
+
+            metrics.increment("agent.profile_update.runs")
+            metrics.observe("agent.profile_update.duration_ms", (datetime.now() - started).total_seconds() * 1000)
+            self.state["turns_since_update"] = max(0, self.turns_since_update - turns_at_start)
+            self.state["last_update_at"] = started.isoformat(timespec="seconds")
+            self.state.pop("last_error", None)
+            self._save_state()
+
+            if not self._rerun or self.turns_since_update < self.interval:
+                return
+
+    async def _debounce(self) -> None:
+        """Wait until no trigger arrived for debounce_seconds, a flush, or the maximum delay."""
+        if self.debounce_seconds <= 0:
+            return
+        loop = asyncio.get_running_loop()
+        max_delay = self.max_debounce_seconds
+        if max_delay is None:
+            max_delay = 5 * self.debounce_seconds
+        give_up_at = loop.time() + max_delay
+        while not self._flush.is_set():
+            self._triggered.clear()
+            timeout = min(self.debounce_seconds, give_up_at - loop.time())
+            if timeout <= 0:
+                return
+            waiters = {asyncio.ensure_future(self._flush.wait()), asyncio.ensure_future(self._triggered.wait())}
+            try:
+                await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for waiter in waiters:
+                    waiter.cancel()
+            if not self._triggered.is_set():
+                return
+            metrics.increment("agent.profile_update.debounce_restarted")
+
+    async def wait_idle(self, timeout: Optional[float] = None) -> None:
+        """
+        Skip any remaining debounce and wait for the running update to finish.
+
+        Args:
+            timeout: Give up waiting after this many seconds (the update keeps running).
+        """
+        task = self._task
+        if task is None or task.done():
+            return
+        self._flush.set()
+        await asyncio.wait({task}, timeout=timeout)
+
+    async def shutdown(self, timeout: float = 10.0) -> None:
+        """Let a pending update finish (up to timeout), then cancel it."""
+        await self.wait_idle(timeout=timeout)
+        task = self._task
+        if task is not None and not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        if self._save_task is not None:
+            await asyncio.gather(self._save_task, return_exceptions=True)
@@ -0,0 +1,214 @@
+"""
+Session registry: one HeadAgent per conversation or user.
+
+Each named session gets its own agent with isolated turn counters, file and
+prompt caches, notebook and USER.md (under agents/sessions/<session_id>/),
+and its own rows in the messages table. AGENT.md, SOUL.md and SPARK.md are
+shared, as are the LLM service and the recall index (each agent only
+recalls communications of its own session). The default session is the
+global head_agent, so clients that never name a session keep the
+single-user behaviour.
+
+Agents are kept in LRU order; once more than max_sessions exist, the least
+recently used session that no connection is holding is closed and dropped.
+Its files stay on disk, so it is rebuilt on next use.
+
+With a SPARK engine attached, every live session's notebook is attached to
+it as well, and detached again when the session is evicted or shut down.
+"""
+
+import asyncio
+import logging
+import re
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from backend.config.settings import settings
+from backend.core.agent.head_agent import (
+    AGENT_FILES_DIR, PROFILE_SECTIONS, HeadAgent, head_agent, render_user_profile
+)
+from backend.core.memory.notebook_store import NOTEBOOK_FILE, parse_status
+from backend.core.metrics import metrics
+from backend.core.spark import SparkEngine
+from backend.models.message import DEFAULT_SESSION_ID
+
+logger = logging.getLogger(__name__)
+
+SESSIONS_DIR = AGENT_FILES_DIR.parent / "sessions"
+
+_SESSION_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# New sessions start with the (empty) sections profile updates fill in
+USER_TEMPLATE = render_user_profile({section: "" for section in PROFILE_SECTIONS})
+
+
+def valid_session_id(session_id: str) -> bool:
+    """Session ids double as directory names: letters, digits, '-' and '_' only."""
+    return bool(_SESSION_ID_RE.match(session_id or ""))
+
+
+class AgentSessionRegistry:
+    """
+    LRU registry of per-session HeadAgents.
+
+    Usage:
+        agent = sessions.acquire("alice")   # pinned while the connection lives
+        ...
+        sessions.release("alice")
+    """
+
+    def __init__(
+        self,
+        default_agent: Optional[HeadAgent],
+        sessions_dir: Path = SESSIONS_DIR,
+        template_dir: Path = AGENT_FILES_DIR,
+        max_sessions: int = 64,
+        agent_factory: Optional[Callable[..., HeadAgent]] = None
+    ):
+        """
+        Args:
+            default_agent: Agent of the default session (None disables agents).
+            sessions_dir: Parent directory of the per-session file directories.
+            template_dir: Shared identity files and the NOTEBOOK.md header template.
+            max_sessions: Named sessions kept in memory before LRU eviction.
+            agent_factory: Builds session agents (defaults to HeadAgent).
+        """
+        self.default_agent = default_agent
+        self.sessions_dir = Path(sessions_dir)
+        self.template_dir = Path(template_dir)
+        self.max_sessions = max_sessions
+        self.agent_factory = agent_factory or HeadAgent
+
+        self._agents: "OrderedDict[str, HeadAgent]" = OrderedDict()
+        self._pins: Dict[str, int] = {}
+        self.spark: Optional[SparkEngine] = None
+
+    def __len__(self) -> int:
+        return len(self._agents)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._agents
+
+    def get(self, session_id: Optional[str] = None) -> Optional[HeadAgent]:
+        """
+        Agent for a session, created on first use.
+
+        Raises:
+            ValueError: If session_id is not a valid session id.
+        """
+        if self.default_agent is None:
+            return None
+        if not session_id or session_id == DEFAULT_SESSION_ID:
+            return self.default_agent
+        if not valid_session_id(session_id):
+            raise ValueError(f"Invalid session id: {session_id!r}")
+
+        agent = self._agents.get(session_id)
+        if agent is not None:
+            self._agents.move_to_end(session_id)
+            metrics.increment("agent.sessions.hits")
+            return agent
+
+        agent = self._create(session_id)
+        self._agents[session_id] = agent
+        if self.spark is not None:
+            self.spark.attach(session_id, agent.notebook)
+        metrics.increment("agent.sessions.created")
+        self._evict()
+        metrics.set_gauge("agent.sessions.active", len(self._agents))
+        return agent
+
+    def agents(self) -> List[HeadAgent]:
+        """The default agent followed by every live session agent, least recently used first."""
+        if self.default_agent is None:
+            return []
+        return [self.default_agent, *self._agents.values()]
+
+    def is_live(self, agent: HeadAgent) -> bool:
+        """Whether an agent from agents() is still in use (not evicted or shut down)."""
+        return agent is self.default_agent or self._agents.get(agent.session_id) is agent
+
+    def attach_spark(self, engine: SparkEngine) -> None:
+        """Have a SPARK engine watch the notebooks of current and future sessions."""
+        self.spark = engine
+        for session_id, agent in self._agents.items():
+            engine.attach(session_id, agent.notebook)
+
+    def acquire(self, session_id: Optional[str] = None) -> Optional[HeadAgent]:
+        """get(), and pin the session so it is not evicted until release()."""
+        agent = self.get(session_id)
+        if agent is not None and agent is not self.default_agent:
+            self._pins[session_id] = self._pins.get(session_id, 0) + 1
+        return agent
+
+    def release(self, session_id: Optional[str]) -> None:
+        """Unpin a session acquired earlier; it becomes evictable once idle."""
+        if session_id not in self._pins:
+            return
+        self._pins[session_id] -= 1
+        if self._pins[session_id] <= 0:
+            del self._pins[session_id]
+        self._evict()
+
+    def _create(self, session_id: str) -> HeadAgent:
+        session_dir = self.sessions_dir / session_id
+        self._seed_files(session_dir)
+        return self.agent_factory(
+            llm_service=self.default_agent.llm_service,
+            session_id=session_id,
+            agent_files_dir=session_dir,
+            shared_files_dir=self.template_dir,
+            recall=self.default_agent.recall
+        )
+
+    def _seed_files(self, session_dir: Path) -> None:
+        """Create a new session's USER.md and an empty NOTEBOOK.md (template header only)."""
+        session_dir.mkdir(parents=True, exist_ok=True)
+        user_file = session_dir / "USER.md"
+        if not user_file.exists():
+            user_file.write_text(USER_TEMPLATE, encoding="utf-8")
+        notebook_file = session_dir / NOTEBOOK_FILE
+        if not notebook_file.exists():
+            try:
+                template = (self.template_dir / NOTEBOOK_FILE).read_text(encoding="utf-8")
+            except FileNotFoundError:
+                template = "# Head Agent Working Notebook\n"
+            header = [line for line in template.splitlines() if parse_status(line) is None]
+            notebook_file.write_text("\n".join(header).rstrip() + "\n", encoding="utf-8")
+
+    def _evict(self) -> None:
+        for session_id in list(self._agents):
+            if len(self._agents) <= self.max_sessions:
+                break
+            if self._pins.get(session_id):
+                continue
+            agent = self._agents.pop(session_id)
+            if self.spark is not None:
+                self.spark.detach(session_id)
+            metrics.increment("agent.sessions.evicted")
+            logger.info(f"Evicted idle agent session {session_id}")
+            self._close(agent)
+        metrics.set_gauge("agent.sessions.active", len(self._agents))
+
+    def _close(self, agent: HeadAgent) -> None:
+        try:
+            asyncio.get_running_loop().create_task(agent.close())
+        except RuntimeError:
+            # No loop (e.g. called from a script): nothing can be pending
+            asyncio.run(agent.close())
+
+    async def shutdown(self) -> None:
+        """Close every session agent (the default agent is left alone)."""
+        agents = list(self._agents.values())
+        if self.spark is not None:
+            for session_id in self._agents:
+                self.spark.detach(session_id)
+        self._agents.clear()
+        self._pins.clear()
+        for agent in agents:
+            await agent.close()
+
+
+# Global registry around the global head_agent
+sessions = AgentSessionRegistry(head_agent, max_sessions=settings.agent_max_sessions)
@@ -5,9 +5,10 @@ Handles saving messages with com_id generation and doubly-linked chain managemen
 import uuid
 import sqlite3
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Tuple
 from backend.database.db import get_db_connection
 from backend.models.communication import Communication, CommunicationCreate, InitiatorLog
+from backend.models.message import DEFAULT_SESSION_ID
 
 
 def parse_timestamp(ts_str: str) -> datetime:
@@ -38,7 +39,8 @@ def _row_to_communication(row: sqlite3.Row) -> Communication:
         initiator_com_id=row['initiator_com_id'],
         exitor_com_id=row['exitor_com_id'],
         is_condensed=bool(row['is_condensed']),
-        condensed_summary=row['condensed_summary']
+        condensed_summary=row['condensed_summary'],
+        session_id=row['session_id']
     )
 
 
@@ -62,15 +64,16 @@ def save_message(message: CommunicationCreate) -> Communication:
         cursor.execute(
             """
             INSERT INTO communications (
-                com_id, sender, recipient, raw_content, initiator_com_id
-            ) VALUES (?, ?, ?, ?, ?)
+                com_id, sender, recipient, raw_content, initiator_com_id, session_id
+            ) VALUES (?, ?, ?, ?, ?, ?)
             """,
             (
                 new_com_id,
                 message.sender,
                 message.recipient,
                 message.raw_content,
-                message.initiator_com_id
+                message.initiator_com_id,
+                message.session_id
             )
         )
 
@@ -121,6 +124,27 @@ def get_message(com_id: str) -> Optional[Communication]:
         conn.close()
 
 
+def get_latest_reply(session_id: str = DEFAULT_SESSION_ID) -> Optional[Communication]:
+    """
+    Return the session's newest assistant message (the end of its most recent thread).
+    Returns None if the assistant has not replied in that session yet.
+    """
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT * FROM communications WHERE sender = 'assistant' AND session_id = ? ORDER BY rowid DESC LIMIT 1",
+            (session_id,)
+        )
+        row = cursor.fetchone()
+
+        if row:
+            return _row_to_communication(row)
+        return None
+    finally:
+        conn.close()
+
+
 def get_initiators() -> List[InitiatorLog]:
     """
     Return all entries from initiator_log (conversation starters).
@@ -207,6 +231,74 @@ def get_chain(com_id: str) -> List[Communication]:
     return chain
 
 
+def get_thread_history(com_id: str, limit: int = 50) -> List[Communication]:
+    """
+    Given any com_id, return it and up to limit - 1 of its predecessors, newest first.
+
+    Walks initiator_com_id links in a single recursive query; page further
+    back by calling again with the last result's initiator_com_id.
+    Returns empty list if com_id not found.
+    """
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            WITH RECURSIVE thread(com_id, initiator_com_id, depth) AS (
+                SELECT com_id, initiator_com_id, 0 FROM communications WHERE com_id = ?
+                UNION ALL
+                SELECT c.com_id, c.initiator_com_id, t.depth + 1
+                FROM communications c JOIN thread t ON c.com_id = t.initiator_com_id
+                WHERE t.depth + 1 < ?
+            )
+            SELECT c.* FROM thread t JOIN communications c ON c.com_id = t.com_id
+            ORDER BY t.depth
+            """,
+            (com_id, limit)
+        )
+        return [_row_to_communication(row) for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+
+def get_messages_since(rowid: int, limit: int = 500) -> List[Tuple[int, Communication]]:
+    """
+    Return up to `limit` messages saved after the given SQLite rowid, oldest first.
+
+    Used by incremental consumers (e.g. the recall index) to track what they have processed.
+    Returns (rowid, Communication) pairs.
+    """
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT rowid AS row_id, * FROM communications WHERE rowid > ? ORDER BY rowid LIMIT ?",
+            (rowid, limit)
+        )
+        return [(row['row_id'], _row_to_communication(row)) for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+
+def get_messages_by_ids(com_ids: List[str]) -> List[Communication]:
+    """
+    Retrieve several messages by com_id, in the order given.
+    Unknown com_ids are skipped.
+    """
+    if not com_ids:
+        return []
+
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        placeholders = ', '.join(['?'] * len(com_ids))
+        cursor.execute(f"SELECT * FROM communications WHERE com_id IN ({placeholders})", com_ids)
+        found = {row['com_id']: _row_to_communication(row) for row in cursor.fetchall()}
+        return [found[com_id] for com_id in com_ids if com_id in found]
+    finally:
+        conn.close()
+
+
 def get_full_message(com_id: str) -> Optional[str]:
     """
     Convenience wrapper: return raw_content string for a com_id.
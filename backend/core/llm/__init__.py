@@ -1,5 +1,28 @@
 """LLM service for OpenRouter integration."""
 
 from backend.core.llm.service import llm_service, LLMService
+from backend.core.llm.scheduler import (
+    LLMScheduler,
+    LaneConfig,
+    INTERACTIVE,
+    BACKGROUND,
+    llm_scheduler,
+)
+from backend.core.llm.router import LLMEndpoint, LLMRouter
+from backend.core.llm.complexity import ComplexityRouter, TierDecision, FAST, FULL
 
-__all__ = ["llm_service", "LLMService"]
+__all__ = [
+    "llm_service",
+    "LLMService",
+    "LLMScheduler",
+    "LaneConfig",
+    "INTERACTIVE",
+    "BACKGROUND",
+    "llm_scheduler",
+    "LLMEndpoint",
+    "LLMRouter",
+    "ComplexityRouter",
+    "TierDecision",
+    "FAST",
+    "FULL",
+]
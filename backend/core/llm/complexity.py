@@ -0,0 +1,195 @@
+"""
+Complexity-based model tier routing.
+
+Interactive turns are scored locally before they reach LLMService: a few
+heuristics catch the obvious cases (small talk, code, very long requests)
+and a small logistic model over cheap message features estimates how
+likely the turn needs the full model. Turns below the threshold go to the
+fast tier (settings.llm_fast_model_name), the rest to the full tier (the
+service default, settings.llm_model_name).
+
+Scoring is pure Python over the message text and takes well under a
+millisecond. Without a fast model configured every turn uses the full tier.
+"""
+
+import logging
+import math
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from backend.config.settings import settings
+from backend.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+FAST = "fast"
+FULL = "full"
+TIERS = (FAST, FULL)
+
+# Logistic model weights over the features of message_features(); the bias
+# puts an average short question just below the default threshold
+DEFAULT_WEIGHTS: Dict[str, float] = {
+    "bias": -1.6,
+    "words": 0.035,
+    "lines": 0.25,
+    "questions": 0.4,
+    "reasoning_terms": 1.1,
+    "technical_terms": 0.6,
+    "numbers": 0.15,
+    "history_turns": 0.04,
+}
+
+# Messages that are pure acknowledgement or greeting (matched on the whole text)
+_SMALL_TALK_RE = re.compile(
+    r"^(?:hi|hello|hey|thanks?|thank you|thx|ty|ok(?:ay)?|cool|great|nice|awesome|"
+    r"got it|sounds good|perfect|yes|no|yep|nope|sure|bye|good (?:morning|night|evening))"
+    r"[\s!.,:)]*(?:(?:very|so) much|a lot)?[\s!.,:)]*$",
+    re.IGNORECASE
+)
+_REASONING_RE = re.compile(
+    r"\b(?:why|explain|compare|analy[sz]e|design|architect|implement|debug|prove|derive|"
+    r"plan|strategy|trade-?offs?|pros and cons|step by step|evaluate|optimi[sz]e|refactor|summari[sz]e)\b",
+    re.IGNORECASE
+)
+_TECHNICAL_RE = re.compile(
+    r"\b(?:code|function|class|error|exception|stack ?trace|sql|api|algorithm|regex|"
+    r"python|javascript|typescript|database|query|bug|compile|deploy)\b",
+    re.IGNORECASE
+)
+_CODE_RE = re.compile(r"```|^\s{4,}\S|\b(?:def|class|import|return|const|function)\b.*[(){};:]", re.MULTILINE)
+_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+
+# Heuristic cut-offs
+LONG_MESSAGE_WORDS = 150
+MAX_HISTORY_TURNS = 20
+
+
+def message_features(text: str, history_turns: int = 0) -> Dict[str, float]:
+    """Cheap numeric features of a user message, as used by the logistic model."""
+    return {
+        "words": float(len(text.split())),
+        "lines": float(text.count("\n")),
+        "questions": float(text.count("?")),
+        "reasoning_terms": float(len(_REASONING_RE.findall(text))),
+        "technical_terms": float(len(_TECHNICAL_RE.findall(text))),
+        "numbers": float(len(_NUMBER_RE.findall(text))),
+        # Long threads lean harder, but only up to a point
+        "history_turns": float(min(history_turns, MAX_HISTORY_TURNS)),
+    }
+
+
+@dataclass
+class TierDecision:
+    """Where a turn was routed and why."""
+
+    tier: str
+    model: Optional[str]
+    score: float
+    reason: str
+    features: Dict[str, float] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, object]:
+        return {"tier": self.tier, "model": self.model, "score": round(self.score, 4), "reason": self.reason}
+
+
+class ComplexityRouter:
+    """
+    Pick the model tier for an interactive turn.
+
+    Usage:
+        decision = router.route(user_message, history_turns=len(history))
+        await llm_service.send_message(messages, stream=True, model=decision.model)
+    """
+
+    def __init__(
+        self,
+        fast_model: Optional[str] = None,
+        threshold: float = 0.5,
+        override: Optional[str] = None,
+        weights: Optional[Dict[str, float]] = None
+    ):
+        """
+        Args:
+            fast_model: Model of the fast tier (None disables routing).
+            threshold: Score at or above which a turn goes to the full tier.
+            override: "fast" or "full" forces that tier for every turn.
+            weights: Logistic model weights (default: DEFAULT_WEIGHTS).
+
+        Raises:
+            ValueError: If override is not a known tier.
+        """
+        if override and override not in TIERS:
+            raise ValueError(f"Unknown model tier override: {override!r}")
+        self.fast_model = fast_model
+        self.threshold = threshold
+        self.override = override or None
+        self.weights = dict(weights or DEFAULT_WEIGHTS)
+
+    @classmethod
+    def from_settings(cls) -> "ComplexityRouter":
+        """Create a router from the llm_fast_model_name/llm_tier_* settings."""
+        return cls(
+            fast_model=settings.llm_fast_model_name,
+            threshold=settings.llm_tier_threshold,
+            override=settings.llm_tier_override,
+        )
+
+    def score(self, features: Dict[str, float]) -> float:
+        """Logistic estimate (0-1) that a turn needs the full model."""
+        z = self.weights.get("bias", 0.0)
+        for name, value in features.items():
+            z += self.weights.get(name, 0.0) * value
+        return 1.0 / (1.0 + math.exp(-max(-30.0, min(30.0, z))))
+
+    def classify(self, text: str, history_turns: int = 0) -> TierDecision:
+        """Score a message and pick its tier, ignoring the override and fast-model availability."""
+        features = message_features(text, history_turns)
+        stripped = text.strip()
+        if _CODE_RE.search(text):
+            return TierDecision(FULL, None, 1.0, "code", features)
+        if features["words"] >= LONG_MESSAGE_WORDS:
+            return TierDecision(FULL, None, 1.0, "long", features)
+        if not stripped or _SMALL_TALK_RE.match(stripped):
+            return TierDecision(FAST, None, 0.0, "small_talk", features)
+        probability = self.score(features)
+        tier = FULL if probability >= self.threshold else FAST
+        return TierDecision(tier, None, probability, "model", features)
+
+    def route(self, text: str, history_turns: int = 0, force: Optional[str] = None) -> TierDecision:
+        """
+        Decide the tier and model for a turn, and record it in metrics.
+
+        Args:
+            text: The user's message.
+            history_turns: Messages of history sent along with it.
+            force: Tier to use without scoring (the override flag still wins).
+
+        Returns:
+            The decision; its model is None for the full tier (the service default).
+        """
+        started = time.perf_counter()
+        if self.override:
+            decision = TierDecision(self.override, None, 1.0 if self.override == FULL else 0.0, "override")
+        elif force:
+            decision = TierDecision(force, None, 1.0 if force == FULL else 0.0, "forced")
+        else:
+            decision = self.classify(text, history_turns)
+        if decision.tier == FAST and not self.fast_model:
+            decision.tier, decision.reason = FULL, "no_fast_model"
+        decision.model = self.fast_model if decision.tier == FAST else None
+
+        metrics.observe("llm.tier.classify_ms", (time.perf_counter() - started) * 1000)
+        metrics.increment(f"llm.tier.routed.{decision.tier}")
+        logger.debug(f"Routed turn to {decision.tier} tier ({decision.reason}, score {decision.score:.3f})")
+        return decision
+
+
+def record_tier_turn(tier: str, ttft_ms: Optional[float], total_ms: float, prompt_tokens: int, output_tokens: int) -> None:
+    """Record latency and token usage of a completed turn under its tier."""
+    if ttft_ms is not None:
+        metrics.observe(f"llm.tier.{tier}.ttft_ms", ttft_ms)
+    metrics.observe(f"llm.tier.{tier}.total_ms", total_ms)
+    metrics.observe(f"llm.tier.{tier}.prompt_tokens", prompt_tokens)
+    metrics.observe(f"llm.tier.{tier}.output_tokens", output_tokens)
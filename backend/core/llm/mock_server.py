@@ -0,0 +1,290 @@
+"""
+Mock LLM Server
+OpenAI-compatible chat-completions server with configurable latency,
+throughput and error rate, for offline load and latency testing.
+
+Run standalone and point the backend at it:
+
+    python -m backend.core.llm.mock_server --port 8001 --ttft-ms 300 --tokens-per-sec 40
+    LLM_BASE_URL=http://127.0.0.1:8001/v1 LLM_API_KEY=mock LLM_MODEL_NAME=mock-model ...
+
+In tests, use MockLLMServer as a context manager (or the mock_llm_server fixture).
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import re
+import socket
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import AsyncGenerator, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CANNED_RESPONSE = (
+    "This is a canned response from the Moon-AI mock LLM server. "
+    "It streams at a configurable rate so latency and throughput can be measured offline."
+)
+
+
+@dataclass
+class MockLLMConfig:
+    """Behaviour knobs for the mock server (all adjustable at runtime via POST /mock/config)."""
+    ttft_ms: float = 200.0                 # Delay before the first token / non-streamed reply
+    tokens_per_sec: float = 50.0           # Streaming rate after the first token (0 = no delay)
+    error_rate: float = 0.0                # Probability (0.0-1.0) that a request fails
+    error_status: int = 503                # HTTP status used for injected failures
+    mode: str = "echo"                     # "echo" (repeat last user message) or "canned"
+    canned_response: str = DEFAULT_CANNED_RESPONSE
+    max_tokens_cap: Optional[int] = None   # Truncate replies to this many tokens if set
+    seed: Optional[int] = None             # Seed for reproducible error injection
+
+
+@dataclass
+class MockLLMStats:
+    """Counters exposed at GET /mock/stats."""
+    requests: int = 0
+    streamed: int = 0
+    errors: int = 0
+    tokens_sent: int = 0
+    models: dict = field(default_factory=dict)
+
+
+def _split_tokens(text: str) -> List[str]:
+    """Split text into word-sized pseudo tokens that keep their trailing whitespace."""
+    return re.findall(r"\s*\S+\s*", text) or [text]
+
+
+def create_mock_llm_app(config: Optional[MockLLMConfig] = None) -> FastAPI:
+    """
+    Build the FastAPI app implementing the OpenAI chat-completions API.
+
+    Args:
+        config: Initial behaviour. Defaults to MockLLMConfig().
+    """
+    app = FastAPI(title="Moon-AI Mock LLM Server")
+    app.state.config = config if config else MockLLMConfig()
+    app.state.stats = MockLLMStats()
+    app.state.rng = random.Random(app.state.config.seed)
+
+    def build_reply(body: dict) -> List[str]:
+        cfg: MockLLMConfig = app.state.config
+        if cfg.mode == "echo":
+            user_messages = [m for m in body.get("messages", []) if m.get("role") == "user"]
+            text = str(user_messages[-1].get("content", "")) if user_messages else ""
+            text = text or "(empty message)"
+        else:
+            text = cfg.canned_response
+
+        tokens = _split_tokens(text)
+        limits = [n for n in (body.get("max_tokens"), cfg.max_tokens_cap) if n]
+        if limits:
+            tokens = tokens[:min(limits)]
+        return tokens
+
+    def should_fail() -> bool:
+        cfg: MockLLMConfig = app.state.config
+        return cfg.error_rate > 0 and app.state.rng.random() < cfg.error_rate
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {"object": "list", "data": [{"id": "mock-model", "object": "model", "owned_by": "moon-ai"}]}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        cfg: MockLLMConfig = app.state.config
+        stats: MockLLMStats = app.state.stats
+        model = body.get("model", "mock-model")
+
+        stats.requests += 1
+        stats.models[model] = stats.models.get(model, 0) + 1
+
+        if should_fail():
+            stats.errors += 1
+            return JSONResponse(
+                status_code=cfg.error_status,
+                content={"error": {"message": "Injected mock failure", "type": "mock_error", "code": cfg.error_status}},
+            )
+
+        tokens = build_reply(body)
+        completion_id = f"chatcmpl-mock-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+
+        if not body.get("stream"):
+            await asyncio.sleep(cfg.ttft_ms / 1000)
+            stats.tokens_sent += len(tokens)
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "finish_reason": "stop",
+                }],
+                "usage": {
+                    "prompt_tokens": sum(len(_split_tokens(str(m.get("content", "")))) for m in body.get("messages", [])),
+                    "completion_tokens": len(tokens),
+                    "total_tokens": len(tokens),
+                },
+            }
+
+        stats.streamed += 1
+
+        def chunk(delta: dict, finish_reason: Optional[str] = None) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            return f"data: {json.dumps(payload)}\n\n"
+
+        async def event_stream() -> AsyncGenerator[str, None]:
+            await asyncio.sleep(cfg.ttft_ms / 1000)
+            yield chunk({"role": "assistant", "content": ""})
+            interval = 1 / cfg.tokens_per_sec if cfg.tokens_per_sec > 0 else 0
+            for i, token in enumerate(tokens):
+                if i and interval:
+                    await asyncio.sleep(interval)
+                stats.tokens_sent += 1
+                yield chunk({"content": token})
+            yield chunk({}, finish_reason="stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+    @app.get("/mock/config")
+    async def read_config():
+        return asdict(app.state.config)
+
+    @app.post("/mock/config")
+    async def update_config(request: Request):
+        updates = await request.json()
+        cfg: MockLLMConfig = app.state.config
+        for key, value in updates.items():
+            if hasattr(cfg, key):
+                setattr(cfg, key, value)
+        if "seed" in updates:
+            app.state.rng = random.Random(cfg.seed)
+        return asdict(cfg)
+
+    @app.get("/mock/stats")
+    async def read_stats():
+        return asdict(app.state.stats)
+
+    @app.post("/mock/reset")
+    async def reset_stats():
+        app.state.stats = MockLLMStats()
+        return asdict(app.state.stats)
+
+    return app
+
+
+def _free_port(host: str) -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+class MockLLMServer:
+    """
+    Run the mock server in a background thread.
+
+    Usage:
+        with MockLLMServer(MockLLMConfig(ttft_ms=50)) as server:
+            client = AsyncOpenAI(base_url=server.base_url, api_key="mock")
+    """
+
+    def __init__(self, config: Optional[MockLLMConfig] = None, host: str = "127.0.0.1", port: Optional[int] = None):
+        self.app = create_mock_llm_app(config)
+        self.host = host
+        self.port = port or _free_port(host)
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def config(self) -> MockLLMConfig:
+        return self.app.state.config
+
+    @property
+    def stats(self) -> MockLLMStats:
+        return self.app.state.stats
+
+    @property
+    def base_url(self) -> str:
+        """OpenAI-style base URL (use as LLM_BASE_URL)."""
+        return f"http://{self.host}:{self.port}/v1"
+
+    def start(self, timeout: float = 10.0) -> "MockLLMServer":
+        """Start serving and block until the socket is accepting connections."""
+        import uvicorn
+
+        self._server = uvicorn.Server(
+            uvicorn.Config(self.app, host=self.host, port=self.port, log_level="warning", lifespan="off")
+        )
+        self._thread = threading.Thread(target=self._server.run, name="mock-llm-server", daemon=True)
+        self._thread.start()
+
+        deadline = time.monotonic() + timeout
+        while not self._server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError("Mock LLM server failed to start")
+            time.sleep(0.01)
+        return self
+
+    def stop(self) -> None:
+        """Signal the server to exit and wait for the thread."""
+        if self._server:
+            self._server.should_exit = True
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def __enter__(self) -> "MockLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="OpenAI-compatible mock LLM server for offline testing.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--ttft-ms", type=float, default=200.0, help="Delay before the first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=50.0, help="Streaming rate (0 = unthrottled)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--mode", choices=["echo", "canned"], default="echo")
+    parser.add_argument("--canned-response", default=DEFAULT_CANNED_RESPONSE)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    config = MockLLMConfig(
+        ttft_ms=args.ttft_ms,
+        tokens_per_sec=args.tokens_per_sec,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        mode=args.mode,
+        canned_response=args.canned_response,
+        seed=args.seed,
+    )
+    logger.info(f"Mock LLM server on http://{args.host}:{args.port}/v1 ({asdict(config)})")
+    uvicorn.run(create_mock_llm_app(config), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
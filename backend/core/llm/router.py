@@ -0,0 +1,232 @@
+"""
+LLM Endpoint Router
+Tracks latency/throughput per OpenAI-compatible endpoint and model, and
+ranks endpoints so each request goes to the currently fastest healthy one.
+"""
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from openai import AsyncOpenAI
+
+from backend.config.settings import settings
+from backend.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Output length used to turn throughput into an expected latency when scoring
+REFERENCE_OUTPUT_TOKENS = 256
+
+# Client errors worth retrying elsewhere (timeout, rate limit); any other 4xx
+# would fail the same way on every endpoint
+FAILOVER_CLIENT_STATUSES = frozenset({408, 429})
+
+
+def should_fail_over(error: Exception) -> bool:
+    """Whether a failed request may succeed on another endpoint."""
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int) and 400 <= status < 500:
+        return status in FAILOVER_CLIENT_STATUSES
+    return True
+
+
+@dataclass
+class LLMEndpoint:
+    """A single OpenAI-compatible endpoint the service can route to."""
+    name: str
+    client: AsyncOpenAI
+    base_url: str = ""
+    default_model: Optional[str] = None
+    model_aliases: Dict[str, str] = field(default_factory=dict)
+
+    def resolve_model(self, requested: Optional[str], fallback: str) -> str:
+        """
+        Map the caller's model name to the name this provider expects.
+
+        Args:
+            requested: Model explicitly requested by the caller (or None).
+            fallback: Service-wide default model.
+        """
+        if requested:
+            return self.model_aliases.get(requested, requested)
+        return self.default_model or fallback
+
+
+class EndpointStats:
+    """EWMA latency/throughput and health state for one (endpoint, model) pair."""
+
+    def __init__(self, alpha: float, prior_latency_ms: float = 10000.0):
+        self.alpha = alpha
+        self.prior_latency_ms = prior_latency_ms
+        self.ttft_ms: Optional[float] = None
+        self.tokens_per_sec: Optional[float] = None
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+        self.last_error: Optional[str] = None
+
+    def _ewma(self, current: Optional[float], sample: float) -> float:
+        if current is None:
+            return sample
+        return self.alpha * sample + (1 - self.alpha) * current
+
+    def record_success(self, ttft_ms: float, output_tokens: int, duration_ms: float) -> None:
+        """Fold a completed request into the moving averages."""
+        self.requests += 1
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+        self.ttft_ms = self._ewma(self.ttft_ms, ttft_ms)
+
+        generation_ms = duration_ms - ttft_ms
+        if output_tokens > 1 and generation_ms > 0:
+            self.tokens_per_sec = self._ewma(self.tokens_per_sec, output_tokens * 1000 / generation_ms)
+
+    def record_failure(self, error: str, failure_threshold: int, cooldown_seconds: float) -> None:
+        """Count a failure, marking the endpoint unhealthy after repeated errors."""
+        self.requests += 1
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.last_error = error
+        if self.consecutive_failures >= failure_threshold:
+            self.unhealthy_until = time.monotonic() + cooldown_seconds
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.unhealthy_until
+
+    @property
+    def expected_latency_ms(self) -> float:
+        """
+        Estimated time to produce a reference-length answer.
+
+        Endpoints without a successful request get the (pessimistic) prior,
+        and every consecutive failure counts the estimate once more.
+        """
+        if self.ttft_ms is None:
+            latency = self.prior_latency_ms
+        else:
+            latency = self.ttft_ms
+            if self.tokens_per_sec:
+                latency += REFERENCE_OUTPUT_TOKENS * 1000 / self.tokens_per_sec
+        return latency * (1 + self.consecutive_failures)
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "ttft_ms_ewma": round(self.ttft_ms, 3) if self.ttft_ms is not None else None,
+            "tokens_per_sec_ewma": round(self.tokens_per_sec, 3) if self.tokens_per_sec is not None else None,
+            "expected_latency_ms": round(self.expected_latency_ms, 3),
+            "requests": self.requests,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "healthy": self.healthy,
+            "last_error": self.last_error,
+        }
+
+
+class LLMRouter:
+    """
+    Latency-aware endpoint selector.
+
+    Endpoints are ranked per model by expected latency (EWMA time-to-first-token
+    plus EWMA throughput). Untried endpoints are assumed slow (a pessimistic
+    prior) so they are used after measured ones, in configured order; failures
+    push an endpoint down the ranking, and endpoints that fail repeatedly are
+    benched for a cooldown and only used as a last resort.
+    """
+
+    def __init__(
+        self,
+        endpoint_names: List[str],
+        alpha: float = 0.3,
+        failure_threshold: int = 3,
+        cooldown_seconds: float = 30.0,
+        prior_latency_ms: float = 10000.0,
+    ):
+        """
+        Initialize the router.
+
+        Args:
+            endpoint_names: Endpoint names in configured preference order.
+            alpha: EWMA smoothing factor (weight of the newest sample).
+            failure_threshold: Consecutive failures before an endpoint is benched.
+            cooldown_seconds: How long a benched endpoint is skipped.
+            prior_latency_ms: Expected latency of endpoints without a successful request.
+        """
+        self.endpoint_names = list(endpoint_names)
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.prior_latency_ms = prior_latency_ms
+        self._stats: Dict[Tuple[str, str], EndpointStats] = {}
+        self._last_choice: Dict[str, str] = {}
+
+    @classmethod
+    def from_settings(cls, endpoint_names: List[str]) -> "LLMRouter":
+        """Create a router using the tunables in settings."""
+        return cls(
+            endpoint_names,
+            alpha=settings.llm_router_ewma_alpha,
+            failure_threshold=settings.llm_router_failure_threshold,
+            cooldown_seconds=settings.llm_router_cooldown_seconds,
+            prior_latency_ms=settings.llm_router_prior_latency_ms,
+        )
+
+    def _get_stats(self, endpoint: str, model: str) -> EndpointStats:
+        key = (endpoint, model)
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = EndpointStats(self.alpha, self.prior_latency_ms)
+        return stats
+
+    def rank(self, model: str) -> List[str]:
+        """
+        Return endpoint names in the order they should be tried for model.
+        Healthy endpoints come first (fastest first); benched ones follow.
+        """
+        order = {name: i for i, name in enumerate(self.endpoint_names)}
+
+        def score(name: str) -> Tuple[int, float, int]:
+            stats = self._get_stats(name, model)
+            return (0 if stats.healthy else 1, stats.expected_latency_ms, order[name])
+
+        ranked = sorted(self.endpoint_names, key=score)
+        if ranked and self._last_choice.get(model) != ranked[0]:
+            previous = self._last_choice.get(model)
+            self._last_choice[model] = ranked[0]
+            if previous is not None:
+                logger.info(f"LLM routing for '{model}' switched from {previous} to {ranked[0]}")
+                metrics.increment("llm.router.switches")
+        return ranked
+
+    def record_success(
+        self,
+        endpoint: str,
+        model: str,
+        ttft_ms: float,
+        output_tokens: int,
+        duration_ms: float,
+    ) -> None:
+        """Record a successful request against (endpoint, model)."""
+        self._get_stats(endpoint, model).record_success(ttft_ms, output_tokens, duration_ms)
+        metrics.increment(f"llm.router.routed.{endpoint}")
+        metrics.observe(f"llm.router.ttft_ms.{endpoint}", ttft_ms)
+
+    def record_failure(self, endpoint: str, model: str, error: Exception) -> None:
+        """Record a failed request against (endpoint, model)."""
+        stats = self._get_stats(endpoint, model)
+        stats.record_failure(str(error), self.failure_threshold, self.cooldown_seconds)
+        metrics.increment(f"llm.router.failures.{endpoint}")
+        if not stats.healthy:
+            logger.warning(f"LLM endpoint {endpoint} benched for {self.cooldown_seconds}s after repeated failures")
+
+    def get_metrics(self) -> Dict[str, object]:
+        """Return per-endpoint/model stats and the current preferred endpoint per model."""
+        endpoints: Dict[str, Dict[str, object]] = {}
+        for (endpoint, model), stats in self._stats.items():
+            endpoints.setdefault(endpoint, {})[model] = stats.to_dict()
+        return {
+            "endpoints": endpoints,
+            "preferred": dict(self._last_choice),
+        }
@@ -0,0 +1,292 @@
+"""
+LLM Request Scheduler
+Coordinates all LLM calls through priority lanes so background work
+(condensation, profile analysis) can never starve interactive turns.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Deque, Dict, List, Optional
+
+from backend.config.settings import settings
+from backend.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Lane names, listed in priority order (highest first)
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+LANE_ORDER = [INTERACTIVE, BACKGROUND]
+
+
+class TokenBucket:
+    """
+    Token-rate budget refilled continuously at tokens_per_minute.
+    A tokens_per_minute of 0 disables the budget.
+    """
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = float(tokens_per_minute)
+        self.rate = tokens_per_minute / 60.0
+        self.tokens = self.capacity
+        self._last_refill = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.capacity <= 0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def time_until_available(self, amount: int) -> float:
+        """
+        Seconds until amount tokens may be consumed (0 if available now).
+        Requests larger than the whole bucket are admitted once it is full.
+        """
+        if self.unlimited:
+            return 0.0
+        self._refill()
+        needed = min(float(amount), self.capacity)
+        if self.tokens >= needed:
+            return 0.0
+        return (needed - self.tokens) / self.rate
+
+    def consume(self, amount: int) -> None:
+        """Charge amount tokens against the budget (may go into debt)."""
+        if self.unlimited:
+            return
+        self._refill()
+        self.tokens -= amount
+
+
+@dataclass
+class LaneConfig:
+    """Limits applied to a single priority lane."""
+    max_concurrency: int
+    tokens_per_minute: int = 0
+
+
+class _Waiter:
+    __slots__ = ("future", "tokens", "enqueued_at")
+
+    def __init__(self, future: asyncio.Future, tokens: int):
+        self.future = future
+        self.tokens = tokens
+        self.enqueued_at = time.monotonic()
+
+
+class _Lane:
+    def __init__(self, name: str, config: LaneConfig):
+        self.name = name
+        self.config = config
+        self.bucket = TokenBucket(config.tokens_per_minute)
+        self.waiters: Deque[_Waiter] = deque()
+        self.active = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.tokens_charged = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    def head(self) -> Optional[_Waiter]:
+        """Return the first waiter that is still interested, dropping cancelled ones."""
+        while self.waiters and self.waiters[0].future.done():
+            self.waiters.popleft()
+        return self.waiters[0] if self.waiters else None
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for w in self.waiters if not w.future.done())
+
+
+class LLMScheduler:
+    """
+    Admission controller in front of LLMService.
+
+    Every call acquires a slot in a lane. Slots are granted in strict
+    priority order: while any interactive request is queued, no background
+    request is admitted. Each lane also has its own concurrency limit and
+    an optional token-rate budget; the global limit caps total in-flight calls.
+    """
+
+    def __init__(self, max_concurrency: int = 8, lanes: Optional[Dict[str, LaneConfig]] = None):
+        """
+        Initialize the scheduler.
+
+        Args:
+            max_concurrency: Maximum number of in-flight LLM calls across all lanes.
+            lanes: Per-lane limits keyed by lane name. Defaults to an interactive
+                   lane using the full concurrency and a background lane capped at 2.
+        """
+        if lanes is None:
+            lanes = {
+                INTERACTIVE: LaneConfig(max_concurrency=max_concurrency),
+                BACKGROUND: LaneConfig(max_concurrency=min(2, max_concurrency)),
+            }
+        self.max_concurrency = max_concurrency
+        order = [name for name in LANE_ORDER if name in lanes]
+        order += [name for name in lanes if name not in order]
+        self._lanes: Dict[str, _Lane] = {name: _Lane(name, lanes[name]) for name in order}
+        self._active = 0
+        # Pending budget-refill dispatch and the loop it was scheduled on
+        self._retry_handle: Optional[asyncio.TimerHandle] = None
+        self._retry_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_lane(self, lane: str) -> _Lane:
+        if lane not in self._lanes:
+            raise ValueError(f"Unknown scheduler lane: {lane}")
+        return self._lanes[lane]
+
+    @asynccontextmanager
+    async def slot(self, lane: str = INTERACTIVE, estimated_tokens: int = 0) -> AsyncIterator[None]:
+        """
+        Hold a scheduler slot for the duration of the block.
+
+        Args:
+            lane: Priority lane name (INTERACTIVE or BACKGROUND).
+            estimated_tokens: Tokens charged against the lane's rate budget.
+        """
+        await self.acquire(lane, estimated_tokens)
+        try:
+            yield
+        finally:
+            self.release(lane)
+
+    async def acquire(self, lane: str = INTERACTIVE, estimated_tokens: int = 0) -> None:
+        """Wait until a slot in lane is granted. Pair with release()."""
+        target = self._get_lane(lane)
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), estimated_tokens)
+        target.waiters.append(waiter)
+        self._dispatch()
+
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Slot was granted just as we were cancelled — hand it back
+                self.release(lane)
+            else:
+                target.rejected += 1
+                self._dispatch()
+            raise
+
+        wait_ms = (time.monotonic() - waiter.enqueued_at) * 1000
+        target.total_wait_ms += wait_ms
+        target.max_wait_ms = max(target.max_wait_ms, wait_ms)
+        metrics.observe(f"llm.scheduler.wait_ms.{lane}", wait_ms)
+
+    def release(self, lane: str = INTERACTIVE) -> None:
+        """Return a slot previously granted by acquire()."""
+        target = self._get_lane(lane)
+        target.active = max(0, target.active - 1)
+        self._active = max(0, self._active - 1)
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Grant queued slots in strict lane-priority order."""
+        retry_after: Optional[float] = None
+
+        for lane in self._lanes.values():
+            while True:
+                waiter = lane.head()
+                if waiter is None:
+                    break
+                if self._active >= self.max_concurrency or lane.active >= lane.config.max_concurrency:
+                    break
+                delay = lane.bucket.time_until_available(waiter.tokens)
+                if delay > 0:
+                    retry_after = delay if retry_after is None else min(retry_after, delay)
+                    break
+
+                lane.waiters.popleft()
+                lane.bucket.consume(waiter.tokens)
+                lane.active += 1
+                lane.admitted += 1
+                lane.tokens_charged += waiter.tokens
+                self._active += 1
+                waiter.future.set_result(None)
+
+            if lane.head() is not None:
+                # Higher-priority work is still queued: lower lanes must wait
+                break
+
+        if retry_after is not None:
+            self._schedule_retry(retry_after)
+
+    def _schedule_retry(self, delay: float) -> None:
+        """Re-run dispatch once a token budget has refilled, unless a sooner retry is pending."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        when = loop.time() + delay
+        pending = self._retry_handle
+        if pending is not None and not pending.cancelled() and self._retry_loop is loop:
+            if pending.when() <= when:
+                return
+            pending.cancel()
+        self._retry_loop = loop
+        self._retry_handle = loop.call_at(when, self._retry_dispatch)
+
+    def _retry_dispatch(self) -> None:
+        self._retry_handle = None
+        self._dispatch()
+
+    def queue_depth(self, lane: Optional[str] = None) -> int:
+        """Number of requests waiting for a slot, for one lane or all lanes."""
+        if lane is not None:
+            return self._get_lane(lane).queue_depth
+        return sum(target.queue_depth for target in self._lanes.values())
+
+    def get_metrics(self) -> Dict[str, object]:
+        """Return current queue depths, in-flight counts and lane totals."""
+        lanes: Dict[str, Dict[str, object]] = {}
+        for name, lane in self._lanes.items():
+            lanes[name] = {
+                "queue_depth": lane.queue_depth,
+                "active": lane.active,
+                "max_concurrency": lane.config.max_concurrency,
+                "tokens_per_minute": lane.config.tokens_per_minute,
+                "admitted": lane.admitted,
+                "cancelled_while_queued": lane.rejected,
+                "tokens_charged": lane.tokens_charged,
+                "avg_wait_ms": round(lane.total_wait_ms / lane.admitted, 3) if lane.admitted else 0.0,
+                "max_wait_ms": round(lane.max_wait_ms, 3),
+            }
+        return {
+            "max_concurrency": self.max_concurrency,
+            "active": self._active,
+            "queue_depth": self.queue_depth(),
+            "lanes": lanes,
+        }
+
+    @property
+    def lane_names(self) -> List[str]:
+        return list(self._lanes)
+
+
+def _build_default_scheduler() -> LLMScheduler:
+    """Create the process-wide scheduler from settings."""
+    return LLMScheduler(
+        max_concurrency=settings.llm_max_concurrency,
+        lanes={
+            INTERACTIVE: LaneConfig(
+                max_concurrency=settings.llm_interactive_concurrency,
+                tokens_per_minute=settings.llm_interactive_tokens_per_minute,
+            ),
+            BACKGROUND: LaneConfig(
+                max_concurrency=settings.llm_background_concurrency,
+                tokens_per_minute=settings.llm_background_tokens_per_minute,
+            ),
+        },
+    )
+
+
+# Global instance
+llm_scheduler = _build_default_scheduler()
+metrics.register_collector("llm_scheduler", llm_scheduler.get_metrics)
@@ -1,35 +1,95 @@
 from typing import AsyncGenerator
+import httpx
 from openai import AsyncOpenAI
 from backend.config.settings import settings
+from backend.core.llm.scheduler import LLMScheduler, INTERACTIVE, llm_scheduler as default_scheduler
+from backend.core.llm.router import LLMEndpoint, LLMRouter, should_fail_over
+from backend.core.metrics import metrics
+import asyncio
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_HEADERS = {
+    "HTTP-Referer": "https://github.com/yourusername/moon-ai",  # Optional
+    "X-Title": "Moon-AI-Assistant-Platform",
+}
+
 class LLMService:
     """Service for interacting with LLM APIs via OpenRouter."""
 
-    def __init__(self):
-        """Initialize OpenRouter client with settings."""
+    def __init__(
+        self,
+        scheduler: LLMScheduler | None = None,
+        endpoints: list[LLMEndpoint] | None = None,
+        router: LLMRouter | None = None
+    ):
+        """
+        Initialize OpenRouter client with settings.
+
+        Args:
+            scheduler: Optional LLMScheduler that admits every call.
+                       Defaults to the module-level singleton.
+            endpoints: Optional explicit endpoint list (first is primary).
+                       Defaults to llm_base_url plus any settings.llm_endpoints.
+            router: Optional LLMRouter. Defaults to one built from settings.
+        """
         if not settings.llm_api_key:
             raise ValueError("LLM_API_KEY environment variable is required")
 
         if not settings.llm_model_name:
             raise ValueError("LLM_MODEL_NAME environment variable is required")
 
-        # Default to OpenRouter if no base URL provided
-        base_url = settings.llm_base_url or "https://openrouter.ai/api/v1"
+        self.model = settings.llm_model_name
+        self.endpoints = endpoints if endpoints else self._endpoints_from_settings()
+        self._endpoints_by_name = {endpoint.name: endpoint for endpoint in self.endpoints}
+        # Primary client, kept for callers that talk to the provider directly
+        self.client = self.endpoints[0].client
+        self.scheduler = scheduler if scheduler else default_scheduler
+        self.router = router if router else LLMRouter.from_settings(list(self._endpoints_by_name))
 
-        self.client = AsyncOpenAI(
-            api_key=settings.llm_api_key,
-            base_url=base_url,
-            default_headers={
-                "HTTP-Referer": "https://github.com/yourusername/moon-ai",  # Optional
-                "X-Title": "Moon-AI-Assistant-Platform",
-            }
+        logger.info(
+            f"LLM Service initialized with model: {self.model} "
+            f"({len(self.endpoints)} endpoint(s): {', '.join(self._endpoints_by_name)})"
         )
-        self.model = settings.llm_model_name
 
-        logger.info(f"LLM Service initialized with model: {self.model}")
+    @staticmethod
+    def _endpoints_from_settings() -> list[LLMEndpoint]:
+        """Build the primary endpoint and any extra configured endpoints."""
+        # Default to OpenRouter if no base URL provided
+        base_url = settings.llm_base_url or "https://openrouter.ai/api/v1"
+        # A stalled endpoint must fail fast enough for failover to help
+        timeout = httpx.Timeout(settings.llm_read_timeout, connect=settings.llm_connect_timeout)
+
+        endpoints = [
+            LLMEndpoint(
+                name="primary",
+                base_url=base_url,
+                client=AsyncOpenAI(
+                    api_key=settings.llm_api_key,
+                    base_url=base_url,
+                    default_headers=DEFAULT_HEADERS,
+                    timeout=timeout
+                ),
+            )
+        ]
+        for config in settings.llm_endpoints:
+            endpoints.append(
+                LLMEndpoint(
+                    name=config.name,
+                    base_url=config.base_url,
+                    client=AsyncOpenAI(
+                        api_key=config.api_key or settings.llm_api_key,
+                        base_url=config.base_url,
+                        default_headers=DEFAULT_HEADERS,
+                        timeout=timeout
+                    ),
+                    default_model=config.model_name,
+                    model_aliases=dict(config.model_aliases),
+                )
+            )
+        return endpoints
 
     async def send_message(
         self,
@@ -37,66 +97,180 @@ class LLMService:
         stream: bool = False,
         temperature: float = 0.7,
         max_tokens: int = 2000,
-        model: str | None = None
+        model: str | None = None,
+        priority: str = INTERACTIVE
     ) -> str | AsyncGenerator[str, None]:
         """
         Send messages to LLM and get response.
 
+        The request is routed to the fastest healthy endpoint; if it fails
+        before producing output, the next endpoint is tried transparently.
+        Client errors (4xx other than 408/429) are raised without failover.
+
         Args:
             messages: List of message dicts with 'role' and 'content'
             stream: Whether to stream response token-by-token
             temperature: Sampling temperature (0.0-2.0)
             max_tokens: Maximum tokens in response
             model: Optional model override
+            priority: Scheduler lane (INTERACTIVE for user-facing turns,
+                      BACKGROUND for condensation/profile work)
 
         Returns:
             Complete response string if stream=False,
             AsyncGenerator yielding tokens if stream=True
         """
+        estimated_tokens = self._estimate_tokens(messages, max_tokens)
         try:
             if stream:
-                return self._stream_response(messages, temperature, max_tokens, model)
+                return self._stream_response(messages, temperature, max_tokens, model, priority, estimated_tokens)
             else:
-                response = await self.client.chat.completions.create(
-                    model=model or self.model,
+                async with self.scheduler.slot(priority, estimated_tokens):
+                    return await self._complete(messages, temperature, max_tokens, model)
+
+        except Exception as e:
+            logger.error(f"Error calling LLM API: {e}")
+            raise
+
+    async def _complete(
+        self,
+        messages: list[dict],
+        temperature: float,
+        max_tokens: int,
+        model: str | None
+    ) -> str:
+        """Non-streaming completion with failover across ranked endpoints."""
+        requested_model = model or self.model
+        last_error: Exception | None = None
+
+        for attempt, name in enumerate(self.router.rank(requested_model)):
+            endpoint = self._endpoints_by_name[name]
+            if attempt:
+                metrics.increment("llm.router.failover")
+                logger.warning(f"Failing over to LLM endpoint {name}")
+
+            started = time.monotonic()
+            try:
+                response = await endpoint.client.chat.completions.create(
+                    model=endpoint.resolve_model(model, self.model),
                     messages=messages,
                     temperature=temperature,
                     max_tokens=max_tokens
                 )
-                return response.choices[0].message.content
+            except Exception as e:
+                if not should_fail_over(e):
+                    # The request itself is invalid: every endpoint would reject it
+                    raise
+                self.router.record_failure(name, requested_model, e)
+                last_error = e
+                continue
 
-        except Exception as e:
-            logger.error(f"Error calling LLM API: {e}")
-            raise
+            duration_ms = (time.monotonic() - started) * 1000
+            content = response.choices[0].message.content
+            completion_tokens = getattr(getattr(response, "usage", None), "completion_tokens", None)
+            if not isinstance(completion_tokens, int):
+                completion_tokens = len(content or "") // 4
+            self.router.record_success(name, requested_model, duration_ms, completion_tokens, duration_ms)
+            return content
+
+        raise last_error if last_error else RuntimeError("No LLM endpoints configured")
 
     async def _stream_response(
         self,
         messages: list[dict],
         temperature: float,
         max_tokens: int,
-        model: str | None = None
+        model: str | None = None,
+        priority: str = INTERACTIVE,
+        estimated_tokens: int = 0
     ) -> AsyncGenerator[str, None]:
-        """Helper for streaming token-by-token responses."""
+        """Helper for streaming token-by-token responses.
+
+        The scheduler slot is held until the stream is exhausted or closed.
+        Endpoints are failed over only until the first token is produced;
+        after that an error is raised to the caller to avoid duplicated output.
+        """
+        requested_model = model or self.model
         try:
-            stream = await self.client.chat.completions.create(
-                model=model or self.model,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens,
-                stream=True
-            )
+            async with self.scheduler.slot(priority, estimated_tokens):
+                last_error: Exception | None = None
+
+                for attempt, name in enumerate(self.router.rank(requested_model)):
+                    endpoint = self._endpoints_by_name[name]
+                    if attempt:
+                        metrics.increment("llm.router.failover")
+                        logger.warning(f"Failing over to LLM endpoint {name}")
+
+                    started = time.monotonic()
+                    ttft_ms: float | None = None
+                    chunk_count = 0
+                    stream = None
+                    try:
+                        stream = await endpoint.client.chat.completions.create(
+                            model=endpoint.resolve_model(model, self.model),
+                            messages=messages,
+                            temperature=temperature,
+                            max_tokens=max_tokens,
+                            stream=True
+                        )
+
+                        async for chunk in stream:
+                            if chunk.choices[0].delta.content:
+                                if ttft_ms is None:
+                                    ttft_ms = (time.monotonic() - started) * 1000
+                                chunk_count += 1
+                                yield chunk.choices[0].delta.content
+                    except Exception as e:
+                        if not should_fail_over(e):
+                            raise
+                        self.router.record_failure(name, requested_model, e)
+                        if ttft_ms is not None:
+                            raise
+                        last_error = e
+                        continue
+                    except (GeneratorExit, asyncio.CancelledError):
+                        # Consumer went away: abort the HTTP stream so the provider stops generating
+                        metrics.increment("llm.stream.cancelled")
+                        logger.info(f"LLM stream from {name} cancelled after {chunk_count} chunks")
+                        raise
+                    finally:
+                        if stream is not None:
+                            await self._close_stream(stream)
 
-            async for chunk in stream:
-                if chunk.choices[0].delta.content:
-                    yield chunk.choices[0].delta.content
+                    duration_ms = (time.monotonic() - started) * 1000
+                    self.router.record_success(
+                        name, requested_model, ttft_ms if ttft_ms is not None else duration_ms,
+                        chunk_count, duration_ms
+                    )
+                    return
+
+                raise last_error if last_error else RuntimeError("No LLM endpoints configured")
 
         except Exception as e:
             logger.error(f"Error streaming LLM response: {e}")
             raise
 
+    @staticmethod
+    async def _close_stream(stream) -> None:
+        """Close an upstream stream, releasing its HTTP connection."""
+        close = getattr(stream, "close", None) or getattr(stream, "aclose", None)
+        if close is None:
+            return
+        try:
+            await close()
+        except Exception as e:
+            logger.debug(f"Error closing LLM stream: {e}")
+
+    @staticmethod
+    def _estimate_tokens(messages: list[dict], max_tokens: int) -> int:
+        """Cheap upper-bound token estimate (~4 chars/token) used for rate budgets."""
+        prompt_chars = sum(len(str(msg.get("content", ""))) for msg in messages)
+        return prompt_chars // 4 + max_tokens
+
 # Global instance
 try:
     llm_service = LLMService()
+    metrics.register_collector("llm_router", llm_service.router.get_metrics)
 except ValueError as e:
     logger.warning(f"LLM Service not initialized: {e}")
     llm_service = None
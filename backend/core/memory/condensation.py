@@ -1,7 +1,8 @@
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 
 from backend.core.llm.service import LLMService
+from backend.core.llm.scheduler import BACKGROUND
 from backend.core.memory.token_counter import TokenCounter, token_counter as default_token_counter
 from backend.core.memory.condensation_link import mark_condensed
 
@@ -41,6 +42,9 @@ class CondensationEngine:
         3. Keep first 3 (anchors).
         4. Keep last 7 (recent context).
         5. Condense the middle slice using LLM.
+
+        If the LLM call fails, this turn gets a placeholder summary but
+        nothing is persisted, so the next turn retries with the raw messages.
         """
         if not self.needs_condensation(messages):
             return messages
@@ -59,27 +63,40 @@ class CondensationEngine:
             return messages
 
         logger.info("Condensing %d middle messages.", len(middle))
-        summary_message = await self._summarise_middle(middle)
+        summary_message, succeeded = await self._summarise_middle(middle)
 
-        # Persist to DB
-        self._persist_condensation(middle, summary_message.get("content", ""))
+        # Persist to DB (never the failure placeholder: it would replace the messages for good)
+        if succeeded:
+            self._persist_condensation(middle, summary_message.get("content", ""))
 
         return first_3 + [summary_message] + last_7
 
     def _persist_condensation(self, middle_messages: List[Dict[str, Any]], summary_text: str):
         """
         Extract com_ids from middle messages and mark them as condensed in the DB.
+
+        Summaries of earlier condensations carry the ids they cover in
+        "com_ids"; those rows are re-marked with the new summary so the old
+        summary text is not injected again on later turns.
         """
         try:
-            com_ids = [msg.get("com_id") for msg in middle_messages if msg.get("com_id")]
+            com_ids = []
+            for msg in middle_messages:
+                if msg.get("com_id"):
+                    com_ids.append(msg["com_id"])
+                com_ids.extend(msg.get("com_ids", []))
             if com_ids:
                 mark_condensed(com_ids, summary_text)
         except Exception as e:
             logger.error(f"Failed to persist condensation state to DB: {e}")
 
-    async def _summarise_middle(self, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+    async def _summarise_middle(self, messages: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], bool]:
         """
         Call the LLM to compress the middle slice into a single system-role message.
+
+        Returns:
+            The summary message and whether the LLM call succeeded (on failure
+            the message holds a placeholder).
         """
         # Build prompt
         prompt_lines = [
@@ -109,24 +126,27 @@ class CondensationEngine:
         ]
 
         try:
-            # Non-streaming call with cheap model
+            # Non-streaming call with cheap model, queued behind interactive turns
             summary_text = await self.llm_service.send_message(
                 messages=llm_messages,
                 model="openai/gpt-4o-mini",
-                stream=False
+                stream=False,
+                priority=BACKGROUND
             )
 
             # Ensure it is a string
             if not isinstance(summary_text, str):
                 summary_text = str(summary_text)
+            succeeded = True
 
         except Exception as e:
             logger.error(f"Condensation LLM call failed: {e}")
             summary_text = "[condensation failed — middle messages omitted]"
+            succeeded = False
 
         return {
             "role": "system",
             "content": summary_text,
             "condensed": True,
             "message_count": len(messages),
-        }
+        }, succeeded
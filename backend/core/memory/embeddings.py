@@ -0,0 +1,63 @@
+"""
+Embeddings
+Local, CPU-only text embeddings for semantic recall.
+
+Uses signed feature hashing of word unigrams and bigrams: no model download,
+no network, deterministic across processes, and about as fast as tokenising.
+It captures lexical overlap rather than deep semantics, which is what recall
+of "that thing we discussed" mostly needs.
+"""
+
+import math
+import re
+import zlib
+from collections import Counter
+from typing import Iterable, List
+
+import numpy as np
+
+DEFAULT_EMBEDDING_DIM = 256
+
+_WORD_RE = re.compile(r"[a-z0-9][a-z0-9_'+#.-]*[a-z0-9+#]|[a-z0-9]")
+
+_STOPWORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "can", "do", "for", "from",
+    "have", "how", "i", "if", "in", "is", "it", "me", "my", "of", "on", "or", "so",
+    "that", "the", "this", "to", "was", "we", "what", "with", "you", "your",
+})
+
+
+def _features(text: str) -> Counter:
+    words = [word for word in _WORD_RE.findall(text.lower()) if word not in _STOPWORDS]
+    features: Counter = Counter(words)
+    # Bigrams are weighted lower; they disambiguate rather than define topics
+    for first, second in zip(words, words[1:]):
+        features[f"{first} {second}"] += 0.5
+    return features
+
+
+class HashingEmbedder:
+    """Signed feature-hashing embedder producing L2-normalised float32 vectors."""
+
+    def __init__(self, dim: int = DEFAULT_EMBEDDING_DIM):
+        self.dim = dim
+
+    def embed(self, text: str) -> np.ndarray:
+        """Embed one text; empty or stopword-only text gives a zero vector."""
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, count in _features(text).items():
+            h = zlib.crc32(feature.encode("utf-8"))
+            sign = 1.0 if h & 0x80000000 else -1.0
+            weight = 1.0 + math.log(count) if count > 1 else count
+            vector[h % self.dim] += sign * weight
+        norm = float(np.linalg.norm(vector))
+        if norm > 0:
+            vector /= norm
+        return vector
+
+    def embed_many(self, texts: Iterable[str]) -> np.ndarray:
+        """Embed several texts into an (n, dim) matrix."""
+        rows: List[np.ndarray] = [self.embed(text) for text in texts]
+        if not rows:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.vstack(rows)
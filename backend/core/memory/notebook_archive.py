@@ -0,0 +1,227 @@
+"""
+Notebook Archive
+Append-only, rotated storage for archived notebook entries.
+
+archived_notebook.md is the active segment. Once it grows past a size limit
+or age, it is gzip-compressed into notebook_archive/ and listed in a small
+JSON manifest, and a fresh active segment is started. Tail reads seek back
+from the end of the active segment and touch at most one compressed
+segment, so their cost stays constant however old the archive gets.
+"""
+
+import gzip
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FILE = "archived_notebook.md"
+ARCHIVE_DIR = "notebook_archive"
+MANIFEST_FILE = "manifest.json"
+ARCHIVE_HEADER = "# Archived Notebook Entries\n\n"
+
+DEFAULT_SEGMENT_MAX_BYTES = 256 * 1024
+DEFAULT_SEGMENT_MAX_DAYS = 30
+
+_TAIL_BLOCK_SIZE = 4096
+
+
+def _tail_lines(path: Path, num_lines: int) -> List[str]:
+    """Read the last num_lines lines of a text file by seeking back from its end."""
+    try:
+        with open(path, "rb") as f:
+            position = f.seek(0, os.SEEK_END)
+            data = b""
+            while position > 0 and data.count(b"\n") <= num_lines:
+                step = min(_TAIL_BLOCK_SIZE, position)
+                position -= step
+                f.seek(position)
+                data = f.read(step) + data
+    except FileNotFoundError:
+        return []
+    lines = data.decode("utf-8", errors="replace").splitlines()
+    return lines[-num_lines:] if num_lines > 0 else []
+
+
+class NotebookArchive:
+    """
+    Rotated archive of completed notebook entries for one agent directory.
+
+    Not thread-safe on its own; NotebookStore calls it under its lock.
+    """
+
+    def __init__(
+        self,
+        agent_dir: Path,
+        max_segment_bytes: int = DEFAULT_SEGMENT_MAX_BYTES,
+        max_segment_days: int = DEFAULT_SEGMENT_MAX_DAYS
+    ):
+        """
+        Args:
+            agent_dir: Directory holding archived_notebook.md.
+            max_segment_bytes: Rotate the active segment once it reaches this size.
+            max_segment_days: Rotate the active segment once it is this old (0 = never).
+        """
+        self.agent_dir = Path(agent_dir)
+        self.active_path = self.agent_dir / ARCHIVE_FILE
+        self.segment_dir = self.agent_dir / ARCHIVE_DIR
+        self.manifest_path = self.segment_dir / MANIFEST_FILE
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segment_days = max_segment_days
+
+        self._manifest = self._load_manifest()
+        self._recover_rotation()
+
+    # --------------------------------------------------------------- manifest
+
+    def _load_manifest(self) -> Dict[str, Any]:
+        try:
+            return json.loads(self.manifest_path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return {"segments": [], "active_started_at": None}
+        except Exception as e:
+            logger.error(f"Corrupt notebook archive manifest, rebuilding: {e}")
+            segments = sorted(p.name for p in self.segment_dir.glob("segment-*.md.gz"))
+            return {"segments": [{"file": name} for name in segments], "active_started_at": None}
+
+    def _save_manifest(self) -> None:
+        self.segment_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self._manifest, indent=2), encoding="utf-8")
+        os.replace(tmp_path, self.manifest_path)
+
+    @property
+    def segments(self) -> List[Dict[str, Any]]:
+        """Manifest entries for the compressed segments, oldest first."""
+        return list(self._manifest["segments"])
+
+    # ---------------------------------------------------------------- writing
+
+    def append(self, lines: List[str]) -> None:
+        """
+        Append entry lines to the active segment, rotating it if it is full or old.
+
+        Args:
+            lines: Archived notebook lines.
+        """
+        if not lines:
+            return
+
+        with open(self.active_path, "a+b") as f:
+            size = f.seek(0, os.SEEK_END)
+            if size == 0:
+                # Only the first segment carries the header, so segments concatenate cleanly
+                prefix = "" if self._manifest["segments"] else ARCHIVE_HEADER
+            else:
+                f.seek(size - 1)
+                prefix = "" if f.read(1) == b"\n" else "\n"
+            f.seek(0, os.SEEK_END)
+            f.write((prefix + "\n".join(lines)).encode("utf-8"))
+            size = f.tell()
+
+        if not self._manifest.get("active_started_at"):
+            self._manifest["active_started_at"] = datetime.now().isoformat(timespec="seconds")
+            self._save_manifest()
+
+        if self._should_rotate(size):
+            self.rotate()
+
+    def _should_rotate(self, size: int) -> bool:
+        if size >= self.max_segment_bytes:
+            return True
+        started = self._manifest.get("active_started_at")
+        if self.max_segment_days and started:
+            return datetime.now() - datetime.fromisoformat(started) >= timedelta(days=self.max_segment_days)
+        return False
+
+    def rotate(self) -> Optional[str]:
+        """
+        Compress the active segment and start a new one.
+
+        Returns:
+            File name of the new compressed segment, or None if there was nothing to rotate.
+        """
+        try:
+            if self.active_path.stat().st_size == 0:
+                return None
+        except FileNotFoundError:
+            return None
+
+        self.segment_dir.mkdir(parents=True, exist_ok=True)
+        # Stage via rename so a crash mid-rotation can be finished on restart
+        staging = self.segment_dir / f"{ARCHIVE_FILE}.rotating"
+        os.replace(self.active_path, staging)
+        self.active_path.touch()
+        return self._finish_rotation(staging)
+
+    def _finish_rotation(self, staging: Path) -> str:
+        index = len(self._manifest["segments"]) + 1
+        name = f"segment-{index:05d}.md.gz"
+        content = staging.read_bytes()
+        with gzip.open(self.segment_dir / name, "wb", compresslevel=6) as gz:
+            gz.write(content)
+
+        now = datetime.now().isoformat(timespec="seconds")
+        self._manifest["segments"].append({
+            "file": name,
+            "lines": content.count(b"\n") + (0 if content.endswith(b"\n") else 1),
+            "bytes": len(content),
+            "started_at": self._manifest.get("active_started_at"),
+            "rotated_at": now,
+        })
+        self._manifest["active_started_at"] = None
+        self._save_manifest()
+        staging.unlink()
+        logger.info(f"Rotated notebook archive segment {name} ({len(content)} bytes)")
+        return name
+
+    def _recover_rotation(self) -> None:
+        staging = self.segment_dir / f"{ARCHIVE_FILE}.rotating"
+        if not staging.exists():
+            return
+        if self._is_last_segment(staging.read_bytes()):
+            # Interrupted after the manifest was saved: only the cleanup is left
+            logger.warning("Removing staging file of an already completed notebook archive rotation")
+            staging.unlink()
+            return
+        logger.warning("Completing interrupted notebook archive rotation")
+        self._finish_rotation(staging)
+
+    def _is_last_segment(self, content: bytes) -> bool:
+        """Whether the newest segment in the manifest already holds exactly this content."""
+        if not self._manifest["segments"]:
+            return False
+        last = self._manifest["segments"][-1]
+        # Entries rebuilt from a corrupt manifest have no size, so those are compared in full
+        if last.get("bytes", len(content)) != len(content):
+            return False
+        try:
+            with gzip.open(self.segment_dir / last["file"], "rb") as gz:
+                return gz.read() == content
+        except (OSError, EOFError):
+            return False
+
+    # ---------------------------------------------------------------- reading
+
+    def tail(self, num_lines: int = 15) -> str:
+        """
+        Return the last num_lines archived lines.
+
+        Reads backwards from the end of the active segment and, only if it is
+        shorter than num_lines, from the newest compressed segment.
+        """
+        lines = _tail_lines(self.active_path, num_lines)
+        if len(lines) < num_lines and self._manifest["segments"]:
+            older = self.read_segment(self._manifest["segments"][-1]["file"]).splitlines()
+            lines = older[-(num_lines - len(lines)):] + lines
+        return "\n".join(lines)
+
+    def read_segment(self, name: str) -> str:
+        """Return the decompressed text of a rotated segment."""
+        path = self.segment_dir / Path(name).name
+        with gzip.open(path, "rb") as gz:
+            return gz.read().decode("utf-8", errors="replace")
@@ -0,0 +1,178 @@
+"""
+Notebook Index
+In-memory token/trigram inverted index over pending notebook entries, used to
+resolve [COMPLETE: ...] directives that paraphrase the original note.
+"""
+
+import heapq
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+# Minimum score for a fuzzy match to be accepted
+DEFAULT_MATCH_THRESHOLD = 0.5
+
+# Candidates (by shared trigrams) that get a full similarity score
+MAX_CANDIDATES = 25
+
+# Trigrams found in more than this fraction of entries are too common to
+# select candidates with (they still count towards the final score)
+COMMON_GRAM_FRACTION = 0.2
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_TAG_RE = re.compile(r"\[(PENDING|COMPLETED|INFO)\]", re.IGNORECASE)
+
+STOPWORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it",
+    "my", "of", "on", "or", "the", "to", "up", "with", "task", "todo",
+})
+
+
+def _words(text: str) -> List[str]:
+    return _WORD_RE.findall(text.lower())
+
+
+def _trigrams(words: List[str]) -> Set[str]:
+    grams: Set[str] = set()
+    for word in words:
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+def _tokens(words: List[str]) -> Set[str]:
+    return {word for word in words if word not in STOPWORDS}
+
+
+class PendingEntryIndex:
+    """
+    Inverted index from trigrams to entry ids.
+
+    Entries containing the query verbatim are found first: they hold every
+    in-word trigram of the query, so intersecting those posting lists
+    (smallest first) leaves a handful of lines to substring-check. Such
+    entries score 1.0, which preserves the original substring behaviour,
+    and answer the query without any fuzzy scoring.
+
+    Otherwise matching is two-phase: the query's selective (not very
+    common) trigrams are looked up in the posting lists to count shared
+    trigrams per entry, and only the top MAX_CANDIDATES are scored with a
+    blend of trigram coverage, content-word coverage and trigram Dice
+    similarity.
+    """
+
+    def __init__(self, threshold: float = DEFAULT_MATCH_THRESHOLD):
+        self.threshold = threshold
+        self._postings: Dict[str, Set[int]] = defaultdict(set)
+        self._entries: Dict[int, Tuple[str, Set[str], Set[str]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, entry_id: int) -> bool:
+        return entry_id in self._entries
+
+    def add(self, entry_id: int, line: str) -> None:
+        """Index (or re-index) an entry line."""
+        if entry_id in self._entries:
+            self.remove(entry_id)
+        words = _words(_TAG_RE.sub(" ", line))
+        grams = _trigrams(words)
+        self._entries[entry_id] = (line.lower(), grams, _tokens(words))
+        for gram in grams:
+            self._postings[gram].add(entry_id)
+
+    def remove(self, entry_id: int) -> None:
+        """Drop an entry from the index; unknown ids are ignored."""
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        for gram in entry[1]:
+            posting = self._postings.get(gram)
+            if posting is not None:
+                posting.discard(entry_id)
+                if not posting:
+                    del self._postings[gram]
+
+    def clear(self) -> None:
+        self._postings.clear()
+        self._entries.clear()
+
+    def search(self, query: str, limit: int = 5) -> List[Tuple[int, float]]:
+        """
+        Rank entries against a query.
+
+        Returns:
+            Up to limit (entry_id, score) pairs, best first; ties go to the
+            oldest entry.
+        """
+        query_lower = query.lower().strip()
+        words = _words(query_lower)
+        if not words:
+            return []
+        query_grams = _trigrams(words)
+        query_tokens = _tokens(words) or set(words)
+
+        verbatim = self._verbatim_hits(query_lower, query_grams)
+        if verbatim:
+            return [(entry_id, 1.0) for entry_id in verbatim[:limit]]
+
+        # Candidate selection from the rarer trigrams keeps posting scans short
+        cutoff = max(MAX_CANDIDATES, int(len(self._entries) * COMMON_GRAM_FRACTION))
+        postings = [self._postings[gram] for gram in query_grams if gram in self._postings]
+        if not postings:
+            return []
+        selective = [posting for posting in postings if len(posting) <= cutoff]
+
+        if selective:
+            shared: Counter = Counter()
+            for posting in selective:
+                shared.update(posting)
+            candidates = [
+                entry_id for entry_id, _ in
+                heapq.nsmallest(MAX_CANDIDATES, shared.items(), key=lambda item: (-item[1], item[0]))
+            ]
+        else:
+            # Only common trigrams: prefer the oldest entries containing all of them
+            postings.sort(key=len)
+            containing_all = set.intersection(*postings)
+            if containing_all:
+                candidates = heapq.nsmallest(MAX_CANDIDATES, containing_all)
+            else:
+                candidates = [
+                    entry_id for entry_id, _ in
+                    Counter(entry_id for posting in postings for entry_id in posting).most_common(MAX_CANDIDATES)
+                ]
+
+        scored: List[Tuple[int, float]] = []
+        for entry_id in candidates:
+            _, grams, tokens = self._entries[entry_id]
+            common = len(query_grams & grams)
+            gram_coverage = common / len(query_grams)
+            token_coverage = len(query_tokens & tokens) / len(query_tokens)
+            dice = 2 * common / (len(query_grams) + len(grams))
+            score = 0.5 * gram_coverage + 0.3 * token_coverage + 0.2 * dice
+            scored.append((entry_id, round(score, 4)))
+
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        return scored[:limit]
+
+    def _verbatim_hits(self, query_lower: str, query_grams: Set[str]) -> List[int]:
+        """Ids of entries containing the query verbatim, oldest first."""
+        # Grams with padding may straddle the query's edges; in-word ones cannot
+        inner = [gram for gram in query_grams if " " not in gram]
+        if inner:
+            postings = sorted((self._postings.get(gram, set()) for gram in inner), key=len)
+            pool = postings[0].intersection(*postings[1:]) if postings[0] else set()
+        else:
+            # Only very short words: nothing selective to intersect
+            pool = self._entries.keys()
+        return sorted(entry_id for entry_id in pool if query_lower in self._entries[entry_id][0])
+
+    def best_match(self, query: str) -> Optional[Tuple[int, float]]:
+        """Return the best (entry_id, score) at or above the threshold, or None."""
+        results = self.search(query, limit=1)
+        if results and results[0][1] >= self.threshold:
+            return results[0]
+        return None
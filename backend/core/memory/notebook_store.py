@@ -0,0 +1,480 @@
+"""
+Notebook Store
+SQLite-backed storage for the Head Agent's working notebook.
+
+Entries are indexed rows (status, timestamps, archive flag); NOTEBOOK.md is a
+derived markdown export. Appends are written to the export with an O(1) file
+append, while completions and archiving patch it once per batch, rewriting
+only the lines from the first changed one onwards. Manual edits to
+NOTEBOOK.md are detected by (mtime, size) and imported back.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from backend.core.memory.notebook_archive import NotebookArchive
+from backend.core.memory.notebook_index import PendingEntryIndex, DEFAULT_MATCH_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+NOTEBOOK_FILE = "NOTEBOOK.md"
+NOTEBOOK_DB_FILE = "notebook.db"
+
+# A same-size rewrite within one filesystem mtime tick leaves (mtime, size)
+# unchanged, so files modified more recently than this cannot be trusted by
+# their stamp alone: the agent's file cache does not cache them, and the
+# store compares them by content unless the stamp is of its own write
+RACY_MTIME_WINDOW_NS = 1_000_000_000
+
+# Status tags, checked in this order
+STATUS_TAGS = (("[COMPLETED]", "COMPLETED"), ("[PENDING]", "PENDING"), ("[INFO]", "INFO"))
+
+
+def parse_status(line: str) -> Optional[str]:
+    """Return the entry status for a notebook line, or None for plain text."""
+    for tag, status in STATUS_TAGS:
+        if tag in line:
+            return status
+    return None
+
+
+class NotebookStore:
+    """
+    Notebook entries for one agent directory.
+
+    Line indexes in this API refer to lines of the rendered NOTEBOOK.md, so
+    callers can keep treating the notebook as a list of lines.
+
+    All methods are thread-safe; use batch() to group several changes into
+    one transaction and a single export.
+    """
+
+    def __init__(self, agent_dir: Path, match_threshold: float = DEFAULT_MATCH_THRESHOLD):
+        """
+        Args:
+            agent_dir: Directory holding NOTEBOOK.md; notebook.db is created there.
+            match_threshold: Minimum fuzzy score for find_pending() to accept a match.
+        """
+        self.agent_dir = Path(agent_dir)
+        self.notebook_path = self.agent_dir / NOTEBOOK_FILE
+        self.archive = NotebookArchive(self.agent_dir)
+        self.db_path = self.agent_dir / NOTEBOOK_DB_FILE
+
+        self._lock = threading.RLock()
+        self._batch_depth = 0
+        self._export_dirty = False
+        # First line index changed since the last export (the export patches from there)
+        self._dirty_from: Optional[int] = None
+        # Lines archived in the open transaction, appended to the archive once it commits
+        self._archive_pending: List[str] = []
+        # Change listeners (e.g. SPARK's wake-up), run once per committed change or batch
+        self._listeners: List[Callable[[], None]] = []
+        self._notify_pending = False
+
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._init_schema()
+
+        # Row ids of the active (unarchived) entries in display order, and
+        # the UTF-8 size of each line (for byte offsets into the export)
+        self._active_ids: List[int] = []
+        self._line_sizes: List[int] = []
+        # Fuzzy-match index over pending entries, kept in step with the rows
+        self._pending_index = PendingEntryIndex(threshold=match_threshold)
+        self._load_active_ids()
+        # Whether NOTEBOOK.md is exactly the active lines joined by "\n", so
+        # line byte offsets are known and the export can be patched in place
+        self._file_exact = False
+        self._stamp: Optional[Tuple[int, int]] = self._load_stamp()
+        # Whether self._stamp is of a file this store wrote itself
+        self._stamp_own = False
+
+    # ------------------------------------------------------------------ schema
+
+    def _init_schema(self) -> None:
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS notebook_entries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                line TEXT NOT NULL,
+                status TEXT,
+                created_at TEXT NOT NULL,
+                completed_at TEXT,
+                archived INTEGER NOT NULL DEFAULT 0,
+                archived_at TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_notebook_active ON notebook_entries(archived, id);
+            CREATE INDEX IF NOT EXISTS idx_notebook_status ON notebook_entries(archived, status, id);
+            CREATE TABLE IF NOT EXISTS notebook_meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+        """)
+        self._conn.commit()
+
+    def _load_active_ids(self) -> None:
+        rows = self._conn.execute(
+            "SELECT id, line, status FROM notebook_entries WHERE archived = 0 ORDER BY id"
+        ).fetchall()
+        self._active_ids = [row["id"] for row in rows]
+        self._line_sizes = [len(row["line"].encode("utf-8")) for row in rows]
+        self._pending_index.clear()
+        for row in rows:
+            if row["status"] == "PENDING":
+                self._pending_index.add(row["id"], row["line"])
+
+    def _load_stamp(self) -> Optional[Tuple[int, int]]:
+        row = self._conn.execute("SELECT value FROM notebook_meta WHERE key = 'export_stamp'").fetchone()
+        if not row or not row["value"]:
+            return None
+        mtime_ns, size, *exact = row["value"].split(":")
+        self._file_exact = exact == ["1"]
+        return (int(mtime_ns), int(size))
+
+    def _save_stamp(self, own: bool = True) -> None:
+        self._stamp = self._file_stamp(self.notebook_path)
+        self._stamp_own = own
+        value = f"{self._stamp[0]}:{self._stamp[1]}:{int(self._file_exact)}" if self._stamp else ""
+        self._conn.execute(
+            "INSERT OR REPLACE INTO notebook_meta (key, value) VALUES ('export_stamp', ?)", (value,)
+        )
+
+    @staticmethod
+    def _file_stamp(path: Path) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    # --------------------------------------------------------------- batching
+
+    @contextmanager
+    def batch(self) -> Iterator["NotebookStore"]:
+        """Group changes: one transaction and one NOTEBOOK.md export at the end."""
+        with self._lock:
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    self._flush()
+
+    def _flush(self) -> None:
+        if self._export_dirty:
+            self._export()
+        self._conn.commit()
+        if self._archive_pending:
+            # Only committed archiving reaches the archive file, so a crash
+            # before the commit cannot leave entries both active and archived
+            lines, self._archive_pending = self._archive_pending, []
+            try:
+                self.archive.append(lines)
+            except Exception as e:
+                logger.error(f"Error appending to notebook archive: {e}")
+        if self._notify_pending:
+            self._notify_pending = False
+            for callback in list(self._listeners):
+                try:
+                    callback()
+                except Exception as e:
+                    logger.error(f"Notebook change listener failed: {e}")
+
+    def _changed(self, from_index: int = 0) -> None:
+        """Record that the export needs updating from a line index on (now, or at batch end)."""
+        if self._dirty_from is None or from_index < self._dirty_from:
+            self._dirty_from = from_index
+        self._export_dirty = True
+        self._notify_pending = True
+        if self._batch_depth == 0:
+            self._flush()
+
+    def add_listener(self, callback: Callable[[], None]) -> None:
+        """
+        Call callback after every committed change to the entries.
+
+        Callbacks run on the writing thread while the store lock is held, so
+        they must be quick and must not call back into the store.
+        """
+        with self._lock:
+            if callback not in self._listeners:
+                self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def _export(self) -> None:
+        """
+        Bring NOTEBOOK.md up to date with the active rows.
+
+        The file is patched in place from the first changed line, so the
+        write is proportional to the lines after it; it is regenerated in
+        full when its layout is unknown or it changed since our last write.
+        """
+        start = self._dirty_from or 0
+        offset = sum(self._line_sizes[:start]) + start
+        stamp = self._file_stamp(self.notebook_path)
+        if not (self._file_exact and stamp is not None and stamp == self._stamp and stamp[1] >= offset):
+            start = 0
+        try:
+            if start == 0:
+                self.notebook_path.write_text("\n".join(self._active_lines()), encoding="utf-8")
+            else:
+                lines = self._active_lines(start)
+                with open(self.notebook_path, "r+b") as f:
+                    # Rewrite from the separator before line `start`, which
+                    # also drops it when no lines follow any more
+                    f.seek(offset - 1)
+                    f.write("".join("\n" + line for line in lines).encode("utf-8"))
+                    f.truncate()
+        except Exception as e:
+            logger.error(f"Error exporting notebook: {e}")
+            return
+        self._export_dirty = False
+        self._dirty_from = None
+        self._file_exact = True
+        self._save_stamp()
+
+    # ------------------------------------------------------------ file import
+
+    def _sync(self) -> None:
+        """Import NOTEBOOK.md if it was edited outside the store."""
+        if self._export_dirty:
+            return  # Our own pending export is authoritative
+
+        stamp = self._file_stamp(self.notebook_path)
+        if stamp == self._stamp:
+            if stamp is None or self._stamp_own or time.time_ns() - stamp[0] >= RACY_MTIME_WINDOW_NS:
+                return
+            # Racy stamp: confirm by content
+            content, lines = self._read_notebook_file(), self._active_lines()
+            if content == "\n".join(lines) or content.splitlines() == lines:
+                return
+        elif stamp is None and not self._active_ids:
+            return
+
+        self._import(self._read_notebook_file() if stamp else "")
+
+    def _read_notebook_file(self) -> str:
+        try:
+            return self.notebook_path.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return ""
+
+    def _import(self, content: str) -> None:
+        """Replace the active entries with the lines of a manually edited NOTEBOOK.md."""
+        now = datetime.now().isoformat(timespec="seconds")
+        self._conn.execute("DELETE FROM notebook_entries WHERE archived = 0")
+        self._conn.executemany(
+            "INSERT INTO notebook_entries (line, status, created_at) VALUES (?, ?, ?)",
+            [(line, parse_status(line), now) for line in content.splitlines()]
+        )
+        self._load_active_ids()
+        # e.g. CRLF line ends or a trailing newline: patched once fully re-exported
+        self._file_exact = content == "\n".join(content.splitlines())
+        # Not our write: a same-size edit within the racy window still needs a content check
+        self._save_stamp(own=False)
+        self._notify_pending = True
+        self._flush()
+        logger.info(f"Imported {len(self._active_ids)} notebook lines from {self.notebook_path.name}")
+
+    # ------------------------------------------------------------- operations
+
+    def _active_lines(self, start: int = 0) -> List[str]:
+        """Lines of the active entries, from line index start on."""
+        if start >= len(self._active_ids):
+            return []
+        rows = self._conn.execute(
+            "SELECT line FROM notebook_entries WHERE archived = 0 AND id >= ? ORDER BY id",
+            (self._active_ids[start],)
+        ).fetchall()
+        return [row["line"] for row in rows]
+
+    def _index_of(self, entry_id: int) -> int:
+        idx = bisect_left(self._active_ids, entry_id)
+        if idx < len(self._active_ids) and self._active_ids[idx] == entry_id:
+            return idx
+        return -1
+
+    def append(self, line: str) -> int:
+        """
+        Append an entry line.
+
+        Args:
+            line: Full notebook line, e.g. "[PENDING] 2024-01-01 10:00 - Task".
+
+        Returns:
+            Line index of the new entry.
+        """
+        with self._lock:
+            self._sync()
+            cursor = self._conn.execute(
+                "INSERT INTO notebook_entries (line, status, created_at) VALUES (?, ?, ?)",
+                (line, parse_status(line), datetime.now().isoformat(timespec="seconds"))
+            )
+            self._active_ids.append(cursor.lastrowid)
+            self._line_sizes.append(len(line.encode("utf-8")))
+            if parse_status(line) == "PENDING":
+                self._pending_index.add(cursor.lastrowid, line)
+
+            if self._export_dirty or not self._file_exact:
+                # An export is already pending (or the file's layout is unknown): it includes this line
+                self._changed(len(self._active_ids) - 1)
+            else:
+                self._append_to_file(self.notebook_path, [line], separate=len(self._active_ids) > 1)
+                self._save_stamp()
+                self._notify_pending = True
+                if self._batch_depth == 0:
+                    self._flush()
+            return len(self._active_ids) - 1
+
+    def find_pending(self, keyword: str) -> int:
+        """
+        Find the pending entry that best matches keyword.
+
+        An entry containing keyword verbatim (case-insensitive) wins, earliest
+        first; otherwise the highest-ranked fuzzy match is used if its score
+        reaches the match threshold.
+
+        Returns:
+            Line index, or -1 if no pending entry matches confidently.
+        """
+        with self._lock:
+            self._sync()
+            match = self._pending_index.best_match(keyword)
+            if match is None:
+                return -1
+            entry_id, score = match
+            if score < 1.0:
+                logger.info(f"Fuzzy-matched notebook entry {entry_id} for '{keyword}' (score {score:.2f})")
+            return self._index_of(entry_id)
+
+    def pending_entries(self) -> List[str]:
+        """Lines of the active [PENDING] entries, oldest first (an indexed query, no file read)."""
+        with self._lock:
+            self._sync()
+            rows = self._conn.execute(
+                "SELECT line FROM notebook_entries WHERE archived = 0 AND status = 'PENDING' ORDER BY id"
+            ).fetchall()
+            return [row["line"] for row in rows]
+
+    def get_line(self, index: int) -> Optional[str]:
+        """Return the notebook line at index, or None if out of range."""
+        with self._lock:
+            self._sync()
+            if index < 0 or index >= len(self._active_ids):
+                return None
+            row = self._conn.execute(
+                "SELECT line FROM notebook_entries WHERE id = ?", (self._active_ids[index],)
+            ).fetchone()
+            return row["line"] if row else None
+
+    def mark_completed(self, index: int) -> bool:
+        """
+        Mark the pending entry at a line index as [COMPLETED].
+
+        Returns:
+            True if the entry was pending and is now completed.
+        """
+        with self._lock:
+            self._sync()
+            if index < 0 or index >= len(self._active_ids):
+                logger.warning(f"Invalid notebook entry index: {index}")
+                return False
+
+            entry_id = self._active_ids[index]
+            row = self._conn.execute("SELECT line FROM notebook_entries WHERE id = ?", (entry_id,)).fetchone()
+            if not row or "[PENDING]" not in row["line"]:
+                return False
+
+            line = row["line"].replace("[PENDING]", "[COMPLETED]")
+            self._pending_index.remove(entry_id)
+            self._conn.execute(
+                "UPDATE notebook_entries SET line = ?, status = ?, completed_at = ? WHERE id = ?",
+                (line, parse_status(line), datetime.now().isoformat(timespec="seconds"), entry_id)
+            )
+            self._line_sizes[index] = len(line.encode("utf-8"))
+            self._changed(index)
+            return True
+
+    def archive_completed(self) -> int:
+        """
+        Move completed entries out of the notebook and append them to the archive.
+
+        The archive file is written once the change commits (at batch end).
+
+        Returns:
+            Number of entries archived.
+        """
+        with self._lock:
+            self._sync()
+            rows = self._conn.execute(
+                "SELECT id, line FROM notebook_entries WHERE archived = 0 AND status = 'COMPLETED' ORDER BY id"
+            ).fetchall()
+            if not rows:
+                return 0
+
+            archived_ids = [row["id"] for row in rows]
+            now = datetime.now().isoformat(timespec="seconds")
+            self._conn.executemany(
+                "UPDATE notebook_entries SET archived = 1, archived_at = ? WHERE id = ?",
+                [(now, entry_id) for entry_id in archived_ids]
+            )
+            first_changed = self._index_of(archived_ids[0])
+            archived = set(archived_ids)
+            kept = [
+                (entry_id, size) for entry_id, size in zip(self._active_ids, self._line_sizes)
+                if entry_id not in archived
+            ]
+            self._active_ids = [entry_id for entry_id, _ in kept]
+            self._line_sizes = [size for _, size in kept]
+
+            self._archive_pending.extend(row["line"] for row in rows)
+            self._changed(first_changed)
+            return len(rows)
+
+    def tail(self, num_lines: int = 15) -> str:
+        """Return the last num_lines lines of the notebook."""
+        with self._lock:
+            self._sync()
+            rows = self._conn.execute(
+                "SELECT line FROM notebook_entries WHERE archived = 0 ORDER BY id DESC LIMIT ?",
+                (num_lines,)
+            ).fetchall()
+            return "\n".join(row["line"] for row in reversed(rows))
+
+    def render(self) -> str:
+        """Return the full NOTEBOOK.md markdown."""
+        with self._lock:
+            self._sync()
+            return "\n".join(self._active_lines())
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._sync()
+            return len(self._active_ids)
+
+    def close(self) -> None:
+        """Flush pending work and close the database."""
+        with self._lock:
+            self._flush()
+            self._conn.close()
+
+    @staticmethod
+    def _append_to_file(path: Path, lines: List[str], separate: bool) -> None:
+        """Append lines to a text file, after a newline if separate."""
+        try:
+            with open(path, "ab") as f:
+                f.write((("\n" if separate else "") + "\n".join(lines)).encode("utf-8"))
+        except Exception as e:
+            logger.error(f"Error appending to {path.name}: {e}")
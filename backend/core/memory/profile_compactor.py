@@ -0,0 +1,199 @@
+"""
+Profile Compactor
+Keeps USER.md bounded as observations accumulate.
+
+New observations are merged at sentence level, dropping sentences that
+near-duplicate something the section already says. Each section has a token
+cap; a section over its cap is de-duplicated, then re-summarised by the LLM,
+and as a last resort trimmed to its newest sentences. The profile's share of
+the system prompt therefore stays flat however long the history gets.
+"""
+
+import logging
+import re
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from backend.core.memory.token_counter import TokenCounter, token_counter as default_token_counter
+from backend.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Default token cap per profile section, with overrides for short sections
+DEFAULT_SECTION_TOKEN_CAP = 150
+SECTION_TOKEN_CAPS: Dict[str, int] = {
+    "Name": 20,
+    "Technical Level": 60,
+}
+
+# Word-set Jaccard similarity at which two sentences count as duplicates
+DEFAULT_SIMILARITY_THRESHOLD = 0.7
+
+ADDITIONALLY_PREFIX = "Additionally:"
+
+# Summarises (section_name, text, token_cap) into a shorter text
+Summariser = Callable[[str, str, int], Awaitable[str]]
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+_WORD_RE = re.compile(r"[a-z0-9+#']+")
+_BULLET_RE = re.compile(r"^\s*(?:[-*•]|\d+\.)\s+")
+
+_STOPWORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have",
+    "in", "is", "it", "of", "on", "or", "the", "their", "they", "to", "user", "with",
+})
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split section text into sentences, dropping bullets and "Additionally:" prefixes."""
+    sentences = []
+    for part in _SENTENCE_RE.split(text):
+        part = part.strip()
+        if part.lower().startswith(ADDITIONALLY_PREFIX.lower()):
+            part = part[len(ADDITIONALLY_PREFIX):]
+        part = _BULLET_RE.sub("", part).strip()
+        if part:
+            sentences.append(part)
+    return sentences
+
+
+def _words(sentence: str) -> Set[str]:
+    words = set(_WORD_RE.findall(sentence.lower()))
+    return (words - _STOPWORDS) or words
+
+
+class ProfileCompactor:
+    """
+    Sentence-level merge and per-section token caps for the user profile.
+    """
+
+    def __init__(
+        self,
+        token_counter: Optional[TokenCounter] = None,
+        default_cap: int = DEFAULT_SECTION_TOKEN_CAP,
+        section_caps: Optional[Dict[str, int]] = None,
+        similarity_threshold: float = DEFAULT_SIMILARITY_THRESHOLD
+    ):
+        """
+        Args:
+            token_counter: Counter used to measure sections (defaults to the global one).
+            default_cap: Token cap for sections without an explicit cap.
+            section_caps: Per-section cap overrides.
+            similarity_threshold: Jaccard similarity treated as a duplicate.
+        """
+        self.token_counter = token_counter or default_token_counter
+        self.default_cap = default_cap
+        self.section_caps = dict(SECTION_TOKEN_CAPS if section_caps is None else section_caps)
+        self.similarity_threshold = similarity_threshold
+
+    def cap_for(self, section_name: str) -> int:
+        return self.section_caps.get(section_name, self.default_cap)
+
+    # ---------------------------------------------------------------- merging
+
+    def is_duplicate(self, sentence: str, known: List[Set[str]]) -> bool:
+        """
+        True if sentence is near-identical to a known sentence.
+
+        Only word-set Jaccard similarity counts: a short sentence whose words
+        all appear in a longer one ("Prefers Java." in "Used Java but now
+        prefers Go.") can state something new and is kept.
+        """
+        words = _words(sentence)
+        if not words:
+            return True
+        for other in known:
+            if other and len(words & other) / len(words | other) >= self.similarity_threshold:
+                return True
+        return False
+
+    def novel_sentences(self, existing: str, new: str) -> List[str]:
+        """
+        Return the sentences of new that existing does not already say.
+
+        A sentence is dropped if its word-set similarity to one existing
+        sentence reaches the threshold. Duplicates within new itself are
+        dropped too.
+        """
+        known = [_words(sentence) for sentence in split_sentences(existing)]
+        novel = []
+        for sentence in split_sentences(new):
+            if not self.is_duplicate(sentence, known):
+                novel.append(sentence)
+                known.append(_words(sentence))
+        return novel
+
+    def dedupe(self, text: str) -> str:
+        """Rewrite text as its distinct sentences, oldest wording first."""
+        return " ".join(self.novel_sentences("", text))
+
+    # ------------------------------------------------------------- compaction
+
+    def trim(self, text: str, cap: int) -> str:
+        """Keep the newest sentences that fit in cap tokens (word-truncating a lone sentence)."""
+        kept: List[str] = []
+        used = 0
+        for sentence in reversed(split_sentences(text)):
+            tokens = self.token_counter.count_tokens(sentence) + 1
+            if used + tokens > cap:
+                break
+            kept.append(sentence)
+            used += tokens
+        if kept:
+            return " ".join(reversed(kept))
+
+        # The newest sentence alone is over the cap: keep as many of its words as fit
+        sentences = split_sentences(text)
+        words = sentences[-1].split() if sentences else []
+        while words and self.token_counter.count_tokens(" ".join(words)) > cap:
+            words = words[:max(1, len(words) * 3 // 4)] if len(words) > 1 else []
+        return " ".join(words)
+
+    async def compact_section(
+        self,
+        section_name: str,
+        text: str,
+        summarise: Optional[Summariser] = None
+    ) -> str:
+        """
+        Bring a section under its token cap; sections already under it are returned unchanged.
+
+        Args:
+            section_name: Profile section heading.
+            text: Current section content.
+            summarise: Optional LLM re-summariser, tried after de-duplication.
+
+        Returns:
+            Section content of at most cap_for(section_name) tokens.
+        """
+        cap = self.cap_for(section_name)
+        if self.token_counter.count_tokens(text) <= cap:
+            return text
+
+        metrics.increment("agent.profile.compactions")
+        compacted = self.dedupe(text)
+        if self.token_counter.count_tokens(compacted) <= cap:
+            return compacted
+
+        if summarise is not None:
+            try:
+                summary = (await summarise(section_name, compacted, cap)).strip()
+                if summary and self.token_counter.count_tokens(summary) <= cap:
+                    metrics.increment("agent.profile.resummarised")
+                    return summary
+                logger.warning(f"Profile summary for '{section_name}' exceeded its cap; trimming")
+            except Exception as e:
+                logger.error(f"Failed to re-summarise profile section '{section_name}': {e}")
+
+        metrics.increment("agent.profile.trimmed")
+        return self.trim(compacted, cap)
+
+    async def compact(
+        self,
+        sections: Dict[str, str],
+        summarise: Optional[Summariser] = None
+    ) -> Dict[str, str]:
+        """Compact every section; returns a new dict in the same order."""
+        return {
+            name: await self.compact_section(name, text, summarise)
+            for name, text in sections.items()
+        }
@@ -0,0 +1,123 @@
+"""
+Message Recall
+Semantic recall of past communications through the local vector index.
+
+The index follows the communications table incrementally: sync() embeds
+every row saved since the stored rowid watermark, so the index catches up
+after restarts and never re-embeds old messages.
+
+One index serves every session; search() can be restricted to a session's
+own messages, so one user's conversation is never recalled into another's.
+"""
+
+import logging
+import threading
+from pathlib import Path
+from typing import Callable, Collection, List, Optional, Tuple
+
+from backend.core.communication.service import get_messages_by_ids, get_messages_since
+from backend.core.memory.embeddings import HashingEmbedder
+from backend.core.memory.vector_index import VectorIndex
+from backend.core.metrics import metrics
+from backend.models.communication import Communication
+
+logger = logging.getLogger(__name__)
+
+# Minimum cosine similarity for a message to be recalled
+DEFAULT_MIN_SCORE = 0.3
+
+# Communications embedded per sync batch
+SYNC_BATCH_SIZE = 1000
+
+# Candidates fetched per result when filtering by session (other sessions' hits are dropped)
+SESSION_OVERFETCH = 4
+
+
+class MessageRecall:
+    """Vector index over communications with incremental sync and filtered search."""
+
+    def __init__(
+        self,
+        index_dir: Path,
+        embedder: Optional[HashingEmbedder] = None,
+        fetch_since: Callable[[int, int], List[Tuple[int, Communication]]] = get_messages_since,
+        fetch_by_ids: Callable[[List[str]], List[Communication]] = get_messages_by_ids
+    ):
+        """
+        Args:
+            index_dir: Directory for the vector index files.
+            embedder: Text embedder (defaults to HashingEmbedder()).
+            fetch_since: Returns (rowid, Communication) pairs saved after a rowid.
+            fetch_by_ids: Loads communications by com_id.
+        """
+        self.embedder = embedder or HashingEmbedder()
+        self.index = VectorIndex(index_dir, dim=self.embedder.dim)
+        self._fetch_since = fetch_since
+        self._fetch_by_ids = fetch_by_ids
+        self._sync_lock = threading.Lock()
+
+    def sync(self, batch_size: int = SYNC_BATCH_SIZE) -> int:
+        """
+        Embed and index every communication saved since the last sync.
+
+        Returns immediately (0) if another sync is already running; that one
+        keeps going until it reaches the newest row.
+
+        Returns:
+            Number of messages indexed.
+        """
+        if not self._sync_lock.acquire(blocking=False):
+            return 0
+        try:
+            indexed = 0
+            while True:
+                rows = self._fetch_since(self.index.watermark or 0, batch_size)
+                if not rows:
+                    break
+                vectors = self.embedder.embed_many(comm.raw_content for _, comm in rows)
+                self.index.append([comm.com_id for _, comm in rows], vectors, watermark=rows[-1][0])
+                indexed += len(rows)
+                if len(rows) < batch_size:
+                    break
+            if indexed:
+                metrics.increment("recall.indexed", indexed)
+                metrics.set_gauge("recall.index_size", len(self.index))
+            return indexed
+        finally:
+            self._sync_lock.release()
+
+    def search(
+        self,
+        query: str,
+        k: int = 5,
+        exclude: Collection[str] = (),
+        min_score: float = DEFAULT_MIN_SCORE,
+        session_id: Optional[str] = None
+    ) -> List[Tuple[Communication, float]]:
+        """
+        Find past communications similar to query.
+
+        Args:
+            query: Text to match (usually the user's new message).
+            k: Maximum number of results.
+            exclude: com_ids to leave out (e.g. messages already in context).
+            min_score: Minimum cosine similarity.
+            session_id: Only return messages of this session (None = any session).
+
+        Returns:
+            (Communication, score) pairs, best first.
+        """
+        vector = self.embedder.embed(query)
+        # Over-fetch so excluded, low-scoring and other sessions' hits still leave k results
+        wanted = k * SESSION_OVERFETCH if session_id is not None else k
+        hits = [
+            (com_id, score) for com_id, score in self.index.search(vector, k=wanted + len(exclude) + k)
+            if score >= min_score and com_id not in exclude
+        ][:wanted]
+        if not hits:
+            return []
+        scores = dict(hits)
+        comms = self._fetch_by_ids([com_id for com_id, _ in hits])
+        if session_id is not None:
+            comms = [comm for comm in comms if comm.session_id == session_id]
+        return [(comm, scores[comm.com_id]) for comm in comms[:k]]
@@ -0,0 +1,285 @@
+"""
+Vector Index
+Embedded, append-only on-disk vector index with int8 storage and IVF search.
+
+Layout of the index directory:
+    meta.json       dim, row count, key width, caller watermark
+    vectors.i8      int8 rows (row-wise scaled to [-127, 127])
+    scales.f16      float16 per-row dequantisation scale
+    keys.bin        fixed-width UTF-8 keys, one per row
+    centroids.npy   IVF coarse centroids (once trained)
+    assign.i32      IVF list of every row (once trained)
+
+Rows are appended incrementally; meta.json is replaced last, so a crash
+mid-append only leaves ignored trailing bytes. Small indexes are searched by
+brute force. Past IVF_MIN_ROWS a spherical k-means quantizer is trained and
+a query scans only the nprobe closest lists, which keeps latency flat as
+the index grows.
+"""
+
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+META_FILE = "meta.json"
+VECTORS_FILE = "vectors.i8"
+SCALES_FILE = "scales.f16"
+KEYS_FILE = "keys.bin"
+CENTROIDS_FILE = "centroids.npy"
+ASSIGN_FILE = "assign.i32"
+
+# Train the IVF quantizer once the index has this many rows, and retrain
+# whenever it has grown by RETRAIN_GROWTH since the last training
+IVF_MIN_ROWS = 50_000
+RETRAIN_GROWTH = 4
+MAX_LISTS = 1024
+DEFAULT_NPROBE = 8
+KMEANS_ITERATIONS = 8
+KMEANS_SAMPLE_PER_LIST = 32
+
+# Rows scored per block in brute-force and assignment passes
+_BLOCK_ROWS = 65_536
+
+
+def _quantize(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    peak = np.abs(vectors).max(axis=1)
+    scales = np.where(peak > 0, peak / 127.0, 1.0).astype(np.float32)
+    quantized = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return quantized, scales
+
+
+class VectorIndex:
+    """
+    Append-only cosine-similarity index over L2-normalised vectors.
+
+    Thread-safe: writers and readers share one lock. search() waits at most
+    `lock_timeout` for a concurrent append/training and otherwise returns no
+    results rather than stalling the caller.
+    """
+
+    def __init__(self, index_dir: Path, dim: int, key_width: int = 36, lock_timeout: float = 0.05):
+        """
+        Args:
+            index_dir: Directory holding the index files (created on first append).
+            dim: Vector dimension.
+            key_width: Maximum key length in UTF-8 bytes (36 fits a UUID).
+            lock_timeout: Longest search() waits for a writer, in seconds.
+        """
+        self.index_dir = Path(index_dir)
+        self.dim = dim
+        self.key_width = key_width
+        self.lock_timeout = lock_timeout
+        self.lock = threading.RLock()
+
+        self.meta: Dict[str, Any] = {"dim": dim, "count": 0, "key_width": key_width, "watermark": None}
+        self._vectors: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+        self._keys: Optional[np.ndarray] = None
+        self._centroids: Optional[np.ndarray] = None
+        self._lists: List[np.ndarray] = []
+        self._load()
+
+    # ---------------------------------------------------------------- storage
+
+    def _path(self, name: str) -> Path:
+        return self.index_dir / name
+
+    def _load(self) -> None:
+        try:
+            meta = json.loads(self._path(META_FILE).read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.error(f"Corrupt vector index metadata in {self.index_dir}, starting empty: {e}")
+            return
+        if meta.get("dim") != self.dim or meta.get("key_width") != self.key_width:
+            logger.warning(f"Vector index in {self.index_dir} has a different shape; rebuilding")
+            return
+        self.meta = meta
+        self._map_rows()
+        if self._path(CENTROIDS_FILE).exists() and self.meta.get("trained_count"):
+            self._centroids = np.load(self._path(CENTROIDS_FILE))
+            assign = np.fromfile(self._path(ASSIGN_FILE), dtype=np.int32, count=len(self))
+            self._build_lists(assign)
+
+    def _map_rows(self) -> None:
+        count = self.meta["count"]
+        if count == 0:
+            self._vectors = self._scales = self._keys = None
+            return
+        self._vectors = np.memmap(self._path(VECTORS_FILE), dtype=np.int8, mode="r", shape=(count, self.dim))
+        self._scales = np.fromfile(self._path(SCALES_FILE), dtype=np.float16, count=count).astype(np.float32)
+        self._keys = np.memmap(self._path(KEYS_FILE), dtype=f"S{self.key_width}", mode="r", shape=(count,))
+
+    def _save_meta(self) -> None:
+        tmp_path = self._path(META_FILE + ".tmp")
+        tmp_path.write_text(json.dumps(self.meta), encoding="utf-8")
+        os.replace(tmp_path, self._path(META_FILE))
+
+    def _append_bytes(self, name: str, data: bytes, offset: int) -> None:
+        # Truncate to the committed length first so a torn earlier append is overwritten
+        with open(self._path(name), "a+b") as f:
+            f.truncate(offset)
+            f.seek(offset)
+            f.write(data)
+
+    def __len__(self) -> int:
+        return self.meta["count"]
+
+    @property
+    def watermark(self) -> Any:
+        """Caller-defined position of the newest appended source row."""
+        return self.meta.get("watermark")
+
+    @property
+    def trained(self) -> bool:
+        return self._centroids is not None
+
+    # ---------------------------------------------------------------- writing
+
+    def append(self, keys: Sequence[str], vectors: np.ndarray, watermark: Any = None) -> None:
+        """
+        Append rows and (optionally) record the caller's watermark with them.
+
+        Args:
+            keys: One key per row.
+            vectors: (n, dim) float array, L2-normalised.
+            watermark: Stored in meta.json once the rows are durable.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        if len(keys) != len(vectors):
+            raise ValueError("keys and vectors must have the same length")
+
+        with self.lock:
+            count = len(self)
+            if len(vectors):
+                self.index_dir.mkdir(parents=True, exist_ok=True)
+                quantized, scales = _quantize(vectors)
+                encoded = np.array([key.encode("utf-8") for key in keys], dtype=f"S{self.key_width}")
+                self._append_bytes(VECTORS_FILE, quantized.tobytes(), count * self.dim)
+                self._append_bytes(SCALES_FILE, scales.astype(np.float16).tobytes(), count * 2)
+                self._append_bytes(KEYS_FILE, encoded.tobytes(), count * self.key_width)
+
+                if self.trained:
+                    assign = self._assign(quantized.astype(np.float32))
+                    self._append_bytes(ASSIGN_FILE, assign.astype(np.int32).tobytes(), count * 4)
+                    rows = np.arange(count, count + len(vectors))
+                    for list_id in np.unique(assign):
+                        self._lists[list_id] = np.concatenate([self._lists[list_id], rows[assign == list_id]])
+
+            self.meta["count"] = count + len(vectors)
+            if watermark is not None:
+                self.meta["watermark"] = watermark
+            self.index_dir.mkdir(parents=True, exist_ok=True)
+            self._save_meta()
+            self._map_rows()
+
+            trained_count = self.meta.get("trained_count") or 0
+            if len(self) >= IVF_MIN_ROWS and (not trained_count or len(self) >= trained_count * RETRAIN_GROWTH):
+                self.train()
+
+    # ----------------------------------------------------------------- IVF
+
+    def _assign(self, rows: np.ndarray) -> np.ndarray:
+        return np.argmax(rows @ self._centroids.T, axis=1)
+
+    def _build_lists(self, assign: np.ndarray) -> None:
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(len(self._centroids) + 1))
+        self._lists = [order[bounds[i]:bounds[i + 1]] for i in range(len(self._centroids))]
+
+    def train(self, n_lists: Optional[int] = None, seed: int = 0) -> None:
+        """(Re)train the IVF quantizer with spherical k-means and reassign every row."""
+        with self.lock:
+            count = len(self)
+            if count == 0:
+                return
+            n_lists = n_lists or int(min(MAX_LISTS, max(16, np.sqrt(count))))
+            n_lists = min(n_lists, count)
+            rng = np.random.default_rng(seed)
+
+            sample_size = min(count, n_lists * KMEANS_SAMPLE_PER_LIST)
+            sample_rows = np.sort(rng.choice(count, size=sample_size, replace=False))
+            sample = self._vectors[sample_rows].astype(np.float32)
+            sample /= np.maximum(np.linalg.norm(sample, axis=1, keepdims=True), 1e-9)
+
+            centroids = sample[rng.choice(sample_size, size=n_lists, replace=False)].copy()
+            for _ in range(KMEANS_ITERATIONS):
+                labels = np.argmax(sample @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, labels, sample)
+                empty = np.bincount(labels, minlength=n_lists) == 0
+                # Re-seed empty lists from random sample rows
+                sums[empty] = sample[rng.choice(sample_size, size=int(empty.sum()))]
+                centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-9)
+
+            self._centroids = centroids.astype(np.float32)
+            assign = np.empty(count, dtype=np.int32)
+            for start in range(0, count, _BLOCK_ROWS):
+                block = self._vectors[start:start + _BLOCK_ROWS].astype(np.float32)
+                assign[start:start + len(block)] = self._assign(block)
+
+            np.save(self._path(CENTROIDS_FILE), self._centroids)
+            assign.tofile(self._path(ASSIGN_FILE))
+            self._build_lists(assign)
+            self.meta["trained_count"] = count
+            self._save_meta()
+            logger.info(f"Trained vector index with {n_lists} lists over {count} rows")
+
+    # ---------------------------------------------------------------- reading
+
+    def search(self, query: np.ndarray, k: int = 5, nprobe: int = DEFAULT_NPROBE) -> List[Tuple[str, float]]:
+        """
+        Return up to k (key, cosine similarity) pairs, best first.
+
+        Args:
+            query: L2-normalised query vector.
+            k: Number of results.
+            nprobe: IVF lists scanned once the quantizer is trained.
+        """
+        query = np.asarray(query, dtype=np.float32).reshape(self.dim)
+        if k <= 0 or not np.any(query):
+            return []
+        if not self.lock.acquire(timeout=self.lock_timeout):
+            logger.debug("Vector index busy; skipping search")
+            return []
+        try:
+            if not len(self):
+                return []
+            if self.trained:
+                probes = np.argsort(-(self._centroids @ query))[:nprobe]
+                # Sorted row order keeps the memmap reads sequential
+                rows = np.sort(np.concatenate([self._lists[p] for p in probes]))
+                scores = (self._vectors[rows].astype(np.float32) @ query) * self._scales[rows]
+            else:
+                rows = None
+                scores = np.concatenate([
+                    (self._vectors[start:start + _BLOCK_ROWS].astype(np.float32) @ query)
+                    * self._scales[start:start + _BLOCK_ROWS]
+                    for start in range(0, len(self), _BLOCK_ROWS)
+                ])
+
+            if len(scores) == 0:
+                return []
+            top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            results = []
+            for position in top:
+                row = int(rows[position]) if rows is not None else int(position)
+                results.append((self._keys[row].decode("utf-8"), round(float(scores[position]), 4)))
+            return results
+        finally:
+            self.lock.release()
+
+    def keys(self) -> Iterable[str]:
+        """Iterate over all keys in insertion order."""
+        if self._keys is None:
+            return []
+        return (key.decode("utf-8") for key in self._keys)
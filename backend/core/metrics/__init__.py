@@ -0,0 +1,5 @@
+"""Operational metrics registry."""
+
+from backend.core.metrics.registry import MetricsRegistry, TimingStats, metrics
+
+__all__ = ["MetricsRegistry", "TimingStats", "metrics"]
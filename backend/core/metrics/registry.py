@@ -0,0 +1,117 @@
+"""
+Metrics Registry
+In-process counters, gauges and timing summaries exposed via /api/v1/metrics.
+"""
+import logging
+import threading
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class TimingStats:
+    """Running summary (count/total/min/max/last) for an observed value."""
+
+    __slots__ = ("count", "total", "min", "max", "last")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def observe(self, value: float) -> None:
+        """Record a single observation."""
+        if self.count == 0 or value < self.min:
+            self.min = value
+        if self.count == 0 or value > self.max:
+            self.max = value
+        self.count += 1
+        self.total += value
+        self.last = value
+
+    def to_dict(self) -> Dict[str, float]:
+        """Return the summary as a plain dict."""
+        return {
+            "count": self.count,
+            "total": round(self.total, 3),
+            "avg": round(self.total / self.count, 3) if self.count else 0.0,
+            "min": round(self.min, 3),
+            "max": round(self.max, 3),
+            "last": round(self.last, 3),
+        }
+
+
+class MetricsRegistry:
+    """
+    Thread-safe registry for lightweight operational metrics.
+
+    Metric names are dotted strings (e.g. "llm.scheduler.admitted.interactive").
+    Components with live state (queues, pools) can register a collector
+    callback that is evaluated on every snapshot instead of pushing gauges.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, float] = {}
+        self._timings: Dict[str, TimingStats] = {}
+        self._collectors: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+    def increment(self, name: str, value: float = 1) -> None:
+        """Increase a counter by value."""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        """Set a gauge to an absolute value."""
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, value: float) -> None:
+        """Record an observation (typically a duration in ms) for name."""
+        with self._lock:
+            stats = self._timings.get(name)
+            if stats is None:
+                stats = self._timings[name] = TimingStats()
+            stats.observe(value)
+
+    def register_collector(self, name: str, collector: Callable[[], Dict[str, Any]]) -> None:
+        """Register a callback whose return value is included in snapshots under name."""
+        with self._lock:
+            self._collectors[name] = collector
+
+    def get_counter(self, name: str) -> float:
+        """Return the current value of a counter (0 if never incremented)."""
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return a JSON-serialisable view of every metric."""
+        with self._lock:
+            data: Dict[str, Any] = {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "timings": {name: stats.to_dict() for name, stats in self._timings.items()},
+            }
+            collectors = dict(self._collectors)
+
+        for name, collector in collectors.items():
+            try:
+                data[name] = collector()
+            except Exception as e:
+                logger.error(f"Metrics collector '{name}' failed: {e}")
+                data[name] = {"error": str(e)}
+        return data
+
+    def reset(self) -> None:
+        """Clear all recorded values (collectors are kept)."""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._timings.clear()
+
+
+# Global registry instance
+metrics = MetricsRegistry()
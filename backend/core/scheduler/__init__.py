@@ -0,0 +1,7 @@
+"""In-process job scheduler for background maintenance work."""
+
+from backend.core.scheduler.jobs import register_maintenance_jobs
+from backend.core.scheduler.scheduler import Job, JobScheduler, scheduler
+from backend.core.scheduler.triggers import CronTrigger, IntervalTrigger
+
+__all__ = ["CronTrigger", "IntervalTrigger", "Job", "JobScheduler", "register_maintenance_jobs", "scheduler"]
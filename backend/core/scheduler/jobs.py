@@ -0,0 +1,85 @@
+"""
+Background maintenance jobs run by the scheduler instead of on user turns.
+"""
+
+import asyncio
+import logging
+import sqlite3
+from datetime import datetime, timezone
+
+from backend.core.scheduler.scheduler import JobScheduler
+from backend.core.scheduler.triggers import CronTrigger, IntervalTrigger
+from backend.database import db
+
+logger = logging.getLogger(__name__)
+
+
+def vacuum_database() -> None:
+    """Reclaim free pages and refresh query-planner statistics of the main database."""
+    conn = sqlite3.connect(db.DB_PATH)
+    try:
+        conn.execute("PRAGMA optimize")
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    logger.info("Vacuumed the message database")
+
+
+def register_maintenance_jobs(scheduler: JobScheduler, registry, spark=None) -> None:
+    """
+    Register the periodic maintenance work for the agents of a session registry.
+
+    Per-agent jobs cover the default agent and every session agent live
+    when the job runs; sessions evicted meanwhile are skipped.
+
+    - profile_update: analyse messages the turn-count trigger has not covered yet
+    - history_condensation: condense each agent's latest thread ahead of its next turn
+    - recall_index_sync: index communications for semantic recall (one shared index)
+    - notebook_archive: sweep [COMPLETED] notebook entries into the archive
+    - log_retention: compress and expire SPARK activity-log segments (with spark)
+    - db_vacuum: weekly VACUUM of the message database
+    """
+
+    async def update_profiles() -> None:
+        agents = registry.agents()
+        for agent in agents:
+            if registry.is_live(agent) and agent.profile_updater.turns_since_update > 0:
+                agent.profile_updater.schedule()
+        for agent in agents:
+            await agent.profile_updater.wait_idle()
+
+    async def condense_histories() -> None:
+        condensed = 0
+        for agent in registry.agents():
+            if registry.is_live(agent) and await agent.condense_history():
+                condensed += 1
+        if condensed:
+            logger.info(f"Condensed the history of {condensed} sessions")
+
+    async def sync_recall_index() -> None:
+        if registry.default_agent is not None:
+            await registry.default_agent.sync_recall_index()
+
+    async def archive_notebooks() -> None:
+        for agent in registry.agents():
+            if registry.is_live(agent):
+                await asyncio.to_thread(agent.archive_completed_entries)
+
+    def expire_spark_logs() -> None:
+        if spark.activity_log is not None:
+            spark.activity_log.rotate(datetime.now(timezone.utc).date())
+
+    scheduler.add_job("profile_update", update_profiles, IntervalTrigger(3600), job_type="llm")
+    scheduler.add_job("history_condensation", condense_histories, IntervalTrigger(1800), job_type="llm")
+    scheduler.add_job("recall_index_sync", sync_recall_index, IntervalTrigger(900), job_type="index")
+    scheduler.add_job(
+        "notebook_archive", archive_notebooks, CronTrigger("0 * * * *"), job_type="maintenance"
+    )
+    if spark is not None:
+        scheduler.add_job(
+            "log_retention", expire_spark_logs, CronTrigger("5 0 * * *"), job_type="maintenance"
+        )
+    scheduler.add_job(
+        "db_vacuum", vacuum_database, CronTrigger("30 3 * * 0"),
+        job_type="maintenance", retry_backoff=300.0
+    )
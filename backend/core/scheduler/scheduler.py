@@ -0,0 +1,314 @@
+"""
+In-process async job scheduler.
+
+Jobs are registered with a trigger (interval or cron) and a job type. The
+scheduler sleeps until the next job is due, runs it as an asyncio task
+(sync callables go to a worker thread), and persists each job's state in
+the scheduled_jobs table after every change. That gives:
+
+- retries: a failed attempt is retried with exponential backoff, up to
+  max_retries, before the job waits for its next regular run;
+- concurrency limits: at most N jobs of the same type run at once;
+- catch-up: a run that fell due while the process was down is executed
+  once, straight after start (missed runs are coalesced, not replayed).
+"""
+
+import asyncio
+import inspect
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from backend.core.metrics import metrics
+from backend.core.scheduler.store import load_job_states, save_job_state
+from backend.core.scheduler.triggers import CronTrigger, IntervalTrigger
+from backend.core.utils import wait_event
+
+logger = logging.getLogger(__name__)
+
+Trigger = Union[IntervalTrigger, CronTrigger]
+
+SUCCESS = "success"
+RETRYING = "retrying"
+FAILED = "failed"
+
+# Longest wait between retries, whatever the backoff says
+MAX_RETRY_BACKOFF_SECONDS = 3600.0
+
+
+@dataclass
+class Job:
+    """A registered job and its persisted state."""
+
+    name: str
+    func: Callable[[], Any]
+    trigger: Trigger
+    job_type: str = "default"
+    max_retries: int = 3
+    retry_backoff: float = 30.0
+    catch_up: bool = True
+    state: Dict[str, Any] = field(default_factory=dict)
+    task: Optional[asyncio.Task] = None
+    running: bool = False
+    # run_now() while in flight: run again as soon as this run has finished
+    rerun: bool = False
+
+    @property
+    def next_run(self) -> Optional[datetime]:
+        return self.state.get("next_run")
+
+    def to_dict(self) -> Dict[str, Any]:
+        def iso(value: Optional[datetime]) -> Optional[str]:
+            return value.isoformat(timespec="seconds") if value else None
+
+        if self.running:
+            status = "running"
+        elif self.task is not None and not self.task.done():
+            status = "queued"
+        else:
+            status = "idle"
+        return {
+            "name": self.name,
+            "job_type": self.job_type,
+            "trigger": str(self.trigger),
+            "status": status,
+            "next_run": iso(self.next_run),
+            "last_run": iso(self.state.get("last_run")),
+            "last_status": self.state.get("last_status"),
+            "last_error": self.state.get("last_error"),
+            "attempts": self.state.get("attempts") or 0,
+            "run_count": self.state.get("run_count") or 0,
+            "failure_count": self.state.get("failure_count") or 0,
+        }
+
+
+class JobScheduler:
+    """
+    Usage:
+        scheduler.add_job("db_vacuum", vacuum_database, CronTrigger("30 3 * * 0"), job_type="maintenance")
+        await scheduler.start()
+        ...
+        await scheduler.stop()
+    """
+
+    def __init__(self, concurrency: Optional[Dict[str, int]] = None, default_concurrency: int = 1):
+        """
+        Args:
+            concurrency: Maximum concurrent runs per job type.
+            default_concurrency: Limit for job types not listed in concurrency.
+        """
+        self.concurrency = dict(concurrency or {})
+        self.default_concurrency = default_concurrency
+        self.jobs: Dict[str, Job] = {}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+
+    # ----------------------------------------------------------- registration
+
+    def add_job(
+        self,
+        name: str,
+        func: Callable[[], Any],
+        trigger: Trigger,
+        job_type: str = "default",
+        max_retries: int = 3,
+        retry_backoff: float = 30.0,
+        catch_up: bool = True
+    ) -> Job:
+        """
+        Register (or replace) a job.
+
+        Args:
+            name: Unique job name; also the key of its persisted state.
+            func: Coroutine function, or plain callable run in a worker thread.
+            trigger: When the job runs.
+            job_type: Concurrency group.
+            max_retries: Failed attempts retried before giving up until the next run.
+            retry_backoff: Delay before the first retry in seconds; doubles per attempt.
+            catch_up: Run once on start if a run was missed while stopped.
+        """
+        job = Job(
+            name=name, func=func, trigger=trigger, job_type=job_type,
+            max_retries=max_retries, retry_backoff=retry_backoff, catch_up=catch_up
+        )
+        self.jobs[name] = job
+        if self.running:
+            job.state = self._initial_state(job, None, datetime.now())
+            save_job_state(job.state)
+            self._wake.set()
+        return job
+
+    # -------------------------------------------------------------- lifecycle
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def _initial_state(self, job: Job, stored: Optional[Dict[str, Any]], now: datetime) -> Dict[str, Any]:
+        state = dict(stored or {})
+        state.update(name=job.name, job_type=job.job_type)
+        next_run = state.get("next_run")
+
+        if stored is None or state.get("trigger") != str(job.trigger) or next_run is None:
+            # New job or changed schedule: start from the trigger
+            state["next_run"] = job.trigger.next_fire(now)
+        elif next_run <= now:
+            if job.catch_up or state.get("last_status") == RETRYING:
+                metrics.increment("scheduler.catch_up")
+                logger.info(f"Job {job.name} missed its run at {next_run}; running now")
+                state["next_run"] = now
+            else:
+                state["next_run"] = job.trigger.next_fire(now)
+        state["trigger"] = str(job.trigger)
+        return state
+
+    async def start(self) -> None:
+        """Load persisted state, schedule catch-up runs and start the loop."""
+        if self.running:
+            return
+        stored = await asyncio.to_thread(load_job_states)
+        now = datetime.now()
+        for job in self.jobs.values():
+            job.state = self._initial_state(job, stored.get(job.name), now)
+            await asyncio.to_thread(save_job_state, job.state)
+
+        self._semaphores = {}
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="job-scheduler")
+        logger.info(f"Job scheduler started with {len(self.jobs)} jobs")
+
+    async def stop(self) -> None:
+        """Stop the loop and cancel in-flight jobs (they run again on the next start)."""
+        task, self._task = self._task, None
+        tasks = [job.task for job in self.jobs.values() if job.task is not None and not job.task.done()]
+        if task is not None:
+            tasks.append(task)
+        for pending in tasks:
+            pending.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def run_now(self, name: str) -> bool:
+        """
+        Make a job due immediately.
+
+        A job that is running (or queued for its concurrency slot) runs once
+        more straight after it finishes; finishing would otherwise replace
+        the requested run with its next regular one.
+
+        Returns:
+            False if no job has that name.
+        """
+        job = self.jobs.get(name)
+        if job is None:
+            return False
+        if job.task is not None and not job.task.done():
+            job.rerun = True
+            return True
+        job.state["next_run"] = datetime.now()
+        if self._wake is not None:
+            self._wake.set()
+        return True
+
+    # -------------------------------------------------------------- execution
+
+    def _semaphore(self, job_type: str) -> asyncio.Semaphore:
+        if job_type not in self._semaphores:
+            limit = self.concurrency.get(job_type, self.default_concurrency)
+            self._semaphores[job_type] = asyncio.Semaphore(max(1, limit))
+        return self._semaphores[job_type]
+
+    async def _run(self) -> None:
+        while True:
+            now = datetime.now()
+            next_due: Optional[datetime] = None
+            for job in self.jobs.values():
+                if job.task is not None and not job.task.done():
+                    continue
+                if job.next_run is not None and job.next_run <= now:
+                    job.task = asyncio.create_task(self._execute(job), name=f"job-{job.name}")
+                elif job.next_run is not None and (next_due is None or job.next_run < next_due):
+                    next_due = job.next_run
+
+            self._wake.clear()
+            timeout = None if next_due is None else max(0.0, (next_due - now).total_seconds())
+            await wait_event(self._wake, timeout)
+
+    async def _execute(self, job: Job) -> None:
+        async with self._semaphore(job.job_type):
+            job.running = True
+            started = datetime.now()
+            job.state["last_run"] = started
+            try:
+                if inspect.iscoroutinefunction(job.func):
+                    await job.func()
+                else:
+                    result = await asyncio.to_thread(job.func)
+                    if inspect.isawaitable(result):
+                        await result
+            except asyncio.CancelledError:
+                job.running = False
+                raise
+            except Exception as e:
+                self._record_failure(job, e)
+            else:
+                self._record_success(job, started)
+            job.running = False
+            if job.rerun:
+                job.rerun = False
+                job.state["next_run"] = datetime.now()
+
+        try:
+            await asyncio.to_thread(save_job_state, job.state)
+        except Exception as e:
+            logger.error(f"Failed to persist state of job {job.name}: {e}")
+        if self._wake is not None:
+            self._wake.set()
+
+    def _record_success(self, job: Job, started: datetime) -> None:
+        elapsed_ms = (datetime.now() - started).total_seconds() * 1000
+        metrics.increment(f"scheduler.{job.name}.runs")
+        metrics.observe(f"scheduler.{job.name}.duration_ms", elapsed_ms)
+        job.state.update(
+            last_status=SUCCESS,
+            last_error=None,
+            attempts=0,
+            run_count=(job.state.get("run_count") or 0) + 1,
+            next_run=job.trigger.next_fire(datetime.now())
+        )
+
+    def _record_failure(self, job: Job, error: Exception) -> None:
+        metrics.increment(f"scheduler.{job.name}.failures")
+        attempts = (job.state.get("attempts") or 0) + 1
+        job.state.update(last_error=str(error), failure_count=(job.state.get("failure_count") or 0) + 1)
+
+        if attempts <= job.max_retries:
+            delay = min(MAX_RETRY_BACKOFF_SECONDS, job.retry_backoff * 2 ** (attempts - 1))
+            job.state.update(
+                last_status=RETRYING,
+                attempts=attempts,
+                next_run=datetime.now() + timedelta(seconds=delay)
+            )
+            logger.warning(f"Job {job.name} failed (attempt {attempts}), retrying in {delay:g}s: {error}")
+        else:
+            job.state.update(last_status=FAILED, attempts=0, next_run=job.trigger.next_fire(datetime.now()))
+            logger.error(f"Job {job.name} failed after {attempts} attempts: {error}")
+
+    # ----------------------------------------------------------------- status
+
+    def status(self) -> Dict[str, Any]:
+        """Scheduler state for the status endpoint."""
+        jobs: List[Dict[str, Any]] = [job.to_dict() for job in self.jobs.values()]
+        return {
+            "running": self.running,
+            "concurrency": {
+                job_type: self.concurrency.get(job_type, self.default_concurrency)
+                for job_type in sorted({job.job_type for job in self.jobs.values()})
+            },
+            "jobs": sorted(jobs, key=lambda job: job["name"]),
+        }
+
+
+# Global instance; maintenance jobs are registered at application startup
+scheduler = JobScheduler(concurrency={"llm": 1, "maintenance": 1, "index": 1})
@@ -0,0 +1,52 @@
+"""
+Scheduled job state, persisted in the scheduled_jobs table.
+
+One row per job name; the scheduler writes it after every state change so
+a restart knows which runs were missed and which retries were pending.
+"""
+
+from datetime import datetime
+from typing import Any, Dict
+
+from backend.database import db
+
+_COLUMNS = (
+    "name", "job_type", "trigger", "next_run", "last_run", "last_status",
+    "last_error", "attempts", "run_count", "failure_count",
+)
+
+
+def _to_db(value: Any) -> Any:
+    return value.isoformat(sep=" ", timespec="seconds") if isinstance(value, datetime) else value
+
+
+def _from_db(row: Dict[str, Any]) -> Dict[str, Any]:
+    for key in ("next_run", "last_run"):
+        if row.get(key):
+            row[key] = datetime.fromisoformat(row[key])
+    return row
+
+
+def load_job_states() -> Dict[str, Dict[str, Any]]:
+    """Return the persisted state of every job, keyed by name."""
+    conn = db.get_db_connection()
+    try:
+        rows = conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM scheduled_jobs").fetchall()
+        return {row["name"]: _from_db(dict(row)) for row in rows}
+    finally:
+        conn.close()
+
+
+def save_job_state(state: Dict[str, Any]) -> None:
+    """Insert or replace a job's state row (keys are the scheduled_jobs columns)."""
+    values = [_to_db(state.get(column)) for column in _COLUMNS]
+    conn = db.get_db_connection()
+    try:
+        conn.execute(
+            f"INSERT OR REPLACE INTO scheduled_jobs ({', '.join(_COLUMNS)}) "
+            f"VALUES ({', '.join('?' for _ in _COLUMNS)})",
+            values
+        )
+        conn.commit()
+    finally:
+        conn.close()
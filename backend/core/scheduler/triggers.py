@@ -0,0 +1,121 @@
+"""
+Job triggers: when a scheduled job should next run.
+
+Both triggers expose next_fire(after) -> datetime and a stable str() form
+that is stored with the job state, so a changed schedule is noticed on
+restart.
+"""
+
+from datetime import datetime, timedelta
+from typing import List, Set
+
+
+class IntervalTrigger:
+    """Fire every `seconds`, measured from the previous run."""
+
+    def __init__(self, seconds: float):
+        if seconds <= 0:
+            raise ValueError("Interval must be positive")
+        self.seconds = seconds
+
+    def next_fire(self, after: datetime) -> datetime:
+        return after + timedelta(seconds=self.seconds)
+
+    def __str__(self) -> str:
+        return f"interval:{self.seconds:g}s"
+
+
+# (name, lowest value, highest value) of the five cron fields
+_CRON_FIELDS = (
+    ("minute", 0, 59),
+    ("hour", 0, 23),
+    ("day", 1, 31),
+    ("month", 1, 12),
+    ("weekday", 0, 7),
+)
+
+# Furthest a cron search looks ahead before giving up (e.g. "0 0 30 2 *")
+_MAX_LOOKAHEAD = timedelta(days=366 * 5)
+
+
+def _parse_field(spec: str, low: int, high: int, name: str) -> Set[int]:
+    values: Set[int] = set()
+    for part in spec.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            step = int(step_text)
+            if step <= 0:
+                raise ValueError(f"Invalid step in cron {name} field: {spec}")
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start_text, end_text = part.split("-", 1)
+            start, end = int(start_text), int(end_text)
+        else:
+            start = int(part)
+            # "5/15" means from 5 to the end in steps of 15
+            end = high if step > 1 else start
+        if start < low or end > high or start > end:
+            raise ValueError(f"Cron {name} value out of range: {spec}")
+        values.update(range(start, end + 1, step))
+    if name == "weekday" and 7 in values:
+        # Both 0 and 7 mean Sunday
+        values.discard(7)
+        values.add(0)
+    return values
+
+
+class CronTrigger:
+    """
+    Standard five-field cron expression: minute hour day month weekday.
+
+    Fields accept *, numbers, ranges (1-5), lists (1,15) and steps (*/10).
+    Weekday 0 (or 7) is Sunday. As in cron, when both day and weekday are
+    restricted a time matches if either does.
+    """
+
+    def __init__(self, expression: str):
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression!r}")
+        self.expression = " ".join(parts)
+        parsed: List[Set[int]] = []
+        for spec, (name, low, high) in zip(parts, _CRON_FIELDS):
+            try:
+                parsed.append(_parse_field(spec, low, high, name))
+            except ValueError as e:
+                raise ValueError(f"Invalid cron expression {expression!r}: {e}") from None
+        self.minutes, self.hours, self.days, self.months, self.weekdays = parsed
+        self._any_day = parts[2] == "*"
+        self._any_weekday = parts[4] == "*"
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day_ok = moment.day in self.days
+        # datetime: Monday=0; cron: Sunday=0
+        weekday_ok = (moment.weekday() + 1) % 7 in self.weekdays
+        if self._any_day:
+            return weekday_ok
+        if self._any_weekday:
+            return day_ok
+        return day_ok or weekday_ok
+
+    def next_fire(self, after: datetime) -> datetime:
+        moment = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = after + _MAX_LOOKAHEAD
+        while moment <= limit:
+            if moment.month not in self.months:
+                year, month = (moment.year + 1, 1) if moment.month == 12 else (moment.year, moment.month + 1)
+                moment = moment.replace(year=year, month=month, day=1, hour=0, minute=0)
+            elif not self._day_matches(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError(f"Cron expression {self.expression!r} never fires")
+
+    def __str__(self) -> str:
+        return f"cron:{self.expression}"
@@ -0,0 +1,9 @@
+"""SPARK heartbeat: periodic, token-frugal checks of the agent's notebook."""
+
+from backend.core.spark.activity_log import ActivityRecord, SparkActivityLog
+from backend.core.spark.config import SparkConfig, load_spark_config
+from backend.core.spark.engine import HeartbeatResult, SparkEngine
+
+__all__ = [
+    "ActivityRecord", "HeartbeatResult", "SparkActivityLog", "SparkConfig", "SparkEngine", "load_spark_config",
+]
@@ -0,0 +1,299 @@
+"""
+SPARK activity log.
+
+Heartbeat results are appended to spark_logs/ as lines in the SPARK.md
+log_format, one segment per UTC day:
+
+    spark-2026-02-16.log       the current day's segment (plain text)
+    spark-2026-02-15.log.gz    closed segments, gzip-compressed
+
+write() only enqueues; a writer task drains the queue in batches and does
+the file I/O in a worker thread, so logging never blocks the event loop.
+When a record for a new day arrives, older plain segments are compressed
+and segments past log_retention_days are deleted, which keeps disk use
+bounded; the scheduler's log_retention job does the same daily, so an
+idle log expires too. Queries open only the segments whose day overlaps the range.
+"""
+
+import asyncio
+import gzip
+import logging
+import re
+import string
+import threading
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from backend.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_PREFIX = "spark-"
+SEGMENT_SUFFIX = ".log"
+COMPRESSED_SUFFIX = ".log.gz"
+
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+# Records waiting to be written; beyond this, new records are dropped
+MAX_QUEUED_RECORDS = 1000
+
+_SEGMENT_RE = re.compile(r"^spark-(\d{4}-\d{2}-\d{2})\.log(\.gz)?$")
+
+
+@dataclass
+class ActivityRecord:
+    """One line of the activity log."""
+
+    timestamp: datetime
+    status: str
+    action: str
+
+    def format(self, log_format: str) -> str:
+        # One record per line: fold any newlines in the action text
+        action = " ".join(self.action.split())
+        return log_format.format(timestamp=self.timestamp.strftime(TIMESTAMP_FORMAT), status=self.status, action=action)
+
+
+def _utc(moment: datetime) -> datetime:
+    """Aware UTC datetime; naive values are taken as local time."""
+    return moment.astimezone(timezone.utc)
+
+
+def _line_pattern(log_format: str) -> re.Pattern:
+    """Regex that parses lines written with log_format."""
+    pattern = ""
+    for literal, name, _, _ in string.Formatter().parse(log_format):
+        pattern += re.escape(literal)
+        if name in ("timestamp", "status", "action"):
+            # The action may contain anything, including the separators
+            pattern += f"(?P<{name}>.*)" if name == "action" else f"(?P<{name}>.*?)"
+        elif name is not None:
+            pattern += ".*?"
+    return re.compile(f"^{pattern}$")
+
+
+class SparkActivityLog:
+    """
+    Append-only, daily-rotated SPARK log for one directory.
+
+    Usage:
+        log = SparkActivityLog(agent_dir / "spark_logs")
+        log.start()
+        log.write(datetime.now(), "OK", "No pending tasks found")
+        records = await log.query(since, until)
+        await log.stop()
+    """
+
+    def __init__(
+        self,
+        log_dir: Path,
+        log_format: str = "{timestamp} | {status} | {action}",
+        retention_days: int = 7,
+        batch_window: float = 0.5,
+        max_batch: int = 100
+    ):
+        """
+        Args:
+            log_dir: Directory holding the segments (created on first write).
+            log_format: Line format with {timestamp}, {status} and {action}.
+            retention_days: Days of segments kept, including today.
+            batch_window: Seconds the writer waits to gather a batch.
+            max_batch: Most records written per batch.
+        """
+        self.log_dir = Path(log_dir)
+        self.log_format = log_format
+        self.retention_days = max(1, retention_days)
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+
+        self._pattern = _line_pattern(log_format)
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._active_day: Optional[date] = None
+        # Held by batch writes and rotate(), which the retention job also calls
+        self._io_lock = threading.RLock()
+
+    # -------------------------------------------------------------- lifecycle
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Start the writer task; must be called from the event loop."""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=MAX_QUEUED_RECORDS)
+        self._task = asyncio.create_task(self._writer(), name="spark-activity-log")
+
+    async def stop(self) -> None:
+        """Write out everything queued, then stop the writer."""
+        if not self.running:
+            return
+        await self.flush()
+        task, self._task = self._task, None
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    async def flush(self) -> None:
+        """Wait until every queued record is on disk."""
+        if self.running:
+            await self._queue.join()
+
+    # ---------------------------------------------------------------- writing
+
+    def write(self, timestamp: datetime, status: str, action: str) -> bool:
+        """
+        Queue a record without blocking.
+
+        Returns:
+            False if the record was dropped (writer not running or queue full).
+        """
+        if not self.running:
+            return False
+        try:
+            self._queue.put_nowait(ActivityRecord(_utc(timestamp), status, action))
+            return True
+        except asyncio.QueueFull:
+            metrics.increment("spark.log.dropped")
+            return False
+
+    async def _writer(self) -> None:
+        # Apply retention to whatever is on disk from previous runs
+        try:
+            await asyncio.to_thread(self.rotate, datetime.now(timezone.utc).date())
+        except Exception as e:
+            logger.error(f"Failed to rotate SPARK logs in {self.log_dir}: {e}")
+
+        while True:
+            batch = [await self._queue.get()]
+            if self.batch_window > 0:
+                await asyncio.sleep(self.batch_window)
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                await asyncio.to_thread(self._write_batch, batch)
+                metrics.increment("spark.log.records", len(batch))
+            except Exception as e:
+                metrics.increment("spark.log.write_failures")
+                logger.error(f"Failed to write {len(batch)} SPARK log records: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _segment_path(self, day: date, compressed: bool = False) -> Path:
+        suffix = COMPRESSED_SUFFIX if compressed else SEGMENT_SUFFIX
+        return self.log_dir / f"{SEGMENT_PREFIX}{day.isoformat()}{suffix}"
+
+    def _write_batch(self, records: List[ActivityRecord]) -> None:
+        with self._io_lock:
+            self._write_batch_locked(records)
+
+    def _write_batch_locked(self, records: List[ActivityRecord]) -> None:
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        by_day: Dict[date, List[str]] = {}
+        for record in records:
+            by_day.setdefault(record.timestamp.date(), []).append(record.format(self.log_format))
+
+        newest = max(by_day)
+        if self._active_day is None or newest > self._active_day:
+            self._active_day = newest
+            self.rotate()
+
+        for day, lines in sorted(by_day.items()):
+            path = self._segment_path(day)
+            if day < self._active_day and self._segment_path(day, compressed=True).exists():
+                # A late record for a closed day gets its own gzip member
+                with gzip.open(self._segment_path(day, compressed=True), "ab") as f:
+                    f.write(("\n".join(lines) + "\n").encode("utf-8"))
+                continue
+            with open(path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+
+    # ------------------------------------------------------ rotation/retention
+
+    def segments(self) -> List[Tuple[date, Path]]:
+        """All segments on disk as (day, path), oldest first."""
+        found = []
+        try:
+            entries = list(self.log_dir.iterdir())
+        except FileNotFoundError:
+            return []
+        for path in entries:
+            match = _SEGMENT_RE.match(path.name)
+            if match:
+                found.append((date.fromisoformat(match.group(1)), path))
+        return sorted(found)
+
+    def rotate(self, today: Optional[date] = None) -> None:
+        """Compress plain segments of days before today and delete expired ones."""
+        today = today or self._active_day or datetime.now(timezone.utc).date()
+        cutoff = today - timedelta(days=self.retention_days - 1)
+        with self._io_lock:
+            for day, path in self.segments():
+                if day < cutoff:
+                    path.unlink(missing_ok=True)
+                    metrics.increment("spark.log.segments_expired")
+                elif day < today and path.name.endswith(SEGMENT_SUFFIX):
+                    self._compress(day, path)
+
+    def _compress(self, day: date, path: Path) -> None:
+        target = self._segment_path(day, compressed=True)
+        staging = target.with_name(target.name + ".tmp")
+        with open(path, "rb") as src, gzip.open(staging, "wb") as dst:
+            dst.write(src.read())
+        if target.exists():
+            # Keep earlier compressed members for the same day
+            with open(target, "ab") as out, open(staging, "rb") as extra:
+                out.write(extra.read())
+            staging.unlink()
+        else:
+            staging.replace(target)
+        path.unlink()
+
+    # ---------------------------------------------------------------- reading
+
+    def read_range(self, since: datetime, until: datetime) -> List[ActivityRecord]:
+        """
+        Records with since <= timestamp <= until, oldest first.
+
+        Only segments whose day falls inside the range are opened.
+        """
+        since, until = _utc(since), _utc(until)
+        records: List[ActivityRecord] = []
+        for day, path in self.segments():
+            if day < since.date() or day > until.date():
+                continue
+            try:
+                if path.name.endswith(COMPRESSED_SUFFIX):
+                    with gzip.open(path, "rt", encoding="utf-8") as f:
+                        text = f.read()
+                else:
+                    text = path.read_text(encoding="utf-8")
+            except FileNotFoundError:
+                # Rotated away between listing and reading
+                continue
+            for line in text.splitlines():
+                record = self._parse(line)
+                if record and since <= record.timestamp <= until:
+                    records.append(record)
+        records.sort(key=lambda record: record.timestamp)
+        return records
+
+    async def query(self, since: datetime, until: Optional[datetime] = None) -> List[ActivityRecord]:
+        """Flush pending records, then read the range in a worker thread."""
+        await self.flush()
+        return await asyncio.to_thread(self.read_range, since, until or datetime.now(timezone.utc))
+
+    def _parse(self, line: str) -> Optional[ActivityRecord]:
+        match = self._pattern.match(line)
+        if not match:
+            return None
+        try:
+            timestamp = datetime.strptime(match.group("timestamp"), TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc)
+        except (IndexError, ValueError):
+            return None
+        groups = match.groupdict()
+        return ActivityRecord(timestamp, groups.get("status", ""), groups.get("action", ""))
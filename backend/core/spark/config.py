@@ -0,0 +1,103 @@
+"""SPARK configuration, parsed from the agent's SPARK.md."""
+
+import logging
+import re
+from dataclasses import dataclass, fields
+from pathlib import Path
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+SPARK_FILE = "SPARK.md"
+
+# Allowed heartbeat interval range (see SPARK.md)
+MIN_INTERVAL_MINUTES = 5
+MAX_INTERVAL_MINUTES = 60
+
+_YAML_BLOCK_RE = re.compile(r"```yaml\s*\n(.*?)```", re.DOTALL)
+_KEY_VALUE_RE = re.compile(r"^\s*([A-Za-z_][A-Za-z0-9_]*)\s*:\s*(.*?)\s*$")
+
+
+@dataclass
+class SparkConfig:
+    """Heartbeat settings; defaults match the documented SPARK.md defaults."""
+
+    interval_minutes: int = 15
+    max_check_tokens: int = 500
+    log_directory: str = "spark_logs"
+    log_retention_days: int = 7
+    log_format: str = "{timestamp} | {status} | {action}"
+    enabled: bool = True
+
+    @property
+    def interval_seconds(self) -> float:
+        return self.interval_minutes * 60.0
+
+
+def _parse_value(raw: str) -> Any:
+    if len(raw) >= 2 and raw[0] == raw[-1] and raw[0] in "\"'":
+        return raw[1:-1]
+    lowered = raw.lower()
+    if lowered in ("true", "yes", "on"):
+        return True
+    if lowered in ("false", "no", "off"):
+        return False
+    try:
+        return int(raw)
+    except ValueError:
+        return raw
+
+
+def parse_spark_config(content: str) -> SparkConfig:
+    """
+    Build a SparkConfig from the ```yaml blocks of SPARK.md.
+
+    Only flat "key: value" lines are read; unknown keys and values of the
+    wrong type are ignored (with a warning) so a bad edit can't stop the
+    backend from starting.
+    """
+    values: Dict[str, Any] = {}
+    for block in _YAML_BLOCK_RE.findall(content):
+        for line in block.splitlines():
+            match = _KEY_VALUE_RE.match(line)
+            if match:
+                values[match.group(1)] = _parse_value(match.group(2))
+
+    config = SparkConfig()
+    for field in fields(SparkConfig):
+        if field.name not in values:
+            continue
+        value = values[field.name]
+        expected = type(getattr(config, field.name))
+        if (expected is int and isinstance(value, bool)) or not isinstance(value, expected):
+            logger.warning(f"Ignoring SPARK.md setting {field.name}={value!r}: expected {expected.__name__}")
+            continue
+        setattr(config, field.name, value)
+
+    clamped = min(MAX_INTERVAL_MINUTES, max(MIN_INTERVAL_MINUTES, config.interval_minutes))
+    if clamped != config.interval_minutes:
+        logger.warning(
+            f"SPARK interval_minutes={config.interval_minutes} outside "
+            f"{MIN_INTERVAL_MINUTES}-{MAX_INTERVAL_MINUTES}; using {clamped}"
+        )
+        config.interval_minutes = clamped
+
+    try:
+        config.log_format.format(timestamp="", status="", action="")
+    except (KeyError, IndexError, ValueError):
+        logger.warning(f"Invalid SPARK log_format {config.log_format!r}; using the default")
+        config.log_format = SparkConfig.log_format
+    return config
+
+
+def load_spark_config(agent_dir: Path) -> SparkConfig:
+    """Read SPARK.md from agent_dir; a missing or unreadable file gives the defaults."""
+    try:
+        content = (Path(agent_dir) / SPARK_FILE).read_text(encoding="utf-8")
+    except FileNotFoundError:
+        logger.warning(f"{SPARK_FILE} not found in {agent_dir}; using default SPARK settings")
+        return SparkConfig()
+    except Exception as e:
+        logger.error(f"Failed to read {SPARK_FILE}: {e}")
+        return SparkConfig()
+    return parse_spark_config(content)
@@ -0,0 +1,388 @@
+"""
+SPARK heartbeat engine.
+
+An asyncio service that periodically checks the notebook for pending work.
+Each heartbeat starts with a local scan (one indexed query on the notebook
+store); the LLM is only consulted when there are pending entries that have
+not been evaluated yet, so an idle agent costs no tokens. Between heartbeats
+the engine sleeps on an event that notebook writes set, so changes are
+picked up early instead of waiting out the full interval.
+
+Besides the agent's own notebook, the engine watches the notebooks of named
+sessions attached to it (the session registry attaches and detaches them as
+session agents come and go). A notebook write wakes the engine and only the
+notebooks that changed are checked; the timer checks all of them.
+"""
+
+import asyncio
+import functools
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from backend.core.llm.scheduler import BACKGROUND
+from backend.core.memory.notebook_store import NotebookStore
+from backend.core.memory.token_counter import TokenCounter, token_counter as default_token_counter
+from backend.core.metrics import metrics
+from backend.core.spark.activity_log import ActivityRecord, SparkActivityLog
+from backend.core.spark.config import SparkConfig, load_spark_config
+from backend.core.utils import wait_event
+from backend.models.message import DEFAULT_SESSION_ID
+
+logger = logging.getLogger(__name__)
+
+OK = "OK"
+ACTION = "ACTION"
+
+# Tokens reserved for the model's verdict within max_check_tokens
+RESPONSE_TOKENS = 60
+
+# An unchanged set of pending entries is re-evaluated at most this often
+REEVALUATE_AFTER = timedelta(hours=24)
+
+# Archived lines given to the model as context for what was done recently
+ARCHIVE_CONTEXT_LINES = 5
+
+SPARK_CHECK_PROMPT = """You are SPARK, a cheap periodic check for an AI assistant's working notebook.
+Decide whether any pending task needs the assistant's attention now.
+
+PENDING ENTRIES:
+{pending}
+
+RECENTLY COMPLETED:
+{archived}
+
+Reply with exactly one line:
+OK
+or
+ACTION: <the pending task that needs attention, quoted briefly>
+"""
+
+
+@dataclass
+class HeartbeatResult:
+    """Outcome of one heartbeat, in SPARK.md log terms."""
+
+    status: str
+    action: str
+    timestamp: datetime = field(default_factory=datetime.now)
+    pending: int = 0
+    llm_called: bool = False
+    session_id: str = DEFAULT_SESSION_ID
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "timestamp": self.timestamp.isoformat(timespec="seconds"),
+            "session_id": self.session_id,
+            "status": self.status,
+            "action": self.action,
+            "pending": self.pending,
+            "llm_called": self.llm_called,
+        }
+
+
+class SparkEngine:
+    """
+    Heartbeat service for one agent directory and the sessions attached to it.
+
+    Usage:
+        engine = SparkEngine(agent_dir=lambda: agent.agent_files_dir,
+                             notebook=lambda: agent.notebook, llm_service=llm)
+        await engine.start()
+        engine.attach("alice", alice_agent.notebook)
+        ...
+        await engine.stop()
+    """
+
+    def __init__(
+        self,
+        agent_dir: Callable[[], Path],
+        notebook: Callable[[], NotebookStore],
+        llm_service: Any = None,
+        token_counter: Optional[TokenCounter] = None,
+        on_action: Optional[Callable[[str], Awaitable[None]]] = None,
+        on_result: Optional[Callable[[HeartbeatResult, SparkConfig], None]] = None,
+        wake_debounce_seconds: float = 2.0
+    ):
+        """
+        Args:
+            agent_dir: Returns the agent directory holding SPARK.md.
+            notebook: Returns the notebook store to scan.
+            llm_service: Service used to evaluate pending entries (None = never call an LLM).
+            token_counter: Counter for the per-check token budget.
+            on_action: Awaited with the task description when a check returns ACTION.
+            on_result: Called with every heartbeat result, after it is logged.
+            wake_debounce_seconds: Quiet period after a notebook change before checking.
+        """
+        self._agent_dir = agent_dir
+        self._notebook = notebook
+        self.llm_service = llm_service
+        self.token_counter = token_counter or default_token_counter
+        self.on_action = on_action
+        self.on_result = on_result
+        self.wake_debounce_seconds = wake_debounce_seconds
+
+        self.config = SparkConfig()
+        self.activity_log: Optional[SparkActivityLog] = None
+        self.recent: Deque[HeartbeatResult] = deque(maxlen=50)
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._watched: Optional[NotebookStore] = None
+        # Attached session notebooks and the change listener registered on each
+        self._sessions: Dict[str, Tuple[NotebookStore, Callable[[], None]]] = {}
+        # Notebooks written to since their last check
+        self._changed: Set[str] = set()
+        # Per notebook: pending lines last shown to the LLM, with its verdict and when
+        self._evaluated: Dict[str, Tuple[Tuple[str, ...], str, str, datetime]] = {}
+
+    # -------------------------------------------------------------- lifecycle
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self) -> bool:
+        """
+        Load SPARK.md and start heartbeating.
+
+        Returns:
+            False if SPARK is disabled in its config.
+        """
+        if self.running:
+            return True
+        self.config = load_spark_config(self._agent_dir())
+        if not self.config.enabled:
+            logger.info("SPARK heartbeat disabled in SPARK.md")
+            return False
+
+        self.activity_log = SparkActivityLog(
+            Path(self._agent_dir()) / self.config.log_directory,
+            log_format=self.config.log_format,
+            retention_days=self.config.log_retention_days
+        )
+        self.activity_log.start()
+
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._watch_notebook()
+        self._task = asyncio.create_task(self._run(), name="spark-heartbeat")
+        logger.info(f"SPARK heartbeat started (every {self.config.interval_minutes} min)")
+        return True
+
+    async def stop(self) -> None:
+        """Stop heartbeating and detach from every notebook."""
+        if self._watched is not None:
+            self._watched.remove_listener(self.notify)
+            self._watched = None
+        for session_id in list(self._sessions):
+            self.detach(session_id)
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        if self.activity_log is not None:
+            await self.activity_log.stop()
+
+    def notify(self, session_id: str = DEFAULT_SESSION_ID) -> None:
+        """Wake the engine early to check a session's notebook; safe to call from any thread."""
+        if self._loop is None or self._wake is None or self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(self._mark_changed, session_id)
+
+    def _mark_changed(self, session_id: str) -> None:
+        self._changed.add(session_id)
+        self._wake.set()
+
+    def attach(self, session_id: str, store: NotebookStore) -> None:
+        """Watch a named session's notebook as well; its pending entries are checked soon."""
+        if session_id == DEFAULT_SESSION_ID:
+            return
+        self.detach(session_id)
+        listener = functools.partial(self.notify, session_id)
+        store.add_listener(listener)
+        self._sessions[session_id] = (store, listener)
+        self.notify(session_id)
+
+    def detach(self, session_id: str) -> None:
+        """Stop watching a session's notebook (e.g. before its agent is closed)."""
+        attached = self._sessions.pop(session_id, None)
+        if attached is not None:
+            store, listener = attached
+            store.remove_listener(listener)
+        self._changed.discard(session_id)
+        self._evaluated.pop(session_id, None)
+
+    @property
+    def sessions(self) -> List[str]:
+        """Named sessions whose notebooks are attached."""
+        return list(self._sessions)
+
+    def _watch_notebook(self) -> None:
+        # The agent may rebind its notebook (agent_files_dir changes); follow it
+        try:
+            store = self._notebook()
+        except Exception as e:
+            logger.error(f"SPARK could not open the notebook: {e}")
+            return
+        if store is not self._watched:
+            if self._watched is not None:
+                self._watched.remove_listener(self.notify)
+            store.add_listener(self.notify)
+            self._watched = store
+
+    async def _run(self) -> None:
+        while True:
+            woken = await wait_event(self._wake, self.config.interval_seconds)
+            if woken:
+                metrics.increment("spark.wakeups.notebook")
+                # Fold bursts of notebook writes into one check
+                await asyncio.sleep(self.wake_debounce_seconds)
+            else:
+                metrics.increment("spark.wakeups.timer")
+            due = [DEFAULT_SESSION_ID] + self.sessions
+            if woken:
+                # Only the notebooks that changed (or were just attached)
+                due = [session_id for session_id in due if session_id in self._changed]
+            self._wake.clear()
+            self._changed.clear()
+
+            for session_id in due:
+                try:
+                    await self.heartbeat(session_id)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    metrics.increment("spark.heartbeat.failures")
+                    logger.error(f"SPARK heartbeat of session {session_id} failed: {e}")
+
+    # -------------------------------------------------------------- heartbeat
+
+    async def heartbeat(self, session_id: str = DEFAULT_SESSION_ID) -> HeartbeatResult:
+        """
+        Check one notebook now and record the result.
+
+        Raises:
+            LookupError: If session_id is neither the default session nor attached.
+        """
+        if session_id == DEFAULT_SESSION_ID:
+            self._watch_notebook()
+            store = self._watched or self._notebook()
+        elif session_id in self._sessions:
+            store = self._sessions[session_id][0]
+        else:
+            raise LookupError(f"No notebook attached for session {session_id!r}")
+        pending = await asyncio.to_thread(store.pending_entries)
+
+        if not pending:
+            result = HeartbeatResult(status=OK, action="No pending tasks found")
+        else:
+            result = await self._evaluate(session_id, store, pending)
+        result.pending = len(pending)
+        result.session_id = session_id
+
+        self.recent.append(result)
+        metrics.increment(f"spark.heartbeat.{result.status.lower()}")
+        if result.llm_called:
+            metrics.increment("spark.heartbeat.llm_calls")
+        # The log has no session column: named sessions are prefixed to the action
+        action = result.action if session_id == DEFAULT_SESSION_ID else f"[{session_id}] {result.action}"
+        logger.info(f"SPARK | {result.status} | {action}")
+        if self.activity_log is not None:
+            self.activity_log.write(result.timestamp, result.status, action)
+        if self.on_result is not None:
+            try:
+                self.on_result(result, self.config)
+            except Exception as e:
+                logger.error(f"SPARK result handler failed: {e}")
+        return result
+
+    async def _evaluate(self, session_id: str, store: NotebookStore, pending: List[str]) -> HeartbeatResult:
+        key = tuple(pending)
+        if session_id in self._evaluated:
+            last_key, status, action, evaluated_at = self._evaluated[session_id]
+            if last_key == key and datetime.now() - evaluated_at < REEVALUATE_AFTER:
+                # Same pending work as last time: reuse the verdict, spend nothing
+                return HeartbeatResult(status=status, action=f"{action} (unchanged)")
+
+        if not self.llm_service:
+            status, action = ACTION, f"Found pending task: \"{_task_text(pending[0])}\""
+            result = HeartbeatResult(status=status, action=action)
+        else:
+            archived = await asyncio.to_thread(store.archive.tail, ARCHIVE_CONTEXT_LINES)
+            prompt = self._build_prompt(pending, archived)
+            reply = await self.llm_service.send_message(
+                messages=[{"role": "user", "content": prompt}],
+                stream=False,
+                max_tokens=RESPONSE_TOKENS,
+                model="openrouter/free",
+                priority=BACKGROUND
+            )
+            status, action = _parse_verdict(reply)
+            result = HeartbeatResult(status=status, action=action, llm_called=True)
+
+        self._evaluated[session_id] = (key, result.status, result.action, datetime.now())
+        if result.status == ACTION and self.on_action is not None:
+            await self.on_action(result.action)
+        return result
+
+    def _build_prompt(self, pending: List[str], archived: str) -> str:
+        """Fit pending entries (oldest first) and recent archive lines into the check budget."""
+        budget = self.config.max_check_tokens - RESPONSE_TOKENS
+        base = SPARK_CHECK_PROMPT.format(pending="", archived="")
+        used = self.token_counter.count_tokens(base)
+
+        pending_lines: List[str] = []
+        for line in pending:
+            cost = self.token_counter.count_tokens(line) + 1
+            if used + cost > budget:
+                pending_lines.append(f"(+{len(pending) - len(pending_lines)} more)")
+                break
+            pending_lines.append(line)
+            used += cost
+
+        archived_lines: List[str] = []
+        for line in reversed(archived.splitlines()):
+            cost = self.token_counter.count_tokens(line) + 1
+            if used + cost > budget:
+                break
+            archived_lines.insert(0, line)
+            used += cost
+
+        return SPARK_CHECK_PROMPT.format(
+            pending="\n".join(pending_lines),
+            archived="\n".join(archived_lines) or "None"
+        )
+
+    async def query_log(self, since: datetime, until: Optional[datetime] = None) -> List[ActivityRecord]:
+        """Logged heartbeats between since and until (default: now), oldest first."""
+        if self.activity_log is None:
+            return []
+        return await self.activity_log.query(since, until)
+
+    def status(self) -> Dict[str, Any]:
+        """Current state for diagnostics."""
+        return {
+            "running": self.running,
+            "enabled": self.config.enabled,
+            "interval_minutes": self.config.interval_minutes,
+            "sessions": self.sessions,
+            "recent": [result.to_dict() for result in list(self.recent)[-10:]],
+        }
+
+
+def _task_text(line: str) -> str:
+    text = line.split(" - ", 1)[-1] if " - " in line else line.replace("[PENDING]", "")
+    return text.strip()[:120]
+
+
+def _parse_verdict(reply: Any) -> Tuple[str, str]:
+    """Map the model's one-line verdict to (status, action)."""
+    first_line = next((line.strip() for line in str(reply).splitlines() if line.strip()), "")
+    if first_line.upper().startswith(ACTION):
+        task = first_line[len(ACTION):].lstrip(" :-").strip()
+        return ACTION, f"Found pending task: {task}" if task else "Pending task needs attention"
+    return OK, "Pending tasks checked; no action needed"
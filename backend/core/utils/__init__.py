@@ -0,0 +1,5 @@
+"""Small helpers shared across backend.core packages."""
+
+from backend.core.utils.aio import wait_event
+
+__all__ = ["wait_event"]
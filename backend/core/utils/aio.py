@@ -0,0 +1,23 @@
+"""asyncio helpers."""
+
+import asyncio
+from typing import Optional
+
+
+async def wait_event(event: asyncio.Event, timeout: Optional[float]) -> bool:
+    """
+    Wait until event is set or timeout seconds have passed (None = no timeout).
+
+    Uses asyncio.wait() rather than asyncio.wait_for(): on Python < 3.12
+    wait_for can swallow a cancellation that coincides with the event being
+    set, so a loop sleeping here could ignore a stop() and be awaited forever.
+
+    Returns:
+        True if the event was set, False on timeout.
+    """
+    waiter = asyncio.ensure_future(event.wait())
+    try:
+        done, _ = await asyncio.wait({waiter}, timeout=timeout)
+    finally:
+        waiter.cancel()
+    return bool(done)
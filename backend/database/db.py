@@ -27,9 +27,15 @@ def init_db():
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 sender TEXT NOT NULL,
                 content TEXT NOT NULL,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                session_id TEXT NOT NULL DEFAULT 'default'
             )
         """)
+        # Databases created before sessions existed: existing rows join the default session
+        columns = {row[1] for row in cursor.execute("PRAGMA table_info(messages)")}
+        if "session_id" not in columns:
+            cursor.execute("ALTER TABLE messages ADD COLUMN session_id TEXT NOT NULL DEFAULT 'default'")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_session ON messages(session_id, id)")
 
         # Communications table (blockchain-style message chain)
         cursor.execute("""
@@ -43,11 +49,17 @@ def init_db():
                 exitor_com_id TEXT,                  -- com_id of the NEXT message in chain (NULL until next is saved)
                 is_condensed BOOLEAN DEFAULT FALSE,  -- True if this message has been condensed
                 condensed_summary TEXT,              -- Summary text if condensed, else NULL
+                session_id TEXT NOT NULL DEFAULT 'default',  -- Conversation session the message belongs to
                 FOREIGN KEY (initiator_com_id) REFERENCES communications(com_id),
                 FOREIGN KEY (exitor_com_id) REFERENCES communications(com_id)
             )
         """)
 
+        columns = {row[1] for row in cursor.execute("PRAGMA table_info(communications)")}
+        if "session_id" not in columns:
+            cursor.execute("ALTER TABLE communications ADD COLUMN session_id TEXT NOT NULL DEFAULT 'default'")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_communications_session ON communications(session_id)")
+
         # Initiator log — records the first message of each conversation thread
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS initiator_log (
@@ -58,6 +70,22 @@ def init_db():
             )
         """)
 
+        # Scheduled job state — survives restarts so missed runs can be caught up
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS scheduled_jobs (
+                name TEXT PRIMARY KEY,               -- Unique job name
+                job_type TEXT NOT NULL,              -- Concurrency group
+                trigger TEXT NOT NULL,               -- str() of the trigger, e.g. "cron:0 3 * * *"
+                next_run DATETIME,                   -- When the job is next due
+                last_run DATETIME,                   -- Start of the most recent attempt
+                last_status TEXT,                    -- "success", "retrying" or "failed"
+                last_error TEXT,                     -- Error of the most recent failed attempt
+                attempts INTEGER DEFAULT 0,          -- Consecutive failed attempts of the current run
+                run_count INTEGER DEFAULT 0,         -- Successful runs
+                failure_count INTEGER DEFAULT 0      -- Failed attempts
+            )
+        """)
+
         conn.commit()
     finally:
         conn.close()
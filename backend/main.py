@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import FastAPI, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
 from backend.config.settings import settings
@@ -8,6 +9,12 @@ from backend.database.db import init_db
 from backend.api.routes.messages import router as messages_router
 from backend.api.routes.files import router as files_router
 from backend.api.routes.communications import router as communications_router
+from backend.api.routes.metrics import router as metrics_router
+from backend.api.routes.scheduler import router as scheduler_router
+from backend.api.routes.spark import router as spark_router
+from backend.core.agent import head_agent, sessions
+from backend.core.scheduler import register_maintenance_jobs, scheduler
+from backend.core.spark import SparkEngine
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -28,6 +35,9 @@ app.include_router(
     tags=["files"]
 )
 app.include_router(communications_router, prefix="/api/v1")
+app.include_router(metrics_router, prefix="/api/v1")
+app.include_router(scheduler_router, prefix="/api/v1")
+app.include_router(spark_router, prefix="/api/v1")
 
 # Configure CORS
 app.add_middleware(
@@ -69,12 +79,45 @@ async def startup_event():
     except Exception as e:
         logger.error(f"Failed to initialize database: {e}")
 
+    # Catch the semantic recall index up with messages saved while offline
+    if head_agent:
+        app.state.recall_sync = asyncio.create_task(head_agent.sync_recall_index())
+
+        # Start the SPARK heartbeat; it sleeps until its interval or a notebook change
+        app.state.spark = SparkEngine(
+            agent_dir=lambda: head_agent.agent_files_dir,
+            notebook=lambda: head_agent.notebook,
+            llm_service=head_agent.llm_service
+        )
+        if await app.state.spark.start():
+            # Session agents' notebooks are watched too, as sessions come and go
+            sessions.attach_spark(app.state.spark)
+
+        # Maintenance runs on its own schedule, off the user's turns
+        register_maintenance_jobs(scheduler, sessions, app.state.spark)
+    try:
+        await scheduler.start()
+    except Exception as e:
+        logger.error(f"Failed to start the job scheduler: {e}")
+
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Run on application shutdown."""
     logger.info("Moon-AI Backend shutting down...")
 
+    await scheduler.stop()
+
+    # Give pending background profile updates a chance to finish, then
+    # close every agent's notebook store the same way
+    await sessions.shutdown()
+    if head_agent:
+        await head_agent.close()
+
+    spark = getattr(app.state, "spark", None)
+    if spark:
+        await spark.stop()
+
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,12 +1,14 @@
 from pydantic import BaseModel
 from datetime import datetime
 from typing import Optional
+from backend.models.message import DEFAULT_SESSION_ID
 
 class CommunicationCreate(BaseModel):
     sender: str
     recipient: str
     raw_content: str
     initiator_com_id: Optional[str] = None   # None for first message in chain
+    session_id: str = DEFAULT_SESSION_ID
 
 class Communication(BaseModel):
     com_id: str
@@ -18,6 +20,7 @@ class Communication(BaseModel):
     exitor_com_id: Optional[str] = None
     is_condensed: bool = False
     condensed_summary: Optional[str] = None
+    session_id: str = DEFAULT_SESSION_ID
 
     model_config = {"from_attributes": True}
 
@@ -5,8 +5,11 @@ class MessageBase(BaseModel):
     sender: str
     content: str
 
+# Session of messages saved without one (single-user clients)
+DEFAULT_SESSION_ID = "default"
+
 class MessageCreate(MessageBase):
-    pass
+    session_id: str = DEFAULT_SESSION_ID
 
 class Message(MessageBase):
     id: int
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 from datetime import datetime
 from backend.database.db import get_db_connection
 from backend.models.message import Message, MessageCreate
@@ -21,8 +21,8 @@ def save_message(message: MessageCreate) -> Message:
     try:
         cursor = conn.cursor()
         cursor.execute(
-            "INSERT INTO messages (sender, content) VALUES (?, ?)",
-            (message.sender, message.content)
+            "INSERT INTO messages (sender, content, session_id) VALUES (?, ?, ?)",
+            (message.sender, message.content, message.session_id)
         )
         message_id = cursor.lastrowid
         conn.commit()
@@ -40,12 +40,15 @@ def save_message(message: MessageCreate) -> Message:
     finally:
         conn.close()
 
-def get_all_messages(limit: int = 100) -> List[Message]:
+def get_all_messages(limit: int = 100, session_id: Optional[str] = None) -> List[Message]:
+    """Get the oldest messages (of one session, if given), ordered chronologically."""
     conn = get_db_connection()
     try:
         cursor = conn.cursor()
         # Order by timestamp ASC, id ASC to handle same-second timestamps correctly
-        cursor.execute("SELECT * FROM messages ORDER BY timestamp ASC, id ASC LIMIT ?", (limit,))
+        where = "WHERE session_id = ?" if session_id is not None else ""
+        params = (session_id, limit) if session_id is not None else (limit,)
+        cursor.execute(f"SELECT * FROM messages {where} ORDER BY timestamp ASC, id ASC LIMIT ?", params)
         rows = cursor.fetchall()
 
         messages = []
@@ -60,19 +63,21 @@ def get_all_messages(limit: int = 100) -> List[Message]:
     finally:
         conn.close()
 
-def get_recent_messages(limit: int = 50) -> List[Message]:
-    """Get the most recent messages, ordered chronologically."""
+def get_recent_messages(limit: int = 50, session_id: Optional[str] = None) -> List[Message]:
+    """Get the most recent messages (of one session, if given), ordered chronologically."""
     conn = get_db_connection()
     try:
         cursor = conn.cursor()
         # Get the last N messages, but we need them in ASC order for chat history
         # Use id as secondary sort key for consistent ordering
-        query = """
+        where = "WHERE session_id = ?" if session_id is not None else ""
+        query = f"""
             SELECT * FROM (
-                SELECT * FROM messages ORDER BY timestamp DESC, id DESC LIMIT ?
+                SELECT * FROM messages {where} ORDER BY timestamp DESC, id DESC LIMIT ?
             ) ORDER BY timestamp ASC, id ASC
         """
-        cursor.execute(query, (limit,))
+        params = (session_id, limit) if session_id is not None else (limit,)
+        cursor.execute(query, params)
         rows = cursor.fetchall()
 
         messages = []
@@ -87,6 +92,43 @@ def get_recent_messages(limit: int = 50) -> List[Message]:
     finally:
         conn.close()
 
+def get_messages_after(after_id: int, limit: int = 500, session_id: Optional[str] = None) -> List[Message]:
+    """Get up to `limit` messages (of one session, if given) with id greater than after_id, oldest first."""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        if session_id is not None:
+            cursor.execute(
+                "SELECT * FROM messages WHERE session_id = ? AND id > ? ORDER BY id ASC LIMIT ?",
+                (session_id, after_id, limit)
+            )
+        else:
+            cursor.execute("SELECT * FROM messages WHERE id > ? ORDER BY id ASC LIMIT ?", (after_id, limit))
+        rows = cursor.fetchall()
+
+        messages = []
+        for row in rows:
+            messages.append(Message(
+                id=row['id'],
+                sender=row['sender'],
+                content=row['content'],
+                timestamp=parse_timestamp(row['timestamp'])
+            ))
+        return messages
+    finally:
+        conn.close()
+
+def update_message_content(message_id: int, content: str) -> bool:
+    """Replace the content of a saved message; returns False if it does not exist."""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("UPDATE messages SET content = ? WHERE id = ?", (content, message_id))
+        conn.commit()
+        return cursor.rowcount > 0
+    finally:
+        conn.close()
+
 def clear_all_messages() -> int:
     conn = get_db_connection()
     try:
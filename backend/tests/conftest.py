@@ -0,0 +1,9 @@
+import pytest
+from backend.core.llm.mock_server import MockLLMConfig, MockLLMServer
+
+
+@pytest.fixture
+def mock_llm_server():
+    """OpenAI-compatible mock LLM server on a free local port (fast defaults for tests)."""
+    with MockLLMServer(MockLLMConfig(ttft_ms=5, tokens_per_sec=0)) as server:
+        yield server
@@ -0,0 +1,163 @@
+"""Tests for per-session HeadAgents and the session registry."""
+
+import time
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from fastapi.testclient import TestClient
+
+from backend.core.agent import AgentSessionRegistry, HeadAgent
+from backend.core.agent.head_agent import PROFILE_SECTIONS
+from backend.main import app
+
+
+@pytest.fixture
+def template_dir(tmp_path):
+    template = tmp_path / "head-agent"
+    template.mkdir()
+    (template / "AGENT.md").write_text("Shared agent definition")
+    (template / "SOUL.md").write_text("Shared soul")
+    (template / "USER.md").write_text("# User Profile\n\n**Name:** Default user")
+    (template / "NOTEBOOK.md").write_text("# Notebook\n\n[PENDING] 2024-01-01 10:00 - Default user's task")
+    return template
+
+
+@pytest.fixture
+def registry(tmp_path, template_dir):
+    default = HeadAgent(llm_service=AsyncMock())
+    default.agent_files_dir = template_dir
+    default._recall = MagicMock()
+    return AgentSessionRegistry(default, sessions_dir=tmp_path / "sessions", template_dir=template_dir, max_sessions=2)
+
+
+def test_default_and_invalid_sessions(registry):
+    assert registry.get() is registry.default_agent
+    assert registry.get("default") is registry.default_agent
+    with pytest.raises(ValueError):
+        registry.get("../escape")
+    assert len(registry) == 0
+
+
+def test_named_sessions_are_isolated(registry, template_dir):
+    """Each session has its own files, counters and caches; identity files are shared."""
+    alice = registry.get("alice")
+    bob = registry.get("bob")
+
+    assert alice is not bob and registry.get("alice") is alice
+    assert alice.session_id == "alice"
+    assert alice.agent_files_dir == registry.sessions_dir / "alice"
+
+    assert alice._read_file("AGENT.md") == "Shared agent definition"
+    profile = alice._read_file("USER.md")
+    assert profile.count("# User Profile") == 1 and "Default user" not in profile
+    assert list(alice._parse_profile_sections(profile)) == list(PROFILE_SECTIONS)
+    notebook = alice._read_file("NOTEBOOK.md")
+    assert notebook.startswith("# Notebook") and "[PENDING]" not in notebook
+
+    alice._message_count_since_last_update = 3
+    assert bob._message_count_since_last_update == 0
+    alice.notebook.append("[PENDING] 2024-01-02 09:00 - Alice's task")
+    assert bob.notebook.pending_entries() == []
+    assert alice.recall is registry.default_agent.recall
+    assert alice.recall_top_k > 0  # recall is filtered by session, not disabled
+
+
+@pytest.mark.asyncio
+async def test_lru_eviction_skips_pinned_sessions(registry):
+    pinned = registry.acquire("a")
+    registry.get("b")
+    registry.get("c")
+
+    assert "a" in registry and "b" not in registry and "c" in registry
+
+    registry.release("a")
+    registry.get("d")
+    assert "a" not in registry and len(registry) == 2
+    assert registry.get("a") is not pinned
+    await registry.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_session_notebooks_follow_the_spark_engine(registry):
+    """Live and new sessions are attached to SPARK; evicted and shut down ones are detached."""
+    spark = MagicMock()
+    alice = registry.get("alice")
+    registry.attach_spark(spark)
+    spark.attach.assert_called_once_with("alice", alice.notebook)
+
+    registry.get("bob")
+    registry.get("carol")
+    assert [call.args[0] for call in spark.attach.call_args_list] == ["alice", "bob", "carol"]
+    spark.detach.assert_called_once_with("alice")
+
+    await registry.shutdown()
+    assert sorted(call.args[0] for call in spark.detach.call_args_list[1:]) == ["bob", "carol"]
+
+
+@pytest.mark.asyncio
+async def test_condense_history_reads_the_sessions_latest_thread(registry):
+    """Background condensation builds the thread of the session's latest reply, without a new message."""
+    agent = registry.get("alice")
+    agent.context_builder = MagicMock()
+    agent.context_builder.build.return_value = [{"role": "user", "content": "old", "com_id": "c1"}, {"role": "user", "content": ""}]
+    agent.condensation_engine = AsyncMock()
+    agent.condensation_engine.condense.side_effect = lambda history: history
+
+    with patch("backend.core.agent.head_agent.get_latest_reply", return_value=None) as latest:
+        assert await agent.condense_history() is False
+    latest.assert_called_once_with("alice")
+    agent.condensation_engine.condense.assert_not_called()
+
+    with patch("backend.core.agent.head_agent.get_latest_reply", return_value=MagicMock(com_id="c9")):
+        assert await agent.condense_history() is False
+    assert agent.context_builder.build.call_args.args[:2] == ("c9", "")
+    agent.condensation_engine.condense.assert_awaited_once_with([{"role": "user", "content": "old", "com_id": "c1"}])
+
+
+@pytest.mark.asyncio
+async def test_process_message_saves_with_session_id(registry):
+    agent = registry.get("alice")
+    agent.llm_service.send_message.return_value = "Hi"
+
+    with patch("backend.core.agent.head_agent.get_recent_messages", return_value=[]) as mock_get, \
+         patch("backend.core.agent.head_agent.save_message") as mock_save:
+        async for _ in agent.process_message("Hello", thread_scoped=False):
+            pass
+
+    assert mock_get.call_args.kwargs["session_id"] == "alice"
+    assert {call.args[0].session_id for call in mock_save.call_args_list} == {"alice"}
+
+
+@pytest.mark.timeout(30)
+def test_websocket_hello_binds_session(registry):
+    """A hello with session_id routes the connection's turns to that session's agent."""
+    used = []
+
+    async def fake_process(self, content, **kwargs):
+        used.append(self.session_id)
+        yield "ok"
+
+    with patch("backend.api.websocket.handlers.sessions", registry), \
+         patch.object(HeadAgent, "process_message", fake_process), \
+         patch.object(HeadAgent, "sync_recall_index", AsyncMock(return_value=0)), \
+         patch("backend.api.websocket.handlers.save_message"):
+        with TestClient(app).websocket_connect("/ws") as websocket:
+            websocket.receive_json()
+            websocket.send_json({"type": "hello", "session_id": "alice"})
+            assert websocket.receive_json()["session_id"] == "alice"
+            assert "alice" in registry._pins
+
+            websocket.send_json({"content": "Hello"})
+            while websocket.receive_json()["type"] != "stream_end":
+                pass
+
+            websocket.send_json({"type": "hello", "session_id": "bad/id"})
+            assert websocket.receive_json()["type"] == "error"
+
+        # The handler unpins the session once it has seen the disconnect
+        for _ in range(100):
+            if "alice" not in registry._pins:
+                break
+            time.sleep(0.01)
+
+    assert used == ["alice"]
+    assert "alice" not in registry._pins
@@ -0,0 +1,26 @@
+"""Tests for the shared asyncio helpers."""
+
+import asyncio
+import pytest
+
+from backend.core.utils import wait_event
+
+
+@pytest.mark.asyncio
+async def test_wait_event_reports_set_or_timeout():
+    event = asyncio.Event()
+    assert await wait_event(event, 0.01) is False
+
+    asyncio.get_running_loop().call_later(0.01, event.set)
+    assert await wait_event(event, 2) is True
+
+
+@pytest.mark.asyncio
+async def test_wait_event_is_cancellable():
+    """Cancelling the waiting task always ends it."""
+    event = asyncio.Event()
+    task = asyncio.create_task(wait_event(event, None))
+    await asyncio.sleep(0)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
@@ -0,0 +1,62 @@
+"""Tests for the semantic answer cache."""
+from backend.core.agent.answer_cache import SemanticAnswerCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_similar_question_hits_under_same_fingerprint():
+    cache = SemanticAnswerCache(threshold=0.9)
+    assert cache.store("What's on my notebook?", "Two open tasks.", fingerprint="v1")
+
+    hit = cache.lookup("what's on my NOTEBOOK", "v1")
+    assert hit is not None
+    assert hit.answer == "Two open tasks."
+    assert hit.similarity >= 0.9
+    assert cache.lookup("What is the capital of France?", "v1") is None
+
+
+def test_fingerprint_change_invalidates():
+    cache = SemanticAnswerCache()
+    cache.store("Summarise my tasks please", "Nothing pending.", fingerprint="v1")
+
+    assert cache.lookup("Summarise my tasks please", "v2") is None
+    assert len(cache) == 0
+    assert cache.lookup("Summarise my tasks please", None) is None
+
+
+def test_answers_are_scoped_to_their_thread_position():
+    cache = SemanticAnswerCache()
+    cache.store("What did I just ask you about?", "Your tax return.", "v1", scope="thread-a")
+
+    assert cache.lookup("What did I just ask you about?", "v1", scope="thread-b") is None
+    assert cache.lookup("What did I just ask you about?", "v1") is None
+    hit = cache.lookup("What did I just ask you about?", "v1", scope="thread-a")
+    assert hit is not None and hit.answer == "Your tax return."
+    # Other positions are not evicted by a miss
+    assert len(cache) == 1
+
+
+def test_ttl_lru_and_context_invalidation():
+    clock = FakeClock()
+    cache = SemanticAnswerCache(ttl_seconds=60, max_entries=2, clock=clock)
+    cache.store("first question about tasks", "A", "v1", context_key="ctx-a")
+    cache.store("second question about notes", "B", "v1", context_key="ctx-b")
+    cache.store("third question about plans", "C", "v1")
+    assert cache.lookup("first question about tasks", "v1") is None
+
+    assert cache.invalidate_context("ctx-b") == 1
+    assert cache.lookup("second question about notes", "v1") is None
+
+    clock.now = 61
+    assert cache.lookup("third question about plans", "v1") is None
+
+
+def test_short_or_disabled_is_never_cached():
+    assert not SemanticAnswerCache().store("yes", "Done.", "v1")
+    assert not SemanticAnswerCache(max_entries=0).store("Summarise my tasks please", "Done.", "v1")
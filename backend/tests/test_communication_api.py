@@ -38,6 +38,7 @@ def client(monkeypatch, tmp_path):
         exitor_com_id TEXT,
         is_condensed BOOLEAN DEFAULT FALSE,
         condensed_summary TEXT,
+        session_id TEXT NOT NULL DEFAULT 'default',
         FOREIGN KEY (initiator_com_id) REFERENCES communications(com_id),
         FOREIGN KEY (exitor_com_id) REFERENCES communications(com_id)
     )""")
@@ -123,3 +124,19 @@ def test_get_chain_not_found(client):
     fake_id = str(uuid.uuid4())
     response = client.get(f"/api/v1/communications/{fake_id}/chain")
     assert response.status_code == 404
+
+def test_get_latest_reply(client):
+    """/latest returns the newest assistant message, or null before the first reply."""
+    response = client.get("/api/v1/communications/latest")
+    assert response.status_code == 200
+    assert response.json() is None
+
+    s1 = save_message(CommunicationCreate(sender="user", recipient="assistant", raw_content="Q1", initiator_com_id=None))
+    s2 = save_message(CommunicationCreate(sender="assistant", recipient="user", raw_content="A1", initiator_com_id=s1.com_id))
+    save_message(CommunicationCreate(sender="user", recipient="assistant", raw_content="Q2", initiator_com_id=s2.com_id))
+    alice = save_message(CommunicationCreate(sender="assistant", recipient="user", raw_content="Hi Alice", session_id="alice"))
+
+    response = client.get("/api/v1/communications/latest")
+    assert response.status_code == 200
+    assert response.json()["com_id"] == s2.com_id
+    assert client.get("/api/v1/communications/latest?session_id=alice").json()["com_id"] == alice.com_id
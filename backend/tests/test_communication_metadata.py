@@ -110,9 +110,10 @@ async def ws_endpoint(websocket: WebSocket):
 client = TestClient(app)
 
 @patch("backend.api.websocket.handlers.save_message")
-@patch("backend.api.websocket.handlers.head_agent")
-def test_save_message_failure_does_not_break_chat(mock_agent, mock_save):
+@patch("backend.api.websocket.handlers.sessions")
+def test_save_message_failure_does_not_break_chat(mock_sessions, mock_save):
     """Test that chat continues even if save_message fails."""
+    mock_agent = mock_sessions.get.return_value
     # Mock save_message to raise exception
     mock_save.side_effect = Exception("DB Error")
 
@@ -143,10 +144,14 @@ def test_save_message_failure_does_not_break_chat(mock_agent, mock_save):
         assert end["type"] == "stream_end"
         assert end.get("ai_com_id") is None
 
+@patch("backend.api.websocket.handlers.get_message")
 @patch("backend.api.websocket.handlers.save_message")
-@patch("backend.api.websocket.handlers.head_agent")
-def test_ws_payload_includes_com_ids(mock_agent, mock_save):
+@patch("backend.api.websocket.handlers.sessions")
+def test_ws_payload_includes_com_ids(mock_sessions, mock_save, mock_get_message):
     """Test that stream_start and stream_end include com_ids."""
+    mock_agent = mock_sessions.get.return_value
+    mock_agent.session_id = "default"
+    mock_get_message.return_value = MagicMock(session_id="default")
 
     # Mock user save
     user_uuid = uuid.uuid4()
@@ -199,3 +204,69 @@ def test_ws_payload_includes_com_ids(mock_agent, mock_save):
         args, _ = mock_save.call_args_list[1]
         assert args[0].sender == "assistant"
         assert str(args[0].initiator_com_id) == str(user_uuid)
+        assert args[0].session_id == "default"
+
+
+@patch("backend.api.websocket.handlers.get_message")
+@patch("backend.api.websocket.handlers.save_message")
+@patch("backend.api.websocket.handlers.sessions")
+def test_ws_rejects_thread_of_another_session(mock_sessions, mock_save, mock_get_message):
+    """A last_com_id saved by another session is refused before anything is saved."""
+    mock_agent = mock_sessions.get.return_value
+    mock_agent.session_id = "default"
+    mock_get_message.return_value = MagicMock(session_id="alice")
+
+    with client.websocket_connect("/ws") as websocket:
+        websocket.receive_json()  # Welcome
+        websocket.send_json({"content": "Hello", "last_com_id": "alice-reply"})
+        error = websocket.receive_json()
+        assert error["type"] == "error"
+        assert error["last_com_id"] == "alice-reply"
+
+    mock_save.assert_not_called()
+    mock_agent.process_message.assert_not_called()
+
+
+@patch("backend.api.websocket.handlers.get_message")
+@patch("backend.api.websocket.handlers.save_message")
+@patch("backend.api.websocket.handlers.sessions")
+def test_ws_regenerate_versions_reply(mock_sessions, mock_save, mock_get_message):
+    """A regeneration links a new reply version to the original user message without saving the user again."""
+    mock_agent = mock_sessions.get.return_value
+    mock_agent.session_id = "default"
+    mock_agent.can_regenerate.side_effect = lambda com_id: com_id == "old-reply"
+    mock_get_message.return_value = MagicMock(initiator_com_id="user-com")
+    new_reply = MagicMock()
+    new_reply.com_id = "new-reply"
+    mock_save.return_value = new_reply
+
+    async def token_generator(com_id):
+        yield "Fresh answer"
+    mock_agent.regenerate.side_effect = token_generator
+
+    with client.websocket_connect("/ws") as websocket:
+        websocket.receive_json()  # Welcome
+
+        websocket.send_json({"type": "regenerate", "com_id": "expired-reply"})
+        error = websocket.receive_json()
+        assert error["type"] == "error"
+        assert error["com_id"] == "expired-reply"
+
+        websocket.send_json({"type": "regenerate", "com_id": "old-reply"})
+        start = websocket.receive_json()
+        assert start["type"] == "stream_start"
+        assert start["user_com_id"] == "user-com"
+        assert start["regenerates"] == "old-reply"
+        assert websocket.receive_json()["token"] == "Fresh answer"
+        end = websocket.receive_json()
+        assert end["type"] == "stream_end"
+        assert end["ai_com_id"] == "new-reply"
+        assert end["replaces_com_id"] == "old-reply"
+
+    mock_agent.regenerate.assert_called_once_with("old-reply")
+    mock_agent.process_message.assert_not_called()
+    assert mock_save.call_count == 1
+    saved = mock_save.call_args[0][0]
+    assert saved.sender == "assistant"
+    assert saved.initiator_com_id == "user-com"
+    mock_agent.remember_reply.assert_called_once_with("new-reply")
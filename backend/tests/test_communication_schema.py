@@ -24,6 +24,7 @@ def db():
             exitor_com_id TEXT,
             is_condensed BOOLEAN DEFAULT FALSE,
             condensed_summary TEXT,
+            session_id TEXT NOT NULL DEFAULT 'default',
             FOREIGN KEY (initiator_com_id) REFERENCES communications(com_id),
             FOREIGN KEY (exitor_com_id) REFERENCES communications(com_id)
         )
@@ -51,7 +52,7 @@ def test_communications_table_exists(db):
     expected = {
         "com_id", "sender", "recipient", "timestamp",
         "raw_content", "initiator_com_id", "exitor_com_id",
-        "is_condensed", "condensed_summary"
+        "is_condensed", "condensed_summary", "session_id"
     }
     assert expected == columns
 
@@ -9,7 +9,7 @@ from backend.core.communication.service import (
     CommunicationCreate,
     Communication
 )
-from backend.core.communication.service import get_chain, get_full_message, get_conversation_start
+from backend.core.communication.service import get_chain, get_full_message, get_conversation_start, get_thread_history
 
 class PersistentConnection(sqlite3.Connection):
     """A connection that ignores close() calls to persist state in tests."""
@@ -38,6 +38,7 @@ def mock_db():
         exitor_com_id TEXT,
         is_condensed BOOLEAN DEFAULT FALSE,
         condensed_summary TEXT,
+        session_id TEXT NOT NULL DEFAULT 'default',
         FOREIGN KEY (initiator_com_id) REFERENCES communications(com_id),
         FOREIGN KEY (exitor_com_id) REFERENCES communications(com_id)
     )""")
@@ -220,6 +221,22 @@ def test_get_chain_three_messages_from_end(mock_db):
     assert chain[1].com_id == m2.com_id
     assert chain[2].com_id == m3.com_id
 
+def test_get_thread_history_pages_newest_first(mock_db):
+    """Walks back from a com_id, newest first, returning at most limit rows."""
+    prev = None
+    ids = []
+    for i in range(5):
+        msg = save_message(CommunicationCreate(sender="u", recipient="a", raw_content=str(i), initiator_com_id=prev))
+        ids.append(msg.com_id)
+        prev = msg.com_id
+
+    page = get_thread_history(ids[3], limit=3)
+    assert [m.com_id for m in page] == [ids[3], ids[2], ids[1]]
+
+    rest = get_thread_history(page[-1].initiator_com_id, limit=3)
+    assert [m.com_id for m in rest] == [ids[0]]
+    assert get_thread_history("fake-id") == []
+
 def test_get_chain_non_existent(mock_db):
     """Returns empty list for a non-existent com_id."""
     chain = get_chain("fake-id")
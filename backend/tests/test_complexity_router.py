@@ -0,0 +1,60 @@
+"""Tests for complexity-based model tier routing."""
+
+import pytest
+from backend.core.llm.complexity import FAST, FULL, ComplexityRouter, message_features
+from backend.core.metrics import metrics
+
+
+@pytest.fixture
+def router():
+    return ComplexityRouter(fast_model="fast-model")
+
+
+@pytest.mark.parametrize("text", ["thanks!", "Thank you so much!", "ok", "What is the capital of France?"])
+def test_easy_turns_go_to_fast_tier(router, text):
+    decision = router.route(text)
+    assert decision.tier == FAST
+    assert decision.model == "fast-model"
+
+
+@pytest.mark.parametrize("text", [
+    "Why does my python function raise a KeyError when I query the database?",
+    "Explain the trade-offs between REST and gRPC for a microservice architecture",
+    "Fix this:\n```\ndef f(x):\n    return x[0]\n```",
+    "word " * 200,
+])
+def test_hard_turns_go_to_full_tier(router, text):
+    decision = router.route(text)
+    assert decision.tier == FULL
+    assert decision.model is None
+
+
+def test_features_and_score():
+    features = message_features("Why? Explain 2 things.\nThanks", history_turns=100)
+    assert features["questions"] == 1
+    assert features["reasoning_terms"] == 2
+    assert features["numbers"] == 1
+    assert features["lines"] == 1
+    assert features["history_turns"] == 20
+
+    router = ComplexityRouter(weights={"bias": 0.0})
+    assert router.score(features) == 0.5
+
+
+def test_override_and_force():
+    forced_fast = ComplexityRouter(fast_model="fast-model", override="fast")
+    assert forced_fast.route("Explain and design a distributed database").tier == FAST
+    assert forced_fast.route("thanks", force=FULL).tier == FAST
+
+    assert ComplexityRouter(fast_model="fast-model", override="full").route("thanks").tier == FULL
+    assert ComplexityRouter(fast_model="fast-model").route("thanks", force=FULL).reason == "forced"
+
+    with pytest.raises(ValueError):
+        ComplexityRouter(override="medium")
+
+
+def test_without_fast_model_everything_is_full():
+    before = metrics.get_counter("llm.tier.routed.full")
+    decision = ComplexityRouter().route("thanks")
+    assert (decision.tier, decision.model, decision.reason) == (FULL, None, "no_fast_model")
+    assert metrics.get_counter("llm.tier.routed.full") == before + 1
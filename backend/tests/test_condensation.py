@@ -1,5 +1,5 @@
 import unittest
-from unittest.mock import AsyncMock, MagicMock
+from unittest.mock import AsyncMock, MagicMock, patch
 from backend.core.memory.condensation import CondensationEngine
 from backend.core.llm.service import LLMService
 from backend.core.memory.token_counter import TokenCounter
@@ -134,5 +134,31 @@ class TestCondensationEngine(unittest.IsolatedAsyncioTestCase):
         self.assertTrue(summary_msg["condensed"])
         self.assertEqual(summary_msg["message_count"], 5)
 
+    async def test_failed_condensation_is_not_persisted(self):
+        # Case 11: the failure placeholder must never be written over the messages
+        messages = [{"role": "user", "content": str(i), "com_id": str(i)} for i in range(15)]
+        self.mock_token_counter.needs_condensation.return_value = True
+
+        with patch("backend.core.memory.condensation.mark_condensed") as mark:
+            self.mock_llm.send_message.side_effect = Exception("LLM Error")
+            await self.engine.condense(messages)
+            mark.assert_not_called()
+
+            self.mock_llm.send_message.side_effect = None
+            self.mock_llm.send_message.return_value = "summary"
+            await self.engine.condense(messages)
+            mark.assert_called_once_with(["3", "4", "5", "6", "7"], "summary")
+
+    async def test_recondensed_summary_marks_the_rows_it_covers(self):
+        # Case 12: a summary from an earlier run is folded into the new one
+        messages = [{"role": "user", "content": str(i), "com_id": str(i)} for i in range(15)]
+        messages[4] = {"role": "system", "content": "old summary", "condensed": True, "com_ids": ["a", "b"]}
+        self.mock_token_counter.needs_condensation.return_value = True
+        self.mock_llm.send_message.return_value = "new summary"
+
+        with patch("backend.core.memory.condensation.mark_condensed") as mark:
+            await self.engine.condense(messages)
+            mark.assert_called_once_with(["3", "a", "b", "5", "6", "7"], "new summary")
+
 if __name__ == "__main__":
     unittest.main()
@@ -35,7 +35,8 @@ class TestCondensationLink(unittest.TestCase):
                 initiator_com_id TEXT,
                 exitor_com_id TEXT,
                 is_condensed BOOLEAN DEFAULT FALSE,
-                condensed_summary TEXT
+                condensed_summary TEXT,
+                session_id TEXT NOT NULL DEFAULT 'default'
             )
         """)
         conn.commit()
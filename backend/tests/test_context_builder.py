@@ -1,7 +1,11 @@
+import sqlite3
 import pytest
 from unittest.mock import AsyncMock, patch
 from backend.core.agent.head_agent import HeadAgent
 from backend.core.memory import CondensationEngine
+from backend.core.communication.service import save_message as save_communication
+from backend.core.memory.condensation_link import mark_condensed
+from backend.models.communication import CommunicationCreate
 from backend.models.message import Message
 from datetime import datetime
 
@@ -142,3 +146,90 @@ async def test_no_condensation_when_engine_none(head_agent, mock_llm_service, mo
     messages = call_args.kwargs["messages"]
 
     assert len(messages) == 3 # System + Hi + Hello
+
+class PersistentConnection(sqlite3.Connection):
+    """A connection that ignores close() calls to persist state in tests."""
+    def close(self):
+        pass
+
+    def force_close(self):
+        super().close()
+
+@pytest.fixture
+def thread_db():
+    """In-memory communications schema shared by the service and worker threads."""
+    conn = sqlite3.connect(":memory:", factory=PersistentConnection, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("""CREATE TABLE communications (
+        com_id TEXT PRIMARY KEY, sender TEXT NOT NULL, recipient TEXT NOT NULL,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP, raw_content TEXT NOT NULL,
+        initiator_com_id TEXT, exitor_com_id TEXT,
+        is_condensed BOOLEAN DEFAULT FALSE, condensed_summary TEXT,
+        session_id TEXT NOT NULL DEFAULT 'default')""")
+    conn.execute("CREATE TABLE initiator_log (id INTEGER PRIMARY KEY AUTOINCREMENT, com_id TEXT NOT NULL UNIQUE, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)")
+    with patch("backend.core.communication.service.get_db_connection", return_value=conn), \
+         patch("backend.core.memory.condensation_link.get_db_connection", return_value=conn):
+        yield conn
+    conn.force_close()
+
+def _save_thread(contents):
+    ids = []
+    prev = None
+    for i, content in enumerate(contents):
+        comm = save_communication(CommunicationCreate(
+            sender="user" if i % 2 == 0 else "assistant",
+            recipient="assistant" if i % 2 == 0 else "user",
+            raw_content=content,
+            initiator_com_id=prev
+        ))
+        ids.append(comm.com_id)
+        prev = comm.com_id
+    return ids
+
+def test_thread_history_is_scoped_budgeted_and_has_com_ids(head_agent, thread_db):
+    thread_a = _save_thread([f"alpha message {i} " + "word " * 20 for i in range(30)])
+    _save_thread(["beta unrelated message"])
+
+    history = head_agent._build_conversation_history("next", last_com_id=thread_a[-1], thread_scoped=True)
+    assert history[-1] == {"role": "user", "content": "next"}
+    assert all("beta" not in msg["content"] for msg in history)
+    assert [msg["com_id"] for msg in history[:-1]] == thread_a[-(len(history) - 1):]
+
+    head_agent.history_token_budget = 200
+    small = head_agent._build_conversation_history("next", last_com_id=thread_a[-1], thread_scoped=True)
+    assert 1 < len(small) < len(history)
+    assert head_agent.token_counter.count_messages_tokens(small) <= 200
+    assert small[-2]["com_id"] == thread_a[-1]
+
+    # A new thread has no history at all
+    assert head_agent._build_conversation_history("hi", last_com_id=None, thread_scoped=True) == [
+        {"role": "user", "content": "hi"}
+    ]
+
+def test_thread_history_reuses_condensed_summaries_and_cached_counts(head_agent, thread_db):
+    thread = _save_thread([f"message {i}" for i in range(6)])
+    mark_condensed(thread[1:4], "[com_id: x] earlier discussion")
+
+    with patch.object(head_agent.token_counter, "count_tokens", wraps=head_agent.token_counter.count_tokens) as counted:
+        history = head_agent._build_conversation_history("now", last_com_id=thread[-1], thread_scoped=True)
+        first_calls = counted.call_count
+        head_agent._build_conversation_history("again", last_com_id=thread[-1], thread_scoped=True)
+        # Only the current message is counted again
+        assert counted.call_count == first_calls + 1
+
+    assert [msg["content"] for msg in history] == [
+        "message 0", "[com_id: x] earlier discussion", "message 4", "message 5", "now"
+    ]
+    assert history[1]["condensed"] is True
+    assert history[1]["com_ids"] == thread[1:4]
+
+@pytest.mark.asyncio
+async def test_thread_scoped_turn_strips_bookkeeping_keys(head_agent, mock_llm_service, mock_db_funcs, thread_db):
+    thread = _save_thread(["Hi", "Hello!"])
+
+    async for _ in head_agent.process_message("How are you?", last_com_id=thread[-1]):
+        pass
+
+    messages = mock_llm_service.send_message.call_args.kwargs["messages"]
+    assert [msg["content"] for msg in messages[1:]] == ["Hi", "Hello!", "How are you?"]
+    assert all(set(msg) == {"role", "content"} for msg in messages)
@@ -0,0 +1,49 @@
+"""Tests for the turn context snapshot cache."""
+from backend.core.agent.context_cache import ContextSnapshotCache, context_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _context(text):
+    return [{"role": "system", "content": "System"}, {"role": "user", "content": text}]
+
+
+def test_identical_contexts_share_one_entry():
+    cache = ContextSnapshotCache()
+    first = cache.put(_context("Hello"))
+    assert cache.put(_context("Hello")) == first == context_key(_context("Hello"))
+    assert cache.put(_context("Other")) != first
+    assert len(cache) == 2
+
+
+def test_snapshot_is_isolated_from_caller_mutation():
+    cache = ContextSnapshotCache()
+    messages = _context("Hello")
+    cache.bind("reply-1", cache.put(messages), message_id=7)
+    messages[1]["content"] = "Changed"
+
+    cached = cache.lookup("reply-1")
+    assert cached.messages == _context("Hello")
+    assert cached.message_id == 7
+
+
+def test_lru_eviction_and_expiry():
+    clock = FakeClock()
+    cache = ContextSnapshotCache(max_entries=2, ttl_seconds=60, clock=clock)
+    cache.bind("a", cache.put(_context("A")))
+    cache.bind("b", cache.put(_context("B")))
+    assert cache.lookup("a") is not None      # "a" is now most recently used
+    cache.bind("c", cache.put(_context("C")))
+
+    assert cache.lookup("b") is None
+    assert cache.lookup("a") is not None
+
+    clock.now = 61
+    assert cache.lookup("a") is None
+    assert cache.lookup("unknown") is None
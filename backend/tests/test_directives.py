@@ -0,0 +1,59 @@
+"""Tests for the streaming [NOTE:]/[COMPLETE:] directive parser."""
+
+import re
+from backend.core.agent.directives import DirectiveParser
+
+
+def run(chunks):
+    parser = DirectiveParser()
+    emitted = [parser.feed(chunk) for chunk in chunks]
+    emitted.append(parser.finish())
+    return emitted, parser.directives
+
+
+def test_directive_split_across_tokens_is_stripped():
+    """Tags never reach the output even when split at arbitrary points."""
+    emitted, directives = run(["Sure. [NO", "TE: buy", " milk] Anything", " else?"])
+
+    assert "".join(emitted) == "Sure.  Anything else?"
+    assert [(d.kind, d.content) for d in directives] == [("note", " buy milk")]
+
+
+def test_clean_text_is_emitted_immediately():
+    """Only a potential tag prefix is held back."""
+    parser = DirectiveParser()
+    assert parser.feed("Hello world ") == "Hello world "
+    assert parser.feed("see [COMP") == "see "
+    assert parser.feed("LETE: Task A]done") == "done"
+    assert parser.directives[0].kind == "complete"
+    assert parser.directives[0].content.strip() == "Task A"
+
+
+def test_non_directive_brackets_pass_through():
+    """Brackets that are not directives, or never close on the line, are released verbatim."""
+    text = "Use a[0] and [link](url). [NOTE: unterminated\nnext line [note"
+    emitted, directives = run(list(text))
+
+    assert "".join(emitted) == text
+    assert directives == []
+
+
+def test_matches_regex_semantics_for_every_split():
+    """Output equals the original regex-based cleanup regardless of tokenization."""
+    text = "A [note: one] B [COMPLETE: two] C [NOTE: x [y] D [NOT: z]"
+    expected = re.sub(r"\[(NOTE|COMPLETE):(.*?)\]", "", text, flags=re.IGNORECASE)
+
+    for size in range(1, len(text) + 1):
+        chunks = [text[i:i + size] for i in range(0, len(text), size)]
+        emitted, directives = run(chunks)
+        assert "".join(emitted) == expected
+        assert [d.content.strip() for d in directives] == ["one", "two", "x [y"]
+
+
+def test_runaway_directive_is_released():
+    """A directive body longer than the cap is treated as plain text."""
+    parser = DirectiveParser(max_directive_chars=10)
+    out = parser.feed("[NOTE: " + "x" * 20) + parser.finish()
+
+    assert out == "[NOTE: " + "x" * 20
+    assert parser.directives == []
@@ -1,7 +1,13 @@
+import asyncio
+import os
+import time
 import pytest
 from unittest.mock import AsyncMock, patch
 from backend.core.agent.head_agent import HeadAgent
+from backend.core.agent.deadline import TurnDeadline
+from backend.core.llm.complexity import ComplexityRouter
 from backend.models.message import Message
+from backend.core.metrics import metrics
 from datetime import datetime
 
 # Mock data
@@ -181,3 +187,319 @@ async def test_process_message_llm_error(head_agent, mock_llm_service, mock_db_f
     assert mock_save.call_count == 2
     assert mock_save.call_args_list[1][0][0].sender == "assistant"
     assert mock_save.call_args_list[1][0][0].content == response
+
+@pytest.mark.asyncio
+async def test_process_message_cancel_persists_partial(head_agent, mock_llm_service, mock_db_funcs):
+    """Closing the generator mid-stream aborts the LLM stream and saves the partial reply once."""
+    _, mock_save = mock_db_funcs
+    upstream_closed = []
+
+    async def long_stream():
+        try:
+            for token in ["Partial ", "answer ", "that ", "never ", "ends"]:
+                yield token
+        finally:
+            upstream_closed.append(True)
+
+    mock_llm_service.send_message.return_value = long_stream()
+    head_agent._update_user_profile = AsyncMock()
+    head_agent._message_count_since_last_update = head_agent.user_profile_update_interval - 1
+
+    with patch.object(head_agent.condensation_engine, "condense", side_effect=lambda msgs: msgs):
+        stream = head_agent.process_message("Hello AI")
+        assert await stream.__anext__() == "Partial "
+        assert await stream.__anext__() == "answer "
+        await stream.aclose()
+
+    assert upstream_closed == [True]
+    assert mock_save.call_count == 2
+    assert mock_save.call_args_list[1][0][0].content == "Partial answer "
+    head_agent._update_user_profile.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_cancel_during_context_assembly_settles_stage_tasks(head_agent, mock_llm_service, mock_db_funcs):
+    """A turn cancelled before streaming cancels its condensation and still saves the user message."""
+    _, mock_save = mock_db_funcs
+    condense_started = asyncio.Event()
+    condense_cancelled = []
+
+    async def hanging_condense(messages):
+        condense_started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            condense_cancelled.append(True)
+            raise
+        return messages
+
+    head_agent.turn_budget_ms = 0
+    tasks_before = asyncio.all_tasks()
+
+    async def consume():
+        return [token async for token in head_agent.process_message("Hello AI")]
+
+    with patch.object(head_agent.condensation_engine, "condense", side_effect=hanging_condense):
+        turn = asyncio.create_task(consume())
+        await asyncio.wait_for(condense_started.wait(), timeout=2)
+        turn.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await turn
+
+    assert condense_cancelled == [True]
+    # No stage task outlives the turn
+    assert asyncio.all_tasks() - tasks_before - {asyncio.current_task()} == set()
+    assert [call[0][0].sender for call in mock_save.call_args_list] == ["user"]
+    mock_llm_service.send_message.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_process_message_records_stage_timings(head_agent, mock_llm_service, mock_db_funcs):
+    """Each pipeline stage is timed and history is read before the user message is saved."""
+    mock_get, mock_save = mock_db_funcs
+    mock_get.return_value = [
+        Message(id=1, sender="user", content="Earlier question", timestamp=datetime.now()),
+    ]
+
+    with patch.object(head_agent.condensation_engine, "condense", side_effect=lambda msgs: msgs):
+        tokens = [token async for token in head_agent.process_message("Hello AI")]
+
+    assert "".join(tokens) == "Mock AI Response"
+    for stage in ("system_prompt", "history", "context_total", "ttft", "total"):
+        assert stage in head_agent.last_turn_timings
+    assert head_agent.last_turn_timings["ttft"] <= head_agent.last_turn_timings["total"]
+
+    # The current message appears exactly once in the prompt
+    messages = mock_llm_service.send_message.call_args.kwargs["messages"]
+    assert [m["content"] for m in messages if m["role"] == "user"] == ["Earlier question", "Hello AI"]
+
+
+@pytest.mark.asyncio
+async def test_slow_condensation_degrades_to_raw_window(head_agent, mock_llm_service, mock_db_funcs):
+    """Condensation that overruns the turn budget is replaced by the raw history window."""
+    mock_get, _ = mock_db_funcs
+    mock_get.return_value = [
+        Message(id=1, sender="user", content="Earlier question", timestamp=datetime.now()),
+    ]
+    condense_finished = asyncio.Event()
+
+    async def slow_condense(messages):
+        await asyncio.sleep(0.2)
+        condense_finished.set()
+        return [{"role": "system", "content": "Summary"}]
+
+    head_agent.turn_budget_ms = 20
+    degraded_before = metrics.get_counter("agent.turn.degraded.condensation")
+
+    with patch.object(head_agent.condensation_engine, "condense", side_effect=slow_condense):
+        tokens = [token async for token in head_agent.process_message("Hello AI")]
+        assert not condense_finished.is_set()
+        # The abandoned condensation still completes in the background
+        await asyncio.wait_for(condense_finished.wait(), timeout=2)
+
+    assert "".join(tokens) == "Mock AI Response"
+    assert "condensation" in head_agent.last_turn_degradations
+    assert metrics.get_counter("agent.turn.degraded.condensation") == degraded_before + 1
+    messages = mock_llm_service.send_message.call_args.kwargs["messages"]
+    assert [m["content"] for m in messages if m["role"] == "user"] == ["Earlier question", "Hello AI"]
+
+
+@pytest.mark.asyncio
+async def test_fast_turn_is_not_degraded(head_agent, mock_db_funcs):
+    """A turn whose context assembles within the budget records no degradations."""
+    head_agent.turn_budget_ms = 5000
+    with patch.object(head_agent.condensation_engine, "condense", side_effect=lambda msgs: msgs):
+        [token async for token in head_agent.process_message("Hello AI")]
+    assert head_agent.last_turn_degradations == []
+
+
+@pytest.mark.asyncio
+async def test_turn_deadline_wait():
+    """TurnDeadline returns finished results, abandons late ones, and never cancels them."""
+
+    async def value(delay, result):
+        await asyncio.sleep(delay)
+        return result
+
+    deadline = TurnDeadline(50)
+    assert await deadline.wait(asyncio.ensure_future(value(0, "fast")), "fast") == (True, "fast")
+    slow = asyncio.ensure_future(value(0.2, "slow"))
+    assert await deadline.wait(slow, "slow") == (False, None)
+    assert deadline.degradations == ["slow"]
+    assert deadline.remaining() == 0.0
+    assert await slow == "slow"
+
+    unlimited = TurnDeadline(0)
+    assert unlimited.remaining() is None
+    assert await unlimited.wait(asyncio.ensure_future(value(0.01, "done")), "any") == (True, "done")
+
+
+@pytest.mark.asyncio
+async def test_regenerate_reuses_cached_context(head_agent, mock_llm_service, mock_db_funcs):
+    """A regeneration resends the exact cached context and replaces the stored reply."""
+    mock_get, mock_save = mock_db_funcs
+    mock_save.return_value = Message(id=42, sender="assistant", content="Mock AI Response", timestamp=datetime.now())
+
+    with patch.object(head_agent.condensation_engine, "condense", side_effect=lambda msgs: msgs):
+        [token async for token in head_agent.process_message("Hello AI")]
+    head_agent.remember_reply("reply-com-id")
+    first_messages = mock_llm_service.send_message.call_args.kwargs["messages"]
+
+    mock_get.reset_mock()
+    mock_save.reset_mock()
+    mock_llm_service.send_message.return_value = async_generator(["Another ", "answer"])
+    with patch.object(head_agent, "build_system_prompt") as mock_prompt, \
+         patch("backend.core.agent.head_agent.update_message_content", return_value=True) as mock_update:
+        tokens = [token async for token in head_agent.regenerate("reply-com-id")]
+
+    assert "".join(tokens) == "Another answer"
+    assert mock_llm_service.send_message.call_args.kwargs["messages"] == first_messages
+    # No context assembly and no new rows
+    mock_prompt.assert_not_called()
+    mock_get.assert_not_called()
+    mock_save.assert_not_called()
+    mock_update.assert_called_once_with(42, "Another answer")
+
+    # The regenerated reply can itself be regenerated
+    head_agent.remember_reply("second-reply-com-id")
+    assert head_agent.can_regenerate("second-reply-com-id")
+
+
+@pytest.mark.asyncio
+async def test_regenerate_unknown_reply_raises(head_agent):
+    assert not head_agent.can_regenerate("missing")
+    with pytest.raises(LookupError):
+        [token async for token in head_agent.regenerate("missing")]
+
+
+@pytest.mark.asyncio
+async def test_process_message_routes_easy_turn_to_fast_tier(head_agent, mock_llm_service, mock_db_funcs):
+    """Small talk is sent to the fast model and its latency is recorded under that tier."""
+    head_agent.complexity_router = ComplexityRouter(fast_model="fast-model")
+    with patch.object(head_agent.condensation_engine, "condense", side_effect=lambda msgs: msgs):
+        [token async for token in head_agent.process_message("thanks!")]
+
+    assert mock_llm_service.send_message.call_args.kwargs["model"] == "fast-model"
+    assert head_agent.last_turn_route.tier == "fast"
+    assert "llm.tier.fast.total_ms" in metrics.snapshot()["timings"]
+
+
+@pytest.mark.asyncio
+async def test_repeated_question_is_replayed_from_answer_cache(head_agent, mock_llm_service, mock_db_funcs):
+    """A repeated question is answered without the LLM until the notebook changes."""
+    _, mock_save = mock_db_funcs
+    _age_files(head_agent.agent_files_dir)
+    with patch.object(head_agent.condensation_engine, "condense", side_effect=lambda msgs: msgs):
+        first = [token async for token in head_agent.process_message("What is on my notebook?")]
+
+        mock_save.reset_mock()
+        with patch.object(head_agent, "_build_conversation_history") as mock_history:
+            replay = [token async for token in head_agent.process_message("what is on my notebook")]
+        mock_history.assert_not_called()
+
+    assert "".join(replay) == "".join(first) == "Mock AI Response"
+    assert len(replay) > 1  # streamed, not sent as one block
+    assert mock_llm_service.send_message.call_count == 1
+    assert [call[0][0].sender for call in mock_save.call_args_list] == ["user", "assistant"]
+
+    # A notebook change invalidates the cached answer
+    head_agent._append_notebook_entry("New task")
+    _age_files(head_agent.agent_files_dir)
+    mock_llm_service.send_message.return_value = async_generator(["Fresh ", "answer"])
+    with patch.object(head_agent.condensation_engine, "condense", side_effect=lambda msgs: msgs):
+        fresh = [token async for token in head_agent.process_message("What is on my notebook?")]
+    assert "".join(fresh) == "Fresh answer"
+    assert mock_llm_service.send_message.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_answer_cache_is_scoped_to_the_thread(head_agent, mock_llm_service, mock_db_funcs):
+    """The same question in another thread is answered afresh, not replayed."""
+    _age_files(head_agent.agent_files_dir)
+    question = "What did we decide about the venue?"
+
+    def history(message, last_com_id=None, thread_scoped=False):
+        return [{"role": "user", "content": message}]
+
+    with patch.object(head_agent.condensation_engine, "condense", side_effect=lambda msgs: msgs), \
+         patch.object(head_agent, "_build_conversation_history", side_effect=history):
+        [token async for token in head_agent.process_message(question, last_com_id="thread-a")]
+
+        mock_llm_service.send_message.return_value = async_generator(["Other ", "thread"])
+        other = [token async for token in head_agent.process_message(question, last_com_id="thread-b")]
+        assert "".join(other) == "Other thread"
+        assert mock_llm_service.send_message.call_count == 2
+
+        again = [token async for token in head_agent.process_message(question, last_com_id="thread-a")]
+    assert "".join(again) == "Mock AI Response"
+    assert mock_llm_service.send_message.call_count == 2
+
+
+def _age_files(directory, seconds=10):
+    """Backdate mtimes so files are outside the racy-mtime window and cacheable."""
+    past = time.time() - seconds
+    for path in directory.iterdir():
+        os.utime(path, (past, past))
+
+
+def test_read_file_cache_revalidates_on_change(head_agent):
+    """Unchanged files are served from cache; edits are picked up via mtime/size."""
+    _age_files(head_agent.agent_files_dir)
+    assert head_agent._read_file("AGENT.md") == MOCK_AGENT_MD
+
+    with patch("pathlib.Path.read_text") as mock_read:
+        assert head_agent._read_file("AGENT.md") == MOCK_AGENT_MD
+        mock_read.assert_not_called()
+
+    (head_agent.agent_files_dir / "AGENT.md").write_text("Updated Agent")
+    assert head_agent._read_file("AGENT.md") == "Updated Agent"
+
+
+def test_system_prompt_trims_notebook_then_profile_to_ceiling(head_agent):
+    """Over-budget prompts lose old notes first, then profile details; identity files stay."""
+    dir_ = head_agent.agent_files_dir
+    (dir_ / "USER.md").write_text(
+        "# User Profile\n\n## Name\nAlice\n\n## Interests & Topics\nLikes astronomy. Reads a lot."
+        "\n\nAdditionally: " + "Collects vintage telescopes and star charts. " * 20
+    )
+    for i in range(40):
+        head_agent._append_notebook_entry(f"Remember detail number {i} about the project")
+
+    full = head_agent._assemble_system_prompt()
+    full_tokens = head_agent.token_counter.count_tokens(full)
+
+    head_agent.system_prompt_ceiling = full_tokens - 50
+    prompt = head_agent._assemble_system_prompt()
+    assert head_agent.token_counter.count_tokens(prompt) <= head_agent.system_prompt_ceiling
+    assert "older notes omitted" in prompt
+    assert "detail number 39" in prompt
+    assert "vintage telescopes" in prompt
+
+    head_agent.system_prompt_ceiling = full_tokens - 400
+    prompt = head_agent._assemble_system_prompt()
+    assert head_agent.token_counter.count_tokens(prompt) <= head_agent.system_prompt_ceiling
+    assert "vintage telescopes" not in prompt
+    assert "Likes astronomy" in prompt
+    assert MOCK_AGENT_MD in prompt and MOCK_SOUL_MD in prompt
+
+    assert metrics.snapshot()["gauges"]["agent.system_prompt.tokens.agent"] > 0
+    assert metrics.get_counter("agent.system_prompt.trimmed.profile") >= 1
+
+
+def test_system_prompt_memoized_until_source_changes(head_agent):
+    """The prompt and its token count are rebuilt only when a source file changes."""
+    _age_files(head_agent.agent_files_dir)
+    first = head_agent.build_system_prompt()
+    tokens = head_agent.system_prompt_tokens(first)
+
+    with patch.object(head_agent, "_assemble_system_prompt") as mock_assemble, \
+         patch.object(head_agent.token_counter, "count_tokens") as mock_count:
+        assert head_agent.build_system_prompt() is first
+        assert head_agent.system_prompt_tokens(first) == tokens
+        mock_assemble.assert_not_called()
+        mock_count.assert_not_called()
+
+    head_agent._append_notebook_entry("New task")
+    second = head_agent.build_system_prompt()
+    assert "New task" in second
+    assert second is not first
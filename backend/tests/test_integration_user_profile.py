@@ -1,5 +1,7 @@
+import asyncio
 import pytest
 import os
+import sys
 from unittest.mock import AsyncMock
 from backend.core.agent.head_agent import HeadAgent
 from backend.models.message import MessageCreate
@@ -58,3 +60,41 @@ async def test_integration_update_user_profile(head_agent, test_db):
     content = (head_agent.agent_files_dir / "USER.md").read_text(encoding="utf-8")
     assert "## Name" in content
     assert "Integration User" in content
+
+@pytest.mark.asyncio
+async def test_backfill_user_profile_covers_whole_history(head_agent, test_db, monkeypatch):
+    agent_module = sys.modules[HeadAgent.__module__]
+    monkeypatch.setattr(agent_module, "PROFILE_BATCH_TOKENS", 50)
+    monkeypatch.setattr(agent_module, "PROFILE_BACKFILL_PAGE_SIZE", 7)
+    for i in range(30):
+        save_message(MessageCreate(sender="user", content=f"History message {i} about astronomy"))
+
+    in_flight = 0
+    peak = 0
+    seen = []
+
+    async def analyse(messages, **kwargs):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        seen.append(messages[0]["content"])
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return "## Interests & Topics\nAstronomy"
+
+    head_agent.llm_service.send_message = AsyncMock(side_effect=analyse)
+
+    batches = await head_agent.backfill_user_profile(max_concurrency=2)
+
+    assert batches == len(seen) > 1
+    assert peak <= 2
+    transcript = "".join(seen)
+    assert all(f"History message {i} " in transcript for i in range(30))
+    assert head_agent.profile_updater.analysed_message_id == get_recent_messages(limit=1)[0].id
+
+    content = (head_agent.agent_files_dir / "USER.md").read_text(encoding="utf-8")
+    assert content.count("Astronomy") == 1
+
+    # Incremental updates continue from the backfill watermark
+    await head_agent._update_user_profile()
+    assert head_agent.llm_service.send_message.call_count == batches
@@ -0,0 +1,190 @@
+"""Tests for latency-aware multi-endpoint routing and failover."""
+
+import json
+import re
+import httpx
+import pytest
+from unittest.mock import patch
+from openai import AsyncOpenAI
+from backend.core.llm.router import LLMEndpoint, LLMRouter
+from backend.core.llm.scheduler import LLMScheduler
+from backend.core.llm.service import LLMService
+
+
+def stub_endpoint(name, reply="ok", fail=False, calls=None, status=503):
+    """Build an endpoint backed by an in-process OpenAI-compatible stub server."""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        if calls is not None:
+            calls.append((name, body["model"]))
+        if fail:
+            return httpx.Response(status, json={"error": {"message": f"{name} unavailable"}})
+        if body.get("stream"):
+            chunks = [
+                {"id": "c", "object": "chat.completion.chunk", "created": 0, "model": body["model"],
+                 "choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}]}
+                for word in re.findall(r"\S+\s*", reply)
+            ]
+            sse = "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in chunks) + "data: [DONE]\n\n"
+            return httpx.Response(200, text=sse, headers={"content-type": "text/event-stream"})
+        return httpx.Response(200, json={
+            "id": "c", "object": "chat.completion", "created": 0, "model": body["model"],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        })
+
+    client = AsyncOpenAI(
+        api_key="sk-test",
+        base_url=f"http://{name}.test/v1",
+        max_retries=0,
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+    return LLMEndpoint(name=name, client=client, base_url=f"http://{name}.test/v1")
+
+
+@pytest.fixture
+def make_service():
+    def _make(endpoints, router=None):
+        with patch("backend.core.llm.service.settings") as mock_settings:
+            mock_settings.llm_api_key = "sk-test"
+            mock_settings.llm_model_name = "test-model"
+            return LLMService(
+                scheduler=LLMScheduler(max_concurrency=4),
+                endpoints=endpoints,
+                router=router or LLMRouter([e.name for e in endpoints]),
+            )
+    return _make
+
+
+def test_router_prefers_fastest_healthy_endpoint():
+    """Ranking follows EWMA latency and benches failing endpoints."""
+    router = LLMRouter(["a", "b"], alpha=0.5, failure_threshold=2, cooldown_seconds=60)
+    router.record_success("a", "m", ttft_ms=900, output_tokens=100, duration_ms=2900)
+    router.record_success("b", "m", ttft_ms=100, output_tokens=100, duration_ms=600)
+    assert router.rank("m") == ["b", "a"]
+
+    router.record_failure("b", "m", RuntimeError("boom"))
+    assert router.rank("m")[0] == "b"  # single failure does not bench
+    router.record_failure("b", "m", RuntimeError("boom"))
+    assert router.rank("m") == ["a", "b"]
+
+    stats = router.get_metrics()
+    assert stats["endpoints"]["b"]["m"]["healthy"] is False
+    assert stats["preferred"]["m"] == "a"
+
+
+def test_router_stats_are_per_model():
+    """Latency history for one model does not affect another."""
+    router = LLMRouter(["a", "b"])
+    router.record_success("a", "slow-model", ttft_ms=5000, output_tokens=1, duration_ms=5000)
+    router.record_success("b", "slow-model", ttft_ms=100, output_tokens=1, duration_ms=100)
+    assert router.rank("slow-model") == ["b", "a"]
+    assert router.rank("other-model") == ["a", "b"]
+
+
+def test_router_untried_and_failed_endpoints_rank_last():
+    """Unknown endpoints get a pessimistic prior instead of being tried first."""
+    router = LLMRouter(["a", "b", "c"], prior_latency_ms=10000)
+    router.record_success("c", "m", ttft_ms=800, output_tokens=1, duration_ms=800)
+    assert router.rank("m") == ["c", "a", "b"]
+
+    # A failure without any success counts against the prior too
+    router.record_failure("a", "m", RuntimeError("boom"))
+    assert router.rank("m") == ["c", "b", "a"]
+    assert router.get_metrics()["endpoints"]["a"]["m"]["expected_latency_ms"] == 20000
+
+
+@pytest.mark.asyncio
+async def test_non_streaming_failover(make_service):
+    """A failing primary is skipped transparently."""
+    calls = []
+    service = make_service([
+        stub_endpoint("primary", fail=True, calls=calls),
+        stub_endpoint("backup", reply="from backup", calls=calls),
+    ])
+
+    result = await service.send_message([{"role": "user", "content": "hi"}])
+
+    assert result == "from backup"
+    assert [name for name, _ in calls] == ["primary", "backup"]
+    endpoints = service.router.get_metrics()["endpoints"]
+    assert endpoints["primary"]["test-model"]["failures"] == 1
+    assert endpoints["backup"]["test-model"]["requests"] == 1
+
+
+@pytest.mark.asyncio
+async def test_streaming_failover_before_first_token(make_service):
+    """Streaming requests fail over when the endpoint errors before any output."""
+    service = make_service([
+        stub_endpoint("primary", fail=True),
+        stub_endpoint("backup", reply="hello from backup"),
+    ])
+
+    tokens = []
+    async for token in await service.send_message([{"role": "user", "content": "hi"}], stream=True):
+        tokens.append(token)
+
+    assert "".join(tokens) == "hello from backup"
+    stats = service.router.get_metrics()["endpoints"]["backup"]["test-model"]
+    assert stats["ttft_ms_ewma"] is not None
+
+
+@pytest.mark.asyncio
+async def test_client_errors_do_not_fail_over(make_service):
+    """A 4xx is raised as is (the request would fail anywhere), except 408/429."""
+    calls = []
+    service = make_service([
+        stub_endpoint("primary", fail=True, status=400, calls=calls),
+        stub_endpoint("backup", calls=calls),
+    ])
+    with pytest.raises(Exception):
+        await service.send_message([{"role": "user", "content": "hi"}])
+    with pytest.raises(Exception):
+        async for _ in await service.send_message([{"role": "user", "content": "hi"}], stream=True):
+            pass
+    assert [name for name, _ in calls] == ["primary", "primary"]
+    assert service.router.get_metrics()["endpoints"]["primary"]["test-model"]["failures"] == 0
+
+    calls.clear()
+    service = make_service([
+        stub_endpoint("primary", fail=True, status=429, calls=calls),
+        stub_endpoint("backup", reply="from backup", calls=calls),
+    ])
+    assert await service.send_message([{"role": "user", "content": "hi"}]) == "from backup"
+    assert [name for name, _ in calls] == ["primary", "backup"]
+
+
+def test_configured_clients_have_timeouts():
+    """Endpoints built from settings fail fast instead of using the 600 s client default."""
+    with patch("backend.core.llm.service.settings") as mock_settings:
+        mock_settings.llm_api_key = "sk-test"
+        mock_settings.llm_base_url = "http://primary.test/v1"
+        mock_settings.llm_endpoints = []
+        mock_settings.llm_connect_timeout = 3.0
+        mock_settings.llm_read_timeout = 20.0
+        endpoint = LLMService._endpoints_from_settings()[0]
+    assert endpoint.client.timeout.connect == 3.0
+    assert endpoint.client.timeout.read == 20.0
+
+
+@pytest.mark.asyncio
+async def test_all_endpoints_failing_raises(make_service):
+    """When every endpoint fails the last error reaches the caller."""
+    service = make_service([stub_endpoint("primary", fail=True), stub_endpoint("backup", fail=True)])
+
+    with pytest.raises(Exception):
+        await service.send_message([{"role": "user", "content": "hi"}])
+
+
+@pytest.mark.asyncio
+async def test_model_aliases_per_endpoint(make_service):
+    """Each endpoint may map the requested model to its own model name."""
+    calls = []
+    backup = stub_endpoint("backup", calls=calls)
+    backup.model_aliases = {"openrouter/free": "local-small"}
+    service = make_service([stub_endpoint("primary", fail=True, calls=calls), backup])
+
+    await service.send_message([{"role": "user", "content": "hi"}], model="openrouter/free")
+
+    assert calls[-1] == ("backup", "local-small")
@@ -0,0 +1,151 @@
+"""Tests for the priority-aware LLM request scheduler."""
+
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from backend.core.llm.scheduler import LLMScheduler, LaneConfig, TokenBucket, INTERACTIVE, BACKGROUND
+from backend.core.llm.service import LLMService
+
+
+def make_scheduler(max_concurrency=1, interactive=1, background=1, background_tpm=0):
+    return LLMScheduler(
+        max_concurrency=max_concurrency,
+        lanes={
+            INTERACTIVE: LaneConfig(max_concurrency=interactive),
+            BACKGROUND: LaneConfig(max_concurrency=background, tokens_per_minute=background_tpm),
+        },
+    )
+
+
+@pytest.mark.asyncio
+async def test_interactive_admitted_before_queued_background():
+    """When a slot frees up, queued interactive work goes first."""
+    scheduler = make_scheduler()
+    order = []
+
+    await scheduler.acquire(BACKGROUND)
+
+    async def worker(lane, name):
+        async with scheduler.slot(lane):
+            order.append(name)
+
+    bg = asyncio.create_task(worker(BACKGROUND, "background"))
+    await asyncio.sleep(0)
+    inter = asyncio.create_task(worker(INTERACTIVE, "interactive"))
+    await asyncio.sleep(0)
+
+    assert scheduler.queue_depth(BACKGROUND) == 1
+    assert scheduler.queue_depth(INTERACTIVE) == 1
+
+    scheduler.release(BACKGROUND)
+    await asyncio.gather(bg, inter)
+
+    assert order == ["interactive", "background"]
+
+
+@pytest.mark.asyncio
+async def test_lane_concurrency_limit():
+    """Background lane never exceeds its own concurrency limit."""
+    scheduler = make_scheduler(max_concurrency=4, interactive=4, background=1)
+
+    await scheduler.acquire(BACKGROUND)
+    waiter = asyncio.create_task(scheduler.acquire(BACKGROUND))
+    await asyncio.sleep(0)
+    assert not waiter.done()
+
+    # Interactive still has headroom
+    await asyncio.wait_for(scheduler.acquire(INTERACTIVE), timeout=1)
+
+    scheduler.release(BACKGROUND)
+    await asyncio.wait_for(waiter, timeout=1)
+    assert scheduler.get_metrics()["lanes"][BACKGROUND]["active"] == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_is_dropped():
+    """A cancelled waiter does not consume a slot or block the queue."""
+    scheduler = make_scheduler()
+    await scheduler.acquire(INTERACTIVE)
+
+    waiter = asyncio.create_task(scheduler.acquire(INTERACTIVE))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    assert scheduler.queue_depth() == 0
+    scheduler.release(INTERACTIVE)
+    assert scheduler.get_metrics()["active"] == 0
+
+
+def test_token_bucket_budget():
+    """Token bucket reports a wait once the budget is spent."""
+    bucket = TokenBucket(tokens_per_minute=600)
+    assert bucket.time_until_available(600) == 0
+    bucket.consume(600)
+    assert bucket.time_until_available(60) > 0
+
+    assert TokenBucket(tokens_per_minute=0).time_until_available(10**9) == 0
+
+
+@pytest.mark.asyncio
+async def test_token_budget_delays_background():
+    """Background work over its token budget waits for the bucket to refill."""
+    scheduler = make_scheduler(max_concurrency=2, interactive=2, background=2, background_tpm=60)
+
+    async with scheduler.slot(BACKGROUND, estimated_tokens=60):
+        pass
+
+    waiter = asyncio.create_task(scheduler.acquire(BACKGROUND, estimated_tokens=60))
+    await asyncio.sleep(0.05)
+    assert not waiter.done()
+    assert scheduler.queue_depth(BACKGROUND) == 1
+    waiter.cancel()
+
+
+@pytest.mark.asyncio
+async def test_budget_retry_is_only_moved_earlier():
+    """Dispatches while a waiter is over budget keep the sooner pending retry instead of resetting it."""
+    scheduler = make_scheduler(max_concurrency=2, interactive=2, background=2, background_tpm=60)
+    loop = asyncio.get_running_loop()
+
+    scheduler._schedule_retry(0.5)
+    first = scheduler._retry_handle
+    scheduler._schedule_retry(5.0)
+    assert scheduler._retry_handle is first and not first.cancelled()
+
+    scheduler._schedule_retry(0.1)
+    assert first.cancelled()
+    assert scheduler._retry_handle.when() <= loop.time() + 0.1
+
+    # Once the retry has fired, a later one can be scheduled again
+    await asyncio.sleep(0.15)
+    assert scheduler._retry_handle is None
+    scheduler._schedule_retry(5.0)
+    assert scheduler._retry_handle is not None
+    scheduler._retry_handle.cancel()
+
+
+@pytest.mark.asyncio
+async def test_llm_service_uses_requested_lane():
+    """LLMService routes calls through the scheduler lane given by priority."""
+    scheduler = make_scheduler()
+    with patch("backend.core.llm.service.settings") as mock_settings:
+        mock_settings.llm_api_key = "sk-test"
+        mock_settings.llm_model_name = "test-model"
+        mock_settings.llm_base_url = None
+        service = LLMService(scheduler=scheduler)
+
+    mock_response = MagicMock()
+    mock_response.choices = [MagicMock()]
+    mock_response.choices[0].message.content = "ok"
+
+    with patch.object(service.client.chat.completions, "create", new_callable=AsyncMock) as mock_create:
+        mock_create.return_value = mock_response
+        result = await service.send_message([{"role": "user", "content": "hi"}], priority=BACKGROUND)
+
+    assert result == "ok"
+    lanes = scheduler.get_metrics()["lanes"]
+    assert lanes[BACKGROUND]["admitted"] == 1
+    assert lanes[INTERACTIVE]["admitted"] == 0
+    assert scheduler.get_metrics()["active"] == 0
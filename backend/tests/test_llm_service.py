@@ -109,3 +109,44 @@ async def test_error_handling(llm_service_instance):
 
         with pytest.raises(Exception, match="API Error"):
             await llm_service_instance.send_message(messages)
+
+
+@pytest.mark.asyncio
+async def test_streaming_close_aborts_upstream(llm_service_instance):
+    """Closing the token generator closes the upstream HTTP stream and frees the slot."""
+    class MockChunk:
+        def __init__(self, content):
+            self.choices = [MagicMock()]
+            self.choices[0].delta.content = content
+
+    class MockStream:
+        def __init__(self):
+            self.closed = False
+
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            return MockChunk("token")
+
+        async def close(self):
+            self.closed = True
+
+    upstream = MockStream()
+    with patch.object(
+        llm_service_instance.client.chat.completions,
+        "create",
+        new_callable=AsyncMock
+    ) as mock_create:
+        mock_create.return_value = upstream
+
+        response_gen = await llm_service_instance.send_message(
+            [{"role": "user", "content": "Hello"}],
+            stream=True
+        )
+        assert await response_gen.__anext__() == "token"
+        assert llm_service_instance.scheduler.get_metrics()["active"] == 1
+        await response_gen.aclose()
+
+    assert upstream.closed is True
+    assert llm_service_instance.scheduler.get_metrics()["active"] == 0
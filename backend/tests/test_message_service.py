@@ -6,6 +6,8 @@ from backend.services.message_service import (
     save_message,
     get_all_messages,
     get_recent_messages,
+    get_messages_after,
+    update_message_content,
     clear_all_messages
 )
 from backend.models.message import MessageCreate
@@ -45,7 +47,8 @@ def db_connection(monkeypatch):
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             sender TEXT NOT NULL,
             content TEXT NOT NULL,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            session_id TEXT NOT NULL DEFAULT 'default'
         )
     """)
     conn.commit()
@@ -84,6 +87,47 @@ def test_get_recent_messages(db_connection):
     assert recent[0].content == "Msg 5"
     assert recent[-1].content == "Msg 9"
 
+def test_get_messages_after(db_connection):
+    saved = [save_message(MessageCreate(sender="user", content=f"Msg {i}")) for i in range(6)]
+
+    page = get_messages_after(saved[1].id, limit=3)
+    assert [m.content for m in page] == ["Msg 2", "Msg 3", "Msg 4"]
+    assert get_messages_after(saved[-1].id) == []
+
+def test_queries_filter_by_session(db_connection):
+    save_message(MessageCreate(sender="user", content="Default"))
+    first = save_message(MessageCreate(sender="user", content="Alice 1", session_id="alice"))
+    save_message(MessageCreate(sender="user", content="Bob 1", session_id="bob"))
+    save_message(MessageCreate(sender="user", content="Alice 2", session_id="alice"))
+
+    assert [m.content for m in get_recent_messages(session_id="alice")] == ["Alice 1", "Alice 2"]
+    assert [m.content for m in get_recent_messages(session_id="default")] == ["Default"]
+    assert len(get_recent_messages()) == 4
+    assert [m.content for m in get_messages_after(first.id, session_id="alice")] == ["Alice 2"]
+
+def test_init_db_adds_session_column_to_old_schema(monkeypatch, tmp_path):
+    from backend.database import db
+
+    db_file = tmp_path / "old.db"
+    conn = sqlite3.connect(db_file)
+    conn.execute("CREATE TABLE messages (id INTEGER PRIMARY KEY AUTOINCREMENT, sender TEXT NOT NULL, "
+                 "content TEXT NOT NULL, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)")
+    conn.execute("INSERT INTO messages (sender, content) VALUES ('user', 'legacy')")
+    conn.execute("CREATE TABLE communications (com_id TEXT PRIMARY KEY, sender TEXT NOT NULL, "
+                 "recipient TEXT NOT NULL, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP, raw_content TEXT NOT NULL, "
+                 "initiator_com_id TEXT, exitor_com_id TEXT, is_condensed BOOLEAN DEFAULT FALSE, condensed_summary TEXT)")
+    conn.execute("INSERT INTO communications (com_id, sender, recipient, raw_content) VALUES ('c1', 'user', 'assistant', 'legacy')")
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(db, "DB_PATH", db_file)
+
+    db.init_db()
+
+    conn = sqlite3.connect(db_file)
+    assert conn.execute("SELECT session_id FROM messages").fetchone()[0] == "default"
+    assert conn.execute("SELECT session_id FROM communications").fetchone()[0] == "default"
+    conn.close()
+
 def test_clear_all_messages(db_connection):
     save_message(MessageCreate(sender="user", content="Msg 1"))
     save_message(MessageCreate(sender="assistant", content="Msg 2"))
@@ -93,3 +137,10 @@ def test_clear_all_messages(db_connection):
 
     messages = get_all_messages()
     assert len(messages) == 0
+
+def test_update_message_content(db_connection):
+    saved = save_message(MessageCreate(sender="assistant", content="First answer"))
+
+    assert update_message_content(saved.id, "Second answer") is True
+    assert [m.content for m in get_all_messages()] == ["Second answer"]
+    assert update_message_content(saved.id + 100, "Nobody") is False
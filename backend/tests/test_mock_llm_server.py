@@ -0,0 +1,106 @@
+"""Tests for the bundled OpenAI-compatible mock LLM server."""
+
+import time
+import httpx
+import pytest
+from unittest.mock import patch
+from openai import AsyncOpenAI
+from backend.core.agent.head_agent import HeadAgent
+from backend.core.llm.router import LLMEndpoint, LLMRouter
+from backend.core.llm.scheduler import LLMScheduler
+from backend.core.llm.service import LLMService
+
+
+def service_for(server):
+    """LLMService whose only endpoint is the mock server."""
+    client = AsyncOpenAI(api_key="mock", base_url=server.base_url, max_retries=0)
+    with patch("backend.core.llm.service.settings") as mock_settings:
+        mock_settings.llm_api_key = "mock"
+        mock_settings.llm_model_name = "mock-model"
+        return LLMService(
+            scheduler=LLMScheduler(max_concurrency=4),
+            endpoints=[LLMEndpoint(name="mock", client=client, base_url=server.base_url)],
+            router=LLMRouter(["mock"]),
+        )
+
+
+@pytest.mark.timeout(30)
+@pytest.mark.asyncio
+async def test_non_streaming_echo(mock_llm_server):
+    """Non-streaming requests echo the last user message."""
+    service = service_for(mock_llm_server)
+    reply = await service.send_message([
+        {"role": "system", "content": "ignored"},
+        {"role": "user", "content": "ping pong"},
+    ])
+    assert reply == "ping pong"
+    assert mock_llm_server.stats.requests == 1
+
+
+@pytest.mark.timeout(30)
+@pytest.mark.asyncio
+async def test_streaming_canned_response(mock_llm_server):
+    """Streaming returns the canned response split into multiple chunks."""
+    mock_llm_server.config.mode = "canned"
+    mock_llm_server.config.canned_response = "one two three"
+    service = service_for(mock_llm_server)
+
+    tokens = [t async for t in await service.send_message([{"role": "user", "content": "x"}], stream=True)]
+
+    assert "".join(tokens) == "one two three"
+    assert len(tokens) == 3
+    assert mock_llm_server.stats.streamed == 1
+
+
+@pytest.mark.timeout(30)
+@pytest.mark.asyncio
+async def test_configured_latency(mock_llm_server):
+    """Time-to-first-token honours ttft_ms."""
+    mock_llm_server.config.ttft_ms = 150
+    service = service_for(mock_llm_server)
+
+    started = time.monotonic()
+    stream = await service.send_message([{"role": "user", "content": "hello"}], stream=True)
+    async for _ in stream:
+        break
+    assert time.monotonic() - started >= 0.15
+    await stream.aclose()
+
+
+@pytest.mark.timeout(30)
+@pytest.mark.asyncio
+async def test_error_injection(mock_llm_server):
+    """An error rate of 1.0 fails every request with the configured status."""
+    mock_llm_server.config.error_rate = 1.0
+    mock_llm_server.config.error_status = 429
+    service = service_for(mock_llm_server)
+
+    with pytest.raises(Exception):
+        await service.send_message([{"role": "user", "content": "hi"}])
+    assert mock_llm_server.stats.errors == 1
+
+
+@pytest.mark.timeout(30)
+def test_runtime_config_endpoint(mock_llm_server):
+    """Behaviour can be changed over HTTP during a load test."""
+    root = mock_llm_server.base_url.rsplit("/v1", 1)[0]
+    response = httpx.post(f"{root}/mock/config", json={"ttft_ms": 42, "mode": "canned"})
+    assert response.status_code == 200
+    assert mock_llm_server.config.ttft_ms == 42
+    assert httpx.get(f"{root}/mock/stats").json()["requests"] == 0
+
+
+@pytest.mark.timeout(30)
+@pytest.mark.asyncio
+async def test_head_agent_end_to_end(mock_llm_server, tmp_path):
+    """HeadAgent streams a full turn through the real OpenAI client and the mock server."""
+    for name in ("AGENT.md", "SOUL.md", "USER.md", "NOTEBOOK.md"):
+        (tmp_path / name).write_text("")
+    agent = HeadAgent(llm_service=service_for(mock_llm_server))
+    agent.agent_files_dir = tmp_path
+
+    with patch("backend.core.agent.head_agent.save_message"), \
+         patch("backend.core.agent.head_agent.get_recent_messages", return_value=[]):
+        tokens = [t async for t in agent.process_message("echo this back")]
+
+    assert "".join(tokens) == "echo this back"
@@ -0,0 +1,86 @@
+"""Tests for the rotated notebook archive."""
+
+import gzip
+from datetime import datetime, timedelta
+from backend.core.memory.notebook_archive import NotebookArchive, ARCHIVE_HEADER
+
+
+def test_append_creates_header_once(tmp_path):
+    archive = NotebookArchive(tmp_path)
+    archive.append(["[COMPLETED] 2024-01-01 - A"])
+    archive.append(["[COMPLETED] 2024-01-02 - B"])
+
+    content = (tmp_path / "archived_notebook.md").read_text()
+    assert content == ARCHIVE_HEADER + "[COMPLETED] 2024-01-01 - A\n[COMPLETED] 2024-01-02 - B"
+
+
+def test_size_rotation_compresses_segment(tmp_path):
+    """A full active segment is gzipped into notebook_archive/ and listed in the manifest."""
+    archive = NotebookArchive(tmp_path, max_segment_bytes=200)
+    for i in range(20):
+        archive.append([f"[COMPLETED] 2024-01-01 - Entry number {i}"])
+
+    assert archive.segments
+    first = archive.segments[0]
+    assert (tmp_path / "notebook_archive" / first["file"]).exists()
+    assert "Entry number 0" in archive.read_segment(first["file"])
+    with gzip.open(tmp_path / "notebook_archive" / first["file"]) as gz:
+        assert gz.read().startswith(ARCHIVE_HEADER.encode())
+
+    # Manifest survives a reopen
+    assert NotebookArchive(tmp_path).segments == archive.segments
+
+
+def test_tail_spans_into_newest_segment(tmp_path):
+    """When the active segment is short, the tail continues into the last compressed segment."""
+    archive = NotebookArchive(tmp_path, max_segment_bytes=10_000)
+    archive.append([f"Line {i}" for i in range(10)])
+    archive.rotate()
+    archive.append(["Line 10", "Line 11"])
+
+    assert archive.tail(4).splitlines() == ["Line 8", "Line 9", "Line 10", "Line 11"]
+    assert archive.tail(2).splitlines() == ["Line 10", "Line 11"]
+
+
+def test_tail_reads_only_the_end_of_large_files(tmp_path):
+    """The tail of a large active segment is found by seeking back from its end."""
+    path = tmp_path / "archived_notebook.md"
+    path.write_text("\n".join(f"Line {i}" for i in range(200_000)))
+    archive = NotebookArchive(tmp_path)
+
+    assert archive.tail(3).splitlines() == ["Line 199997", "Line 199998", "Line 199999"]
+
+
+def test_age_rotation(tmp_path):
+    archive = NotebookArchive(tmp_path, max_segment_days=30)
+    archive.append(["Old entry"])
+    archive._manifest["active_started_at"] = (datetime.now() - timedelta(days=31)).isoformat()
+    archive.append(["Newer entry"])
+
+    assert len(archive.segments) == 1
+    assert (tmp_path / "archived_notebook.md").read_text() == ""
+    assert archive.tail(2).splitlines() == ["Old entry", "Newer entry"]
+
+
+def test_interrupted_rotation_is_recovered_once(tmp_path):
+    """A staging file left by a crash is rotated on reopen, unless the manifest already lists it."""
+    archive = NotebookArchive(tmp_path)
+    archive.append(["Entry A"])
+    staging = tmp_path / "notebook_archive" / "archived_notebook.md.rotating"
+
+    # Crash before compression: the reopen finishes the rotation
+    (tmp_path / "archived_notebook.md").replace(staging)
+    reopened = NotebookArchive(tmp_path)
+    assert [segment["file"] for segment in reopened.segments] == ["segment-00001.md.gz"]
+    assert not staging.exists()
+
+    # Crash after the manifest was saved: no duplicate segment
+    reopened.append(["Entry B"])
+    content = (tmp_path / "archived_notebook.md").read_bytes()
+    reopened.rotate()
+    staging.write_bytes(content)
+    again = NotebookArchive(tmp_path)
+    assert len(again.segments) == 2
+    assert not staging.exists()
+    assert again.read_segment("segment-00001.md.gz").endswith("Entry A")
+    assert again.read_segment("segment-00002.md.gz") == "Entry B"
@@ -0,0 +1,87 @@
+"""Tests for fuzzy [COMPLETE: ...] resolution over pending notebook entries."""
+
+import time
+from backend.core.memory.notebook_index import PendingEntryIndex
+from backend.core.memory.notebook_store import NotebookStore
+
+
+def build_index(lines):
+    index = PendingEntryIndex()
+    for entry_id, line in enumerate(lines, start=1):
+        index.add(entry_id, line)
+    return index
+
+
+def test_paraphrased_completion_matches():
+    """Reordered or partially reworded task descriptions still resolve."""
+    index = build_index([
+        "[PENDING] 2024-01-01 10:00 - Call the bank about the mortgage",
+        "[PENDING] 2024-01-01 10:05 - Buy milk and eggs for breakfast",
+        "[PENDING] 2024-01-01 10:10 - Send quarterly report to Alice",
+    ])
+
+    assert index.best_match("bought the eggs and milk")[0] == 2
+    assert index.best_match("quarterly report sent to alice")[0] == 3
+    assert index.best_match("mortgage call with bank")[0] == 1
+
+
+def test_unrelated_completion_is_rejected():
+    """Low-confidence matches fall below the threshold instead of completing the wrong task."""
+    index = build_index(["[PENDING] 2024-01-01 10:00 - Buy milk"])
+
+    assert index.best_match("renew passport") is None
+
+
+def test_exact_substring_wins_and_prefers_oldest():
+    """Verbatim matches keep the original first-match semantics."""
+    index = build_index([
+        "[PENDING] 2024-01-01 - Task A",
+        "[PENDING] 2024-01-01 - Task B",
+        "[PENDING] 2024-01-02 - Task A again",
+    ])
+
+    assert index.best_match("task b") == (2, 1.0)
+    assert index.best_match("Task A") == (1, 1.0)
+
+
+def test_verbatim_entry_outside_the_fuzzy_candidates_wins():
+    """An entry containing the query is found even when many older near-misses outrank it on trigrams."""
+    index = build_index(["[PENDING] - Wash car red"] * 30 + ["[PENDING] - Wash red car"])
+
+    assert index.best_match("red car") == (31, 1.0)
+
+
+def test_removed_entries_are_not_matched():
+    index = build_index(["[PENDING] - Water the plants"])
+    index.remove(1)
+
+    assert index.best_match("water the plants") is None
+    assert len(index) == 0
+
+
+def test_lookup_is_fast_with_thousands_of_entries():
+    """Resolution stays well under a millisecond with a large pending list."""
+    index = build_index([f"[PENDING] 2024-01-01 - Follow up with customer {i} about invoice {i * 7}" for i in range(5000)])
+
+    for query, score in (("customer 4321 invoice", None), ("customer 4321 about invoice", 1.0)):
+        started = time.perf_counter()
+        for _ in range(50):
+            match = index.best_match(query)
+        elapsed_ms = (time.perf_counter() - started) * 1000 / 50
+
+        assert match[0] == 4322
+        assert score is None or match[1] == score
+        assert elapsed_ms < 1
+
+
+def test_store_keeps_index_in_step(tmp_path):
+    """Appends are indexed and completed entries drop out of matching."""
+    (tmp_path / "NOTEBOOK.md").write_text("# Notebook")
+    store = NotebookStore(tmp_path)
+    store.append("[PENDING] 2024-01-01 10:00 - Book flights to Lisbon")
+
+    index = store.find_pending("flights booked for lisbon")
+    assert index == 1
+
+    store.mark_completed(index)
+    assert store.find_pending("flights booked for lisbon") == -1
@@ -75,7 +75,7 @@ def test_archive_completed_entries_direct(head_agent):
 """
     (head_agent.agent_files_dir / "NOTEBOOK.md").write_text(notebook_content)
 
-    head_agent._archive_completed_entries()
+    assert head_agent.archive_completed_entries() == 1
 
     # Verify NOTEBOOK.md only has PENDING
     new_notebook = (head_agent.agent_files_dir / "NOTEBOOK.md").read_text()
@@ -177,3 +177,21 @@ def test_find_entry_index(head_agent):
 
     idx_missing = head_agent._find_entry_index("Task C")
     assert idx_missing == -1
+
+@pytest.mark.asyncio
+async def test_directives_are_not_streamed_to_client(head_agent, mock_llm_service):
+    """Directive tags are stripped from the streamed tokens, not just the saved message."""
+    async def mock_gen():
+        yield "Noted. [NO"
+        yield "TE: Call the bank] I'll "
+        yield "remind you."
+
+    mock_llm_service.send_message.return_value = mock_gen()
+
+    with patch("backend.core.agent.head_agent.save_message") as mock_save, \
+         patch("backend.core.agent.head_agent.get_recent_messages", return_value=[]):
+        streamed = "".join([token async for token in head_agent.process_message("User input")])
+
+    assert streamed == "Noted.  I'll remind you."
+    assert mock_save.call_args_list[1][0][0].content == streamed
+    assert "Call the bank" in (head_agent.agent_files_dir / "NOTEBOOK.md").read_text()
@@ -0,0 +1,149 @@
+"""Tests for the SQLite-backed notebook store."""
+
+import pytest
+from backend.core.memory.notebook_store import NotebookStore
+
+
+@pytest.fixture
+def agent_dir(tmp_path):
+    (tmp_path / "NOTEBOOK.md").write_text("# Notebook\n\n[PENDING] 2024-01-01 10:00 - Existing task")
+    return tmp_path
+
+
+def test_imports_existing_markdown(agent_dir):
+    """Existing NOTEBOOK.md lines become rows and keep their line indexes."""
+    store = NotebookStore(agent_dir)
+    assert len(store) == 3
+    assert store.find_pending("existing") == 2
+    assert store.get_line(0) == "# Notebook"
+
+
+def test_append_is_a_file_append(agent_dir):
+    """Appends extend NOTEBOOK.md without regenerating it."""
+    store = NotebookStore(agent_dir)
+    store.render()
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(store, "_export", lambda: pytest.fail("append must not re-export"))
+        index = store.append("[PENDING] 2024-01-02 09:00 - New task")
+
+    assert index == 3
+    assert (agent_dir / "NOTEBOOK.md").read_text().splitlines()[-1].endswith("New task")
+
+
+def test_complete_and_archive_in_one_batch(agent_dir):
+    """A batch of changes produces a single export and an appended archive."""
+    store = NotebookStore(agent_dir)
+    exports = []
+    original_export = store._export
+    store._export = lambda: (exports.append(True), original_export())
+
+    with store.batch():
+        store.append("[PENDING] 2024-01-02 09:00 - Second task")
+        assert store.mark_completed(store.find_pending("existing"))
+        assert store.mark_completed(store.find_pending("second"))
+        assert store.archive_completed() == 2
+
+    assert len(exports) == 1
+    assert (agent_dir / "NOTEBOOK.md").read_text() == "# Notebook\n"
+    archive = (agent_dir / "archived_notebook.md").read_text()
+    assert archive.startswith("# Archived Notebook Entries")
+    assert "[COMPLETED] 2024-01-01 10:00 - Existing task" in archive
+    assert archive.rstrip().endswith("Second task")
+
+
+def test_state_survives_reopen(agent_dir):
+    """Rows persist in notebook.db and an unchanged export is not re-imported."""
+    store = NotebookStore(agent_dir)
+    store.append("[PENDING] 2024-01-02 09:00 - Persisted task")
+    store.close()
+
+    reopened = NotebookStore(agent_dir)
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(reopened, "_import", lambda content: pytest.fail("unchanged notebook re-imported"))
+        assert reopened.tail(1).endswith("Persisted task")
+
+
+def test_manual_edit_is_imported(agent_dir):
+    """Edits made directly to NOTEBOOK.md win over the stored rows."""
+    store = NotebookStore(agent_dir)
+    store.append("[PENDING] 2024-01-02 09:00 - Task A")
+
+    (agent_dir / "NOTEBOOK.md").write_text("[PENDING] 2024-01-03 - Task B")
+
+    assert store.tail(5) == "[PENDING] 2024-01-03 - Task B"
+    assert store.find_pending("task a") == -1
+    assert store.find_pending("task b") == 0
+
+
+def test_listeners_fire_once_per_commit_and_pending_entries(agent_dir):
+    """Listeners run after each committed change (once per batch); pending_entries lists [PENDING] rows."""
+    store = NotebookStore(agent_dir)
+    store.render()
+    calls = []
+    store.add_listener(lambda: calls.append(1))
+
+    store.append("[PENDING] 2024-01-02 09:00 - Second task")
+    assert len(calls) == 1
+
+    with store.batch():
+        store.mark_completed(store.find_pending("existing"))
+        store.append("[PENDING] 2024-01-03 09:00 - Third task")
+    assert len(calls) == 2
+
+    assert store.pending_entries() == [
+        "[PENDING] 2024-01-02 09:00 - Second task",
+        "[PENDING] 2024-01-03 09:00 - Third task",
+    ]
+
+
+def test_own_writes_skip_the_racy_content_check(agent_dir):
+    """A stamp the store wrote itself is trusted even inside the racy mtime window."""
+    store = NotebookStore(agent_dir)
+    store.append("[PENDING] 2024-01-02 09:00 - Fresh task")
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(store, "_read_notebook_file", lambda: pytest.fail("own export re-read"))
+        assert store.tail(1).endswith("Fresh task")
+        assert store.mark_completed(store.find_pending("fresh"))
+        assert store.pending_entries() == ["[PENDING] 2024-01-01 10:00 - Existing task"]
+
+
+def test_completion_patches_the_export_in_place(agent_dir):
+    """Completions rewrite NOTEBOOK.md only from the changed line; archiving keeps it exact."""
+    store = NotebookStore(agent_dir)
+    store.mark_completed(store.find_pending("existing"))  # first export: full rewrite
+    for n in range(50):
+        store.append(f"[PENDING] 2024-01-02 09:{n:02d} - Task {n}")
+
+    path_type = type(store.notebook_path)
+    write_text = path_type.write_text
+
+    def no_full_export(path, *args, **kwargs):
+        if path == store.notebook_path:
+            pytest.fail("NOTEBOOK.md rewritten in full")
+        return write_text(path, *args, **kwargs)
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(path_type, "write_text", no_full_export)
+        assert store.mark_completed(store.find_pending("task 48"))
+        assert store.mark_completed(store.find_pending("task 7"))
+        assert store.archive_completed() == 3
+        store.append("[INFO] 2024-01-03 - Note")
+
+    assert (agent_dir / "NOTEBOOK.md").read_text() == store.render()
+    assert "Task 48" not in store.render() and store.render().endswith("Note")
+
+
+def test_archive_is_written_after_the_batch_commits(agent_dir):
+    """Archived lines reach the archive file only once the batch commits."""
+    store = NotebookStore(agent_dir)
+    archive_file = agent_dir / "archived_notebook.md"
+
+    with store.batch():
+        store.mark_completed(store.find_pending("existing"))
+        assert store.archive_completed() == 1
+        assert not archive_file.exists() or "Existing task" not in archive_file.read_text()
+
+    assert "[COMPLETED] 2024-01-01 10:00 - Existing task" in archive_file.read_text()
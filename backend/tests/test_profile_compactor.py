@@ -0,0 +1,57 @@
+import pytest
+from unittest.mock import AsyncMock
+
+from backend.core.memory.profile_compactor import ProfileCompactor, split_sentences
+from backend.core.memory.token_counter import token_counter
+
+
+@pytest.fixture
+def compactor():
+    return ProfileCompactor(token_counter=token_counter, default_cap=40, section_caps={"Name": 10})
+
+
+def test_split_sentences_strips_bullets_and_additionally():
+    text = "Likes Python. Works remotely!\n\nAdditionally: - Prefers short answers"
+    assert split_sentences(text) == ["Likes Python.", "Works remotely!", "Prefers short answers"]
+
+
+def test_novel_sentences_drops_near_duplicates(compactor):
+    existing = "The user enjoys Python and Rust programming. Works at a startup."
+    new = "Enjoys Python programming. The user works at a startup. Plays chess on weekends."
+    assert compactor.novel_sentences(existing, new) == ["Plays chess on weekends."]
+
+
+def test_novel_sentences_keeps_sentences_contained_in_longer_ones(compactor):
+    """A sentence whose words all appear in a longer one is not a duplicate of it."""
+    existing = "Used Java for years but now prefers Go for new services."
+    assert compactor.novel_sentences(existing, "Prefers Java.") == ["Prefers Java."]
+
+
+def test_dedupe_keeps_first_wording(compactor):
+    text = "Prefers concise replies.\n\nAdditionally: Prefers concise replies!\n\nAdditionally: Uses Linux."
+    assert compactor.dedupe(text) == "Prefers concise replies. Uses Linux."
+
+
+@pytest.mark.asyncio
+async def test_compact_section_under_cap_is_unchanged(compactor):
+    summarise = AsyncMock()
+    assert await compactor.compact_section("Context", "Works remotely.", summarise) == "Works remotely."
+    summarise.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_compact_section_resummarises_then_trims(compactor):
+    text = " ".join(f"Observation number {i} about topic {i * 7}." for i in range(20))
+
+    summarise = AsyncMock(return_value="Discusses many numbered topics.")
+    assert await compactor.compact_section("Context", text, summarise) == "Discusses many numbered topics."
+    summarise.assert_awaited_once()
+
+    # Summary over the cap (or no summariser): keep the newest sentences that fit
+    summarise = AsyncMock(return_value=text)
+    trimmed = await compactor.compact_section("Context", text, summarise)
+    assert token_counter.count_tokens(trimmed) <= 40
+    assert trimmed.endswith("Observation number 19 about topic 133.")
+
+    name = await compactor.compact_section("Name", "Alexandra " * 30)
+    assert 0 < token_counter.count_tokens(name) <= 10
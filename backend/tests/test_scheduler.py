@@ -0,0 +1,239 @@
+"""Tests for the persistent job scheduler."""
+
+import asyncio
+import sqlite3
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock
+
+from backend.core.agent import AgentSessionRegistry
+from backend.core.scheduler import CronTrigger, IntervalTrigger, JobScheduler, register_maintenance_jobs
+from backend.core.scheduler.store import load_job_states, save_job_state
+from backend.database import db
+
+
+@pytest.fixture(autouse=True)
+def job_db(monkeypatch, tmp_path):
+    db_file = tmp_path / "scheduler.db"
+
+    def connect():
+        conn = sqlite3.connect(str(db_file))
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    monkeypatch.setattr(db, "get_db_connection", connect)
+    db.init_db()
+    return db_file
+
+
+async def _wait_for(predicate, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("condition not reached")
+        await asyncio.sleep(0.01)
+
+
+def test_cron_trigger_next_fire():
+    """Cron fields, steps, weekday and the day/weekday OR rule."""
+    start = datetime(2024, 1, 1, 10, 7)  # a Monday
+    assert CronTrigger("*/15 * * * *").next_fire(start) == datetime(2024, 1, 1, 10, 15)
+    assert CronTrigger("30 3 * * 0").next_fire(start) == datetime(2024, 1, 7, 3, 30)
+    assert CronTrigger("0 0 1 * *").next_fire(start) == datetime(2024, 2, 1, 0, 0)
+    assert CronTrigger("0 9 15 * 1").next_fire(start) == datetime(2024, 1, 8, 9, 0)
+    assert CronTrigger("0 0 29 2 *").next_fire(start) == datetime(2024, 2, 29, 0, 0)
+    with pytest.raises(ValueError):
+        CronTrigger("61 * * * *")
+    with pytest.raises(ValueError):
+        CronTrigger("* * *")
+
+
+@pytest.mark.asyncio
+async def test_interval_job_runs_and_persists():
+    """An interval job runs repeatedly and its state is saved after each run."""
+    scheduler = JobScheduler()
+    runs = []
+    scheduler.add_job("tick", lambda: runs.append(1), IntervalTrigger(0.05))
+
+    await scheduler.start()
+    try:
+        await _wait_for(lambda: len(runs) >= 2)
+    finally:
+        await scheduler.stop()
+
+    await _wait_for(lambda: (load_job_states().get("tick") or {}).get("run_count", 0) >= 1)
+    state = load_job_states()["tick"]
+    assert state["last_status"] == "success"
+    assert state["trigger"] == "interval:0.05s"
+
+
+@pytest.mark.asyncio
+async def test_failed_job_retries_with_backoff():
+    """Failures are retried until max_retries, then the job waits for its next run."""
+    scheduler = JobScheduler()
+    attempts = []
+
+    async def flaky():
+        attempts.append(datetime.now())
+        if len(attempts) < 3:
+            raise RuntimeError("boom")
+
+    job = scheduler.add_job("flaky", flaky, IntervalTrigger(3600), max_retries=3, retry_backoff=0.02)
+    await scheduler.start()
+    scheduler.run_now("flaky")
+    try:
+        await _wait_for(lambda: job.state.get("last_status") == "success")
+    finally:
+        await scheduler.stop()
+
+    assert len(attempts) == 3
+    # Second retry waited roughly twice as long as the first
+    assert attempts[2] - attempts[1] >= timedelta(seconds=0.04)
+    assert job.state["failure_count"] == 2
+    assert job.state["attempts"] == 0
+
+
+@pytest.mark.asyncio
+async def test_run_now_during_a_run_runs_again_after_it():
+    """A manual trigger while the job runs is not lost when the run sets its next regular time."""
+    scheduler = JobScheduler()
+    release = asyncio.Event()
+    runs = []
+
+    async def slow():
+        runs.append(datetime.now())
+        if len(runs) == 1:
+            await release.wait()
+
+    job = scheduler.add_job("slow", slow, IntervalTrigger(3600))
+    await scheduler.start()
+    scheduler.run_now("slow")
+    try:
+        await _wait_for(lambda: job.running)
+        assert scheduler.run_now("slow")
+        release.set()
+        await _wait_for(lambda: (job.state.get("run_count") or 0) == 2)
+    finally:
+        await scheduler.stop()
+
+    assert len(runs) == 2
+    assert not job.rerun
+    assert job.next_run > datetime.now() + timedelta(minutes=30)
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limit_per_job_type():
+    """Jobs of one type never run beyond their limit; other types are unaffected."""
+    scheduler = JobScheduler(concurrency={"heavy": 1})
+    active = {"heavy": 0, "peak": 0}
+    done = []
+
+    async def heavy():
+        active["heavy"] += 1
+        active["peak"] = max(active["peak"], active["heavy"])
+        await asyncio.sleep(0.05)
+        active["heavy"] -= 1
+        done.append(1)
+
+    for name in ("a", "b", "c"):
+        scheduler.add_job(name, heavy, IntervalTrigger(3600), job_type="heavy")
+    await scheduler.start()
+    for name in ("a", "b", "c"):
+        scheduler.run_now(name)
+    try:
+        await _wait_for(lambda: len(done) == 3)
+    finally:
+        await scheduler.stop()
+
+    assert active["peak"] == 1
+    assert scheduler.status()["concurrency"] == {"heavy": 1}
+
+
+@pytest.mark.asyncio
+async def test_missed_run_is_caught_up_once_after_restart():
+    """A run that fell due while stopped executes once on start; catch_up=False skips it."""
+    trigger = CronTrigger("0 3 * * *")
+    missed = datetime.now() - timedelta(days=3)
+    for name in ("nightly", "skippable"):
+        save_job_state({
+            "name": name, "job_type": "default", "trigger": str(trigger),
+            "next_run": missed, "last_status": "success", "run_count": 4,
+        })
+
+    scheduler = JobScheduler()
+    runs = []
+    scheduler.add_job("nightly", lambda: runs.append("nightly"), trigger)
+    scheduler.add_job("skippable", lambda: runs.append("skippable"), trigger, catch_up=False)
+    await scheduler.start()
+    try:
+        await _wait_for(lambda: scheduler.jobs["nightly"].state.get("run_count") == 5)
+        await asyncio.sleep(0.05)
+    finally:
+        await scheduler.stop()
+
+    assert runs == ["nightly"]
+    assert scheduler.jobs["nightly"].next_run > datetime.now()
+    assert scheduler.jobs["skippable"].next_run > datetime.now()
+
+
+def test_status_endpoint_lists_jobs(monkeypatch):
+    """GET /scheduler/jobs reports jobs; POST .../run makes one due or 404s."""
+    from fastapi.testclient import TestClient
+    import backend.api.routes.scheduler as scheduler_routes
+    from backend.main import app
+
+    scheduler = JobScheduler()
+    scheduler.add_job("nightly", lambda: None, CronTrigger("0 3 * * *"), job_type="maintenance")
+    monkeypatch.setattr(scheduler_routes, "scheduler", scheduler)
+    client = TestClient(app)
+
+    body = client.get("/api/v1/scheduler/jobs").json()
+    assert body["running"] is False
+    assert body["jobs"][0]["name"] == "nightly"
+    assert body["jobs"][0]["trigger"] == "cron:0 3 * * *"
+
+    assert client.post("/api/v1/scheduler/jobs/nightly/run").status_code == 200
+    assert client.post("/api/v1/scheduler/jobs/missing/run").status_code == 404
+
+
+def _agent(session_id="default", **kwargs):
+    agent = AsyncMock(session_id=session_id)
+    agent.archive_completed_entries = MagicMock(return_value=0)
+    agent.profile_updater.schedule = MagicMock()
+    agent.profile_updater.turns_since_update = 0
+    agent.condense_history.return_value = False
+    return agent
+
+
+@pytest.mark.asyncio
+async def test_maintenance_jobs_cover_every_live_session(tmp_path):
+    """Per-agent jobs run for the default and each live session agent; evicted ones are skipped."""
+    default = _agent()
+    registry = AgentSessionRegistry(
+        default, sessions_dir=tmp_path, template_dir=tmp_path, max_sessions=1, agent_factory=_agent
+    )
+    alice = registry.get("alice")
+    alice.profile_updater.turns_since_update = 2
+    spark = MagicMock()
+    scheduler = JobScheduler()
+    register_maintenance_jobs(scheduler, registry, spark)
+
+    await scheduler.jobs["profile_update"].func()
+    alice.profile_updater.schedule.assert_called_once()
+    default.profile_updater.schedule.assert_not_called()
+    alice.profile_updater.wait_idle.assert_awaited_once()
+
+    await scheduler.jobs["history_condensation"].func()
+    await scheduler.jobs["notebook_archive"].func()
+    for agent in (default, alice):
+        agent.condense_history.assert_awaited_once()
+        agent.archive_completed_entries.assert_called_once()
+
+    registry.get("bob")  # evicts alice
+    await scheduler.jobs["notebook_archive"].func()
+    assert alice.archive_completed_entries.call_count == 1
+    assert registry.agents()[1].archive_completed_entries.call_count == 1
+
+    await asyncio.to_thread(scheduler.jobs["log_retention"].func)
+    spark.activity_log.rotate.assert_called_once()
+    await registry.shutdown()
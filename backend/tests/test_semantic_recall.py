@@ -0,0 +1,150 @@
+import sqlite3
+import pytest
+import numpy as np
+from unittest.mock import AsyncMock, patch
+
+import backend.core.memory.vector_index as vector_index
+from backend.core.agent.head_agent import HeadAgent
+from backend.core.communication.service import save_message
+from backend.core.memory.embeddings import HashingEmbedder
+from backend.core.memory.recall import MessageRecall
+from backend.core.memory.vector_index import VectorIndex
+from backend.models.communication import CommunicationCreate
+
+
+class PersistentConnection(sqlite3.Connection):
+    """A connection that ignores close() calls to persist state in tests."""
+    def close(self):
+        pass
+
+    def force_close(self):
+        super().close()
+
+
+@pytest.fixture
+def comm_db():
+    conn = sqlite3.connect(":memory:", factory=PersistentConnection, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("""CREATE TABLE communications (
+        com_id TEXT PRIMARY KEY, sender TEXT NOT NULL, recipient TEXT NOT NULL,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP, raw_content TEXT NOT NULL,
+        initiator_com_id TEXT, exitor_com_id TEXT,
+        is_condensed BOOLEAN DEFAULT FALSE, condensed_summary TEXT,
+        session_id TEXT NOT NULL DEFAULT 'default')""")
+    conn.execute("CREATE TABLE initiator_log (id INTEGER PRIMARY KEY AUTOINCREMENT, com_id TEXT NOT NULL UNIQUE, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)")
+    with patch("backend.core.communication.service.get_db_connection", return_value=conn):
+        yield conn
+    conn.force_close()
+
+
+def _save(content, sender="user", prev=None, session_id="default"):
+    return save_message(CommunicationCreate(
+        sender=sender, recipient="assistant" if sender == "user" else "user",
+        raw_content=content, initiator_com_id=prev, session_id=session_id
+    ))
+
+
+def test_hashing_embedder_ranks_related_text_higher():
+    embedder = HashingEmbedder(dim=256)
+    query = embedder.embed("How do I configure the nginx reverse proxy?")
+    related = embedder.embed("The nginx reverse proxy configuration lives in sites-enabled")
+    unrelated = embedder.embed("My favourite pasta recipe uses fresh basil")
+
+    assert np.isclose(np.linalg.norm(query), 1.0)
+    assert float(query @ related) > float(query @ unrelated) + 0.2
+    assert not embedder.embed("the and of").any()
+
+
+def test_vector_index_persists_and_reloads(tmp_path):
+    embedder = HashingEmbedder(dim=64)
+    texts = ["deploy the docker container", "bake sourdough bread", "tune postgres indexes"]
+    index = VectorIndex(tmp_path / "idx", dim=64)
+    index.append(["a", "b", "c"], embedder.embed_many(texts), watermark=3)
+
+    reopened = VectorIndex(tmp_path / "idx", dim=64)
+    assert len(reopened) == 3
+    assert reopened.watermark == 3
+    key, score = reopened.search(embedder.embed("docker container deploy"), k=1)[0]
+    assert key == "a" and score > 0.9
+
+    # A torn append (bytes written, meta not updated) is ignored and overwritten
+    with open(tmp_path / "idx" / "vectors.i8", "ab") as f:
+        f.write(b"\x01" * 64)
+    reopened.append(["d"], embedder.embed_many(["tune postgres vacuum"]))
+    assert list(VectorIndex(tmp_path / "idx", dim=64).keys()) == ["a", "b", "c", "d"]
+
+
+def test_vector_index_ivf_matches_brute_force(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_index, "IVF_MIN_ROWS", 2000)
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(40, 32)).astype(np.float32)
+    labels = rng.integers(0, 40, 3000)
+    vectors = centers[labels] + rng.normal(scale=0.3, size=(3000, 32)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    index = VectorIndex(tmp_path / "ivf", dim=32)
+    index.append([f"k{i}" for i in range(1500)], vectors[:1500])
+    assert not index.trained
+    index.append([f"k{i}" for i in range(1500, 3000)], vectors[1500:])
+    assert index.trained
+
+    query = vectors[2500]
+    assert index.search(query, k=1)[0][0] == "k2500"
+    assert VectorIndex(tmp_path / "ivf", dim=32).search(query, k=1)[0][0] == "k2500"
+
+
+def test_recall_sync_is_incremental_and_search_excludes(comm_db, tmp_path):
+    recall = MessageRecall(tmp_path / "recall")
+    first = _save("We picked PostgreSQL for the billing service database")
+    _save("Lunch was a burrito today", prev=first.com_id)
+
+    assert recall.sync() == 2
+    assert recall.sync() == 0
+    third = _save("Billing service database migrations run nightly")
+    assert recall.sync() == 1
+
+    hits = recall.search("which database does the billing service use?", k=2)
+    assert {comm.com_id for comm, _ in hits} == {first.com_id, third.com_id}
+
+    hits = recall.search("which database does the billing service use?", k=2, exclude={third.com_id})
+    assert [comm.com_id for comm, _ in hits] == [first.com_id]
+
+
+def test_recall_search_is_scoped_to_a_session(comm_db, tmp_path):
+    recall = MessageRecall(tmp_path / "recall")
+    for n in range(6):
+        _save(f"Bob's bank account number {n} is private", session_id="bob")
+    alice = _save("Alice keeps her bank account at the credit union", session_id="alice")
+    recall.sync()
+
+    hits = recall.search("which bank account?", k=2, session_id="alice")
+    assert [comm.com_id for comm, _ in hits] == [alice.com_id]
+    assert all(comm.session_id == "bob" for comm, _ in recall.search("which bank account?", k=3, session_id="bob"))
+    assert recall.search("which bank account?", k=2, session_id="carol") == []
+
+
+@pytest.mark.asyncio
+async def test_head_agent_injects_recalled_messages(comm_db, tmp_path):
+    async def stream():
+        yield "ok"
+
+    llm = AsyncMock()
+    llm.send_message.return_value = stream()
+    agent = HeadAgent(llm_service=llm)
+    agent.agent_files_dir = tmp_path
+    recall = MessageRecall(tmp_path / "recall")
+
+    old = _save("Remember: the staging server hostname is atlas-07")
+    recall.sync()
+    current = _save("hello again", prev=None)
+
+    with patch.object(HeadAgent, "recall", recall), \
+         patch("backend.core.agent.head_agent.save_message"):
+        async for _ in agent.process_message("what is the staging server hostname?", last_com_id=current.com_id):
+            pass
+
+    messages = llm.send_message.call_args.kwargs["messages"]
+    assert messages[1]["role"] == "system"
+    assert "atlas-07" in messages[1]["content"]
+    assert old.com_id not in messages[1]["content"]
+    assert messages[-1]["content"] == "what is the staging server hostname?"
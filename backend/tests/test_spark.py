@@ -0,0 +1,216 @@
+"""Tests for the SPARK heartbeat engine and its SPARK.md config."""
+
+import asyncio
+import gzip
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock
+
+from backend.core.memory.notebook_store import NotebookStore
+from backend.core.spark import SparkActivityLog, SparkEngine, load_spark_config
+from backend.core.spark.config import parse_spark_config
+
+SPARK_MD = """# SPARK
+
+```yaml
+interval_minutes: {interval}
+max_check_tokens: 300
+enabled: {enabled}
+```
+"""
+
+
+@pytest.fixture
+def agent_dir(tmp_path):
+    (tmp_path / "SPARK.md").write_text(SPARK_MD.format(interval=10, enabled="true"))
+    (tmp_path / "NOTEBOOK.md").write_text("# Notebook\n")
+    return tmp_path
+
+
+@pytest.fixture
+def store(agent_dir):
+    store = NotebookStore(agent_dir)
+    yield store
+    store.close()
+
+
+def _engine(agent_dir, store, llm=None, **kwargs):
+    return SparkEngine(agent_dir=lambda: agent_dir, notebook=lambda: store, llm_service=llm, **kwargs)
+
+
+def test_config_parse_defaults_and_clamp(agent_dir):
+    """Values come from the yaml blocks; bad types are ignored and the interval is clamped."""
+    config = load_spark_config(agent_dir)
+    assert config.interval_minutes == 10
+    assert config.max_check_tokens == 300
+    assert config.log_directory == "spark_logs"
+
+    config = parse_spark_config(SPARK_MD.format(interval=1, enabled="maybe"))
+    assert config.interval_minutes == 5
+    assert config.enabled is True
+
+    assert load_spark_config(agent_dir / "missing").interval_minutes == 15
+
+
+@pytest.mark.asyncio
+async def test_heartbeat_without_pending_skips_llm(agent_dir, store):
+    """An empty notebook is checked locally; the LLM is never called."""
+    llm = AsyncMock()
+    engine = _engine(agent_dir, store, llm)
+
+    result = await engine.heartbeat()
+
+    assert result.status == "OK"
+    assert result.action == "No pending tasks found"
+    llm.send_message.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_unchanged_pending_set_is_evaluated_once(agent_dir, store):
+    """Pending work costs one LLM check; the same set again reuses the verdict."""
+    llm = AsyncMock()
+    llm.send_message.return_value = "ACTION: follow up on the report"
+    on_action = AsyncMock()
+    engine = _engine(agent_dir, store, llm, on_action=on_action)
+    store.append("[PENDING] 2024-01-02 09:00 - Send the report")
+
+    first = await engine.heartbeat()
+    second = await engine.heartbeat()
+
+    assert first.status == "ACTION" and first.llm_called
+    assert "follow up on the report" in first.action
+    assert second.status == "ACTION" and not second.llm_called
+    assert llm.send_message.await_count == 1
+    on_action.assert_awaited_once()
+
+    prompt = llm.send_message.call_args.kwargs["messages"][0]["content"]
+    assert "Send the report" in prompt
+
+    store.append("[PENDING] 2024-01-03 09:00 - Book the venue")
+    await engine.heartbeat()
+    assert llm.send_message.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_notebook_change_wakes_engine_early(agent_dir, store):
+    """A notebook write wakes the engine long before its interval elapses."""
+    engine = _engine(agent_dir, store, wake_debounce_seconds=0.01)
+    assert await engine.start()
+    try:
+        await asyncio.to_thread(store.append, "[PENDING] 2024-01-02 09:00 - Water the plants")
+        for _ in range(100):
+            if engine.recent:
+                break
+            await asyncio.sleep(0.01)
+        assert engine.recent[-1].pending == 1
+    finally:
+        await engine.stop()
+    assert not engine.running
+
+
+@pytest.mark.asyncio
+async def test_attached_session_notebooks_are_checked(agent_dir, store, tmp_path):
+    """A session notebook write wakes the engine and only that notebook is checked."""
+    session_dir = tmp_path / "alice"
+    session_dir.mkdir()
+    (session_dir / "NOTEBOOK.md").write_text("# Notebook\n")
+    alice = NotebookStore(session_dir)
+    engine = _engine(agent_dir, store, wake_debounce_seconds=0.01)
+    assert await engine.start()
+    try:
+        engine.attach("alice", alice)
+        assert engine.sessions == ["alice"]
+        await asyncio.to_thread(alice.append, "[PENDING] 2024-01-02 09:00 - Alice's task")
+        for _ in range(100):
+            if any(result.pending for result in engine.recent):
+                break
+            await asyncio.sleep(0.01)
+        checked = [(result.session_id, result.pending) for result in engine.recent]
+        assert ("alice", 1) in checked
+        assert all(session_id == "alice" for session_id, _ in checked)
+
+        engine.detach("alice")
+        assert engine.sessions == [] and not alice._listeners
+        with pytest.raises(LookupError):
+            await engine.heartbeat("alice")
+    finally:
+        await engine.stop()
+        alice.close()
+
+
+@pytest.mark.asyncio
+async def test_disabled_engine_does_not_start(agent_dir, store):
+    (agent_dir / "SPARK.md").write_text(SPARK_MD.format(interval=10, enabled="false"))
+    engine = _engine(agent_dir, store)
+
+    assert await engine.start() is False
+    assert not engine.running
+
+
+def _utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+@pytest.mark.asyncio
+async def test_activity_log_batches_and_queries(tmp_path):
+    """Queued records land in the day's segment in log_format and parse back."""
+    log = SparkActivityLog(tmp_path / "spark_logs", log_format="[{status}] {timestamp} :: {action}", batch_window=0)
+    log.start()
+    for minute in range(3):
+        assert log.write(_utc(2026, 2, 16, 14, minute), "OK", f"check {minute} | done")
+    records = await log.query(_utc(2026, 2, 16, 14, 1), _utc(2026, 2, 16, 23, 59))
+    await log.stop()
+
+    assert [record.action for record in records] == ["check 1 | done", "check 2 | done"]
+    lines = (tmp_path / "spark_logs" / "spark-2026-02-16.log").read_text().splitlines()
+    assert lines[0] == "[OK] 2026-02-16T14:00:00Z :: check 0 | done"
+    assert log.write(_utc(2026, 2, 16, 15), "OK", "after stop") is False
+
+
+@pytest.mark.asyncio
+async def test_activity_log_rotates_compresses_and_expires(tmp_path):
+    """A new day compresses earlier segments and drops those past retention."""
+    log_dir = tmp_path / "spark_logs"
+    log = SparkActivityLog(log_dir, retention_days=3, batch_window=0)
+    log.start()
+    log.write(_utc(2026, 2, 10, 9), "OK", "old")
+    await log.flush()
+    log.write(_utc(2026, 2, 12, 9), "ACTION", "Found pending task")
+    await log.flush()
+    log.write(_utc(2026, 2, 13, 9), "OK", "today")
+    await log.stop()
+
+    assert sorted(path.name for path in log_dir.iterdir()) == ["spark-2026-02-12.log.gz", "spark-2026-02-13.log"]
+    with gzip.open(log_dir / "spark-2026-02-12.log.gz", "rt") as f:
+        assert f.read() == "2026-02-12T09:00:00Z | ACTION | Found pending task\n"
+
+
+def test_activity_log_query_reads_only_segments_in_range(tmp_path):
+    """Segments outside the range are never opened (a corrupt one would raise)."""
+    log_dir = tmp_path / "spark_logs"
+    log_dir.mkdir()
+    (log_dir / "spark-2026-02-01.log.gz").write_bytes(b"not gzip")
+    with gzip.open(log_dir / "spark-2026-02-15.log.gz", "wt") as f:
+        f.write("2026-02-15T23:00:00Z | OK | late\n")
+    (log_dir / "spark-2026-02-16.log").write_text("2026-02-16T01:00:00Z | OK | early\nnot a record\n")
+
+    log = SparkActivityLog(log_dir)
+    records = log.read_range(_utc(2026, 2, 15, 12), _utc(2026, 2, 16, 12))
+
+    assert [record.action for record in records] == ["late", "early"]
+
+
+@pytest.mark.asyncio
+async def test_engine_logs_heartbeats(agent_dir, store):
+    """Heartbeats of a started engine are written to the SPARK.md log directory."""
+    engine = _engine(agent_dir, store)
+    await engine.start()
+    engine.activity_log.batch_window = 0
+    try:
+        await engine.heartbeat()
+        records = await engine.query_log(datetime.now(timezone.utc) - timedelta(minutes=1))
+    finally:
+        await engine.stop()
+
+    assert [(record.status, record.action) for record in records] == [("OK", "No pending tasks found")]
+    assert any((agent_dir / "spark_logs").iterdir())
@@ -0,0 +1,88 @@
+"""Tests for adaptive WebSocket token coalescing."""
+
+import asyncio
+import pytest
+from backend.api.websocket.coalescer import TokenCoalescer
+
+
+class FrameRecorder:
+    def __init__(self):
+        self.frames = []
+
+    async def __call__(self, text, count):
+        self.frames.append((text, count))
+
+
+@pytest.mark.asyncio
+async def test_first_token_is_sent_immediately():
+    """Batching never delays time-to-first-token."""
+    recorder = FrameRecorder()
+    coalescer = TokenCoalescer(recorder, min_window_ms=1000, max_window_ms=1000)
+
+    await coalescer.add("Hello")
+    assert recorder.frames == [("Hello", 1)]
+
+    await coalescer.close()
+
+
+@pytest.mark.asyncio
+async def test_fast_tokens_are_batched_and_order_preserved():
+    """A burst of tokens collapses into a handful of frames with the same text."""
+    recorder = FrameRecorder()
+    coalescer = TokenCoalescer(recorder, min_window_ms=20, max_window_ms=50)
+    tokens = [f"t{i} " for i in range(500)]
+
+    for token in tokens:
+        await coalescer.add(token)
+    await coalescer.close()
+
+    assert "".join(text for text, _ in recorder.frames) == "".join(tokens)
+    assert sum(count for _, count in recorder.frames) == len(tokens)
+    assert len(recorder.frames) <= 10
+
+
+@pytest.mark.asyncio
+async def test_timer_flushes_stalled_tokens():
+    """Buffered tokens go out when the window elapses even if no more tokens arrive."""
+    recorder = FrameRecorder()
+    coalescer = TokenCoalescer(recorder, min_window_ms=10, max_window_ms=10)
+
+    await coalescer.add("a")
+    await coalescer.add("b")
+    await asyncio.sleep(0.05)
+
+    assert recorder.frames == [("a", 1), ("b", 1)]
+    await coalescer.close()
+
+
+@pytest.mark.asyncio
+async def test_byte_cap_forces_flush():
+    """A full buffer is flushed without waiting for the window."""
+    recorder = FrameRecorder()
+    coalescer = TokenCoalescer(recorder, min_window_ms=1000, max_window_ms=1000, max_bytes=10)
+
+    await coalescer.add("x")
+    await coalescer.add("12345")
+    await coalescer.add("67890")
+
+    assert recorder.frames[-1] == ("1234567890", 2)
+    await coalescer.close()
+
+
+@pytest.mark.asyncio
+async def test_background_send_error_is_raised_on_next_add():
+    """A failed timer flush (e.g. client gone) surfaces to the producer."""
+    calls = []
+
+    async def failing_send(text, count):
+        calls.append(text)
+        if len(calls) > 1:
+            raise ConnectionError("client disconnected")
+
+    coalescer = TokenCoalescer(failing_send, min_window_ms=5, max_window_ms=5)
+    await coalescer.add("a")
+    await coalescer.add("b")
+    await asyncio.sleep(0.03)
+
+    with pytest.raises(ConnectionError):
+        await coalescer.add("c")
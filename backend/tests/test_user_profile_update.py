@@ -1,3 +1,5 @@
+import asyncio
+import json
 import pytest
 from unittest.mock import AsyncMock, patch
 from backend.core.agent.head_agent import HeadAgent
@@ -74,6 +76,9 @@ async def test_profile_update_triggers_after_5_messages(head_agent):
         async for token in head_agent.process_message("test"):
             pass
 
+    # The update runs in the background after the turn has finished
+    await head_agent.profile_updater.wait_idle()
+
     assert head_agent._update_user_profile.call_count == 1
     assert head_agent._message_count_since_last_update == 0
 
@@ -108,8 +113,179 @@ Testing
 
 @pytest.mark.asyncio
 async def test_update_handles_llm_failure(head_agent):
+    """A failed update is reported to the ProfileUpdater, which keeps the turn counter for the retry."""
     head_agent.llm_service.send_message.side_effect = Exception("LLM Error")
+    message = Message(id=1, sender="user", content="My name is Alice", timestamp=datetime.now())
+    updater = head_agent.profile_updater
+    updater.debounce_seconds = 0
+    head_agent._message_count_since_last_update = 5
+
+    with patch("backend.core.agent.head_agent.get_recent_messages", return_value=[message]):
+        with pytest.raises(Exception, match="LLM Error"):
+            await head_agent._update_user_profile()
+
+        updater.schedule()
+        await updater.wait_idle()
+
+    assert updater.turns_since_update == 5
+    assert updater.state["last_error"] == "LLM Error"
+    assert updater.analysed_message_id == 0
+
+@pytest.mark.asyncio
+async def test_profile_update_does_not_block_turn(head_agent):
+    """The turn's generator finishes before the (slow) profile update does."""
+    release = asyncio.Event()
+
+    async def slow_update():
+        await release.wait()
+
+    head_agent._update_user_profile = AsyncMock(side_effect=slow_update)
+    head_agent.profile_updater.debounce_seconds = 0
+    head_agent._message_count_since_last_update = 4
+
+    with patch("backend.core.agent.head_agent.save_message"), \
+         patch("backend.core.agent.head_agent.get_recent_messages", return_value=[]):
+        async for token in head_agent.process_message("test"):
+            pass
+
+    assert head_agent.profile_updater.running
+    release.set()
+    await head_agent.profile_updater.wait_idle()
+    assert not head_agent.profile_updater.running
+    assert head_agent._message_count_since_last_update == 0
+
+@pytest.mark.asyncio
+async def test_profile_updates_are_single_flight_and_debounced(head_agent):
+    """Triggers during the debounce window or a running update collapse into one run."""
+    head_agent._update_user_profile = AsyncMock()
+    updater = head_agent.profile_updater
+    updater.interval = 1
+    updater.debounce_seconds = 0.05
+
+    for _ in range(3):
+        updater.record_turn()
+    await asyncio.sleep(0.1)
+    await updater.wait_idle()
+
+    assert head_agent._update_user_profile.call_count == 1
+    assert updater.turns_since_update == 0
+
+@pytest.mark.asyncio
+async def test_profile_update_debounce_restarts_on_new_turns(head_agent):
+    """Each turn during the quiet period postpones the update, up to the maximum delay."""
+    loop = asyncio.get_running_loop()
+    ran_at = []
+    head_agent._update_user_profile = AsyncMock(side_effect=lambda: ran_at.append(loop.time()))
+    updater = head_agent.profile_updater
+    updater.interval = 1
+    updater.debounce_seconds = 0.1
+
+    for _ in range(4):
+        updater.record_turn()
+        last_turn = loop.time()
+        await asyncio.sleep(0.06)
+        assert not ran_at
+    await asyncio.sleep(0.2)
+
+    assert head_agent._update_user_profile.call_count == 1
+    assert ran_at[0] - last_turn >= 0.09
+    assert updater.turns_since_update == 0
+
+    # A steady stream of turns cannot postpone the update forever
+    updater.max_debounce_seconds = 0.2
+    ran_at.clear()
+    started = loop.time()
+    for _ in range(8):
+        updater.record_turn()
+        await asyncio.sleep(0.05)
+    assert ran_at and ran_at[0] - started < 0.35
+    await updater.shutdown()
 
-    with patch("backend.core.agent.head_agent.get_recent_messages", return_value=[]):
-        # Should not raise exception
+
+@pytest.mark.asyncio
+async def test_record_turn_writes_state_off_the_event_loop(head_agent):
+    """The per-turn watermark write runs in a worker thread and still reaches disk."""
+    updater = head_agent.profile_updater
+    updater.interval = 100
+    with patch.object(updater, "_save_state", side_effect=AssertionError("synchronous write")):
+        for _ in range(3):
+            updater.record_turn()
+    await updater.shutdown()
+
+    state = json.loads((head_agent.agent_files_dir / "profile_state.json").read_text(encoding="utf-8"))
+    assert state["turns_since_update"] == 3
+
+
+def test_profile_watermark_persists(head_agent, mock_llm_service, tmp_path):
+    """The turn counter survives a restart via profile_state.json."""
+    head_agent._message_count_since_last_update = 3
+
+    restarted = HeadAgent(llm_service=mock_llm_service)
+    restarted.agent_files_dir = tmp_path
+    assert restarted._message_count_since_last_update == 3
+
+@pytest.mark.asyncio
+async def test_update_only_analyses_messages_after_watermark(head_agent):
+    messages = [
+        Message(id=i, sender="user", content=f"Message number {i}", timestamp=datetime.now())
+        for i in range(1, 5)
+    ]
+
+    with patch("backend.core.agent.head_agent.get_recent_messages", return_value=messages[:2]):
         await head_agent._update_user_profile()
+    assert head_agent.profile_updater.analysed_message_id == 2
+
+    with patch("backend.core.agent.head_agent.get_recent_messages", return_value=messages):
+        await head_agent._update_user_profile()
+
+    prompt = head_agent.llm_service.send_message.call_args.kwargs["messages"][0]["content"]
+    assert "Message number 3" in prompt and "Message number 4" in prompt
+    assert "Message number 2" not in prompt
+    assert head_agent.profile_updater.analysed_message_id == 4
+
+    # Nothing new: no LLM call at all
+    calls = head_agent.llm_service.send_message.call_count
+    with patch("backend.core.agent.head_agent.get_recent_messages", return_value=messages):
+        await head_agent._update_user_profile()
+    assert head_agent.llm_service.send_message.call_count == calls
+
+@pytest.mark.asyncio
+async def test_update_splits_messages_into_token_bounded_batches(head_agent):
+    messages = [
+        Message(id=i, sender="user", content="word " * 400, timestamp=datetime.now())
+        for i in range(1, 11)
+    ]
+
+    batches = head_agent._profile_batches(messages)
+    assert len(batches) > 1
+    assert [last_id for _, last_id in batches][-1] == 10
+    for text, _ in batches:
+        assert head_agent.token_counter.count_tokens(text) <= 3000
+
+    # A failing batch stops the run and leaves the watermark at the last merged batch
+    head_agent.llm_service.send_message.side_effect = [
+        "## Interests\nFirst batch", Exception("LLM Error")
+    ]
+    with patch("backend.core.agent.head_agent.get_recent_messages", return_value=messages):
+        with pytest.raises(Exception, match="LLM Error"):
+            await head_agent._update_user_profile()
+    assert head_agent.profile_updater.analysed_message_id == batches[0][1]
+    assert "First batch" in (head_agent.agent_files_dir / "USER.md").read_text(encoding="utf-8")
+
+@pytest.mark.asyncio
+async def test_profile_stays_bounded_over_many_updates(head_agent):
+    head_agent.llm_service.send_message.side_effect = lambda messages, **kwargs: (
+        "Keep it short." if "Condense" in messages[0]["content"] else
+        f"## Interests & Topics\nEnjoys Python programming. Asked about topic {len(messages[0]['content'])}."
+    )
+
+    sizes = []
+    for i in range(1, 31):
+        message = Message(id=i, sender="user", content=f"Question {i} " + "x" * i, timestamp=datetime.now())
+        with patch("backend.core.agent.head_agent.get_recent_messages", return_value=[message]):
+            await head_agent._update_user_profile()
+        sizes.append(head_agent.token_counter.count_tokens(head_agent._read_file("USER.md")))
+
+    content = head_agent._read_file("USER.md")
+    assert content.count("Enjoys Python programming") <= 1
+    assert max(sizes[10:]) <= head_agent.profile_compactor.cap_for("Interests & Topics") + 20
@@ -1,4 +1,5 @@
 """Tests for WebSocket functionality."""
+import asyncio
 import pytest
 from unittest.mock import patch
 from fastapi.testclient import TestClient
@@ -13,7 +14,7 @@ def client():
 def test_websocket_connection(client):
     """Test WebSocket connection and agent integration (streaming)."""
     # Mock the HeadAgent.process_message to return an async generator
-    async def mock_streaming_response(content):
+    async def mock_streaming_response(content, **kwargs):
         yield "Mocked "
         yield "AI "
         yield "Response"
@@ -75,3 +76,74 @@ def test_websocket_invalid_json(client):
         response = websocket.receive_json()
         assert response["type"] == "error"
         assert "Invalid JSON" in response["message"]
+
+@pytest.mark.timeout(30)
+def test_websocket_cancel_aborts_stream(client):
+    """A cancel message closes the agent generator and ends the stream early."""
+    closed = []
+
+    async def slow_streaming_response(content, **kwargs):
+        try:
+            yield "First "
+            for _ in range(100):
+                await asyncio.sleep(0.05)
+                yield "more "
+        finally:
+            closed.append(True)
+
+    with patch("backend.core.agent.head_agent.HeadAgent.process_message", side_effect=slow_streaming_response):
+        with client.websocket_connect("/ws") as websocket:
+            websocket.receive_json()
+            websocket.send_json({"type": "message", "content": "Tell me a long story"})
+
+            start_msg = websocket.receive_json()
+            assert start_msg["type"] == "stream_start"
+
+            first = websocket.receive_json()
+            assert first["token"] == "First "
+
+            websocket.send_json({"type": "cancel", "message_id": start_msg["message_id"]})
+
+            while True:
+                msg = websocket.receive_json()
+                if msg["type"] == "stream_end":
+                    break
+                assert msg["type"] == "stream_token"
+
+            assert msg["cancelled"] is True
+            assert msg["content"].startswith("First ")
+            assert len(msg["content"]) < len("First ") + 100 * len("more ")
+
+    assert closed == [True]
+
+
+def test_websocket_token_batching_negotiation(client):
+    """Clients that negotiate token_batching receive fewer, larger stream_token frames."""
+
+    async def fast_streaming_response(content, **kwargs):
+        for i in range(200):
+            yield f"tok{i} "
+
+    with patch("backend.core.agent.head_agent.HeadAgent.process_message", side_effect=fast_streaming_response):
+        with client.websocket_connect("/ws") as websocket:
+            websocket.receive_json()
+            websocket.send_json({"type": "hello", "features": ["token_batching", "unknown_feature"]})
+            ack = websocket.receive_json()
+            assert ack["type"] == "hello_ack"
+            assert ack["features"] == ["token_batching"]
+
+            websocket.send_json({"type": "message", "content": "Go fast"})
+            assert websocket.receive_json()["type"] == "stream_start"
+
+            frames = []
+            while True:
+                msg = websocket.receive_json()
+                if msg["type"] == "stream_end":
+                    break
+                frames.append(msg)
+
+    expected = "".join(f"tok{i} " for i in range(200))
+    assert "".join(frame["token"] for frame in frames) == expected
+    assert sum(frame["count"] for frame in frames) == 200
+    assert len(frames) < 200
+    assert msg["content"] == expected
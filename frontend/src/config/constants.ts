@@ -6,6 +6,14 @@
 export const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || 'http://localhost:8000';
 export const WEBSOCKET_URL = import.meta.env.VITE_WEBSOCKET_URL || 'ws://localhost:8000/ws';
 
+// Session Configuration
+// The default session is the single-user agent (its USER.md, NOTEBOOK.md and history).
+// Set VITE_SESSION_ID to use a named session, or VITE_ISOLATED_SESSIONS=true to give
+// every browser its own session.
+export const DEFAULT_SESSION_ID = 'default';
+export const CONFIGURED_SESSION_ID = import.meta.env.VITE_SESSION_ID || '';
+export const ISOLATED_SESSIONS = import.meta.env.VITE_ISOLATED_SESSIONS === 'true';
+
 // WebSocket Configuration
 export const WEBSOCKET_RECONNECT_INTERVAL = 3000; // 3 seconds
 export const WEBSOCKET_MAX_RECONNECT_ATTEMPTS = 5;
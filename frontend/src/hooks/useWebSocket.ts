@@ -1,12 +1,13 @@
 import { useEffect, useRef, useState, useCallback } from 'react';
 import { Message } from '../types/chat';
+import { getSessionId } from '../services/session';
 
 export interface WebSocketConfig {
   url: string;
   onMessage?: (message: Message) => void;
   onStreamStart?: (messageId: string, userComId?: string) => void;
   onStreamToken?: (messageId: string, token: string) => void;
-  onStreamEnd?: (messageId: string, fullContent: string, aiComId?: string) => void;
+  onStreamEnd?: (messageId: string, fullContent: string, aiComId?: string, cancelled?: boolean) => void;
   onConnect?: () => void;
   onDisconnect?: () => void;
   onError?: (error: Event) => void;
@@ -14,10 +15,14 @@ export interface WebSocketConfig {
   reconnectInterval?: number;
 }
 
+// Protocol features this client supports (negotiated with a "hello" on connect)
+const CLIENT_FEATURES = ['token_batching'];
+
 export interface WebSocketState {
   isConnected: boolean;
   connectionError: string | null;
   sendMessage: (content: string, lastComId?: string | null) => void;
+  cancelStream: (messageId?: string) => void;
   disconnect: () => void;
 }
 
@@ -78,6 +83,8 @@ export function useWebSocket(config: WebSocketConfig): WebSocketState {
         console.log('WebSocket connected');
         setIsConnected(true);
         setConnectionError(null);
+        // Opt in to batched stream_token frames and bind this client's session; older servers ignore this
+        ws.send(JSON.stringify({ type: 'hello', features: CLIENT_FEATURES, session_id: getSessionId() }));
         onConnectRef.current?.();
       };
 
@@ -87,12 +94,17 @@ export function useWebSocket(config: WebSocketConfig): WebSocketState {
 
           if (data.type === 'connection') {
             console.log('Connection confirmed:', data.message);
+          } else if (data.type === 'hello_ack') {
+            console.log('Negotiated features:', data.features);
           } else if (data.type === 'stream_start') {
             onStreamStartRef.current?.(data.message_id, data.user_com_id);
           } else if (data.type === 'stream_token') {
-            onStreamTokenRef.current?.(data.message_id, data.token);
+            // With token_batching a frame carries several tokens (`count`) concatenated in `token`
+            if (data.token) {
+              onStreamTokenRef.current?.(data.message_id, data.token);
+            }
           } else if (data.type === 'stream_end') {
-            onStreamEndRef.current?.(data.message_id, data.content, data.ai_com_id);
+            onStreamEndRef.current?.(data.message_id, data.content, data.ai_com_id, data.cancelled);
           } else if (data.type === 'echo' || data.type === 'message') {
             const sender = data.sender === 'assistant' ? 'ai' : (data.sender || 'ai');
             const message: Message = {
@@ -153,6 +165,13 @@ export function useWebSocket(config: WebSocketConfig): WebSocketState {
     }
   }, []);
 
+  // Ask the server to stop generating the current (or given) response
+  const cancelStream = useCallback((messageId?: string) => {
+    if (wsRef.current && wsRef.current.readyState === WebSocket.OPEN) {
+      wsRef.current.send(JSON.stringify({ type: 'cancel', message_id: messageId ?? null }));
+    }
+  }, []);
+
   const disconnect = useCallback(() => {
     shouldReconnectRef.current = false;
     if (reconnectTimeoutRef.current) {
@@ -190,6 +209,7 @@ export function useWebSocket(config: WebSocketConfig): WebSocketState {
     isConnected,
     connectionError,
     sendMessage,
+    cancelStream,
     disconnect
   };
 }
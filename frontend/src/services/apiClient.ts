@@ -13,6 +13,15 @@ interface MessageResponse {
   timestamp: string;
 }
 
+interface CommunicationResponse {
+  com_id: string;
+  sender: string;
+  recipient: string;
+  timestamp: string;
+  raw_content: string;
+  initiator_com_id: string | null;
+}
+
 interface ApiError {
   message: string;
   code?: string;
@@ -65,8 +74,14 @@ class ApiClient {
     return this.request<HealthResponse>('/api/v1/health');
   }
 
-  async getMessages(limit: number = 100): Promise<MessageResponse[]> {
-    return this.request<MessageResponse[]>(`/api/v1/messages?limit=${limit}`);
+  async getMessages(limit: number = 100, sessionId?: string): Promise<MessageResponse[]> {
+    const session = sessionId ? `&session_id=${encodeURIComponent(sessionId)}` : '';
+    return this.request<MessageResponse[]>(`/api/v1/messages?limit=${limit}${session}`);
+  }
+
+  async getLatestReply(sessionId?: string): Promise<CommunicationResponse | null> {
+    const query = sessionId ? `?session_id=${encodeURIComponent(sessionId)}` : '';
+    return this.request<CommunicationResponse | null>(`/api/v1/communications/latest${query}`);
   }
 
   async clearConversation(): Promise<void> {
@@ -75,4 +90,4 @@ class ApiClient {
 }
 
 export const apiClient = new ApiClient();
-export type { HealthResponse, ApiError, MessageResponse };
+export type { HealthResponse, ApiError, MessageResponse, CommunicationResponse };
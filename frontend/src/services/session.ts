@@ -0,0 +1,36 @@
+import { v4 as uuidv4 } from 'uuid';
+import { CONFIGURED_SESSION_ID, DEFAULT_SESSION_ID, ISOLATED_SESSIONS } from '../config/constants';
+
+const SESSION_STORAGE_KEY = 'moon-ai.session-id';
+
+let cachedSessionId: string | null = null;
+
+/**
+ * Conversation session of this client, sent in the WebSocket hello and used
+ * to scope history requests.
+ *
+ * Clients stay on the default session (the existing single-user agent)
+ * unless configured otherwise: VITE_SESSION_ID names a session, and
+ * VITE_ISOLATED_SESSIONS=true generates one per browser, kept in
+ * localStorage so a reload continues it.
+ */
+export function getSessionId(): string {
+  if (cachedSessionId) {
+    return cachedSessionId;
+  }
+  if (CONFIGURED_SESSION_ID || !ISOLATED_SESSIONS) {
+    cachedSessionId = CONFIGURED_SESSION_ID || DEFAULT_SESSION_ID;
+    return cachedSessionId;
+  }
+  try {
+    cachedSessionId = localStorage.getItem(SESSION_STORAGE_KEY);
+    if (!cachedSessionId) {
+      cachedSessionId = uuidv4();
+      localStorage.setItem(SESSION_STORAGE_KEY, cachedSessionId);
+    }
+  } catch {
+    // Storage unavailable (e.g. private mode): keep the id for this page only
+    cachedSessionId = cachedSessionId || uuidv4();
+  }
+  return cachedSessionId;
+}
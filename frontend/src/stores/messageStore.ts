@@ -1,6 +1,7 @@
 import { create } from 'zustand';
 import { Message } from '../types/chat';
 import { apiClient, MessageResponse } from '../services/apiClient';
+import { getSessionId } from '../services/session';
 
 interface MessageState {
   messages: Message[];
@@ -24,16 +25,21 @@ export const useMessageStore = create<MessageState>((set) => ({
   loadMessages: async () => {
     set({ isLoading: true, error: null });
     try {
-      const data: MessageResponse[] = await apiClient.getMessages(100);
+      const sessionId = getSessionId();
+      const [data, latestReply] = await Promise.all([
+        apiClient.getMessages(100, sessionId),
+        apiClient.getLatestReply(sessionId),
+      ]);
 
-      const messages: Message[] = data.map((msg) => ({
+      const messages: Message[] = data.map((msg: MessageResponse) => ({
         id: msg.id.toString(),
         sender: msg.sender === 'assistant' ? 'ai' : 'user',
         content: msg.content,
         timestamp: new Date(msg.timestamp),
       }));
 
-      set({ messages, isLoading: false });
+      // Continue the newest thread rather than starting a new one after a reload
+      set({ messages, lastComId: latestReply?.com_id ?? null, isLoading: false });
     } catch (error: unknown) {
       console.error('Error loading messages:', error);
       set({